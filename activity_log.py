@@ -0,0 +1,282 @@
+"""
+Buffered writer for the activity (audit) log.
+
+log_activity() no longer inserts into activity_logs inside the caller's transaction. It hands
+the entry to a bounded in-process queue and returns. A writer thread drains the queue every
+ACTIVITY_LOG_FLUSH_INTERVAL seconds (sooner once ACTIVITY_LOG_BATCH_SIZE entries are waiting)
+and writes each batch with one multi-row INSERT on its own connection, so an audit write never
+commits or rolls back the request's session.
+
+Durable fallback: entries that can't be written (database down, queue full) are appended to
+ACTIVITY_LOG_SPOOL_PATH as JSON lines and replayed by the next successful flush. The spool is
+shared by every worker process, so appending and claiming it happen under an flock on
+ACTIVITY_LOG_SPOOL_PATH.lock (a thread lock only where fcntl doesn't exist). Lines that can't be
+parsed (e.g. torn by a worker killed mid-append) are moved to ACTIVITY_LOG_SPOOL_PATH.corrupt.
+Whatever is still queued when the process exits is flushed (or spooled) at exit.
+
+ACTIVITY_LOG_BUFFERED = false writes each entry immediately, still on its own connection.
+"""
+
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+from sqlalchemy.exc import IntegrityError
+
+class ActivityLogWriter:
+    def __init__(self, buffered=True, batch_size=500, flush_interval=2.0, max_queue=10000, spool_path=None):
+        self.buffered = buffered
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.app = None
+        self._queue = queue.Queue(max_queue)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.written = 0
+        self.spooled = 0
+        self.dropped = 0
+        self.last_flush_at = None
+        self.last_error = None
+
+    def configure(self, app, buffered=None, batch_size=None, flush_interval=None, max_queue=None, spool_path=None):
+        """Bind the writer to an app; settings left as None keep their current value"""
+        self.app = app
+        if buffered is not None:
+            self.buffered = buffered
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if max_queue is not None and max_queue != self._queue.maxsize:
+            self.flush()
+            self._queue = queue.Queue(max_queue)
+        if spool_path is not None:
+            self.spool_path = spool_path
+
+    def submit(self, entry):
+        """Record one activity_logs row (a dict of column values)"""
+        if self.app is None:
+            from flask import current_app
+            self.app = current_app._get_current_object()
+        if not self.buffered:
+            with self._flush_lock:
+                self._write(self._take_spool() + [entry])
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # The writer can't keep up (or the database is down); keep the entry on disk instead
+            self._spool([entry])
+            return
+        self._start_thread()
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def _start_thread(self):
+        # Started on first use, so each gunicorn worker gets its own writer after the fork
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f'Activity log writer error: {str(e)}', exc_info=True)
+
+    def flush(self):
+        """Write everything queued and spooled so far; returns the number of rows written"""
+        with self._flush_lock:
+            # Claim the spool before draining the queue, so a spool error can't strand drained entries
+            spooled = self._take_spool() if self.app is not None else []
+            entries = []
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if self.app is None:
+                if entries:
+                    self._spool(entries)
+                return 0
+            entries = spooled + entries
+            if not entries:
+                return 0
+            written = 0
+            for start in range(0, len(entries), self.batch_size):
+                written += self._write(entries[start:start + self.batch_size])
+            self.last_flush_at = datetime.utcnow()
+            return written
+
+    def _write(self, entries):
+        """Insert a batch in one statement; spools it when the database can't be reached"""
+        from extensions import db
+        from models import ActivityLog
+
+        table = ActivityLog.__table__
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    connection.execute(table.insert(), entries)
+            self.written += len(entries)
+            self.last_error = None
+            return len(entries)
+        except IntegrityError:
+            # One bad row (e.g. its user was deleted meanwhile) must not cost the batch
+            written = 0
+            with self.app.app_context():
+                for entry in entries:
+                    try:
+                        with db.engine.begin() as connection:
+                            connection.execute(table.insert(), [entry])
+                        written += 1
+                    except IntegrityError as e:
+                        self.dropped += 1
+                        logging.error(f"Dropped activity log entry {entry.get('action')} for user {entry.get('user_id')}: {str(e)}")
+                    except Exception as e:
+                        self.last_error = str(e)
+                        self._spool([entry])
+            self.written += written
+            return written
+        except Exception as e:
+            self.last_error = str(e)
+            logging.error(f'Could not write {len(entries)} activity log entries, spooling them: {str(e)}')
+            self._spool(entries)
+            return 0
+
+    @contextmanager
+    def _spool_locked(self):
+        """Hold the spool against other threads and, through an flock, other worker processes"""
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+            with open(f'{self.spool_path}.lock', 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _spool(self, entries):
+        if not self.spool_path:
+            self.dropped += len(entries)
+            logging.error(f'No ACTIVITY_LOG_SPOOL_PATH; dropped {len(entries)} activity log entries')
+            return
+        lines = ''.join(json.dumps(entry, default=_json_default) + '\n' for entry in entries)
+        try:
+            with self._spool_locked():
+                with open(self.spool_path, 'ab+') as spool:
+                    spool.seek(0, os.SEEK_END)
+                    if spool.tell():
+                        spool.seek(-1, os.SEEK_END)
+                        if spool.read(1) != b'\n':
+                            lines = '\n' + lines  # end a line torn by a worker killed mid-append
+                    spool.write(lines.encode('utf-8'))
+            self.spooled += len(entries)
+        except OSError as e:
+            self.dropped += len(entries)
+            logging.error(f'Could not spool {len(entries)} activity log entries: {str(e)}')
+
+    def _take_spool(self):
+        """Claim the spool file (other workers may share it) and return its entries.
+
+        Unparseable lines are moved to the .corrupt file; a file that can't be read is left in
+        place for the next flush.
+        """
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return []
+        entries = []
+        corrupt = []
+        try:
+            with self._spool_locked():
+                try:
+                    with open(self.spool_path, encoding='utf-8') as spool:
+                        lines = spool.readlines()
+                except FileNotFoundError:
+                    return []
+                os.remove(self.spool_path)
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                        entry['created_at'] = datetime.fromisoformat(entry['created_at'])
+                    except (ValueError, KeyError, TypeError):
+                        corrupt.append(line if line.endswith('\n') else line + '\n')
+                        continue
+                    entries.append(entry)
+                if corrupt:
+                    with open(f'{self.spool_path}.corrupt', 'a', encoding='utf-8') as corrupt_file:
+                        corrupt_file.write(''.join(corrupt))
+        except OSError as e:
+            # Once the spool is removed its entries are returned; otherwise it stays on disk
+            logging.error(f'Could not read the activity log spool: {str(e)}')
+        if corrupt:
+            logging.error(f'Moved {len(corrupt)} unreadable activity log spool lines to {self.spool_path}.corrupt')
+        if entries:
+            logging.info(f'Replaying {len(entries)} spooled activity log entries')
+        return entries
+
+    def close(self, timeout=10):
+        """Stop the writer thread and flush what is left"""
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f'Activity log flush at exit failed: {str(e)}')
+
+    def stats(self):
+        return {
+            'buffered': self.buffered,
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'spooled': self.spooled,
+            'dropped': self.dropped,
+            'spool_pending': bool(self.spool_path and os.path.exists(self.spool_path)),
+            'last_flush_at': self.last_flush_at.isoformat() if self.last_flush_at else None,
+            'last_error': self.last_error
+        }
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+activity_log_writer = ActivityLogWriter()
+atexit.register(activity_log_writer.close)
+
+def init_activity_log(app):
+    """Apply the ACTIVITY_LOG_* settings from the app config"""
+    activity_log_writer.configure(
+        app,
+        buffered=app.config.get('ACTIVITY_LOG_BUFFERED', True),
+        batch_size=app.config.get('ACTIVITY_LOG_BATCH_SIZE', 500),
+        flush_interval=app.config.get('ACTIVITY_LOG_FLUSH_INTERVAL', 2.0),
+        max_queue=app.config.get('ACTIVITY_LOG_MAX_QUEUE', 10000),
+        spool_path=app.config.get('ACTIVITY_LOG_SPOOL_PATH')
+    )
@@ -1,10 +1,10 @@
 import os
 import logging
+import click
 from dotenv import load_dotenv
 from flask import Flask, redirect, url_for, flash, request, render_template, jsonify, session
 from flask_login import LoginManager, current_user
 from flask_wtf.csrf import CSRFProtect, CSRFError
-from flask_session import Session
 from werkzeug.middleware.proxy_fix import ProxyFix
 from functools import wraps
 from flask_migrate import Migrate
@@ -13,6 +13,7 @@ from config import config
 from extensions import db, scheduler
 from routes.attendance import sync_attendance_task
 from flask_apscheduler import APScheduler
+import time
 from datetime import datetime
 from pytz import timezone as pytz_timezone, utc
 
@@ -24,6 +25,7 @@ scheduler = APScheduler()
 
 
 def create_app(config_name='default'):
+    boot_started = time.perf_counter()
     app = Flask(__name__)
     
     # Load config
@@ -32,7 +34,26 @@ def create_app(config_name='default'):
     # Initialize extensions
     db.init_app(app)
     migrate = Migrate(app, db)
-    Session(app)
+    
+    # Keep monthly_attendance_summary in step with DailyAttendance writes
+    from report_helpers.monthly_summary import register_monthly_summary_listeners
+    register_monthly_summary_listeners()
+    # Application cache; commits invalidate the cached data of the tables they write
+    from cache import init_cache
+    init_cache(app)
+    # Fingerprint devices: one reusable, serialized connection per device
+    from device_sessions import init_device_sessions
+    init_device_sessions(app)
+    if app.config.get('DEVICE_LIVE_CAPTURE'):
+        # Device operations take devices over from live capture listeners in other workers
+        from live_capture import init_live_capture
+        init_live_capture(app)
+    # Audit log entries are written in batches off the request path
+    from activity_log import init_activity_log
+    init_activity_log(app)
+    # Server-side sessions (SESSION_TYPE)
+    from server_sessions import init_sessions
+    init_sessions(app)
     csrf = CSRFProtect(app)
     scheduler.init_app(app)
     
@@ -40,7 +61,8 @@ def create_app(config_name='default'):
     from security import setup_security_middleware
     setup_security_middleware(app)
     
-    # Log database connection info and validate connection
+    # Log database connection info. Nothing connects here: a database that is down or slow must
+    # not hold up the worker's boot; /health reports connectivity and the schema revision
     with app.app_context():
         db_url = app.config.get('SQLALCHEMY_DATABASE_URI', 'Not set')
         # Mask password in logs
@@ -65,35 +87,6 @@ def create_app(config_name='default'):
             logging.error("⚠️  WARNING: Database URL appears to use device IP (192.168.11.253)")
             logging.error("⚠️  This is likely a misconfiguration. Check your DATABASE_URL environment variable.")
         
-        # Test database connection with retry logic
-        max_retries = 3
-        retry_delay = 5  # seconds
-        connection_successful = False
-        
-        for attempt in range(1, max_retries + 1):
-            try:
-                from sqlalchemy import text
-                db.session.execute(text('SELECT 1'))
-                db.session.commit()
-                logging.info("✅ Database connection test successful")
-                connection_successful = True
-                break
-            except Exception as e:
-                if attempt < max_retries:
-                    logging.warning(f"⚠️  Database connection attempt {attempt}/{max_retries} failed: {str(e)}")
-                    logging.info(f"⏳ Retrying in {retry_delay} seconds...")
-                    import time
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                else:
-                    logging.error(f"❌ Database connection test failed after {max_retries} attempts: {str(e)}")
-                    logging.error("⚠️  The application will start but may not work correctly. Please check:")
-                    logging.error("   1. DATABASE_URL environment variable is set correctly")
-                    logging.error("   2. Database server is accessible from this host")
-                    logging.error("   3. Network/firewall allows connections to the database")
-                    logging.error("   4. Database server is running and accepting connections")
-                    logging.warning("⚠️  Application will continue to start. Database connections will be retried on first request.")
-        
         logging.info(f"=============================")
     
     # Configure logging
@@ -111,11 +104,11 @@ def create_app(config_name='default'):
     
     @login_manager.user_loader
     def load_user(user_id):
-        from models import User
+        from helpers import get_user_identity
         from sqlalchemy.exc import OperationalError
         from psycopg2 import OperationalError as Psycopg2OperationalError
         try:
-            return User.query.get(int(user_id))
+            return get_user_identity(int(user_id))
         except (OperationalError, Psycopg2OperationalError) as e:
             logging.error(f"Database connection error while loading user: {str(e)}")
             # Return None to indicate user cannot be loaded
@@ -293,376 +286,6 @@ def create_app(config_name='default'):
     def utility_processor():
         return {'now': datetime.now()}
     
-    # Quick fix for missing table and sequence - run once at startup
-    _tables_initialized = False
-    
-    def ensure_tables_exist():
-        """Ensure critical tables exist and sequences are fixed - runs once"""
-        nonlocal _tables_initialized
-        if _tables_initialized:
-            return
-        _tables_initialized = True
-        try:
-            from sqlalchemy import text
-            from psycopg2 import OperationalError
-            from sqlalchemy.exc import OperationalError as SQLAlchemyOperationalError
-            
-            # Create employee_attachments table if missing
-            try:
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS employee_attachments (
-                        id SERIAL PRIMARY KEY,
-                        user_id INTEGER NOT NULL,
-                        file_name VARCHAR(255) NOT NULL,
-                        display_name VARCHAR(255) NOT NULL,
-                        file_path VARCHAR(500) NOT NULL,
-                        file_size INTEGER,
-                        file_type VARCHAR(100),
-                        description TEXT,
-                        uploaded_by INTEGER,
-                        created_at TIMESTAMP,
-                        updated_at TIMESTAMP,
-                        CONSTRAINT fk_employee_attachments_user 
-                            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                        CONSTRAINT fk_employee_attachments_uploader 
-                            FOREIGN KEY (uploaded_by) REFERENCES users(id) ON DELETE SET NULL
-                    )
-                """))
-                db.session.commit()
-                logging.info("✅ employee_attachments table checked/created")
-            except (OperationalError, SQLAlchemyOperationalError) as e:
-                # Connection errors - don't log as warning, just skip silently
-                # The connection will be retried on actual database operations
-                db.session.rollback()
-                return  # Skip remaining operations if we can't connect
-            except Exception as e:
-                logging.warning(f"employee_attachments table check: {e}")
-                db.session.rollback()
-            
-            # Create documentation_pages table if missing
-            try:
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS documentation_pages (
-                        id SERIAL PRIMARY KEY,
-                        title VARCHAR(255) NOT NULL,
-                        slug VARCHAR(255) NOT NULL UNIQUE,
-                        content TEXT NOT NULL,
-                        category VARCHAR(100) NOT NULL,
-                        tags VARCHAR(100)[],
-                        visible_roles VARCHAR(20)[],
-                        is_published BOOLEAN DEFAULT FALSE,
-                        view_count INTEGER DEFAULT 0,
-                        created_by INTEGER,
-                        updated_by INTEGER,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        CONSTRAINT fk_doc_created_by 
-                            FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL,
-                        CONSTRAINT fk_doc_updated_by 
-                            FOREIGN KEY (updated_by) REFERENCES users(id) ON DELETE SET NULL
-                    )
-                """))
-                
-                # Add slug column if table exists but column doesn't
-                db.session.execute(text("""
-                    DO $$ 
-                    BEGIN
-                        IF NOT EXISTS (
-                            SELECT 1 FROM information_schema.columns 
-                            WHERE table_name='documentation_pages' AND column_name='slug'
-                        ) THEN
-                            ALTER TABLE documentation_pages ADD COLUMN slug VARCHAR(255);
-                            -- Update existing rows with slugs generated from titles
-                            UPDATE documentation_pages SET slug = LOWER(REGEXP_REPLACE(REGEXP_REPLACE(title, '[^a-zA-Z0-9\s-]', '', 'g'), '\s+', '-', 'g')) WHERE slug IS NULL;
-                            ALTER TABLE documentation_pages ALTER COLUMN slug SET NOT NULL;
-                            CREATE UNIQUE INDEX IF NOT EXISTS idx_doc_slug ON documentation_pages(slug);
-                        END IF;
-                    END $$;
-                """))
-                # Create indexes
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_doc_category ON documentation_pages(category)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_doc_published ON documentation_pages(is_published)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_doc_created_at ON documentation_pages(created_at)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_doc_slug ON documentation_pages(slug)
-                """))
-                db.session.commit()
-                logging.info("✅ documentation_pages table checked/created")
-            except (OperationalError, SQLAlchemyOperationalError) as e:
-                db.session.rollback()
-            except Exception as e:
-                logging.warning(f"documentation_pages table check: {e}")
-                db.session.rollback()
-            
-            # Create email_templates table if missing
-            try:
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS email_templates (
-                        id SERIAL PRIMARY KEY,
-                        template_name VARCHAR(100) NOT NULL UNIQUE,
-                        template_type VARCHAR(50) NOT NULL,
-                        subject VARCHAR(255) NOT NULL,
-                        body_html TEXT NOT NULL,
-                        footer TEXT,
-                        signature TEXT,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        created_by INTEGER,
-                        updated_by INTEGER,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        CONSTRAINT fk_email_template_created_by 
-                            FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL,
-                        CONSTRAINT fk_email_template_updated_by 
-                            FOREIGN KEY (updated_by) REFERENCES users(id) ON DELETE SET NULL
-                    )
-                """))
-                # Create indexes
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_email_template_type ON email_templates(template_type)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_email_template_active ON email_templates(is_active)
-                """))
-                db.session.commit()
-                logging.info("✅ email_templates table checked/created")
-            except (OperationalError, SQLAlchemyOperationalError) as e:
-                db.session.rollback()
-            except Exception as e:
-                logging.warning(f"email_templates table check: {e}")
-                db.session.rollback()
-            
-            # Create ticket tables if missing
-            try:
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS ticket_categories (
-                        id SERIAL PRIMARY KEY,
-                        name VARCHAR(100) NOT NULL UNIQUE,
-                        description TEXT,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """))
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS ticket_department_mapping (
-                        id SERIAL PRIMARY KEY,
-                        category_id INTEGER NOT NULL,
-                        department_id INTEGER NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        CONSTRAINT fk_ticket_dept_mapping_category 
-                            FOREIGN KEY (category_id) REFERENCES ticket_categories(id) ON DELETE CASCADE,
-                        CONSTRAINT fk_ticket_dept_mapping_dept 
-                            FOREIGN KEY (department_id) REFERENCES departments(id) ON DELETE CASCADE,
-                        CONSTRAINT uq_category_department UNIQUE (category_id, department_id)
-                    )
-                """))
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS tickets (
-                        id SERIAL PRIMARY KEY,
-                        user_id INTEGER NOT NULL,
-                        category_id INTEGER,
-                        title VARCHAR(255) NOT NULL,
-                        description TEXT NOT NULL,
-                        priority VARCHAR(20) NOT NULL DEFAULT 'medium',
-                        status VARCHAR(20) NOT NULL DEFAULT 'open',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        CONSTRAINT fk_ticket_user 
-                            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                        CONSTRAINT fk_ticket_category 
-                            FOREIGN KEY (category_id) REFERENCES ticket_categories(id) ON DELETE SET NULL
-                    )
-                """))
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS ticket_comments (
-                        id SERIAL PRIMARY KEY,
-                        ticket_id INTEGER NOT NULL,
-                        user_id INTEGER,
-                        comment_text TEXT NOT NULL,
-                        is_internal BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        CONSTRAINT fk_ticket_comment_ticket 
-                            FOREIGN KEY (ticket_id) REFERENCES tickets(id) ON DELETE CASCADE,
-                        CONSTRAINT fk_ticket_comment_user 
-                            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
-                    )
-                """))
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS ticket_attachments (
-                        id SERIAL PRIMARY KEY,
-                        ticket_id INTEGER NOT NULL,
-                        comment_id INTEGER,
-                        filename VARCHAR(255) NOT NULL,
-                        file_path VARCHAR(500) NOT NULL,
-                        file_size INTEGER,
-                        uploaded_by INTEGER,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        CONSTRAINT fk_ticket_attachment_ticket 
-                            FOREIGN KEY (ticket_id) REFERENCES tickets(id) ON DELETE CASCADE,
-                        CONSTRAINT fk_ticket_attachment_comment 
-                            FOREIGN KEY (comment_id) REFERENCES ticket_comments(id) ON DELETE CASCADE,
-                        CONSTRAINT fk_ticket_attachment_uploader 
-                            FOREIGN KEY (uploaded_by) REFERENCES users(id) ON DELETE SET NULL
-                    )
-                """))
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS ticket_status_history (
-                        id SERIAL PRIMARY KEY,
-                        ticket_id INTEGER NOT NULL,
-                        old_status VARCHAR(20),
-                        new_status VARCHAR(20) NOT NULL,
-                        changed_by INTEGER,
-                        comment TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        CONSTRAINT fk_ticket_status_history_ticket 
-                            FOREIGN KEY (ticket_id) REFERENCES tickets(id) ON DELETE CASCADE,
-                        CONSTRAINT fk_ticket_status_history_changer 
-                            FOREIGN KEY (changed_by) REFERENCES users(id) ON DELETE SET NULL
-                    )
-                """))
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS ticket_email_templates (
-                        id SERIAL PRIMARY KEY,
-                        template_type VARCHAR(50) NOT NULL UNIQUE,
-                        subject VARCHAR(255) NOT NULL,
-                        body_html TEXT NOT NULL,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """))
-                db.session.execute(text("""
-                    CREATE TABLE IF NOT EXISTS scheduled_reminders (
-                        id SERIAL PRIMARY KEY,
-                        subject VARCHAR(255) NOT NULL,
-                        body TEXT NOT NULL,
-                        frequency VARCHAR(20) NOT NULL,
-                        target_recipients TEXT,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        next_send_date TIMESTAMP,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """))
-                # Create indexes
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_category_active ON ticket_categories(is_active)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_dept_mapping_category ON ticket_department_mapping(category_id)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_dept_mapping_dept ON ticket_department_mapping(department_id)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_user ON tickets(user_id)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_category ON tickets(category_id)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_status ON tickets(status)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_priority ON tickets(priority)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_created ON tickets(created_at)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_comment_ticket ON ticket_comments(ticket_id)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_comment_user ON ticket_comments(user_id)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_comment_created ON ticket_comments(created_at)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_attachment_ticket ON ticket_attachments(ticket_id)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_attachment_comment ON ticket_attachments(comment_id)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_status_history_ticket ON ticket_status_history(ticket_id)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_status_history_created ON ticket_status_history(created_at)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_email_template_type ON ticket_email_templates(template_type)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_ticket_email_template_active ON ticket_email_templates(is_active)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_scheduled_reminder_active ON scheduled_reminders(is_active)
-                """))
-                db.session.execute(text("""
-                    CREATE INDEX IF NOT EXISTS idx_scheduled_reminder_next_send ON scheduled_reminders(next_send_date)
-                """))
-                db.session.commit()
-                logging.info("✅ Ticket tables checked/created")
-            except (OperationalError, SQLAlchemyOperationalError) as e:
-                db.session.rollback()
-            except Exception as e:
-                logging.warning(f"Ticket tables check: {e}")
-                db.session.rollback()
-            
-            # Break tables removed
-            
-            # Fix Department sequence
-            try:
-                result = db.session.execute(text("SELECT COALESCE(MAX(id), 0) FROM departments"))
-                max_id = result.scalar() or 0
-                
-                # Ensure sequence exists and is linked
-                db.session.execute(text("""
-                    DO $$ 
-                    BEGIN
-                        IF NOT EXISTS (SELECT 1 FROM pg_sequences WHERE sequencename = 'departments_id_seq') THEN
-                            CREATE SEQUENCE departments_id_seq;
-                        END IF;
-                    END $$;
-                """))
-                db.session.execute(text("ALTER TABLE departments ALTER COLUMN id SET DEFAULT nextval('departments_id_seq')"))
-                db.session.execute(text("ALTER SEQUENCE departments_id_seq OWNED BY departments.id"))
-                db.session.execute(text(f"SELECT setval('departments_id_seq', GREATEST({max_id}, 1), false)"))
-                db.session.commit()
-                logging.info(f"✅ Department sequence fixed")
-            except (OperationalError, SQLAlchemyOperationalError) as e:
-                # Connection errors - skip silently
-                db.session.rollback()
-            except Exception as e:
-                logging.warning(f"Department sequence fix: {e}")
-                db.session.rollback()
-                
-        except (OperationalError, SQLAlchemyOperationalError) as e:
-            # Connection errors - skip silently, connection will be retried later
-            try:
-                db.session.rollback()
-            except:
-                pass
-        except Exception as e:
-            logging.warning(f"Table/sequence check: {e}")
-            try:
-                db.session.rollback()
-            except:
-                pass
-    
-    # Run on first request
-    @app.before_request
-    def before_request_ensure_tables():
-        ensure_tables_exist()
-    
     # Check session timeout based on remember me status
     @app.before_request
     def check_session_timeout():
@@ -691,8 +314,9 @@ def create_app(config_name='default'):
                     session.clear()
                     flash('Your session has expired. Please log in again.', 'info')
                     return redirect(url_for('auth.login'))
-                else:
+                elif not session.permanent:
                     # Update session lifetime dynamically based on remember me status
+                    # (only when needed: assigning marks the session modified and forces a write)
                     session.permanent = True
                     # Flask will use PERMANENT_SESSION_LIFETIME, but we track our own timeout
                     # The session will be invalidated by our check above
@@ -724,6 +348,7 @@ def create_app(config_name='default'):
         from routes.email_templates import email_templates_bp
         from routes.tickets import tickets_bp
         from routes.members import members_bp
+        from routes.exports import exports_bp
         
         # Register blueprints
         app.register_blueprint(auth_bp)
@@ -742,512 +367,14 @@ def create_app(config_name='default'):
         app.register_blueprint(email_templates_bp)
         app.register_blueprint(tickets_bp)
         app.register_blueprint(members_bp)
+        app.register_blueprint(exports_bp)
         
-        # Initialize database
-        # db.create_all()  # Commented out - using migrations instead
-        
-        # Create default email templates if they don't exist
-        try:
-            from models import EmailTemplate, User
-            from helpers import get_email_template
-            
-            # Get first technical support or admin for created_by
-            creator = User.query.filter(User.role.in_(['product_owner', 'admin'])).first()
-            creator_id = creator.id if creator else None
-            
-            default_templates = [
-                {
-                    'template_name': 'leave_manager_notification',
-                    'template_type': 'leave_manager_notification',
-                    'subject': 'New Leave Request from {employee_name} - Action Required',
-                    'body_html': '''
-                    <html>
-                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                                <h2 style="margin: 0; font-size: 24px;">New Leave Request</h2>
-                            </div>
-                            
-                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
-                                <h3 style="color: #667eea; margin-top: 0;">Hello {manager_name},</h3>
-                                <p>A new leave request has been submitted by <strong>{employee_name}</strong> and requires your review.</p>
-                                
-                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
-                                    <p style="margin: 5px 0;"><strong>Start Date:</strong> {start_date}</p>
-                                    <p style="margin: 5px 0;"><strong>End Date:</strong> {end_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
-                                    <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
-                                </div>
-                                
-                                <div style="margin: 20px 0; padding: 15px; background: #e3f2fd; border-radius: 6px;">
-                                    <p style="margin: 0; font-size: 14px; color: #1565c0;">
-                                        <strong>Action Required:</strong> Please review and approve or reject this request.
-                                    </p>
-                                    <p style="margin: 10px 0 0 0;">
-                                        <a href="{approval_link}" style="background: #667eea; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Review Request</a>
-                                    </p>
-                                </div>
-                            </div>
-                            
-                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
-                                <p style="margin: 0; font-size: 12px; color: #666;">
-                                    This is an automated message from Everlast HR System.<br>
-                                    Please do not reply to this email.
-                                </p>
-                            </div>
-                        </div>
-                    </body>
-                    </html>
-                    ''',
-                    'footer': None,
-                    'signature': None
-                },
-                {
-                    'template_name': 'leave_admin_notification',
-                    'template_type': 'leave_admin_notification',
-                    'subject': 'Leave Request Approved by Manager - Final Approval Required',
-                    'body_html': '''
-                    <html>
-                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                                <h2 style="margin: 0; font-size: 24px;">Leave Request - Final Approval</h2>
-                            </div>
-                            
-                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
-                                <h3 style="color: #667eea; margin-top: 0;">Hello {admin_name},</h3>
-                                <p>A leave request from <strong>{employee_name}</strong> has been approved by their manager <strong>{manager_name}</strong> and now requires your final approval.</p>
-                                
-                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                                    <p style="margin: 5px 0;"><strong>Employee:</strong> {employee_name}</p>
-                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
-                                    <p style="margin: 5px 0;"><strong>Start Date:</strong> {start_date}</p>
-                                    <p style="margin: 5px 0;"><strong>End Date:</strong> {end_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
-                                    <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
-                                    <p style="margin: 5px 0;"><strong>Manager Comment:</strong> {comment}</p>
-                                </div>
-                                
-                                <div style="margin: 20px 0; padding: 15px; background: #e3f2fd; border-radius: 6px;">
-                                    <p style="margin: 0; font-size: 14px; color: #1565c0;">
-                                        <strong>Action Required:</strong> Please review and provide final approval or rejection.
-                                    </p>
-                                    <p style="margin: 10px 0 0 0;">
-                                        <a href="{approval_link}" style="background: #667eea; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Review Request</a>
-                                    </p>
-                                </div>
-                            </div>
-                            
-                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
-                                <p style="margin: 0; font-size: 12px; color: #666;">
-                                    This is an automated message from Everlast HR System.<br>
-                                    Please do not reply to this email.
-                                </p>
-                            </div>
-                        </div>
-                    </body>
-                    </html>
-                    ''',
-                    'footer': None,
-                    'signature': None
-                },
-                {
-                    'template_name': 'leave_employee_confirmation',
-                    'template_type': 'leave_employee_confirmation',
-                    'subject': 'Your Leave Request Has Been Approved',
-                    'body_html': '''
-                    <html>
-                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                            <div style="background: linear-gradient(135deg, #28a745 0%, #20c997 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                                <h2 style="margin: 0; font-size: 24px;">✓ Leave Request Approved</h2>
-                            </div>
-                            
-                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #28a745;">
-                                <h3 style="color: #28a745; margin-top: 0;">Hello {employee_name},</h3>
-                                <p>Great news! Your leave request has been fully approved.</p>
-                                
-                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
-                                    <p style="margin: 5px 0;"><strong>Start Date:</strong> {start_date}</p>
-                                    <p style="margin: 5px 0;"><strong>End Date:</strong> {end_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
-                                    <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #28a745; font-weight: bold;">{status}</span></p>
-                                </div>
-                                
-                                <div style="margin: 20px 0; padding: 15px; background: #d4edda; border-radius: 6px; border-left: 4px solid #28a745;">
-                                    <p style="margin: 0; font-size: 14px; color: #155724;">
-                                        <strong>Approved by:</strong> {admin_name}<br>
-                                        <strong>Comment:</strong> {comment}
-                                    </p>
-                                </div>
-                                
-                                <p>Your leave balance has been updated accordingly. Please ensure your team is informed about your absence.</p>
-                            </div>
-                            
-                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
-                                <p style="margin: 0; font-size: 12px; color: #666;">
-                                    This is an automated message from Everlast HR System.<br>
-                                    Please do not reply to this email.
-                                </p>
-                            </div>
-                        </div>
-                    </body>
-                    </html>
-                    ''',
-                    'footer': None,
-                    'signature': None
-                },
-                {
-                    'template_name': 'leave_employee_rejection',
-                    'template_type': 'leave_employee_rejection',
-                    'subject': 'Your Leave Request Has Been Rejected',
-                    'body_html': '''
-                    <html>
-                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                            <div style="background: linear-gradient(135deg, #dc3545 0%, #c82333 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                                <h2 style="margin: 0; font-size: 24px;">Leave Request Rejected</h2>
-                            </div>
-                            
-                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #dc3545;">
-                                <h3 style="color: #dc3545; margin-top: 0;">Hello {employee_name},</h3>
-                                <p>We regret to inform you that your leave request has been rejected.</p>
-                                
-                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
-                                    <p style="margin: 5px 0;"><strong>Start Date:</strong> {start_date}</p>
-                                    <p style="margin: 5px 0;"><strong>End Date:</strong> {end_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
-                                    <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #dc3545; font-weight: bold;">{status}</span></p>
-                                </div>
-                                
-                                <div style="margin: 20px 0; padding: 15px; background: #f8d7da; border-radius: 6px; border-left: 4px solid #dc3545;">
-                                    <p style="margin: 0; font-size: 14px; color: #721c24;">
-                                        <strong>Rejection Reason:</strong><br>
-                                        {comment}
-                                    </p>
-                                </div>
-                                
-                                <p>If you have any questions or concerns, please contact your manager or HR department.</p>
-                            </div>
-                            
-                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
-                                <p style="margin: 0; font-size: 12px; color: #666;">
-                                    This is an automated message from Everlast HR System.<br>
-                                    Please do not reply to this email.
-                                </p>
-                            </div>
-                        </div>
-                    </body>
-                    </html>
-                    ''',
-                    'footer': None,
-                    'signature': None
-                },
-                {
-                    'template_name': 'permission_manager_notification',
-                    'template_type': 'permission_manager_notification',
-                    'subject': 'New Permission Request from {employee_name} - Action Required',
-                    'body_html': '''
-                    <html>
-                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                                <h2 style="margin: 0; font-size: 24px;">New Permission Request</h2>
-                            </div>
-                            
-                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
-                                <h3 style="color: #667eea; margin-top: 0;">Hello {manager_name},</h3>
-                                <p>A new permission request has been submitted by <strong>{employee_name}</strong> and requires your review.</p>
-                                
-                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
-                                    <p style="margin: 5px 0;"><strong>Date:</strong> {start_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Time:</strong> {end_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
-                                    <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
-                                </div>
-                                
-                                <div style="margin: 20px 0; padding: 15px; background: #e3f2fd; border-radius: 6px;">
-                                    <p style="margin: 0; font-size: 14px; color: #1565c0;">
-                                        <strong>Action Required:</strong> Please review and approve or reject this request.
-                                    </p>
-                                    <p style="margin: 10px 0 0 0;">
-                                        <a href="{approval_link}" style="background: #667eea; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Review Request</a>
-                                    </p>
-                                </div>
-                            </div>
-                            
-                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
-                                <p style="margin: 0; font-size: 12px; color: #666;">
-                                    This is an automated message from Everlast HR System.<br>
-                                    Please do not reply to this email.
-                                </p>
-                            </div>
-                        </div>
-                    </body>
-                    </html>
-                    ''',
-                    'footer': None,
-                    'signature': None
-                },
-                {
-                    'template_name': 'permission_admin_notification',
-                    'template_type': 'permission_admin_notification',
-                    'subject': 'Permission Request Approved by Manager - Final Approval Required',
-                    'body_html': '''
-                    <html>
-                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                                <h2 style="margin: 0; font-size: 24px;">Permission Request - Final Approval</h2>
-                            </div>
-                            
-                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
-                                <h3 style="color: #667eea; margin-top: 0;">Hello {admin_name},</h3>
-                                <p>A permission request from <strong>{employee_name}</strong> has been approved by their manager <strong>{manager_name}</strong> and now requires your final approval.</p>
-                                
-                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                                    <p style="margin: 5px 0;"><strong>Employee:</strong> {employee_name}</p>
-                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
-                                    <p style="margin: 5px 0;"><strong>Date:</strong> {start_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Time:</strong> {end_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
-                                    <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
-                                    <p style="margin: 5px 0;"><strong>Manager Comment:</strong> {comment}</p>
-                                </div>
-                                
-                                <div style="margin: 20px 0; padding: 15px; background: #e3f2fd; border-radius: 6px;">
-                                    <p style="margin: 0; font-size: 14px; color: #1565c0;">
-                                        <strong>Action Required:</strong> Please review and provide final approval or rejection.
-                                    </p>
-                                    <p style="margin: 10px 0 0 0;">
-                                        <a href="{approval_link}" style="background: #667eea; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Review Request</a>
-                                    </p>
-                                </div>
-                            </div>
-                            
-                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
-                                <p style="margin: 0; font-size: 12px; color: #666;">
-                                    This is an automated message from Everlast HR System.<br>
-                                    Please do not reply to this email.
-                                </p>
-                            </div>
-                        </div>
-                    </body>
-                    </html>
-                    ''',
-                    'footer': None,
-                    'signature': None
-                },
-                {
-                    'template_name': 'permission_employee_confirmation',
-                    'template_type': 'permission_employee_confirmation',
-                    'subject': 'Your Permission Request Has Been Approved',
-                    'body_html': '''
-                    <html>
-                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                            <div style="background: linear-gradient(135deg, #28a745 0%, #20c997 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                                <h2 style="margin: 0; font-size: 24px;">✓ Permission Request Approved</h2>
-                            </div>
-                            
-                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #28a745;">
-                                <h3 style="color: #28a745; margin-top: 0;">Hello {employee_name},</h3>
-                                <p>Great news! Your permission request has been fully approved.</p>
-                                
-                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
-                                    <p style="margin: 5px 0;"><strong>Date:</strong> {start_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Time:</strong> {end_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
-                                    <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #28a745; font-weight: bold;">{status}</span></p>
-                                </div>
-                                
-                                <div style="margin: 20px 0; padding: 15px; background: #d4edda; border-radius: 6px; border-left: 4px solid #28a745;">
-                                    <p style="margin: 0; font-size: 14px; color: #155724;">
-                                        <strong>Approved by:</strong> {admin_name}<br>
-                                        <strong>Comment:</strong> {comment}
-                                    </p>
-                                </div>
-                                
-                                <p>Please ensure your team is informed about your absence during this time.</p>
-                            </div>
-                            
-                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
-                                <p style="margin: 0; font-size: 12px; color: #666;">
-                                    This is an automated message from Everlast HR System.<br>
-                                    Please do not reply to this email.
-                                </p>
-                            </div>
-                        </div>
-                    </body>
-                    </html>
-                    ''',
-                    'footer': None,
-                    'signature': None
-                },
-                {
-                    'template_name': 'permission_employee_rejection',
-                    'template_type': 'permission_employee_rejection',
-                    'subject': 'Your Permission Request Has Been Rejected',
-                    'body_html': '''
-                    <html>
-                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                            <div style="background: linear-gradient(135deg, #dc3545 0%, #c82333 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-                                <h2 style="margin: 0; font-size: 24px;">Permission Request Rejected</h2>
-                            </div>
-                            
-                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #dc3545;">
-                                <h3 style="color: #dc3545; margin-top: 0;">Hello {employee_name},</h3>
-                                <p>We regret to inform you that your permission request has been rejected.</p>
-                                
-                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
-                                    <p style="margin: 5px 0;"><strong>Date:</strong> {start_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Time:</strong> {end_date}</p>
-                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
-                                    <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #dc3545; font-weight: bold;">{status}</span></p>
-                                </div>
-                                
-                                <div style="margin: 20px 0; padding: 15px; background: #f8d7da; border-radius: 6px; border-left: 4px solid #dc3545;">
-                                    <p style="margin: 0; font-size: 14px; color: #721c24;">
-                                        <strong>Rejection Reason:</strong><br>
-                                        {comment}
-                                    </p>
-                                </div>
-                                
-                                <p>If you have any questions or concerns, please contact your manager or HR department.</p>
-                            </div>
-                            
-                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
-                                <p style="margin: 0; font-size: 12px; color: #666;">
-                                    This is an automated message from Everlast HR System.<br>
-                                    Please do not reply to this email.
-                                </p>
-                            </div>
-                        </div>
-                    </body>
-                    </html>
-                    ''',
-                    'footer': None,
-                    'signature': None
-                },
-                {
-                    'template_name': 'leave_employee_submission_confirmation',
-                    'template_type': 'leave_employee_submission_confirmation',
-                    'subject': 'Your Leave Request Has Been Submitted - Pending Review',
-                    'body_html': '''<html>
-<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-            <h2 style="margin: 0; font-size: 24px;">Leave Request Submitted</h2>
-        </div>
-        
-        <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
-            <h3 style="color: #667eea; margin-top: 0;">Hello {employee_name},</h3>
-            <p>Your leave request has been successfully submitted and is now pending manager review.</p>
-            
-            <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
-                <p style="margin: 5px 0;"><strong>Start Date:</strong> {start_date}</p>
-                <p style="margin: 5px 0;"><strong>End Date:</strong> {end_date}</p>
-                <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
-                <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
-                <p style="margin: 5px 0;"><strong>Submitted On:</strong> {submission_date} at {submission_time}</p>
-                <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #ffc107; font-weight: bold;">{status}</span></p>
-            </div>
-            
-            <div style="margin: 20px 0; padding: 15px; background: #fff3cd; border-radius: 6px; border-left: 4px solid #ffc107;">
-                <p style="margin: 0; font-size: 14px; color: #856404;">
-                    <strong>Next Steps:</strong> Your request is now pending manager review. You will be notified once your manager has reviewed your request.
-                </p>
-            </div>
-        </div>
-        
-        <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
-            <p style="margin: 0; font-size: 12px; color: #666;">
-                This is an automated message from Everlast HR System.<br>
-                Please do not reply to this email.
-            </p>
-        </div>
-    </div>
-</body>
-</html>''',
-                    'footer': None,
-                    'signature': None
-                },
-                {
-                    'template_name': 'permission_employee_submission_confirmation',
-                    'template_type': 'permission_employee_submission_confirmation',
-                    'subject': 'Your Permission Request Has Been Submitted - Pending Review',
-                    'body_html': '''<html>
-<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
-            <h2 style="margin: 0; font-size: 24px;">Permission Request Submitted</h2>
-        </div>
-        
-        <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
-            <h3 style="color: #667eea; margin-top: 0;">Hello {employee_name},</h3>
-            <p>Your permission request has been successfully submitted and is now pending manager review.</p>
-            
-            <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
-                <p style="margin: 5px 0;"><strong>Date:</strong> {start_date}</p>
-                <p style="margin: 5px 0;"><strong>Time:</strong> {end_date}</p>
-                <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
-                <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
-                <p style="margin: 5px 0;"><strong>Submitted On:</strong> {submission_date} at {submission_time}</p>
-                <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #ffc107; font-weight: bold;">{status}</span></p>
-            </div>
-            
-            <div style="margin: 20px 0; padding: 15px; background: #fff3cd; border-radius: 6px; border-left: 4px solid #ffc107;">
-                <p style="margin: 0; font-size: 14px; color: #856404;">
-                    <strong>Next Steps:</strong> Your request is now pending manager review. You will be notified once your manager has reviewed your request.
-                </p>
-            </div>
-        </div>
+        # The sync agent authenticates with an HMAC signature instead of a session + CSRF token
+        from routes.api import sync_attendance_logs, sync_logs_v2
+        csrf.exempt(sync_attendance_logs)
+        csrf.exempt(sync_logs_v2)
         
-        <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
-            <p style="margin: 0; font-size: 12px; color: #666;">
-                This is an automated message from Everlast HR System.<br>
-                Please do not reply to this email.
-            </p>
-        </div>
-    </div>
-</body>
-</html>''',
-                    'footer': None,
-                    'signature': None
-                }
-            ]
-            
-            for template_data in default_templates:
-                existing = EmailTemplate.query.filter_by(template_name=template_data['template_name']).first()
-                if not existing:
-                    template = EmailTemplate(
-                        template_name=template_data['template_name'],
-                        template_type=template_data['template_type'],
-                        subject=template_data['subject'],
-                        body_html=template_data['body_html'],
-                        footer=template_data['footer'],
-                        signature=template_data['signature'],
-                        is_active=True,
-                        created_by=creator_id,
-                        updated_by=creator_id
-                    )
-                    db.session.add(template)
-                    logging.info(f"Created default email template: {template_data['template_name']}")
-            
-            db.session.commit()
-            logging.info("Default email templates checked/created")
-        except Exception as e:
-            logging.warning(f"Error creating default email templates: {str(e)}")
-            db.session.rollback()
+        # Schema changes and default data are applied by `flask prepare-database` (schema_setup.py)
         
         # Create default admin user if doesn't exist
         # from models import User
@@ -1270,19 +397,87 @@ def create_app(config_name='default'):
     app.config['SCHEDULER_API_ENABLED'] = True
     app.config['SCHEDULER_TIMEZONE'] = 'UTC'
     
-    # Auto-sync enabled - sync every 45 seconds
+    # Auto-sync enabled - incremental sync (only punches newer than each device's cursor) every 45 seconds
     @scheduler.task('interval', id='sync_attendance', seconds=45, misfire_grace_time=300, coalesce=True, max_instances=1)
     def scheduled_sync():
         with app.app_context():
             try:
                 from routes.attendance import sync_attendance_task
                 logging.info('Starting scheduled attendance sync...')
-                sync_stats = sync_attendance_task(full_sync=True)
+                sync_stats = sync_attendance_task()
                 if sync_stats:
                     logging.info(f"Scheduled sync completed. Added {sync_stats.get('records_added', 0)} records and updated {sync_stats.get('records_updated', 0)} records.")
             except Exception as e:
                 logging.error(f'Scheduled sync failed: {str(e)}')
     
+    # Nightly reconciliation - full re-scan of every device's history to fill any gaps
+    @scheduler.task('cron', id='reconcile_attendance', hour=2, minute=30, misfire_grace_time=3600, coalesce=True, max_instances=1)
+    def scheduled_reconciliation():
+        with app.app_context():
+            try:
+                from routes.attendance import sync_attendance_task
+                logging.info('Starting nightly attendance reconciliation (full sync)...')
+                sync_stats = sync_attendance_task(full_sync=True)
+                if sync_stats:
+                    logging.info(f"Reconciliation completed. Added {sync_stats.get('records_added', 0)} records and updated {sync_stats.get('records_updated', 0)} records.")
+            except Exception as e:
+                logging.error(f'Scheduled reconciliation failed: {str(e)}')
+    
+    # Live capture - keep a punch listener running for every active device (one process per device)
+    if app.config.get('DEVICE_LIVE_CAPTURE'):
+        @scheduler.task('interval', id='supervise_live_capture', seconds=30, misfire_grace_time=60, coalesce=True, max_instances=1)
+        def scheduled_live_capture():
+            try:
+                from live_capture import supervise_listeners
+                supervise_listeners(app)
+            except Exception as e:
+                logging.error(f'Live capture supervision failed: {str(e)}')
+    
+    # Deliver queued notification emails
+    @scheduler.task('interval', id='deliver_email_outbox', seconds=app.config.get('EMAIL_OUTBOX_INTERVAL', 10), misfire_grace_time=60, coalesce=True, max_instances=1)
+    def scheduled_email_delivery():
+        with app.app_context():
+            try:
+                from email_outbox import deliver_outbox
+                deliver_outbox(
+                    batch_size=app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 100),
+                    max_attempts=app.config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 8),
+                    retry_base=app.config.get('EMAIL_OUTBOX_RETRY_BASE', 60),
+                    retry_max=app.config.get('EMAIL_OUTBOX_RETRY_MAX', 3600),
+                    retention_days=app.config.get('EMAIL_OUTBOX_RETENTION_DAYS', 30)
+                )
+            except Exception as e:
+                logging.error(f'Email outbox delivery failed: {str(e)}')
+    
+    # Delete expired database sessions
+    @scheduler.task('interval', id='sweep_expired_sessions', seconds=app.config.get('SESSION_SWEEP_INTERVAL', 900), misfire_grace_time=300, coalesce=True, max_instances=1)
+    def scheduled_session_sweep():
+        try:
+            from server_sessions import sweep_expired_sessions
+            removed = sweep_expired_sessions(app)
+            if removed:
+                logging.info(f'Removed {removed} expired sessions')
+        except Exception as e:
+            logging.error(f'Expired session sweep failed: {str(e)}')
+    
+    @scheduler.task('interval', id='renew_export_job_leases', minutes=1, misfire_grace_time=30, coalesce=True, max_instances=1)
+    def scheduled_export_lease_renewal():
+        with app.app_context():
+            try:
+                from export_jobs import renew_export_job_leases
+                renew_export_job_leases(app)
+            except Exception as e:
+                logging.error(f'Export job lease renewal failed: {str(e)}')
+    
+    @scheduler.task('interval', id='cleanup_export_jobs', minutes=10, misfire_grace_time=300, coalesce=True, max_instances=1)
+    def scheduled_export_cleanup():
+        with app.app_context():
+            try:
+                from export_jobs import cleanup_export_jobs
+                cleanup_export_jobs(app)
+            except Exception as e:
+                logging.error(f'Export job cleanup failed: {str(e)}')
+    
     scheduler.start()  # Enable auto-sync
     
     @app.route('/')
@@ -1399,10 +594,26 @@ def create_app(config_name='default'):
                 'overflow': getattr(pool, 'overflow', lambda: 'N/A')()
             }
             
+            from cache import cache
+            from live_updates import stream_stats
+            from device_sessions import device_sessions
+            from live_capture import listener_stats
+            from email_outbox import outbox_stats
+            from activity_log import activity_log_writer
+            from schema_setup import schema_status
+            
             return jsonify({
                 'status': 'healthy',
                 'database': 'connected',
-                'pool_status': pool_status
+                'pool_status': pool_status,
+                'cache': cache.stats(),
+                'live_updates': stream_stats(),
+                'device_sessions': device_sessions.stats(),
+                'live_capture': listener_stats(),
+                'email_outbox': outbox_stats(),
+                'activity_log': activity_log_writer.stats(),
+                'schema': schema_status(),
+                'boot_seconds': app.config.get('BOOT_SECONDS')
             }), 200
             
         except Exception as e:
@@ -1414,6 +625,35 @@ def create_app(config_name='default'):
                 'error': str(e)
             }), 500
     
+    @app.cli.command('rebuild-monthly-summary')
+    @click.option('--start', 'start_month', default=None, help='First month to rebuild (YYYY-MM); defaults to the oldest attendance')
+    @click.option('--end', 'end_month', default=None, help='Last month to rebuild (YYYY-MM); defaults to the newest attendance')
+    def rebuild_monthly_summary_command(start_month, end_month):
+        """Rebuild monthly_attendance_summary from daily_attendance"""
+        from report_helpers.monthly_summary import rebuild_monthly_summaries, month_bounds
+        
+        start_date = month_bounds(*map(int, start_month.split('-')))[0] if start_month else None
+        end_date = month_bounds(*map(int, end_month.split('-')))[1] if end_month else None
+        rebuilt = rebuild_monthly_summaries(start_date, end_date)
+        click.echo(f'Rebuilt {rebuilt} monthly attendance summaries')
+    
+    @app.cli.command('prepare-database')
+    @click.option('--no-upgrade', is_flag=True, help='Skip the Alembic migrations')
+    def prepare_database_command(no_upgrade):
+        """Apply migrations, create the legacy tables and seed default data (once per deploy)"""
+        from schema_setup import prepare_database
+        # The scheduled jobs must not run against a half-migrated schema
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
+        created = prepare_database(upgrade=not no_upgrade)
+        click.echo(f'Database prepared ({created} default email templates created)')
+    
+    @app.cli.command('requeue-dead-emails')
+    def requeue_dead_emails_command():
+        """Put dead-lettered emails back in the outbox with a fresh set of attempts"""
+        from email_outbox import requeue_dead_emails
+        click.echo(f'Requeued {requeue_dead_emails()} dead-lettered emails')
+    
     @app.teardown_appcontext
     def close_db(error):
         """Ensure database connections are properly closed"""
@@ -1424,6 +664,12 @@ def create_app(config_name='default'):
         except Exception as e:
             logging.warning(f"Error closing database session: {str(e)}")
     
+    app.config['BOOT_SECONDS'] = round(time.perf_counter() - boot_started, 3)
+    budget = app.config.get('STARTUP_BUDGET_SECONDS')
+    if budget and app.config['BOOT_SECONDS'] > budget:
+        logging.warning(f"App created in {app.config['BOOT_SECONDS']}s, over the {budget}s startup budget")
+    else:
+        logging.info(f"App created in {app.config['BOOT_SECONDS']}s")
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,427 @@
+"""
+Application cache.
+
+Slow, frequently repeated lookups (dashboard stats, manager team lists, department dropdowns,
+SMTP/email template lookups, ...) are memoized with @cached or a cache.entry() lookup. Every
+cached value carries tags - table names of the data it was built from - and the version of each
+tag when it was computed. A commit that writes to a tagged table bumps the tag's version, which
+makes every value built from the old version a miss; nothing has to know which keys to delete.
+
+Backends (CACHE_BACKEND):
+    sqlite  SQLite file shared by every worker on the host (CACHE_URL is the file path; default)
+    redis   any Redis-compatible server (CACHE_URL is the redis:// URL; needs the redis package)
+    memory  per-process LRU with TTL
+
+Tag versions live in the backend, so a commit only invalidates other workers' entries through a
+shared backend (sqlite, redis). With the memory backend - configured, or fallen back to when the
+shared one can't start - every TTL is capped at CACHE_UNSHARED_MAX_TTL seconds instead.
+
+Values are pickled, so every hit returns a private copy. Cached ORM instances are merged back
+into the current session without a query; rows holding secrets (users, the SMTP configuration)
+are cached as ids or column values without them instead. Cache failures are logged and treated
+as misses.
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from sqlalchemy import event
+
+# session.info key holding the tags written by the pending transaction
+PENDING_TAGS = 'cache_pending_tags'
+
+_MISSING = object()
+
+def _tag_name(tag):
+    """Tags are table names; models are accepted for convenience"""
+    return getattr(tag, '__tablename__', tag)
+
+class MemoryBackend:
+    """Per-process LRU + TTL store"""
+
+    name = 'memory'
+    shared = False
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def tag_versions(self, tags):
+        with self._lock:
+            return tuple(self._tags.get(tag, 0) for tag in tags)
+
+    def bump_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def size(self):
+        return len(self._entries)
+
+class SQLiteBackend:
+    """Store in a local SQLite file, shared by all worker processes on the host"""
+
+    name = 'sqlite'
+    shared = True
+
+    # Expired rows are purged every PURGE_EVERY writes
+    PURGE_EVERY = 200
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM cache_entries WHERE key = ? AND expires_at >= ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, sqlite3.Binary(value), time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute('DELETE FROM cache_entries WHERE expires_at < ?', (time.time(),))
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def clear(self):
+        self._conn().execute('DELETE FROM cache_entries')
+
+    def tag_versions(self, tags):
+        if not tags:
+            return ()
+        rows = dict(self._conn().execute(
+            f'SELECT tag, version FROM cache_tags WHERE tag IN ({",".join("?" * len(tags))})', tuple(tags)
+        ).fetchall())
+        return tuple(rows.get(tag, 0) for tag in tags)
+
+    def bump_tags(self, tags):
+        self._conn().executemany(
+            'INSERT INTO cache_tags (tag, version) VALUES (?, 1) '
+            'ON CONFLICT(tag) DO UPDATE SET version = version + 1',
+            [(tag,) for tag in tags]
+        )
+
+    def size(self):
+        return self._conn().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+
+class RedisBackend:
+    """Store in a Redis-compatible server shared by every worker and host"""
+
+    name = 'redis'
+    shared = True
+
+    def __init__(self, url, prefix='hr-cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self.prefix = prefix
+        self.tags_key = f'{prefix}tags'
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = [key for key in self.client.scan_iter(match=f'{self.prefix}*') if key != self.tags_key.encode()]
+        if keys:
+            self.client.delete(*keys)
+
+    def tag_versions(self, tags):
+        if not tags:
+            return ()
+        return tuple(int(version or 0) for version in self.client.hmget(self.tags_key, list(tags)))
+
+    def bump_tags(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.hincrby(self.tags_key, tag, 1)
+        pipe.execute()
+
+    def size(self):
+        return None
+
+def create_backend(kind, url=None, max_entries=2048):
+    """Backend for CACHE_BACKEND; falls back to the memory backend if the shared one can't start"""
+    try:
+        if kind == 'sqlite':
+            return SQLiteBackend(url)
+        if kind == 'redis':
+            return RedisBackend(url)
+    except Exception as e:
+        logging.warning(f'Cache backend {kind!r} unavailable ({str(e)}), using the in-process cache')
+    return MemoryBackend(max_entries)
+
+class CacheEntry:
+    """Result of a cache lookup; store() saves a freshly computed value under the same key"""
+
+    def __init__(self, cache, namespace, key, tags, ttl, versions, value=_MISSING):
+        self.cache = cache
+        self.namespace = namespace
+        self.key = key
+        self.tags = tags
+        self.ttl = ttl
+        self.versions = versions
+        self.value = None if value is _MISSING else value
+        self.hit = value is not _MISSING
+
+    def store(self, value):
+        # Tag versions were read before the value was computed, so a write that commits
+        # in the meantime already makes this value stale
+        if self.versions is not None:
+            self.cache._store(self.key, value, self.ttl, self.versions)
+        return value
+
+class Cache:
+    """Tagged cache over a pluggable backend, with per-namespace hit/miss counters"""
+
+    def __init__(self, backend=None, default_ttl=300):
+        self.backend = backend or MemoryBackend()
+        self.default_ttl = default_ttl
+        self.max_ttl = None
+        self._counters = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._errors = 0
+        self._counter_lock = threading.Lock()
+
+    def configure(self, backend, default_ttl=None, max_ttl=None):
+        """max_ttl caps every entry's TTL (None: no cap)"""
+        self.backend = backend
+        if default_ttl is not None:
+            self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+
+    def _count(self, namespace, field):
+        with self._counter_lock:
+            self._counters[namespace][field] += 1
+
+    def _error(self, action, e):
+        with self._counter_lock:
+            self._errors += 1
+        logging.warning(f'Cache {action} failed ({self.backend.name}): {str(e)}')
+
+    def entry(self, namespace, key, tags=(), ttl=None):
+        """Look key up in namespace; returns a CacheEntry whose value is set on a hit"""
+        tags = tuple(sorted({_tag_name(tag) for tag in tags}))
+        full_key = f'{namespace}:{key!r}'
+        ttl = ttl or self.default_ttl
+        if self.max_ttl:
+            ttl = min(ttl, self.max_ttl)
+        try:
+            versions = self.backend.tag_versions(tags)
+            raw = self.backend.get(full_key)
+            if raw is not None:
+                stored_versions, value = pickle.loads(raw)
+                if stored_versions == versions:
+                    self._count(namespace, 'hits')
+                    return CacheEntry(self, namespace, full_key, tags, ttl, versions, _attach(value))
+        except Exception as e:
+            self._error('read', e)
+            versions = None
+        self._count(namespace, 'misses')
+        return CacheEntry(self, namespace, full_key, tags, ttl, versions)
+
+    def _store(self, full_key, value, ttl, versions):
+        try:
+            self.backend.set(full_key, pickle.dumps((versions, value), pickle.HIGHEST_PROTOCOL), ttl)
+        except Exception as e:
+            self._error('write', e)
+
+    def invalidate_tags(self, tags):
+        tags = sorted({_tag_name(tag) for tag in tags})
+        if not tags:
+            return
+        try:
+            self.backend.bump_tags(tags)
+        except Exception as e:
+            self._error('invalidate', e)
+
+    def delete(self, namespace, key):
+        try:
+            self.backend.delete(f'{namespace}:{key!r}')
+        except Exception as e:
+            self._error('delete', e)
+
+    def clear(self):
+        try:
+            self.backend.clear()
+        except Exception as e:
+            self._error('clear', e)
+
+    def stats(self):
+        """Hit/miss counters of this process, for /health"""
+        with self._counter_lock:
+            namespaces = {name: dict(counts) for name, counts in sorted(self._counters.items())}
+            errors = self._errors
+        hits = sum(counts['hits'] for counts in namespaces.values())
+        misses = sum(counts['misses'] for counts in namespaces.values())
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            'backend': self.backend.name,
+            'entries': size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses) * 100, 1) if hits + misses else 0,
+            'errors': errors,
+            'namespaces': namespaces
+        }
+
+cache = Cache()
+
+def _attach(value):
+    """Merge cached ORM instances into the current session (no query) so lazy loads keep working"""
+    from extensions import db
+
+    if isinstance(value, db.Model):
+        return db.session.merge(value, load=False)
+    if isinstance(value, list):
+        return [_attach(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_attach(item) for item in value)
+    return value
+
+def cached(tags=(), ttl=None, key=None, namespace=None):
+    """Memoize a function in the application cache.
+
+    tags: tables (names or models) the result is built from; commits writing to any of them
+    invalidate it. key: function of the call arguments returning the cache key (defaults to
+    the arguments themselves). The wrapped function keeps the original as .uncached.
+    """
+    def decorator(f):
+        name = namespace or f'{f.__module__}.{f.__name__}'
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            cache_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            entry = cache.entry(name, cache_key, tags=tags, ttl=ttl)
+            if entry.hit:
+                return entry.value
+            return entry.store(f(*args, **kwargs))
+
+        decorated_function.uncached = f
+        return decorated_function
+    return decorator
+
+def mark_cache_tags_stale(tags, session=None):
+    """Invalidate tags when the current transaction commits (for writes the hooks can't see)"""
+    from extensions import db
+
+    session = session or db.session
+    session.info.setdefault(PENDING_TAGS, set()).update(_tag_name(tag) for tag in tags)
+
+def _capture_flushed_tables(session, flush_context, instances):
+    tables = set()
+    for instance in session.new:
+        tables.add(_tag_name(type(instance)))
+    for instance in session.deleted:
+        tables.add(_tag_name(type(instance)))
+    for instance in session.dirty:
+        if session.is_modified(instance, include_collections=False):
+            tables.add(_tag_name(type(instance)))
+    if tables:
+        session.info.setdefault(PENDING_TAGS, set()).update(tables)
+
+def _capture_statement_tables(orm_execute_state):
+    """Bulk INSERT/UPDATE/DELETE statements (query.update(), core upserts) skip the flush"""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    name = getattr(table, 'name', None)
+    if name:
+        orm_execute_state.session.info.setdefault(PENDING_TAGS, set()).add(name)
+
+def _invalidate_after_commit(session):
+    tags = session.info.pop(PENDING_TAGS, None)
+    if tags:
+        cache.invalidate_tags(tags)
+
+def _discard_after_rollback(session):
+    session.info.pop(PENDING_TAGS, None)
+
+def register_cache_listeners(session):
+    """Invalidate the tags of every table a commit of the given session wrote to"""
+    if not event.contains(session, 'before_flush', _capture_flushed_tables):
+        event.listen(session, 'before_flush', _capture_flushed_tables)
+        event.listen(session, 'do_orm_execute', _capture_statement_tables)
+        event.listen(session, 'after_commit', _invalidate_after_commit)
+        event.listen(session, 'after_rollback', _discard_after_rollback)
+
+def init_cache(app):
+    """Configure the backend from the app config and hook invalidation into db.session"""
+    from extensions import db
+
+    backend = create_backend(
+        app.config.get('CACHE_BACKEND', 'sqlite'),
+        app.config.get('CACHE_URL'),
+        app.config.get('CACHE_MAX_ENTRIES', 2048)
+    )
+    # Other workers never see this process's invalidations, so keep what they'd miss short-lived
+    max_ttl = None if backend.shared else app.config.get('CACHE_UNSHARED_MAX_TTL', 10)
+    cache.configure(backend, app.config.get('CACHE_DEFAULT_TTL', 300), max_ttl)
+    register_cache_listeners(db.session)
+    if max_ttl:
+        logging.info(f'Application cache: {backend.name} backend (per process, entries kept at most {max_ttl}s)')
+    else:
+        logging.info(f'Application cache: {backend.name} backend')
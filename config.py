@@ -55,22 +55,108 @@ class Config:
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
+    # ------------------------
+    # Background export jobs
+    # ------------------------
+    # Finished export files are kept in the export_jobs table for EXPORT_JOB_TTL seconds. The
+    # process holding a job renews its lease every minute; queued jobs whose lease ran out for
+    # EXPORT_JOB_LEASE seconds are taken over by another process
+    EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', '2'))
+    EXPORT_JOB_TTL = int(os.environ.get('EXPORT_JOB_TTL', '3600'))
+    EXPORT_JOB_TIMEOUT = int(os.environ.get('EXPORT_JOB_TIMEOUT', '1800'))  # Running jobs older than this are failed
+    EXPORT_JOB_LEASE = int(os.environ.get('EXPORT_JOB_LEASE', '180'))
+    # Write Excel exports with a write-only (streaming) workbook; False restores the in-memory writer
+    EXCEL_STREAMING_EXPORT = os.environ.get('EXCEL_STREAMING_EXPORT', 'true').lower() == 'true'
+
+    # ------------------------
+    # Activity log
+    # ------------------------
+    # Audit entries are queued in memory and written in batches by a background thread; entries
+    # that can't be written are kept in ACTIVITY_LOG_SPOOL_PATH until the database is back
+    ACTIVITY_LOG_BUFFERED = os.environ.get('ACTIVITY_LOG_BUFFERED', 'true').lower() == 'true'
+    ACTIVITY_LOG_BATCH_SIZE = int(os.environ.get('ACTIVITY_LOG_BATCH_SIZE', '500'))
+    ACTIVITY_LOG_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_LOG_FLUSH_INTERVAL', '2'))  # seconds
+    ACTIVITY_LOG_MAX_QUEUE = int(os.environ.get('ACTIVITY_LOG_MAX_QUEUE', '10000'))
+    ACTIVITY_LOG_SPOOL_PATH = os.environ.get('ACTIVITY_LOG_SPOOL_PATH', os.path.join(
+        os.path.abspath(os.path.dirname(__file__)),
+        'activity_log_spool.jsonl'
+    ))
+
+    # ------------------------
+    # Email outbox
+    # ------------------------
+    # Notification emails are queued and sent every EMAIL_OUTBOX_INTERVAL seconds over one SMTP
+    # session. Failed messages are retried after EMAIL_OUTBOX_RETRY_BASE seconds, doubling up to
+    # EMAIL_OUTBOX_RETRY_MAX, and dead-lettered after EMAIL_OUTBOX_MAX_ATTEMPTS
+    EMAIL_OUTBOX_INTERVAL = int(os.environ.get('EMAIL_OUTBOX_INTERVAL', '10'))
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', '100'))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', '8'))
+    EMAIL_OUTBOX_RETRY_BASE = int(os.environ.get('EMAIL_OUTBOX_RETRY_BASE', '60'))
+    EMAIL_OUTBOX_RETRY_MAX = int(os.environ.get('EMAIL_OUTBOX_RETRY_MAX', '3600'))
+    EMAIL_OUTBOX_RETENTION_DAYS = int(os.environ.get('EMAIL_OUTBOX_RETENTION_DAYS', '30'))  # Sent messages
+
+    # ------------------------
+    # Application cache
+    # ------------------------
+    # sqlite (file shared by the workers on this host; CACHE_URL is the file path), redis
+    # (CACHE_URL is the redis:// URL; needed once more than one container serves the app) or
+    # memory (per process). Invalidation only reaches other workers through a shared backend, so
+    # with memory every entry lives at most CACHE_UNSHARED_MAX_TTL seconds.
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite').lower()
+    CACHE_URL = os.environ.get('CACHE_URL', os.path.join(
+        os.path.abspath(os.path.dirname(__file__)),
+        'instance',
+        'cache.sqlite3'
+    ))
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', '300'))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '2048'))
+    CACHE_UNSHARED_MAX_TTL = int(os.environ.get('CACHE_UNSHARED_MAX_TTL', '10'))
+    # /calendar/events results are cached this many seconds (dropped early when attendance,
+    # leaves, permissions or holidays change)
+    CALENDAR_EVENTS_CACHE_TTL = int(os.environ.get('CALENDAR_EVENTS_CACHE_TTL', '300'))
+    # The logged-in user (with department and managed departments) is cached this many seconds per
+    # user id; each request checks users/departments.updated_at, so changes apply immediately
+    USER_IDENTITY_CACHE_TTL = int(os.environ.get('USER_IDENTITY_CACHE_TTL', '60'))
+
+    # ------------------------
+    # Live updates (/attendance/stream)
+    # ------------------------
+    # Every open stream holds one of the worker's threads (8 in nixpacks.toml), so keep the cap
+    # small. Streams are only offered with a shared CACHE_BACKEND (sqlite/redis), since events
+    # published in one worker never reach the others through the memory backend. Pages without
+    # a stream poll; with a shared backend an unchanged poll is a 304 that runs no queries.
+    LIVE_UPDATES_MAX_STREAMS = int(os.environ.get('LIVE_UPDATES_MAX_STREAMS', '2'))  # Per process
+    LIVE_UPDATES_HEARTBEAT = int(os.environ.get('LIVE_UPDATES_HEARTBEAT', '15'))
+    LIVE_UPDATES_STREAM_SECONDS = int(os.environ.get('LIVE_UPDATES_STREAM_SECONDS', '300'))  # Then the browser reconnects
+    LIVE_UPDATES_POLL_SECONDS = int(os.environ.get('LIVE_UPDATES_POLL_SECONDS', '2'))  # Checks for other workers' events
+
     # ------------------------
     # Server Settings
     # ------------------------
     HOST = os.environ.get('HOST', '0.0.0.0')
     PORT = 5000
+    # create_app() should finish within this many seconds; slower boots are logged as a warning.
+    # scripts/benchmark_startup.py measures it
+    STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', '5'))
 
     # ------------------------
     # Session Configuration
     # ------------------------
-    SESSION_TYPE = 'filesystem'
+    # 'database' stores sessions in the server_sessions table (server_sessions.py), shared by
+    # every worker; 'filesystem' keeps them in SESSION_FILE_DIR on the local disk
+    SESSION_TYPE = os.environ.get('SESSION_TYPE', 'database')
     SESSION_FILE_DIR = os.path.join(
         os.path.abspath(os.path.dirname(__file__)),
         'flask_session_data'
     )
     SESSION_PERMANENT = True
     PERMANENT_SESSION_LIFETIME = 1800  # 30 minutes
+    # Database sessions are cached for SESSION_CACHE_TTL seconds; an unchanged session's expiry is
+    # written back at most every SESSION_TOUCH_INTERVAL seconds; expired rows are swept every
+    # SESSION_SWEEP_INTERVAL seconds
+    SESSION_CACHE_TTL = int(os.environ.get('SESSION_CACHE_TTL', '5'))
+    SESSION_TOUCH_INTERVAL = int(os.environ.get('SESSION_TOUCH_INTERVAL', '60'))
+    SESSION_SWEEP_INTERVAL = int(os.environ.get('SESSION_SWEEP_INTERVAL', '900'))
 
     # ------------------------
     # Scheduler
@@ -89,6 +175,26 @@ class Config:
     DEVICE_PORT = int(os.environ.get('DEVICE_PORT', '4370'))
     DEVICE_URL = os.environ.get('DEVICE_URL', 'http://192.168.11.253/')
 
+    # Devices are fetched in parallel; each sync cycle waits at most
+    # DEVICE_SYNC_DEADLINE seconds for slow or offline devices
+    DEVICE_SYNC_MAX_WORKERS = int(os.environ.get('DEVICE_SYNC_MAX_WORKERS', '4'))
+    DEVICE_SYNC_DEADLINE = int(os.environ.get('DEVICE_SYNC_DEADLINE', '90'))
+
+    # Each process keeps one connection per device open between operations (device_sessions.py).
+    # Unused connections close after DEVICE_SESSION_IDLE_TIMEOUT seconds; failed connects are
+    # retried after DEVICE_SESSION_BACKOFF_BASE seconds, doubling up to DEVICE_SESSION_BACKOFF_MAX
+    DEVICE_SESSION_TIMEOUT = int(os.environ.get('DEVICE_SESSION_TIMEOUT', '30'))
+    DEVICE_SESSION_IDLE_TIMEOUT = int(os.environ.get('DEVICE_SESSION_IDLE_TIMEOUT', '60'))
+    DEVICE_SESSION_BACKOFF_BASE = int(os.environ.get('DEVICE_SESSION_BACKOFF_BASE', '5'))
+    DEVICE_SESSION_BACKOFF_MAX = int(os.environ.get('DEVICE_SESSION_BACKOFF_MAX', '300'))
+
+    # Live capture (live_capture.py): one listener per device stores punches as they happen.
+    # The periodic sync then only reconciles captured devices every DEVICE_LIVE_CAPTURE_RECONCILE_SECONDS.
+    # A listener checks every DEVICE_LIVE_CAPTURE_TIMEOUT seconds whether others need the device
+    DEVICE_LIVE_CAPTURE = os.environ.get('DEVICE_LIVE_CAPTURE', 'false').lower() == 'true'
+    DEVICE_LIVE_CAPTURE_TIMEOUT = int(os.environ.get('DEVICE_LIVE_CAPTURE_TIMEOUT', '5'))
+    DEVICE_LIVE_CAPTURE_RECONCILE_SECONDS = int(os.environ.get('DEVICE_LIVE_CAPTURE_RECONCILE_SECONDS', '900'))
+
     # ------------------------
     # Sync Agent
     # ------------------------
@@ -96,6 +202,11 @@ class Config:
     ENABLE_DIRECT_DEVICE_SYNC = os.environ.get(
         'ENABLE_DIRECT_DEVICE_SYNC', 'false'
     ).lower() == 'true'
+    # /api/v2/sync/logs batch limits (size is after gzip decompression) and how long
+    # idempotency keys are remembered
+    SYNC_BATCH_MAX_LOGS = int(os.environ.get('SYNC_BATCH_MAX_LOGS', '20000'))
+    SYNC_BATCH_MAX_BYTES = int(os.environ.get('SYNC_BATCH_MAX_BYTES', str(32 * 1024 * 1024)))
+    SYNC_BATCH_RETENTION_DAYS = int(os.environ.get('SYNC_BATCH_RETENTION_DAYS', '7'))
 
     # ------------------------
     # Admin Instance Flag
@@ -0,0 +1,40 @@
+"""
+Shared pytest fixtures for the test_*.py modules.
+
+make_app builds a bare Flask app bound to a SQLite database with the application's tables
+created; each test module adds the extensions, configuration and rows it needs. No running
+server or PostgreSQL is needed.
+"""
+import pytest
+from flask import Flask
+
+from extensions import db
+
+def create_tables():
+    """Create every table except documentation_pages, which uses PostgreSQL-only column types"""
+    db.metadata.create_all(db.engine, tables=[
+        table for name, table in db.metadata.tables.items() if name != 'documentation_pages'
+    ])
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Factory: make_app(database=None, **config) returns an app with the schema in place.
+
+    database names a SQLite file in the test's temporary directory (needed when several
+    threads or engines share the data); without it the database is in memory.
+    """
+    def factory(database=None, **config):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / database}' if database else 'sqlite://'
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+        app.config.update(config)
+        db.init_app(app)
+        with app.app_context():
+            create_tables()
+        return app
+    return factory
+
+@pytest.fixture
+def app(make_app):
+    """An app on an in-memory database"""
+    return make_app()
@@ -2,38 +2,379 @@
 Connection management utilities for preventing database connection pool exhaustion
 """
 import logging
+import os
+import socket
 from contextlib import contextmanager
+from datetime import datetime, timedelta
 from flask import current_app
 from extensions import db
 from functools import wraps
+from sqlalchemy import text, bindparam, DateTime
+from sqlalchemy.exc import ProgrammingError, OperationalError
 import threading
+import time
 
 # Thread-local storage for tracking sync operations
 _sync_lock = threading.Lock()
 _active_syncs = set()
 
+# Cluster-wide lease (sync_leases table) so only one process syncs at a time.
+# The holder renews the lease every SYNC_LEASE_HEARTBEAT seconds; if the process
+# dies the lease simply expires after SYNC_LEASE_TTL and another worker takes over.
+SYNC_LEASE_NAME = 'attendance_sync'
+SYNC_LEASE_TTL = 120  # seconds
+SYNC_LEASE_HEARTBEAT = 30  # seconds
+SYNC_LEASE_RETRY = 5  # seconds between renewal attempts after one failed
+_process_owner = f"{socket.gethostname()}:{os.getpid()}"
+_heartbeats = {}  # operation_id -> threading.Event used to stop its heartbeat thread
+_lost_leases = set()  # operation ids whose lease expired or was taken while they ran
+_lease_table_missing_logged = False
+
+def _lease_table_missing(e):
+    """Whether `e` means the sync_leases table doesn't exist (database not migrated yet)"""
+    if not isinstance(e, (ProgrammingError, OperationalError)):
+        return False
+    orig = getattr(e, 'orig', None)
+    if getattr(orig, 'pgcode', None) == '42P01':  # undefined_table
+        return True
+    return 'no such table' in str(orig or e).lower()
+
+def _lease_unavailable(e):
+    """Log (once) that the lease table can't be used and we fall back to the in-process lock"""
+    global _lease_table_missing_logged
+    if not _lease_table_missing_logged:
+        logging.warning(f"Cluster sync lease unavailable, falling back to in-process lock: {str(e)}")
+        _lease_table_missing_logged = True
+
+def _lease_error(name, e):
+    """Handle a failed lease query: fall back to in-process locking only when the table is missing.
+
+    Returns True for a missing table. Any other error (connection lost, pool timeout) is logged
+    and returns False, so callers treat the lease as not held rather than all taking it at once.
+    """
+    if _lease_table_missing(e):
+        _lease_unavailable(e)
+        return True
+    logging.error(f"Lease {name} query failed: {str(e)}")
+    return False
+
+def acquire_lease(name, holder, ttl=SYNC_LEASE_TTL):
+    """Try to take a named cluster-wide lease. Returns True if `holder` now holds it.
+
+    Falls back to True (in-process only) when the sync_leases table doesn't exist yet;
+    returns False on any other database error.
+    """
+    now = datetime.utcnow()
+    try:
+        with db.engine.begin() as conn:
+            row = conn.execute(text("""
+                INSERT INTO sync_leases (name, holder, owner, acquired_at, heartbeat_at, expires_at)
+                VALUES (:name, :holder, :owner, :now, :now, :expires_at)
+                ON CONFLICT (name) DO UPDATE SET
+                    holder = excluded.holder,
+                    owner = excluded.owner,
+                    acquired_at = excluded.acquired_at,
+                    heartbeat_at = excluded.heartbeat_at,
+                    expires_at = excluded.expires_at,
+                    reconciled_at = NULL,
+                    yield_requested_at = NULL,
+                    yielded_at = NULL
+                WHERE sync_leases.expires_at < :now
+                RETURNING holder
+            """), {
+                'name': name,
+                'holder': holder,
+                'owner': _process_owner,
+                'now': now,
+                'expires_at': now + timedelta(seconds=ttl)
+            }).first()
+        return row is not None and row[0] == holder
+    except Exception as e:
+        return _lease_error(name, e)
+
+def renew_lease(name, holder, ttl=SYNC_LEASE_TTL, engine=None):
+    """Extend a lease `holder` holds.
+
+    Returns True when renewed, False once it was lost (expired and taken, or cleared) and None
+    when the query failed - the lease is then still held until its current expiry.
+    Pass the engine when calling from a thread without an app context.
+    """
+    now = datetime.utcnow()
+    try:
+        with (engine or db.engine).begin() as conn:
+            result = conn.execute(text("""
+                UPDATE sync_leases SET heartbeat_at = :now, expires_at = :expires_at
+                WHERE name = :name AND holder = :holder
+            """), {
+                'name': name,
+                'holder': holder,
+                'now': now,
+                'expires_at': now + timedelta(seconds=ttl)
+            })
+        return result.rowcount != 0
+    except Exception as e:
+        return True if _lease_error(name, e) else None
+
+def release_lease(name, holder):
+    """Release a named lease if `holder` still holds it"""
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(
+                text("DELETE FROM sync_leases WHERE name = :name AND holder = :holder"),
+                {'name': name, 'holder': holder}
+            )
+    except Exception as e:
+        _lease_error(name, e)
+
+def active_leases(names):
+    """The subset of `names` currently held by some process in the cluster.
+
+    Empty when the sync_leases table doesn't exist yet; other database errors are raised, since
+    an empty answer would tell every caller that nothing is held.
+    """
+    names = list(names)
+    if not names:
+        return set()
+    try:
+        with db.engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT name FROM sync_leases WHERE name IN :names AND expires_at >= :now").bindparams(
+                    bindparam('names', expanding=True)
+                ),
+                {'names': names, 'now': datetime.utcnow()}
+            ).all()
+        return {row[0] for row in rows}
+    except Exception as e:
+        if not _lease_table_missing(e):
+            raise
+        _lease_unavailable(e)
+        return set()
+
+def lease_reconciled_at(names):
+    """{name: reconciled_at} for the leases in `names` currently held by some process.
+
+    reconciled_at is None until mark_leases_reconciled() was called for the current holder.
+    Empty when the sync_leases table doesn't exist yet; other database errors are raised.
+    """
+    names = list(names)
+    if not names:
+        return {}
+    try:
+        with db.engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT name, reconciled_at FROM sync_leases WHERE name IN :names AND expires_at >= :now").bindparams(
+                    bindparam('names', expanding=True)
+                ).columns(reconciled_at=DateTime),
+                {'names': names, 'now': datetime.utcnow()}
+            ).all()
+        return {row[0]: row[1] for row in rows}
+    except Exception as e:
+        if not _lease_table_missing(e):
+            raise
+        _lease_unavailable(e)
+        return {}
+
+def mark_leases_reconciled(names):
+    """Record that the resources behind the held leases in `names` were just reconciled"""
+    names = list(names)
+    if not names:
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(
+                text("UPDATE sync_leases SET reconciled_at = :now WHERE name IN :names").bindparams(
+                    bindparam('names', expanding=True)
+                ),
+                {'names': names, 'now': datetime.utcnow()}
+            )
+    except Exception as e:
+        _lease_error(', '.join(names), e)
+
+# Handing a leased resource over across processes: a process that needs the resource calls
+# request_lease_yield() until the holder has yielded (or the lease is gone), uses it, then
+# end_lease_yield(). The holder polls lease_yield_requested(), lets go of the resource,
+# confirms with set_lease_yielded(True) and resumes once the request is withdrawn.
+
+def request_lease_yield(name):
+    """Ask the holder of `name` to hand its resource over (repeat while waiting).
+
+    Returns None when nobody holds the lease, otherwise (request time, whether the holder has
+    yielded). A missing sync_leases table counts as nobody holding it.
+    """
+    now = datetime.utcnow()
+    try:
+        with db.engine.begin() as conn:
+            row = conn.execute(text("""
+                UPDATE sync_leases SET yield_requested_at = :now
+                WHERE name = :name AND expires_at >= :now
+                RETURNING yielded_at
+            """), {'name': name, 'now': now}).first()
+    except Exception as e:
+        if not _lease_table_missing(e):
+            raise
+        _lease_unavailable(e)
+        return None
+    return None if row is None else (now, row[0] is not None)
+
+def end_lease_yield(name, requested_at):
+    """Withdraw a yield request made at or before `requested_at` (later requests stay pending)"""
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text("""
+                UPDATE sync_leases SET yield_requested_at = NULL
+                WHERE name = :name AND yield_requested_at <= :requested_at
+            """), {'name': name, 'requested_at': requested_at})
+    except Exception as e:
+        _lease_error(name, e)
+
+def lease_yield_requested(name, holder):
+    """Whether another process asked `holder` to hand over the resource of lease `name`"""
+    try:
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT yield_requested_at FROM sync_leases WHERE name = :name AND holder = :holder"),
+                {'name': name, 'holder': holder}
+            ).first()
+        return row is not None and row[0] is not None
+    except Exception as e:
+        _lease_error(name, e)
+        return False
+
+def set_lease_yielded(name, holder, yielded):
+    """Confirm the resource was handed over (yielded=True), or take it back and clear the request"""
+    try:
+        with db.engine.begin() as conn:
+            if yielded:
+                conn.execute(
+                    text("UPDATE sync_leases SET yielded_at = :now WHERE name = :name AND holder = :holder"),
+                    {'name': name, 'holder': holder, 'now': datetime.utcnow()}
+                )
+            else:
+                conn.execute(text("""
+                    UPDATE sync_leases SET yielded_at = NULL, yield_requested_at = NULL
+                    WHERE name = :name AND holder = :holder
+                """), {'name': name, 'holder': holder})
+    except Exception as e:
+        _lease_error(name, e)
+
+def _acquire_cluster_lease(operation_id):
+    """Try to take the cluster-wide sync lease. Returns True if this operation now holds it."""
+    return acquire_lease(SYNC_LEASE_NAME, operation_id)
+
+def _release_cluster_lease(operation_id):
+    """Release the cluster-wide lease if this operation still holds it"""
+    release_lease(SYNC_LEASE_NAME, operation_id)
+
+def _cluster_lease_active():
+    """Check whether any process in the cluster holds an unexpired sync lease"""
+    try:
+        return SYNC_LEASE_NAME in active_leases([SYNC_LEASE_NAME])
+    except Exception as e:
+        # Can't tell: report a sync as running rather than start another one
+        logging.error(f"Could not check the cluster sync lease: {str(e)}")
+        return True
+
+class SyncLeaseLost(Exception):
+    """The sync lease expired or was taken over while the sync was still running"""
+
+def sync_lease_lost(operation_id):
+    """Whether the heartbeat gave up the lease of a running sync operation"""
+    return operation_id in _lost_leases
+
+def check_sync_lease(operation_id):
+    """Raise SyncLeaseLost if the operation no longer holds the sync lease.
+
+    Call before committing work or advancing cursors, so a sync that overran its lease doesn't
+    write alongside the process that took it over.
+    """
+    if operation_id in _lost_leases:
+        raise SyncLeaseLost(f"Sync operation {operation_id} lost the cluster sync lease")
+
+def _start_lease_heartbeat(operation_id, acquired_at):
+    """Renew the lease in the background while the sync operation runs.
+
+    acquired_at is the time.monotonic() taken before the lease was acquired. A failed renewal is
+    retried every SYNC_LEASE_RETRY seconds until the lease's own expiry is near; the operation is
+    marked lost then, or as soon as a renewal finds the lease gone.
+    """
+    engine = db.engine
+    stop_event = threading.Event()
+
+    def heartbeat():
+        expires_at = acquired_at + SYNC_LEASE_TTL
+        wait = SYNC_LEASE_HEARTBEAT
+        while not stop_event.wait(wait):
+            attempted_at = time.monotonic()
+            renewed = renew_lease(SYNC_LEASE_NAME, operation_id, SYNC_LEASE_TTL, engine=engine)
+            if renewed:
+                expires_at = attempted_at + SYNC_LEASE_TTL
+                wait = SYNC_LEASE_HEARTBEAT
+                continue
+            if renewed is None and time.monotonic() + SYNC_LEASE_RETRY < expires_at:
+                logging.warning(f"Could not renew sync lease for operation {operation_id}; retrying in {SYNC_LEASE_RETRY}s")
+                wait = SYNC_LEASE_RETRY
+                continue
+            _lost_leases.add(operation_id)
+            logging.warning(f"Sync lease for operation {operation_id} was lost (expired or cleared)")
+            return
+
+    threading.Thread(target=heartbeat, name=f'sync-lease-{operation_id[:8]}', daemon=True).start()
+    _heartbeats[operation_id] = stop_event
+
 def is_sync_running():
-    """Check if a sync operation is already running"""
+    """Check if a sync operation is already running in this process or anywhere in the cluster"""
     with _sync_lock:
-        return len(_active_syncs) > 0
+        if len(_active_syncs) > 0:
+            return True
+    return _cluster_lease_active()
 
 def register_sync_operation(operation_id):
-    """Register a sync operation to prevent concurrent syncs"""
+    """Register a sync operation to prevent concurrent syncs.
+
+    Returns False if another process in the cluster already holds the sync lease.
+    """
     with _sync_lock:
+        if _active_syncs:
+            return False
+        acquired_at = time.monotonic()
+        if not _acquire_cluster_lease(operation_id):
+            logging.info(f"Sync operation {operation_id} not registered - lease held by another process")
+            return False
         _active_syncs.add(operation_id)
-        logging.info(f"Registered sync operation: {operation_id}")
+        _start_lease_heartbeat(operation_id, acquired_at)
+        logging.info(f"Registered sync operation: {operation_id} ({_process_owner})")
+        return True
 
 def unregister_sync_operation(operation_id):
     """Unregister a sync operation"""
     with _sync_lock:
+        stop_event = _heartbeats.pop(operation_id, None)
+        if stop_event:
+            stop_event.set()
+        if operation_id in _active_syncs:
+            _release_cluster_lease(operation_id)
         _active_syncs.discard(operation_id)
+        _lost_leases.discard(operation_id)
         logging.info(f"Unregistered sync operation: {operation_id}")
 
 def clear_all_sync_operations():
-    """Clear all sync operations (for debugging/reset purposes)"""
+    """Clear all sync operations, including a stuck cluster lease (for debugging/reset purposes)"""
     with _sync_lock:
         cleared_count = len(_active_syncs)
         _active_syncs.clear()
+        for stop_event in _heartbeats.values():
+            stop_event.set()
+        _heartbeats.clear()
+        _lost_leases.clear()
+        try:
+            with db.engine.begin() as conn:
+                result = conn.execute(
+                    text("DELETE FROM sync_leases WHERE name = :name"),
+                    {'name': SYNC_LEASE_NAME}
+                )
+            cleared_count = max(cleared_count, result.rowcount or 0)
+        except Exception as e:
+            _lease_error(SYNC_LEASE_NAME, e)
         logging.info(f"Cleared {cleared_count} sync operations")
         return cleared_count
 
@@ -121,17 +462,15 @@ def safe_sync_operation(operation_id):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Check if sync is already running (with shorter timeout)
-            if is_sync_running():
+            # Register this sync operation - fails if a sync is already running
+            # in this process or another worker holds the cluster lease
+            if not register_sync_operation(operation_id):
                 logging.info(f"Sync operation {operation_id} skipped - another sync is already running")
                 return {
                     'status': 'skipped',
                     'message': 'Another sync operation is already running'
                 }
             
-            # Register this sync operation
-            register_sync_operation(operation_id)
-            
             try:
                 # Use managed database session
                 with managed_db_session():
@@ -0,0 +1,279 @@
+"""
+Persistent sessions with the ZKTeco fingerprint devices.
+
+Every device operation (sync, status pages, diagnostics, user import) borrows the device's
+session instead of opening its own ZK connection. A session keeps one connection open
+between operations and hands it to one caller at a time, so a status page and a sync never
+talk to the same device at once. Sessions are keyed by device address: DeviceSettings rows
+pointing at the same ip:port are the same device and share one.
+
+- Reuse: a connection idle for more than HEALTH_CHECK_AFTER seconds is probed with a cheap
+  command before it is handed out, and replaced when the probe fails.
+- Idle timeout: connections unused for idle_timeout seconds are closed by a background reaper,
+  so the device is not held forever by a process that no longer needs it.
+- Backoff: after a failed connect, borrowing fails fast with DeviceUnavailable until the
+  retry time (exponential, capped) instead of waiting out another connect timeout.
+
+Sessions are per process; with several workers each one keeps at most one connection per device.
+A process that holds a device for long stretches elsewhere (a live capture listener,
+live_capture.py) is asked to hand it over through the `handover` hook before a borrow connects.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from zk import ZK
+
+# Connections idle longer than this are probed before reuse
+HEALTH_CHECK_AFTER = 10
+
+class DeviceUnavailable(Exception):
+    """The device could not be connected (or is in reconnect backoff)"""
+
+class DeviceBusy(DeviceUnavailable):
+    """Another operation held the device for longer than the caller was willing to wait"""
+
+class DeviceSession:
+    """One device's connection and the lock that serializes its use"""
+
+    def __init__(self, ip, port):
+        self.ip = ip
+        self.port = port
+        self.lock = threading.Lock()
+        self.waiters = 0
+        self.conn = None
+        self.connected_at = None
+        self.last_used = 0.0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error = None
+        self.borrows = 0
+        self.connects = 0
+
+    @property
+    def name(self):
+        return f'{self.ip}:{self.port}'
+
+    def disconnect(self):
+        conn, self.conn = self.conn, None
+        self.connected_at = None
+        if conn is not None:
+            try:
+                conn.disconnect()
+            except Exception as e:
+                logging.debug(f'Error disconnecting from device {self.name}: {str(e)}')
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'connected': self.conn is not None,
+            'in_use': self.lock.locked(),
+            'waiting': self.waiters,
+            'idle_seconds': round(now - self.last_used, 1) if self.last_used else None,
+            'borrows': self.borrows,
+            'connects': self.connects,
+            'failures': self.failures,
+            'retry_in': round(self.retry_at - now, 1) if self.retry_at > now else 0,
+            'last_error': self.last_error
+        }
+
+class DeviceSessionManager:
+    def __init__(self, timeout=30, idle_timeout=60, backoff_base=5, backoff_max=300, connector=ZK):
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connector = connector
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        # Optional handover(ip, port, wait) context manager entered around each borrow, for
+        # devices another process may be holding on to
+        self.handover = None
+
+    def configure(self, timeout=None, idle_timeout=None, backoff_base=None, backoff_max=None, connector=None):
+        """Change settings and drop existing connections (they were made with the old ones)"""
+        if timeout is not None:
+            self.timeout = timeout
+        if idle_timeout is not None:
+            self.idle_timeout = idle_timeout
+        if backoff_base is not None:
+            self.backoff_base = backoff_base
+        if backoff_max is not None:
+            self.backoff_max = backoff_max
+        if connector is not None:
+            self.connector = connector
+        self.close_all()
+        with self._lock:
+            self._sessions.clear()
+
+    def _session(self, ip, port):
+        key = (ip, int(port))
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = DeviceSession(ip, int(port))
+            return session
+
+    def _connect(self, session, retry_now):
+        now = time.monotonic()
+        if not retry_now and session.retry_at > now:
+            raise DeviceUnavailable(
+                f'Device {session.name} is unreachable ({session.last_error}); '
+                f'retrying in {round(session.retry_at - now)}s'
+            )
+        try:
+            conn = self.connector(session.ip, port=session.port, timeout=self.timeout).connect()
+            if not conn:
+                raise DeviceUnavailable('connect returned no connection')
+        except Exception as e:
+            session.failures += 1
+            session.last_error = str(e)
+            delay = min(self.backoff_base * 2 ** (session.failures - 1), self.backoff_max)
+            session.retry_at = time.monotonic() + delay
+            logging.warning(f'Could not connect to device {session.name} (attempt {session.failures}, '
+                            f'next try in {delay}s): {str(e)}')
+            raise DeviceUnavailable(f'Could not connect to device {session.name}: {str(e)}') from e
+
+        session.conn = conn
+        session.connected_at = time.monotonic()
+        session.connects += 1
+        session.failures = 0
+        session.retry_at = 0.0
+        session.last_error = None
+        logging.info(f'Connected to device {session.name}')
+        self._start_reaper()
+
+    def _healthy(self, session):
+        if time.monotonic() - session.last_used < HEALTH_CHECK_AFTER:
+            return True
+        try:
+            session.conn.get_time()
+            return True
+        except Exception as e:
+            logging.info(f'Device {session.name} connection went stale, reconnecting: {str(e)}')
+            return False
+
+    @contextmanager
+    def borrow(self, ip, port, wait=30, retry_now=False):
+        """Yield the device's connection for exclusive use.
+
+        Waits up to `wait` seconds for another operation to finish (DeviceBusy after that) and
+        raises DeviceUnavailable when the device can't be connected. retry_now ignores the
+        reconnect backoff (for explicit diagnostics). An exception escaping the block drops the
+        connection, since the device may be mid-command; the next borrow reconnects.
+        """
+        session = self._session(ip, port)
+        with self._lock:
+            session.waiters += 1
+        try:
+            acquired = session.lock.acquire(timeout=wait)
+        finally:
+            with self._lock:
+                session.waiters -= 1
+        if not acquired:
+            raise DeviceBusy(f'Device {session.name} is busy with another operation')
+        try:
+            with self.handover(ip, port, wait) if self.handover else nullcontext():
+                if session.conn is not None and not self._healthy(session):
+                    session.disconnect()
+                if session.conn is None:
+                    self._connect(session, retry_now)
+                session.borrows += 1
+                try:
+                    yield session.conn
+                except BaseException:
+                    session.disconnect()
+                    raise
+                finally:
+                    session.last_used = time.monotonic()
+        finally:
+            session.lock.release()
+
+    def has_waiters(self, ip, port):
+        """Whether other operations are waiting for the device (long holders should let go)"""
+        session = self._sessions.get((ip, int(port)))
+        return session is not None and session.waiters > 0
+
+    def close(self, ip, port, wait=5):
+        """Close the device's connection so another process can connect to it"""
+        session = self._sessions.get((ip, int(port)))
+        if session is not None and session.lock.acquire(timeout=wait):
+            try:
+                session.disconnect()
+            finally:
+                session.lock.release()
+
+    def is_connected(self, ip, port):
+        session = self._sessions.get((ip, int(port)))
+        return session is not None and session.conn is not None
+
+    def close_idle(self):
+        """Disconnect sessions unused for idle_timeout seconds; returns how many were closed"""
+        closed = 0
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            if session.conn is None or now - session.last_used < self.idle_timeout:
+                continue
+            # Never wait on a session in use: it is not idle
+            if session.lock.acquire(blocking=False):
+                try:
+                    if session.conn is not None and time.monotonic() - session.last_used >= self.idle_timeout:
+                        session.disconnect()
+                        closed += 1
+                        logging.info(f'Closed idle connection to device {session.name}')
+                finally:
+                    session.lock.release()
+        return closed
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            if session.lock.acquire(timeout=5):
+                try:
+                    session.disconnect()
+                finally:
+                    session.lock.release()
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap, name='device-session-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(max(1, min(self.idle_timeout / 2, 30)))
+            try:
+                self.close_idle()
+            except Exception as e:
+                logging.warning(f'Device session reaper error: {str(e)}')
+            with self._lock:
+                if not any(session.conn is not None for session in self._sessions.values()):
+                    # Nothing left to watch; the next connect starts a new reaper
+                    self._reaper = None
+                    return
+
+    def stats(self):
+        with self._lock:
+            sessions = dict(self._sessions)
+        return {session.name: session.stats() for session in sessions.values()}
+
+device_sessions = DeviceSessionManager()
+atexit.register(device_sessions.close_all)
+
+def init_device_sessions(app):
+    """Apply the DEVICE_SESSION_* settings from the app config"""
+    device_sessions.configure(
+        timeout=app.config.get('DEVICE_SESSION_TIMEOUT', 30),
+        idle_timeout=app.config.get('DEVICE_SESSION_IDLE_TIMEOUT', 60),
+        backoff_base=app.config.get('DEVICE_SESSION_BACKOFF_BASE', 5),
+        backoff_max=app.config.get('DEVICE_SESSION_BACKOFF_MAX', 300)
+    )
@@ -0,0 +1,134 @@
+"""
+Simulated ZKTeco fingerprint device for tests and local development.
+
+A SimulatedDevice stands in for zk.ZK wherever a connector is accepted:
+
+    device = SimulatedDevice(users=[('100', 'Jane Doe')])
+    device_sessions.configure(connector=device)
+    device.punch('100')  # shows up in get_attendance() and in a running live_capture()
+
+It implements the part of the pyzk connection API the application uses (attendance download,
+size probe, user list, device info and live capture) and can be taken offline to exercise
+reconnects and backoff. The same device answers every address. With a capacity, a full device
+overwrites its oldest records the way a wrapping attendance log does.
+"""
+
+import queue
+import threading
+from datetime import datetime
+
+from zk.attendance import Attendance
+from zk.user import User as DeviceUser
+
+class SimulatedDevice:
+    def __init__(self, users=(), name='Simulated Device', capacity=None):
+        self.name = name
+        self.capacity = capacity
+        self.users = [DeviceUser(uid, user_name, 0, user_id=str(user_id))
+                      for uid, (user_id, user_name) in enumerate(users, start=1)]
+        self.attendance = []
+        self.online = True
+        self.connects = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def __call__(self, ip, port=4370, timeout=60, **kwargs):
+        return SimulatedConnection(self, timeout)
+
+    def punch(self, user_id, timestamp=None, status=1, punch=0):
+        """Record a punch; returns the Attendance record"""
+        user_id = str(user_id)
+        uid = next((user.uid for user in self.users if user.user_id == user_id), int(user_id))
+        record = Attendance(user_id, timestamp or datetime.now().replace(microsecond=0), status, punch, uid)
+        with self._lock:
+            self.attendance.append(record)
+            if self.capacity and len(self.attendance) > self.capacity:
+                del self.attendance[0]
+            listeners = list(self._listeners)
+        for events in listeners:
+            events.put(record)
+        return record
+
+    def clear_attendance(self):
+        with self._lock:
+            self.attendance = []
+
+class SimulatedConnection:
+    def __init__(self, device, timeout):
+        self.device = device
+        self.timeout = timeout
+        self.is_connect = False
+        self.end_live_capture = False
+        self.records = 0
+        self.rec_cap = 0
+        self.users = 0
+
+    def _check(self):
+        if not self.device.online or not self.is_connect:
+            raise ConnectionError(f'{self.device.name} is not reachable')
+
+    def connect(self):
+        if not self.device.online:
+            raise ConnectionError(f'{self.device.name} timed out')
+        self.device.connects += 1
+        self.is_connect = True
+        return self
+
+    def disconnect(self):
+        self.is_connect = False
+        return True
+
+    def get_time(self):
+        self._check()
+        return datetime.now()
+
+    def read_sizes(self):
+        self._check()
+        with self.device._lock:
+            self.records = len(self.device.attendance)
+        self.rec_cap = self.device.capacity or 0
+        self.users = len(self.device.users)
+        return True
+
+    def get_attendance(self):
+        self._check()
+        with self.device._lock:
+            return list(self.device.attendance)
+
+    def get_users(self):
+        self._check()
+        return list(self.device.users)
+
+    def get_firmware_version(self):
+        self._check()
+        return 'Ver 6.60 (simulated)'
+
+    def get_serialnumber(self):
+        self._check()
+        return 'SIM0000001'
+
+    def get_platform(self):
+        self._check()
+        return 'ZMM220_TFT'
+
+    def get_device_name(self):
+        self._check()
+        return self.device.name
+
+    def live_capture(self, new_timeout=10):
+        """Yield punches as they happen and None every new_timeout seconds without one"""
+        self._check()
+        events = queue.Queue()
+        with self.device._lock:
+            self.device._listeners.append(events)
+        self.end_live_capture = False
+        try:
+            while not self.end_live_capture:
+                try:
+                    yield events.get(timeout=new_timeout)
+                except queue.Empty:
+                    self._check()
+                    yield None
+        finally:
+            with self.device._lock:
+                self.device._listeners.remove(events)
@@ -0,0 +1,182 @@
+"""
+Email outbox: notification emails are queued in email_outbox and delivered in the background.
+
+Request handlers only call enqueue_email(), which adds a row to the handler's own transaction:
+the email is queued when the handler commits its change and dropped if it rolls back. Handlers
+that notify after they already committed call commit_queued_emails(). A scheduler job runs
+deliver_outbox() every EMAIL_OUTBOX_INTERVAL seconds. It takes the cluster lease
+'email_outbox' (one worker delivers at a time), logs in to the active SMTP configuration
+once and sends every due message over that session.
+
+A message that fails is retried after EMAIL_OUTBOX_RETRY_BASE seconds, doubling up to
+EMAIL_OUTBOX_RETRY_MAX. After EMAIL_OUTBOX_MAX_ATTEMPTS it is dead-lettered (status 'dead')
+and kept with its last error; `flask requeue-dead-emails` puts dead letters back in the queue.
+"""
+
+import uuid
+import smtplib
+import logging
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+from sqlalchemy import func
+
+from extensions import db
+from models import EmailOutbox
+from connection_manager import acquire_lease, renew_lease, release_lease
+
+OUTBOX_LEASE_NAME = 'email_outbox'
+OUTBOX_LEASE_TTL = 120  # seconds; renewed after every message
+
+# Errors that only concern one message; any other SMTP/socket error means the relay is
+# unreachable or the session is gone, and the rest of the batch waits for the next run
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+def enqueue_email(recipient_email, subject, html_body, recipient_name=None):
+    """Queue an email for background delivery in the caller's transaction (committed with the
+    caller's changes). Returns the outbox row."""
+    message = EmailOutbox(
+        recipient_email=recipient_email,
+        recipient_name=recipient_name,
+        subject=subject,
+        html_body=html_body
+    )
+    db.session.add(message)
+    logging.info(f"Email queued for {recipient_email}: {subject[:100]}")
+    return message
+
+def commit_queued_emails():
+    """Commit emails queued after the caller already committed its own changes.
+    Returns False (and drops them) if the commit fails."""
+    try:
+        db.session.commit()
+        return True
+    except Exception as e:
+        logging.error(f"Failed to queue emails: {str(e)}", exc_info=True)
+        db.session.rollback()
+        return False
+
+def open_smtp_session(smtp_config, timeout=30):
+    """Connect and log in with an SMTPConfiguration; the caller quits the returned session"""
+    if smtp_config.use_ssl:
+        server = smtplib.SMTP_SSL(smtp_config.smtp_server, smtp_config.smtp_port, timeout=timeout)
+    else:
+        server = smtplib.SMTP(smtp_config.smtp_server, smtp_config.smtp_port, timeout=timeout)
+        if smtp_config.use_tls:
+            server.starttls()
+    try:
+        server.login(smtp_config.smtp_username, smtp_config.smtp_password)
+    except Exception:
+        _quit(server)
+        raise
+    return server
+
+def _quit(server):
+    try:
+        server.quit()
+    except Exception as e:
+        logging.debug(f"Error closing SMTP connection: {str(e)}")
+
+def _build_message(smtp_config, message):
+    msg = MIMEMultipart()
+    msg['From'] = f"{smtp_config.sender_name} <{smtp_config.sender_email}>"
+    msg['To'] = message.recipient_email
+    msg['Subject'] = message.subject
+    msg.attach(MIMEText(message.html_body, 'html'))
+    return msg
+
+def _record_failure(message, error, now, max_attempts, retry_base, retry_max):
+    message.attempts += 1
+    message.last_error = str(error)[:2000]
+    if message.attempts >= max_attempts:
+        message.status = 'dead'
+        logging.error(f"Email {message.id} to {message.recipient_email} dead-lettered after {message.attempts} attempts: {str(error)}")
+    else:
+        delay = min(retry_base * 2 ** (message.attempts - 1), retry_max)
+        message.next_attempt_at = now + timedelta(seconds=delay)
+        logging.warning(f"Email {message.id} to {message.recipient_email} failed (attempt {message.attempts}), retrying in {delay}s: {str(error)}")
+
+def deliver_outbox(batch_size=100, max_attempts=8, retry_base=60, retry_max=3600, retention_days=30):
+    """Send the due messages over one SMTP session. Needs an app context.
+
+    Returns a dict with 'sent', 'failed' and 'dead' counts, or 'skipped' with the reason.
+    """
+    from helpers import get_active_smtp_config
+
+    smtp_config = get_active_smtp_config()
+    if not smtp_config:
+        return {'skipped': 'no active SMTP configuration'}
+
+    holder = uuid.uuid4().hex
+    if not acquire_lease(OUTBOX_LEASE_NAME, holder, OUTBOX_LEASE_TTL):
+        return {'skipped': 'another process is delivering'}
+
+    counts = {'sent': 0, 'failed': 0, 'dead': 0}
+    server = None
+    try:
+        now = datetime.utcnow()
+        due = EmailOutbox.query.filter(
+            EmailOutbox.status == 'pending',
+            EmailOutbox.next_attempt_at <= now
+        ).order_by(EmailOutbox.id).limit(batch_size).all()
+
+        for message in due:
+            now = datetime.utcnow()
+            try:
+                if server is None:
+                    server = open_smtp_session(smtp_config)
+                server.send_message(_build_message(smtp_config, message))
+                message.status = 'sent'
+                message.sent_at = now
+                message.attempts += 1
+                message.last_error = None
+                counts['sent'] += 1
+            except MESSAGE_ERRORS as e:
+                _record_failure(message, e, now, max_attempts, retry_base, retry_max)
+                counts['dead' if message.status == 'dead' else 'failed'] += 1
+            except OSError as e:
+                # smtplib errors are OSErrors too: can't reach or log in to the relay
+                _record_failure(message, e, now, max_attempts, retry_base, retry_max)
+                counts['dead' if message.status == 'dead' else 'failed'] += 1
+                db.session.commit()
+                if isinstance(e, smtplib.SMTPAuthenticationError):
+                    logging.error("SMTP login failed - check the password in Settings > SMTP Configuration")
+                break
+            db.session.commit()
+            if not renew_lease(OUTBOX_LEASE_NAME, holder, OUTBOX_LEASE_TTL):
+                logging.warning("Email outbox lease lost; stopping this delivery run")
+                break
+
+        if retention_days:
+            EmailOutbox.query.filter(
+                EmailOutbox.status == 'sent',
+                EmailOutbox.sent_at < datetime.utcnow() - timedelta(days=retention_days)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Email outbox delivery failed: {str(e)}", exc_info=True)
+    finally:
+        if server is not None:
+            _quit(server)
+        release_lease(OUTBOX_LEASE_NAME, holder)
+
+    if counts['sent'] or counts['failed'] or counts['dead']:
+        logging.info(f"Email outbox: {counts['sent']} sent, {counts['failed']} to retry, {counts['dead']} dead-lettered")
+    return counts
+
+def requeue_dead_emails():
+    """Give dead-lettered messages a fresh set of attempts. Commits. Returns how many were requeued."""
+    requeued = EmailOutbox.query.filter(EmailOutbox.status == 'dead').update({
+        'status': 'pending',
+        'attempts': 0,
+        'next_attempt_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    return requeued
+
+def outbox_stats():
+    """Message counts by status"""
+    return {status: count for status, count in
+            db.session.query(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)}
@@ -0,0 +1,263 @@
+"""
+Background report export jobs.
+
+An export view decorated with @background_export returns a job id (HTTP 202) instead of the
+file when called with ?async=1. The job row lives in the export_jobs table; a small in-process
+thread pool calls the export's builder directly with the requesting user and the saved query
+arguments (no view replay, no login), and stores the file in the job row so any worker or
+container can serve the download. Clients poll the status endpoint and download the file once
+it is ready.
+
+The process that queues or runs a job holds a lease on it (worker, lease_expires_at) and renews
+it every minute. Jobs whose lease ran out belong to a process that exited: queued ones are taken
+over and run again, running ones are failed. Expired rows are removed by cleanup_export_jobs.
+"""
+
+import os
+import json
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, request, jsonify, url_for
+from flask_login import current_user
+from sqlalchemy import or_
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_options_header
+
+from extensions import db
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Export builders by name (the name is stored in ExportJob.endpoint): name -> (builder, roles)
+_builders = {}
+
+def _get_executor(app):
+    """Process-wide worker pool, created on first use (after gunicorn forks)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('EXPORT_JOB_WORKERS', 2),
+                thread_name_prefix='export-job'
+            )
+        return _executor
+
+def worker_id():
+    """Identifies this process as the holder of job leases"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def _lease_expiry(app, now=None):
+    return (now or datetime.utcnow()) + timedelta(seconds=app.config.get('EXPORT_JOB_LEASE', 180))
+
+def wants_background_export():
+    """True when the client asked for a job id instead of the file"""
+    return request.args.get('async') == '1'
+
+def background_export(builder, roles=None):
+    """Let an export view run as a background job when called with ?async=1.
+
+    builder(viewer, query_args) returns the export response; the job calls it directly for the
+    requesting user. roles, when given, are checked again when the job runs.
+    """
+    name = f'{builder.__module__}.{builder.__name__}'
+    _builders[name] = (builder, roles)
+
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if wants_background_export():
+                job = enqueue_export_job(name, request.args)
+                return jsonify({
+                    'job_id': job.id,
+                    'status': job.status,
+                    'status_url': url_for('exports.job_status', job_id=job.id),
+                    'download_url': url_for('exports.download', job_id=job.id)
+                }), 202
+            return view(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def enqueue_export_job(name, args):
+    """Record a queued job for the current user, leased to this process, and hand it to the pool"""
+    from models import ExportJob
+
+    app = current_app._get_current_object()
+    params = [[key, value] for key, value in args.items(multi=True) if key != 'async']
+    job = ExportJob(
+        id=str(uuid.uuid4()),
+        user_id=current_user.id,
+        endpoint=name,
+        params=json.dumps({'args': params}),
+        status='queued',
+        worker=worker_id(),
+        lease_expires_at=_lease_expiry(app)
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    submit_export_job(app, job.id)
+    return job
+
+def submit_export_job(app, job_id):
+    _get_executor(app).submit(run_export_job, app, job_id)
+
+def _claim_job(app, job_id):
+    """Atomically move a job this process holds from queued to running; False if it can't"""
+    from models import ExportJob
+
+    now = datetime.utcnow()
+    claimed = ExportJob.query.filter_by(id=job_id, status='queued', worker=worker_id()).update(
+        {'status': 'running', 'started_at': now, 'lease_expires_at': _lease_expiry(app, now)},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return claimed == 1
+
+def _finish_job(app, job_id, **values):
+    from models import ExportJob
+
+    now = datetime.utcnow()
+    values.update(
+        finished_at=now,
+        lease_expires_at=None,
+        expires_at=now + timedelta(seconds=app.config.get('EXPORT_JOB_TTL', 3600))
+    )
+    ExportJob.query.filter_by(id=job_id).update(values, synchronize_session=False)
+    db.session.commit()
+
+def run_export_job(app, job_id):
+    """Build the job's export for its user and store the file in the job row"""
+    from models import ExportJob, User
+
+    with app.app_context():
+        try:
+            if not _claim_job(app, job_id):
+                return
+            job = ExportJob.query.get(job_id)
+            user = User.query.get(job.user_id)
+            query_args = MultiDict(json.loads(job.params or '{}').get('args') or [])
+            builder, roles = _builders[job.endpoint]
+        except Exception as e:
+            logging.error(f'Export job {job_id} could not start: {str(e)}')
+            db.session.rollback()
+            _finish_job(app, job_id, status='failed', error=str(e))
+            return
+
+        try:
+            if user is None or user.status != 'active':
+                raise Exception('User is no longer active')
+            if roles and user.role not in roles:
+                raise Exception('You no longer have access to this export')
+
+            # The builders only read their arguments; the empty request context is what
+            # send_file() and jsonify() need to build the response
+            with app.test_request_context():
+                response = app.make_response(builder(user, query_args))
+                try:
+                    disposition = response.headers.get('Content-Disposition', '')
+                    if response.status_code != 200 or 'attachment' not in disposition:
+                        raise Exception(_response_error(response))
+
+                    filename = parse_options_header(disposition)[1].get('filename') or f'export-{job_id}'
+                    response.direct_passthrough = False
+                    content = b''.join(response.iter_encoded())
+                finally:
+                    response.close()
+
+            _finish_job(
+                app,
+                job_id,
+                status='done',
+                filename=filename,
+                mimetype=response.mimetype,
+                content=content,
+                file_size=len(content)
+            )
+            logging.info(f'Export job {job_id} ({job.endpoint}) finished: {filename}')
+        except Exception as e:
+            logging.error(f'Export job {job_id} ({job.endpoint}) failed: {str(e)}')
+            db.session.rollback()
+            _finish_job(app, job_id, status='failed', error=str(e))
+        finally:
+            db.session.remove()
+
+def _response_error(response):
+    """Best-effort error message from a non-file export response"""
+    if response.is_json:
+        data = response.get_json(silent=True) or {}
+        message = data.get('error') or data.get('message')
+        if message:
+            return message
+    if response.status_code in (301, 302, 303):
+        return 'Export was rejected (check the selected dates and employees)'
+    return f'Export returned HTTP {response.status_code}'
+
+def renew_export_job_leases(app):
+    """Keep the leases on this process's queued and running jobs, and take over queued jobs
+    whose process is gone; returns the number taken over"""
+    from models import ExportJob
+
+    now = datetime.utcnow()
+    me = worker_id()
+    ExportJob.query.filter(ExportJob.worker == me, ExportJob.status.in_(['queued', 'running'])).update(
+        {'lease_expires_at': _lease_expiry(app, now)},
+        synchronize_session=False
+    )
+    db.session.commit()
+
+    orphaned = [job_id for (job_id,) in db.session.query(ExportJob.id).filter(
+        ExportJob.status == 'queued',
+        or_(ExportJob.lease_expires_at.is_(None), ExportJob.lease_expires_at < now)
+    ).all()]
+    taken = 0
+    for job_id in orphaned:
+        # Only one process wins the update; the others see the renewed lease
+        taken_over = ExportJob.query.filter(
+            ExportJob.id == job_id,
+            ExportJob.status == 'queued',
+            or_(ExportJob.lease_expires_at.is_(None), ExportJob.lease_expires_at < now)
+        ).update({'worker': me, 'lease_expires_at': _lease_expiry(app, now)}, synchronize_session=False)
+        db.session.commit()
+        if taken_over:
+            submit_export_job(app, job_id)
+            taken += 1
+    if taken:
+        logging.info(f'Took over {taken} export job(s) from stopped workers')
+    return taken
+
+def cleanup_export_jobs(app):
+    """Remove expired rows and fail jobs that ran too long or whose worker stopped mid-run"""
+    from models import ExportJob
+
+    now = datetime.utcnow()
+    removed = ExportJob.query.filter(ExportJob.expires_at.isnot(None), ExportJob.expires_at < now).delete(
+        synchronize_session=False
+    )
+
+    timeout = timedelta(seconds=app.config.get('EXPORT_JOB_TIMEOUT', 1800))
+    expires_at = now + timedelta(seconds=app.config.get('EXPORT_JOB_TTL', 3600))
+    stuck = ExportJob.query.filter(ExportJob.status == 'running', ExportJob.started_at < now - timeout).update(
+        {'status': 'failed', 'error': 'Export timed out', 'finished_at': now, 'lease_expires_at': None,
+         'expires_at': expires_at},
+        synchronize_session=False
+    )
+    # A running job is only renewed by the process running it
+    lost = ExportJob.query.filter(
+        ExportJob.status == 'running',
+        or_(ExportJob.lease_expires_at.is_(None), ExportJob.lease_expires_at < now)
+    ).update(
+        {'status': 'failed', 'error': 'Export worker stopped', 'finished_at': now, 'lease_expires_at': None,
+         'expires_at': expires_at},
+        synchronize_session=False
+    )
+    db.session.commit()
+
+    if removed or stuck or lost:
+        logging.info(f'Export job cleanup: {removed} expired, {stuck} timed out, {lost} lost with their worker')
+    return removed
@@ -2,11 +2,16 @@ from datetime import datetime, date, timedelta
 from functools import wraps
 from flask import flash, redirect, url_for, abort, request, current_app
 from flask_login import current_user
-from models import LeaveRequest, PermissionRequest, User, SMTPConfiguration, EmailTemplate, Ticket, TicketCategory, TicketDepartmentMapping, TicketComment, TicketStatusHistory, TicketEmailTemplate, Department, ActivityLog
+from models import LeaveRequest, PermissionRequest, User, SMTPConfiguration, EmailTemplate, Ticket, TicketCategory, TicketDepartmentMapping, TicketComment, TicketStatusHistory, TicketEmailTemplate, Department
 from extensions import db
-from zk import ZK, const
+from cache import cache, cached
+from sqlalchemy import or_, and_, select, func
+from sqlalchemy.orm import joinedload, selectinload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from device_sessions import device_sessions, DeviceUnavailable
 import logging
 import re
+import base64
 
 def role_required(*roles):
     """Decorator that checks if the current user has one of the required roles."""
@@ -180,26 +185,93 @@ def get_user_managers(user):
     
     return managers
 
-def get_employees_for_manager(manager_id):
-    """Get all employees that report to a specific manager."""
+# Never cached with the identity; loaded from the database if a request needs it
+IDENTITY_SKIPPED_FIELDS = {'password_hash'}
+
+def _identity_version(user_id):
+    """(users.updated_at, latest departments.updated_at) - one cheap query per request that tells
+    every worker when a cached identity is stale; None when the user no longer exists"""
+    return db.session.execute(
+        select(User.updated_at, select(func.max(Department.updated_at)).scalar_subquery())
+        .where(User.id == user_id)
+    ).first()
+
+def _column_values(instance, skipped=()):
+    return {column.key: getattr(instance, column.key)
+            for column in instance.__mapper__.column_attrs if column.key not in skipped}
+
+def _detached(model, values):
+    """A clean, detached instance holding values; columns left out load on first access"""
+    instance = model.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        set_committed_value(instance, key, value)
+    make_transient_to_detached(instance)
+    return instance
+
+def get_user_identity(user_id):
+    """The user Flask-Login loads on every request, with the department relationships that
+    templates and role checks use already loaded.
+
+    Cached per user id as plain column values (never the password hash) next to the
+    users/departments updated_at version they were read at. Every request checks that version
+    with one query, so a deactivated user or demoted admin is picked up by all workers at once."""
+    version = _identity_version(user_id)
+    if version is None:
+        return None
+    version = tuple(version)
+
+    entry = cache.entry('user_identity', user_id, ttl=current_app.config.get('USER_IDENTITY_CACHE_TTL', 60))
+    if entry.hit and entry.value['version'] == version:
+        user = _detached(User, entry.value['user'])
+        department = entry.value['department']
+        set_committed_value(user, 'department', department and _detached(Department, department))
+        set_committed_value(user, 'managed_department',
+                            [_detached(Department, values) for values in entry.value['managed_department']])
+        return db.session.merge(user, load=False)
+
+    user = User.query.options(
+        joinedload(User.department),
+        selectinload(User.managed_department)
+    ).filter(User.id == user_id).first()
+    if user is not None:
+        entry.store({
+            'version': version,
+            'user': _column_values(user, IDENTITY_SKIPPED_FIELDS),
+            'department': user.department and _column_values(user.department),
+            'managed_department': [_column_values(department) for department in user.managed_department]
+        })
+    return user
+
+def users_in_order(user_ids, *options):
+    """The users with these ids, in the same order, from one query (ids of deleted users are skipped)"""
+    if not user_ids:
+        return []
+    users = {user.id: user for user in User.query.options(*options).filter(User.id.in_(user_ids))}
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
+@cached(tags=('users', 'departments'))
+def _manager_employee_ids(manager_id):
+    """Ids of the employees reporting to a manager; only ids are cached, never user rows"""
     from models import Department
     
     manager = User.query.get(manager_id)
     if not manager:
         return []
     
-    employees = []
-    
     # Special case for admin and technical support users - they should see all employees
     if manager.role in ['admin', 'product_owner']:
         # Return all active employees in the system
-        return User.query.filter(User.status == 'active', User.id != manager_id).all()
+        return [user_id for (user_id,) in db.session.query(User.id).filter(
+            User.status == 'active', User.id != manager_id
+        ).order_by(User.id)]
+    
+    employee_ids = []
     
     # CASE 1: If this user is officially assigned as a department manager
     departments = Department.query.filter_by(manager_id=manager_id).all()
     for dept in departments:
         dept_employees = User.query.filter_by(department_id=dept.id, status='active').all()
-        employees.extend(dept_employees)
+        employee_ids.extend(emp.id for emp in dept_employees)
     
     # CASE 2: If this user has a manager role but is not officially assigned as department manager
     if manager.role == 'manager':
@@ -212,10 +284,14 @@ def get_employees_for_manager(manager_id):
             
             # Add them to the list if not already present
             for emp in dept_employees:
-                if emp not in employees:
-                    employees.append(emp)
+                if emp.id not in employee_ids:
+                    employee_ids.append(emp.id)
     
-    return employees
+    return employee_ids
+
+def get_employees_for_manager(manager_id):
+    """Get all employees that report to a specific manager."""
+    return users_in_order(_manager_employee_ids(manager_id))
 
 def leave_request_to_dict(leave_request):
     """Convert a LeaveRequest object to a dictionary for JSON serialization."""
@@ -246,8 +322,16 @@ def permission_request_to_dict(permission_request):
         'admin_updated_at': permission_request.admin_updated_at.strftime('%Y-%m-%d %H:%M:%S') if permission_request.admin_updated_at else None
     }
 
+# Counts include today's attendance, so keep them short-lived even without writes
+@cached(
+    tags=('users', 'departments', 'leave_requests', 'permission_requests', 'attendance_logs', 'leave_balances', 'leave_types'),
+    ttl=60,
+    key=lambda user: (user.id, user.role, date.today().isoformat())
+)
 def get_dashboard_stats(user):
     """Get statistics for the dashboard based on user role."""
+    from report_helpers.dashboard_stats import scope_counters, staff_user_ids, leave_balance_summaries
+    
     stats = {
         'pending_leave_requests': 0,
         'pending_permission_requests': 0,
@@ -262,66 +346,28 @@ def get_dashboard_stats(user):
     
     if user.role == 'employee':
         # Employee sees only their own stats
-        stats['pending_leave_requests'] = LeaveRequest.query.filter_by(
-            user_id=user.id, status='pending'
-        ).count()
-        
-        stats['pending_permission_requests'] = PermissionRequest.query.filter_by(
-            user_id=user.id, status='pending'
-        ).count()
-        
-        stats['approved_leave_requests'] = LeaveRequest.query.filter_by(
-            user_id=user.id, status='approved'
-        ).count()
-        
-        stats['approved_permission_requests'] = PermissionRequest.query.filter_by(
-            user_id=user.id, status='approved'
-        ).count()
-        
-        stats['rejected_leave_requests'] = LeaveRequest.query.filter_by(
-            user_id=user.id, status='rejected'
-        ).count()
-        
-        stats['rejected_permission_requests'] = PermissionRequest.query.filter_by(
-            user_id=user.id, status='rejected'
-        ).count()
-        
-        # Add employee-specific attendance stats for today
-        from models import AttendanceLog
-        from datetime import date, datetime
-        today = date.today()
-        
-        # Check if employee is present today using AttendanceLog (more reliable for real-time data)
-        start_datetime = datetime.combine(today, datetime.min.time())
-        end_datetime = datetime.combine(today, datetime.max.time())
-        
-        # Check if employee has ANY attendance log today (check-in OR check-out)
-        has_attendance_log = AttendanceLog.query.filter(
-            AttendanceLog.user_id == user.id,
-            AttendanceLog.timestamp.between(start_datetime, end_datetime)
-        ).first() is not None
-        
-        if has_attendance_log:
-            stats['present_today'] = 1
-            stats['absent_today'] = 0
-            # Also set team_present_today and team_absent_today for consistency
-            stats['team_present_today'] = 1
-            stats['team_absent_today'] = 0
-        else:
-            stats['present_today'] = 0
-            stats['absent_today'] = 1
-            # Also set team_present_today and team_absent_today for consistency
-            stats['team_present_today'] = 0
-            stats['team_absent_today'] = 1
+        headcounts = {}
+        if user.department_id:
+            headcounts['department'] = select(User.id).where(
+                User.department_id == user.department_id,
+                User.status == 'active'
+            )
+        counters = scope_counters(request_user_ids=[user.id], present_user_ids=[user.id], headcounts=headcounts)
+        _set_request_counts(stats, counters)
+        
+        # Any attendance log today (check-in OR check-out) counts as present
+        present = 1 if counters['present_today'] else 0
+        stats['present_today'] = present
+        stats['absent_today'] = 1 - present
+        # Also set team_present_today and team_absent_today for consistency
+        stats['team_present_today'] = present
+        stats['team_absent_today'] = 1 - present
         
         # Get department information
         if user.department:
             stats['department_name'] = user.department.department_name
             # Count employees in the same department
-            stats['total_employees'] = User.query.filter_by(
-                department_id=user.department_id,
-                status='active'
-            ).count()
+            stats['total_employees'] = counters.get('department', 0)
         else:
             stats['department_name'] = None
             stats['total_employees'] = 0
@@ -332,53 +378,19 @@ def get_dashboard_stats(user):
         employee_ids = [emp.id for emp in employees]
         
         if employee_ids:  # Only query if there are employees
-            stats['pending_leave_requests'] = LeaveRequest.query.filter(
-                LeaveRequest.user_id.in_(employee_ids),
-                LeaveRequest.status == 'pending',
-                LeaveRequest.manager_status == 'pending'
-            ).count()
-            
-            stats['pending_permission_requests'] = PermissionRequest.query.filter(
-                PermissionRequest.user_id.in_(employee_ids),
-                PermissionRequest.status == 'pending',
-                PermissionRequest.admin_status == 'pending'
-            ).count()
-            
-            # Get approved requests from manager's team
-            stats['approved_leave_requests'] = LeaveRequest.query.filter(
-                LeaveRequest.user_id.in_(employee_ids),
-                LeaveRequest.status == 'approved'
-            ).count()
-            
-            stats['approved_permission_requests'] = PermissionRequest.query.filter(
-                PermissionRequest.user_id.in_(employee_ids),
-                PermissionRequest.status == 'approved'
-            ).count()
-            
-            # Get team attendance statistics for today
-            from models import DailyAttendance, AttendanceLog
-            from datetime import date, datetime
-            today = date.today()
-            
             # Filter to only active employees for counts
             active_employee_ids = [emp.id for emp in employees if emp.status == 'active']
+            counters = scope_counters(request_user_ids=employee_ids, present_user_ids=active_employee_ids)
             
-            # Count team members present today using AttendanceLog (more reliable for real-time data)
-            # Check for any attendance log today (check-in OR check-out)
-            start_datetime = datetime.combine(today, datetime.min.time())
-            end_datetime = datetime.combine(today, datetime.max.time())
-            
-            # Get users who have ANY attendance log today
-            present_user_ids = db.session.query(AttendanceLog.user_id).filter(
-                AttendanceLog.timestamp.between(start_datetime, end_datetime),
-                AttendanceLog.user_id.in_(active_employee_ids)
-            ).distinct().all()
-            
-            # Convert to list of IDs
-            present_user_ids_list = [user_id[0] for user_id in present_user_ids]
-            stats['team_present_today'] = len(present_user_ids_list)
+            # Pending = still waiting for the manager (leave) / admin (permission)
+            stats['pending_leave_requests'] = counters['leave_pending_manager']
+            stats['pending_permission_requests'] = counters['permission_pending_admin']
+            # Get approved requests from manager's team
+            stats['approved_leave_requests'] = counters['leave_approved']
+            stats['approved_permission_requests'] = counters['permission_approved']
             
-            # Count team members absent today (only active employees)
+            # Team attendance for today (any log today = present)
+            stats['team_present_today'] = counters['present_today']
             stats['team_absent_today'] = len(active_employee_ids) - stats['team_present_today']
             
             # Count only active employees
@@ -388,140 +400,27 @@ def get_dashboard_stats(user):
             stats['team_present_today'] = 0
             stats['team_absent_today'] = 0
         
-        
-    elif user.role in ['admin', 'product_owner']:
-        # Admin sees all pending requests (simplified for better UX)
-        stats['pending_leave_requests'] = LeaveRequest.query.filter_by(status='pending').count()
-        
-        # All pending permission requests
-        stats['pending_permission_requests'] = PermissionRequest.query.filter_by(status='pending').count()
-        
-        # All approved leave requests
-        stats['approved_leave_requests'] = LeaveRequest.query.filter_by(status='approved').count()
-        
-        # All approved permission requests
-        stats['approved_permission_requests'] = PermissionRequest.query.filter_by(status='approved').count()
-        
-        # All rejected leave requests
-        stats['rejected_leave_requests'] = LeaveRequest.query.filter_by(status='rejected').count()
-        
-        # All rejected permission requests
-        stats['rejected_permission_requests'] = PermissionRequest.query.filter_by(status='rejected').count()
-        
-        # Count all employees with fingerprint numbers (including all roles)
-        stats['total_employees'] = User.query.filter(
-            User.status == 'active', 
-            User.fingerprint_number != None,
-            User.fingerprint_number != ''
-        ).count()
-        
-        # Count all departments (only those with employees)
-        from models import Department
-        stats['total_departments'] = Department.query.count()
-        
-        # Add attendance statistics for today using AttendanceLog
-        from models import AttendanceLog
-        from datetime import date, datetime
-        today = date.today()
-        
-        # Count employees present today using AttendanceLog (any log = present)
-        from models import AttendanceLog
-        from datetime import datetime
-        
-        # Get users who have ANY attendance log today (check-in OR check-out)
-        start_datetime = datetime.combine(today, datetime.min.time())
-        end_datetime = datetime.combine(today, datetime.max.time())
-        
-        present_users = db.session.query(AttendanceLog.user_id).join(User).filter(
-            AttendanceLog.timestamp.between(start_datetime, end_datetime),
-            User.fingerprint_number != None,
-            User.fingerprint_number != '',
-            User.status == 'active',
-            User.role.notin_(['admin', 'product_owner'])
-        ).distinct().count()
-        
-        stats['total_attendance_today'] = present_users
-        stats['team_present_today'] = present_users  # Also set for consistency
+    elif user.role in ['admin', 'product_owner', 'director']:
+        # Admin/Technical Support see all requests; the director sees the same company-wide view (read-only).
+        # Each counts staff excluding its own kind of account.
+        excluded_roles = ['admin', 'director'] if user.role == 'director' else ['admin', 'product_owner']
+        staff = staff_user_ids(excluded_roles)
+        headcounts = {'staff': staff}
+        if user.role != 'director':
+            # Admins count every employee with a fingerprint number (including all roles)
+            headcounts['enrolled'] = staff_user_ids([])
+        counters = scope_counters(present_user_ids=staff, headcounts=headcounts, count_departments=True)
+        _set_request_counts(stats, counters)
+        
+        stats['total_employees'] = counters.get('enrolled', counters['staff'])
+        stats['total_departments'] = counters['departments']
+        
+        # Employees present today (any log today = present)
+        stats['total_attendance_today'] = counters['present_today']
+        stats['team_present_today'] = counters['present_today']  # Also set for consistency
         
         # Count employees absent today (only those with fingerprint numbers)
-        total_active_employees_with_fingerprint = User.query.filter(
-            User.status == 'active', 
-            User.role.notin_(['admin', 'product_owner']),
-            User.fingerprint_number != None,
-            User.fingerprint_number != ''
-        ).count()
-        
-        stats['team_absent_today'] = total_active_employees_with_fingerprint - stats['total_attendance_today']
-        
-        # Calculate attendance rate
-        if total_active_employees_with_fingerprint > 0:
-            stats['attendance_rate'] = round((stats['total_attendance_today'] / total_active_employees_with_fingerprint) * 100, 1)
-        else:
-            stats['attendance_rate'] = 0
-    
-    elif user.role == 'director':
-        # Director sees all company-wide stats (same as admin but view-only)
-        stats['pending_leave_requests'] = LeaveRequest.query.filter_by(status='pending').count()
-        
-        # All pending permission requests
-        stats['pending_permission_requests'] = PermissionRequest.query.filter_by(status='pending').count()
-        
-        # All approved leave requests
-        stats['approved_leave_requests'] = LeaveRequest.query.filter_by(status='approved').count()
-        
-        # All approved permission requests
-        stats['approved_permission_requests'] = PermissionRequest.query.filter_by(status='approved').count()
-        
-        # All rejected leave requests
-        stats['rejected_leave_requests'] = LeaveRequest.query.filter_by(status='rejected').count()
-        
-        # All rejected permission requests
-        stats['rejected_permission_requests'] = PermissionRequest.query.filter_by(status='rejected').count()
-        
-        # Count all employees (excluding admins and directors) with fingerprint numbers
-        stats['total_employees'] = User.query.filter(
-            User.status == 'active', 
-            User.role.notin_(['admin', 'director']),
-            User.fingerprint_number != None,
-            User.fingerprint_number != ''
-        ).count()
-        
-        # Count all departments
-        from models import Department
-        stats['total_departments'] = Department.query.count()
-        
-        # Add attendance statistics for today using AttendanceLog
-        from models import AttendanceLog
-        from datetime import date, datetime
-        today = date.today()
-        
-        # Count employees present today using AttendanceLog (any log = present)
-        from models import AttendanceLog
-        from datetime import datetime
-        
-        # Get users who have ANY attendance log today (check-in OR check-out)
-        start_datetime = datetime.combine(today, datetime.min.time())
-        end_datetime = datetime.combine(today, datetime.max.time())
-        
-        present_users = db.session.query(AttendanceLog.user_id).join(User).filter(
-            AttendanceLog.timestamp.between(start_datetime, end_datetime),
-            User.fingerprint_number != None,
-            User.fingerprint_number != '',
-            User.status == 'active',
-            User.role.notin_(['admin', 'director'])
-        ).distinct().count()
-        
-        stats['total_attendance_today'] = present_users
-        stats['team_present_today'] = present_users  # Also set for consistency
-        
-        # Count employees absent today (only those with fingerprint numbers)
-        total_active_employees_with_fingerprint = User.query.filter(
-            User.status == 'active', 
-            User.role.notin_(['admin', 'director']),
-            User.fingerprint_number != None,
-            User.fingerprint_number != ''
-        ).count()
-        
+        total_active_employees_with_fingerprint = counters['staff']
         stats['team_absent_today'] = total_active_employees_with_fingerprint - stats['total_attendance_today']
         
         # Calculate attendance rate
@@ -531,61 +430,36 @@ def get_dashboard_stats(user):
             stats['attendance_rate'] = 0
     
     # Add leave balance information for all roles
-    from models import LeaveBalance, LeaveType
-    from datetime import datetime
-    
-    current_year = datetime.now().year
     if user.role in ['admin', 'director']:
         # Admins and directors see all leave balances
-        leave_balances = LeaveBalance.query.join(LeaveType).filter(
-            LeaveBalance.year == current_year
-        ).all()
+        stats['leave_balances'] = leave_balance_summaries()
     else:
         # Employees and managers see only their own balances
-        leave_balances = LeaveBalance.query.join(LeaveType).filter(
-            LeaveBalance.user_id == user.id,
-            LeaveBalance.year == current_year
-        ).all()
-    
-    stats['leave_balances'] = []
-    for balance in leave_balances:
-        stats['leave_balances'].append({
-            'leave_type_name': balance.leave_type.name,
-            'total_days': balance.total_days,
-            'used_days': balance.used_days,
-            'remaining_days': balance.remaining_days,
-            'is_negative': balance.remaining_days < 0,
-            'color': balance.leave_type.color
-        })
+        stats['leave_balances'] = leave_balance_summaries(user.id)
     
     return stats
 
-def connect_to_fingerprint_device(ip, port=4370):
-    """
-    Establishes connection with the fingerprint device
-    Returns the connection object if successful, None otherwise
-    """
-    try:
-        zk = ZK(ip, port=port, timeout=5)
-        conn = zk.connect()
-        return conn
-    except Exception as e:
-        logging.error(f"Error connecting to fingerprint device: {str(e)}")
-        return None
+def _set_request_counts(stats, counters):
+    stats['pending_leave_requests'] = counters['leave_pending']
+    stats['pending_permission_requests'] = counters['permission_pending']
+    stats['approved_leave_requests'] = counters['leave_approved']
+    stats['approved_permission_requests'] = counters['permission_approved']
+    stats['rejected_leave_requests'] = counters['leave_rejected']
+    stats['rejected_permission_requests'] = counters['permission_rejected']
 
 def sync_users_from_device(ip="192.168.11.2", port=4370):
     """
     Fetches users from the fingerprint device and syncs them with the database
     Returns tuple (success: bool, message: str)
     """
-    conn = None
     try:
-        conn = connect_to_fingerprint_device(ip, port)
-        if not conn:
-            return False, "Could not connect to the device"
-
         # Get all users from the device
-        device_users = conn.get_users()
+        try:
+            with device_sessions.borrow(ip, port) as conn:
+                device_users = conn.get_users()
+        except DeviceUnavailable as e:
+            logging.error(f"Error connecting to fingerprint device: {str(e)}")
+            return False, "Could not connect to the device"
         if not device_users:
             return False, "No users found on the device"
 
@@ -671,10 +545,6 @@ def sync_users_from_device(ip="192.168.11.2", port=4370):
         error_msg = f"Error syncing users: {str(e)}"
         logging.error(error_msg)
         return False, error_msg
-    
-    finally:
-        if conn:
-            conn.disconnect()
 
 def get_fingerprint_filter():
     """
@@ -730,11 +600,31 @@ def format_hours_minutes(hours):
     
     return result
 
+# Never cached with the SMTP configuration; loaded from the database when a message is sent
+SMTP_SKIPPED_FIELDS = {'smtp_password'}
+
+def get_active_smtp_config():
+    """The active SMTP configuration, or None.
+
+    Cached as plain column values without the password, which loads from the database on
+    first access."""
+    entry = cache.entry('smtp_config', 'active', tags=('smtp_configurations',))
+    if entry.hit:
+        return entry.value and db.session.merge(_detached(SMTPConfiguration, entry.value), load=False)
+    smtp_config = SMTPConfiguration.query.filter_by(is_active=True).first()
+    entry.store(smtp_config and _column_values(smtp_config, SMTP_SKIPPED_FIELDS))
+    return smtp_config
+
+@cached(tags=('departments',))
+def get_departments():
+    """All departments, for filter and form dropdowns"""
+    return Department.query.all()
+
 def send_admin_email_notification(subject, message, request_type=None, request_id=None):
     """Send email notifications based on module-specific email lists for leave/permission requests."""
     try:
         # Get active SMTP configuration
-        smtp_config = SMTPConfiguration.query.filter_by(is_active=True).first()
+        smtp_config = get_active_smtp_config()
         if not smtp_config:
             logging.warning("No active SMTP configuration found. Email notification not sent.")
             return False
@@ -760,38 +650,18 @@ def send_admin_email_notification(subject, message, request_type=None, request_i
             logging.warning(f"No recipient emails found for {request_type} notifications. Email not sent.")
             return False
         
-        # Import email libraries
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.mime.multipart import MIMEMultipart
-        
-        # Connect to SMTP server
-        if smtp_config.use_ssl:
-            server = smtplib.SMTP_SSL(smtp_config.smtp_server, smtp_config.smtp_port)
-        else:
-            server = smtplib.SMTP(smtp_config.smtp_server, smtp_config.smtp_port)
-            if smtp_config.use_tls:
-                server.starttls()
+        from email_outbox import enqueue_email
         
-        try:
-            server.login(smtp_config.smtp_username, smtp_config.smtp_password)
-        except Exception as login_error:
-            logging.error(f"SMTP login failed: {str(login_error)}")
-            server.quit()
-            return False
+        # Names of the recipients who are users of the system, in one query
+        users_by_email = {user.email: user for user in User.query.filter(User.email.in_(recipient_emails)).all()}
         
-        # Send email to each recipient
+        # Queue an email for each recipient
+        queued = 0
         for recipient_email in recipient_emails:
             try:
-                # Try to get the user's name if they exist in the system
-                user = User.query.filter_by(email=recipient_email).first()
+                user = users_by_email.get(recipient_email)
                 recipient_name = user.get_full_name() if user else recipient_email.split('@')[0].title()
                 
-                msg = MIMEMultipart()
-                msg['From'] = f"{smtp_config.sender_name} <{smtp_config.sender_email}>"
-                msg['To'] = recipient_email
-                msg['Subject'] = subject
-                
                 # Create HTML email body
                 html_body = f"""
                 <html>
@@ -828,29 +698,31 @@ def send_admin_email_notification(subject, message, request_type=None, request_i
                 </html>
                 """
                 
-                msg.attach(MIMEText(html_body, 'html'))
-                server.send_message(msg)
-                logging.info(f"Email notification sent to: {recipient_email}")
+                if enqueue_email(recipient_email, subject, html_body, recipient_name=recipient_name):
+                    queued += 1
                 
             except Exception as e:
-                logging.error(f"Failed to send email to {recipient_email}: {str(e)}")
+                logging.error(f"Failed to queue email to {recipient_email}: {str(e)}")
                 continue
         
-        server.quit()
-        return True
+        return queued > 0
         
     except Exception as e:
         logging.error(f"Failed to send admin email notifications: {str(e)}")
         return False
 
 
+@cached(tags=('email_templates',))
+def _get_active_email_template(template_type):
+    return EmailTemplate.query.filter_by(
+        template_type=template_type,
+        is_active=True
+    ).first()
+
 def get_email_template(template_type):
     """Get active email template by type"""
     try:
-        template = EmailTemplate.query.filter_by(
-            template_type=template_type,
-            is_active=True
-        ).first()
+        template = _get_active_email_template(template_type)
         if not template:
             logging.warning(f"Email template '{template_type}' not found or not active")
         return template
@@ -908,7 +780,7 @@ def render_email_template(template, context_dict):
 
 
 def send_email_to_user(user, subject, html_body):
-    """Send email to a specific user"""
+    """Queue an email to a specific user (delivered by the email outbox)"""
     if not user:
         logging.warning(f"Cannot send email: user is None")
         return False
@@ -917,147 +789,26 @@ def send_email_to_user(user, subject, html_body):
         logging.warning(f"Cannot send email to user {user.id} ({user.get_full_name()}): email address is missing")
         return False
     
-    try:
-        smtp_config = SMTPConfiguration.query.filter_by(is_active=True).first()
-        if not smtp_config:
-            logging.warning("No active SMTP configuration found. Email not sent.")
-            return False
-        
-        logging.info(f"=== EMAIL SENDING PROCESS ===")
-        logging.info(f"Recipient: {user.get_full_name()} ({user.email})")
-        logging.info(f"Subject: {subject[:100]}")
-        logging.info(f"SMTP Server: {smtp_config.smtp_server}:{smtp_config.smtp_port}")
-        logging.info(f"SMTP Username: {smtp_config.smtp_username}")
-        logging.info(f"Use SSL: {smtp_config.use_ssl}, Use TLS: {smtp_config.use_tls}")
-        logging.info(f"Attempting to send email...")
-        
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.mime.multipart import MIMEMultipart
-        
-        # Connect to SMTP server with timeout
-        try:
-            if smtp_config.use_ssl:
-                server = smtplib.SMTP_SSL(smtp_config.smtp_server, smtp_config.smtp_port, timeout=30)
-            else:
-                server = smtplib.SMTP(smtp_config.smtp_server, smtp_config.smtp_port, timeout=30)
-                if smtp_config.use_tls:
-                    server.starttls()
-        except Exception as conn_error:
-            logging.error(f"SMTP connection failed to {smtp_config.smtp_server}:{smtp_config.smtp_port}: {str(conn_error)}", exc_info=True)
-            return False
-        
-        try:
-            logging.info(f"Attempting SMTP login with username: {smtp_config.smtp_username}")
-            server.login(smtp_config.smtp_username, smtp_config.smtp_password)
-            logging.info(f"✅ SMTP login successful for {smtp_config.smtp_username}")
-        except Exception as login_error:
-            logging.error(f"❌ SMTP login FAILED for {smtp_config.smtp_username}")
-            logging.error(f"   Error: {str(login_error)}")
-            logging.error(f"   This usually means the SMTP password is incorrect or has expired.")
-            logging.error(f"   Please update the SMTP password in Settings > SMTP Configuration")
-            try:
-                server.quit()
-            except:
-                pass
-            return False
-        
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = f"{smtp_config.sender_name} <{smtp_config.sender_email}>"
-            msg['To'] = user.email
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(html_body, 'html'))
-            server.send_message(msg)
-            logging.info(f"Email sent successfully to {user.email}: {subject}")
-            return True
-        except Exception as send_error:
-            logging.error(f"Failed to send email to {user.email}: {str(send_error)}", exc_info=True)
-            return False
-        finally:
-            try:
-                server.quit()
-            except Exception as quit_error:
-                logging.warning(f"Error closing SMTP connection: {str(quit_error)}")
-        
-    except Exception as e:
-        logging.error(f"Failed to send email to {user.email}: {str(e)}", exc_info=True)
-        return False
+    return send_email_to_address(user.email, subject, html_body, recipient_name=user.get_full_name())
 
 
 def send_email_to_address(email_address, subject, html_body, recipient_name=None):
-    """Send email to a specific email address"""
+    """Queue an email to a specific email address in the caller's transaction (delivered by the
+    email outbox once the caller commits)"""
     if not email_address:
         logging.warning(f"Cannot send email: email address is None or empty")
         return False
     
     try:
-        smtp_config = SMTPConfiguration.query.filter_by(is_active=True).first()
-        if not smtp_config:
+        if not get_active_smtp_config():
             logging.warning("No active SMTP configuration found. Email not sent.")
             return False
         
-        logging.info(f"=== EMAIL SENDING PROCESS ===")
-        logging.info(f"Recipient: {recipient_name or email_address} ({email_address})")
-        logging.info(f"Subject: {subject[:100]}")
-        logging.info(f"SMTP Server: {smtp_config.smtp_server}:{smtp_config.smtp_port}")
-        logging.info(f"SMTP Username: {smtp_config.smtp_username}")
-        logging.info(f"Use SSL: {smtp_config.use_ssl}, Use TLS: {smtp_config.use_tls}")
-        logging.info(f"Attempting to send email...")
-        
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.mime.multipart import MIMEMultipart
-        
-        # Connect to SMTP server with timeout
-        try:
-            if smtp_config.use_ssl:
-                server = smtplib.SMTP_SSL(smtp_config.smtp_server, smtp_config.smtp_port, timeout=30)
-            else:
-                server = smtplib.SMTP(smtp_config.smtp_server, smtp_config.smtp_port, timeout=30)
-                if smtp_config.use_tls:
-                    server.starttls()
-        except Exception as conn_error:
-            logging.error(f"SMTP connection failed to {smtp_config.smtp_server}:{smtp_config.smtp_port}: {str(conn_error)}", exc_info=True)
-            return False
-        
-        try:
-            logging.info(f"Attempting SMTP login with username: {smtp_config.smtp_username}")
-            server.login(smtp_config.smtp_username, smtp_config.smtp_password)
-            logging.info(f"✅ SMTP login successful for {smtp_config.smtp_username}")
-        except Exception as login_error:
-            logging.error(f"❌ SMTP login FAILED for {smtp_config.smtp_username}")
-            logging.error(f"   Error: {str(login_error)}")
-            logging.error(f"   This usually means the SMTP password is incorrect or has expired.")
-            logging.error(f"   Please update the SMTP password in Settings > SMTP Configuration")
-            try:
-                server.quit()
-            except:
-                pass
-            return False
-        
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = f"{smtp_config.sender_name} <{smtp_config.sender_email}>"
-            msg['To'] = email_address
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(html_body, 'html'))
-            server.send_message(msg)
-            logging.info(f"Email sent successfully to {email_address}: {subject}")
-            return True
-        except Exception as send_error:
-            logging.error(f"Failed to send email to {email_address}: {str(send_error)}", exc_info=True)
-            return False
-        finally:
-            try:
-                server.quit()
-            except Exception as quit_error:
-                logging.warning(f"Error closing SMTP connection: {str(quit_error)}")
+        from email_outbox import enqueue_email
+        return enqueue_email(email_address, subject, html_body, recipient_name=recipient_name) is not None
         
     except Exception as e:
-        logging.error(f"Failed to send email to {email_address}: {str(e)}", exc_info=True)
+        logging.error(f"Failed to queue email to {email_address}: {str(e)}", exc_info=True)
         return False
 
 
@@ -1172,14 +923,14 @@ def send_email_to_admin(employee, template_type, request_data):
             
             if send_email_to_user(admin, subject_personalized, html_body_personalized):
                 success_count += 1
-                logging.info(f"✅ Email sent successfully to {admin.get_full_name()} ({admin.email})")
+                logging.info(f"✅ Email queued for {admin.get_full_name()} ({admin.email})")
             else:
                 failed_count += 1
-                logging.error(f"❌ Failed to send email to {admin.get_full_name()} ({admin.email})")
+                logging.error(f"❌ Failed to queue email to {admin.get_full_name()} ({admin.email})")
         
         logging.info(f"=== EMAIL SENDING SUMMARY ===")
         logging.info(f"Total admins: {len(admins)}")
-        logging.info(f"Successfully sent: {success_count}")
+        logging.info(f"Queued: {success_count}")
         logging.info(f"Failed: {failed_count}")
         
         return success_count > 0
@@ -1240,12 +991,147 @@ def send_email_to_employee(employee, template_type, request_data):
         return False
 
 
+# ============================================================================
+# LIST PAGINATION HELPERS
+# ============================================================================
+
+LIST_PAGE_SIZE = 20
+
+class KeysetPage:
+    """One page of a newest-first list paginated on (created_at, id)"""
+    
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor  # Pass as ?after= to get older rows
+        self.prev_cursor = prev_cursor  # Pass as ?before= to get newer rows
+        self.total = total
+    
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+    
+    def to_dict(self):
+        return {
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'per_page': self.per_page,
+            'total': self.total
+        }
+
+def encode_cursor(item):
+    """Opaque cursor for a row's (created_at, id) position"""
+    raw = f"{item.created_at.isoformat()}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, item_id = raw.rsplit('|', 1)
+        # Compare naive, like the stored column values
+        return datetime.fromisoformat(created_at).replace(tzinfo=None), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def keyset_paginate(query, model, after=None, before=None, per_page=LIST_PAGE_SIZE, with_total=True, total=None):
+    """Fetch one page of query newest-first, seeking past a cursor instead of using OFFSET.
+    
+    after: cursor of the last row already shown; returns the next (older) page.
+    before: cursor of the first row already shown; returns the previous (newer) page.
+    total: the count from the first page, carried along in the pager links; the COUNT(*)
+    only runs on the first page (no cursor) so page turns stay a single indexed seek.
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+    if with_total and total is None and not (after or before):
+        total = query.order_by(None).count()
+    elif not with_total:
+        total = None
+    created_at, row_id = model.created_at, model.id
+    
+    if before:
+        # Walk towards newer rows, then flip back to newest-first
+        created, item_id = before
+        rows = query.filter(or_(
+            created_at > created,
+            and_(created_at == created, row_id > item_id)
+        )).order_by(None).order_by(created_at.asc(), row_id.asc()).limit(per_page + 1).all()
+        has_newer = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        return KeysetPage(
+            items,
+            per_page,
+            next_cursor=encode_cursor(items[-1]) if items else None,
+            prev_cursor=encode_cursor(items[0]) if items and has_newer else None,
+            total=total
+        )
+    
+    if after:
+        created, item_id = after
+        query = query.filter(or_(
+            created_at < created,
+            and_(created_at == created, row_id < item_id)
+        ))
+    rows = query.order_by(None).order_by(created_at.desc(), row_id.desc()).limit(per_page + 1).all()
+    items = rows[:per_page]
+    return KeysetPage(
+        items,
+        per_page,
+        next_cursor=encode_cursor(items[-1]) if len(rows) > per_page else None,
+        prev_cursor=encode_cursor(items[0]) if items and after else None,
+        total=total
+    )
+
+def apply_list_filters(query, model, status=None, department_id=None, date_range=None, date_from=None, date_to=None):
+    """Apply the list pages' status, department and created-date filters in SQL
+    
+    date_range 'custom' uses date_from/date_to (dates, both inclusive; either may be omitted).
+    """
+    if status and status != 'all':
+        query = query.filter(model.status == status)
+    
+    if department_id:
+        department_users = db.session.query(User.id).filter(User.department_id == department_id)
+        query = query.filter(model.user_id.in_(department_users))
+    
+    if date_range and date_range != 'all':
+        today_start = datetime.combine(date.today(), datetime.min.time())
+        if date_range == 'today':
+            query = query.filter(model.created_at >= today_start)
+        elif date_range in ('week', 'this_week'):
+            query = query.filter(model.created_at >= today_start - timedelta(days=7))
+        elif date_range in ('month', 'this_month'):
+            query = query.filter(model.created_at >= today_start - timedelta(days=30))
+        elif date_range == 'custom':
+            if date_from:
+                query = query.filter(model.created_at >= datetime.combine(date_from, datetime.min.time()))
+            if date_to:
+                query = query.filter(model.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    
+    return query
+
+def count_by_status(query, model):
+    """{'pending': n, 'approved': n, 'rejected': n, 'total': n} for a request query in one GROUP BY"""
+    counts = {'pending': 0, 'approved': 0, 'rejected': 0}
+    rows = query.order_by(None).with_entities(model.status, db.func.count(model.id)).group_by(model.status).all()
+    for status, count in rows:
+        counts[status] = counts.get(status, 0) + count
+    counts['total'] = sum(count for _, count in rows)
+    return counts
+
+
 # ============================================================================
 # TICKETING SYSTEM HELPER FUNCTIONS
 # ============================================================================
 
-def get_tickets_for_user(user, show_own_only=False):
-    """Returns tickets based on user role
+def get_tickets_query_for_user(user, show_own_only=False):
+    """Returns the (unordered) ticket query visible to a user based on role
     
     Args:
         user: The user object
@@ -1253,39 +1139,35 @@ def get_tickets_for_user(user, show_own_only=False):
                       If False, return tickets based on role (for inbox/manager views)
     """
     if not user or not user.is_authenticated:
-        return []
+        return Ticket.query.filter(db.false())
     
     # If show_own_only is True, always return user's own tickets
     if show_own_only:
-        return Ticket.query.filter_by(user_id=user.id).order_by(Ticket.created_at.desc()).all()
+        return Ticket.query.filter_by(user_id=user.id)
     
     if user.role == 'product_owner':
         # Technical Support sees all tickets
-        return Ticket.query.order_by(Ticket.created_at.desc()).all()
+        return Ticket.query
     elif user.role in ['admin', 'director']:
         # Admin/Director sees all tickets (same as Technical Support for now)
-        return Ticket.query.order_by(Ticket.created_at.desc()).all()
+        return Ticket.query
     elif user.department_id:
-        # Check if user's department is in ticket department mappings (IT/Web)
-        department_ids = TicketDepartmentMapping.query.with_entities(
-            TicketDepartmentMapping.department_id
-        ).distinct().all()
-        department_ids = [d[0] for d in department_ids]
+        # Categories routed to the user's department (IT/Web)
+        category_ids = [c[0] for c in TicketDepartmentMapping.query.filter_by(
+            department_id=user.department_id
+        ).with_entities(TicketDepartmentMapping.category_id).distinct().all()]
         
-        if user.department_id in department_ids:
+        if category_ids:
             # IT/Web department users see all tickets assigned to their department
-            category_ids = TicketDepartmentMapping.query.filter_by(
-                department_id=user.department_id
-            ).with_entities(TicketDepartmentMapping.category_id).distinct().all()
-            category_ids = [c[0] for c in category_ids]
-            
-            if category_ids:
-                return Ticket.query.filter(
-                    Ticket.category_id.in_(category_ids)
-                ).order_by(Ticket.created_at.desc()).all()
+            return Ticket.query.filter(Ticket.category_id.in_(category_ids))
     
     # Regular employees see only their own tickets
-    return Ticket.query.filter_by(user_id=user.id).order_by(Ticket.created_at.desc()).all()
+    return Ticket.query.filter_by(user_id=user.id)
+
+
+def get_tickets_for_user(user, show_own_only=False):
+    """Returns tickets based on user role, newest first"""
+    return get_tickets_query_for_user(user, show_own_only).order_by(Ticket.created_at.desc()).all()
 
 
 def get_department_tickets(department_id):
@@ -1681,6 +1563,9 @@ def log_activity(user, action, entity_type=None, entity_id=None, before_values=N
     """
     Log user activity to the activity log table.
     
+    The entry is handed to the buffered writer (activity_log.py) and written shortly after,
+    outside the caller's transaction; the caller's session is neither committed nor rolled back.
+    
     Args:
         user: User object or user_id (int) - the user performing the action
         action: str - action type (e.g., 'login', 'logout', 'edit_user', 'delete_user')
@@ -1692,7 +1577,7 @@ def log_activity(user, action, entity_type=None, entity_id=None, before_values=N
         description: str - optional description of the action
     
     Returns:
-        ActivityLog object if successful, None if error
+        True if the entry was recorded, False if error
     """
     try:
         import json
@@ -1720,25 +1605,22 @@ def log_activity(user, action, entity_type=None, entity_id=None, before_values=N
         before_json = json.dumps(before_values) if before_values else None
         after_json = json.dumps(after_values) if after_values else None
         
-        # Create activity log entry
-        activity_log = ActivityLog(
-            user_id=user_id,
-            action=action,
-            entity_type=entity_type,
-            entity_id=entity_id,
-            before_values=before_json,
-            after_values=after_json,
-            ip_address=ip_address,
-            description=description,
-            created_at=datetime.utcnow()
-        )
-        
-        db.session.add(activity_log)
-        db.session.commit()
+        # Queue the activity log entry
+        from activity_log import activity_log_writer
+        activity_log_writer.submit({
+            'user_id': user_id,
+            'action': action,
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'before_values': before_json,
+            'after_values': after_json,
+            'ip_address': ip_address,
+            'description': description,
+            'created_at': datetime.utcnow()
+        })
         
-        return activity_log
+        return True
     except Exception as e:
         # Log error but don't break the main application flow
         logging.error(f"Error logging activity: {str(e)}", exc_info=True)
-        db.session.rollback()
-        return None
+        return False
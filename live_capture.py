@@ -0,0 +1,329 @@
+"""
+Real-time punch capture from the fingerprint devices (DEVICE_LIVE_CAPTURE).
+
+One listener thread per active device keeps the device's session (device_sessions.py) in
+pyzk live capture mode and stores each punch as it arrives (ingest_live_punch): the row is
+written, the day recomputed and the change published on the live stream about a second after
+the finger is on the scanner.
+
+Listeners are started by a scheduler job. A device's listener holds the cluster lease
+live_capture:<device id> (sync_leases), so with several workers exactly one process listens
+to each device. A listener hands the device back whenever another operation (a status page,
+the sync) is waiting for it and resumes capturing afterwards. Operations in the same process
+are seen through device_sessions' waiters; other processes ask through the lease row
+(device_handover, installed as device_sessions.handover), and the listener closes its
+connection until they are done.
+
+The periodic sync stays on as reconciliation: it skips devices with a running listener until
+DEVICE_LIVE_CAPTURE_RECONCILE_SECONDS have passed since their last sync (reconciled_at on the
+lease row), then downloads past the cursor as usual and fills whatever the listener missed
+while it was down.
+"""
+
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from functools import partial
+from contextlib import contextmanager
+
+from connection_manager import (acquire_lease, renew_lease, release_lease, lease_reconciled_at, mark_leases_reconciled,
+                                request_lease_yield, end_lease_yield, lease_yield_requested, set_lease_yielded,
+                                SYNC_LEASE_TTL, SYNC_LEASE_HEARTBEAT, SYNC_LEASE_RETRY)
+from device_sessions import device_sessions, DeviceUnavailable, DeviceBusy
+
+# Pause after a failed capture attempt; device_sessions' backoff decides when to reconnect
+RETRY_SECONDS = 5
+
+# Longest a listener waits for queued device operations before it takes the device back
+YIELD_SECONDS = 60
+
+# Same for operations in other processes (longer: a reconciling sync downloads the whole log)
+HANDOVER_SECONDS = 180
+
+# How often a capturing listener checks the lease row for hand-over requests, and how often
+# a waiting process checks whether the listener has let go
+HANDOVER_POLL_SECONDS = 1
+HANDOVER_WAIT_POLL_SECONDS = 0.2
+
+_listeners = {}  # device id -> DeviceListener
+_listeners_lock = threading.Lock()
+
+def lease_name(device_id):
+    return f'live_capture:{device_id}'
+
+class DeviceListener(threading.Thread):
+    """Captures one device's punches until stopped, its device changes or its lease is lost"""
+
+    def __init__(self, app, device, timeout=5):
+        super().__init__(name=f'live-capture-{device.id}', daemon=True)
+        self.app = app
+        self.device_id = device.id
+        self.address = (device.device_ip, device.device_port)
+        self.lease = lease_name(device.id)
+        self.holder = uuid.uuid4().hex
+        self.timeout = timeout
+        self.stop_event = threading.Event()
+        self.renew_attempted_at = time.monotonic()
+        self.renew_wait = SYNC_LEASE_HEARTBEAT
+        # Taken before the lease is acquired, so never later than the real expiry
+        self.lease_expires_at = self.renew_attempted_at + SYNC_LEASE_TTL
+        self.handover_checked_at = 0.0
+        self.handover_requested = False
+        self.capturing = False
+        self.punches = 0
+        self.last_punch_at = None
+        self.last_error = None
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _renew(self):
+        """Keep the lease alive; stops the listener once another process took it over.
+
+        A renewal that failed (database unreachable) is retried every SYNC_LEASE_RETRY seconds
+        until the lease's own expiry is near, and the listener stops only then.
+        """
+        if time.monotonic() - self.renew_attempted_at >= self.renew_wait:
+            attempted_at = time.monotonic()
+            renewed = renew_lease(self.lease, self.holder, SYNC_LEASE_TTL)
+            if renewed:
+                self.lease_expires_at = attempted_at + SYNC_LEASE_TTL
+                self.renew_wait = SYNC_LEASE_HEARTBEAT
+            elif renewed is None and time.monotonic() + SYNC_LEASE_RETRY < self.lease_expires_at:
+                logging.warning(f'Could not renew the live capture lease for device {self.device_id}; '
+                                f'retrying in {SYNC_LEASE_RETRY}s')
+                self.renew_wait = SYNC_LEASE_RETRY
+            else:
+                logging.warning(f'Live capture lease for device {self.device_id} was lost')
+                self.stop()
+            self.renew_attempted_at = time.monotonic()
+        return not self.stop_event.is_set()
+
+    def run(self):
+        with self.app.app_context():
+            from extensions import db
+            try:
+                while self._renew():
+                    try:
+                        self._capture()
+                        self.last_error = None
+                    except DeviceUnavailable as e:
+                        self.last_error = str(e)
+                        self.stop_event.wait(RETRY_SECONDS)
+                    except Exception as e:
+                        self.last_error = str(e)
+                        logging.error(f'Live capture on device {self.device_id} failed: {str(e)}')
+                        db.session.rollback()
+                        self.stop_event.wait(RETRY_SECONDS)
+                    self._yield_device()
+            finally:
+                self.capturing = False
+                release_lease(self.lease, self.holder)
+                db.session.remove()
+                logging.info(f'Live capture stopped for device {self.device_id}')
+
+    def _capture(self):
+        from extensions import db
+        from models import DeviceSettings
+
+        device = db.session.get(DeviceSettings, self.device_id)
+        if not device or not device.is_active or (device.device_ip, device.device_port) != self.address:
+            self.stop()
+            return
+
+        with device_sessions.borrow(*self.address, wait=self.timeout) as conn:
+            self.capturing = True
+            logging.info(f'Live capture started on {device.get_display_name()}')
+            try:
+                for record in conn.live_capture(new_timeout=self.timeout):
+                    if record is not None:
+                        self._store(device, record)
+                    if not self._renew() or self._yield_requested():
+                        # Leave live capture mode cleanly: the generator ends on its next step
+                        conn.end_live_capture = True
+            finally:
+                self.capturing = False
+
+    def _store(self, device, record):
+        from extensions import db
+        from routes.attendance import ingest_live_punch
+
+        try:
+            outcome = ingest_live_punch(device, record)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f'Could not store live punch {record.user_id} @ {record.timestamp} from device {self.device_id}: {str(e)}')
+            return
+        self.punches += 1
+        self.last_punch_at = record.timestamp
+        logging.info(f'Live punch {record.user_id} @ {record.timestamp} on device {self.device_id}: {outcome}')
+
+    def _yield_requested(self):
+        """Whether an operation in this process or another one is waiting for the device"""
+        if device_sessions.has_waiters(*self.address):
+            return True
+        if time.monotonic() - self.handover_checked_at >= HANDOVER_POLL_SECONDS:
+            self.handover_checked_at = time.monotonic()
+            self.handover_requested = lease_yield_requested(self.lease, self.holder)
+        return self.handover_requested
+
+    def _yield_device(self):
+        """Let the operations queued for the device go first"""
+        deadline = time.monotonic() + YIELD_SECONDS
+        while (device_sessions.has_waiters(*self.address) and time.monotonic() < deadline
+               and not self.stop_event.is_set()):
+            self.stop_event.wait(0.2)
+        if self.handover_requested:
+            self._hand_over()
+
+    def _hand_over(self):
+        """Close the connection for another process until it withdraws its request"""
+        self.handover_requested = False
+        device_sessions.close(*self.address)
+        set_lease_yielded(self.lease, self.holder, True)
+        logging.info(f'Live capture on device {self.device_id} paused for another process')
+        try:
+            deadline = time.monotonic() + HANDOVER_SECONDS
+            while (time.monotonic() < deadline and self._renew()
+                   and lease_yield_requested(self.lease, self.holder)):
+                self.stop_event.wait(HANDOVER_WAIT_POLL_SECONDS)
+        finally:
+            set_lease_yielded(self.lease, self.holder, False)
+
+    def stats(self):
+        return {
+            'device': f'{self.address[0]}:{self.address[1]}',
+            'alive': self.is_alive(),
+            'capturing': self.capturing,
+            'punches': self.punches,
+            'last_punch_at': self.last_punch_at.isoformat() if self.last_punch_at else None,
+            'last_error': self.last_error
+        }
+
+def supervise_listeners(app):
+    """Start listeners for the active devices this process can take the lease of, and stop
+    the ones whose device was removed, deactivated or moved. Runs from a scheduler job.
+    Returns the number of listeners running in this process.
+    """
+    from models import DeviceSettings
+
+    with app.app_context():
+        devices = {device.id: device for device in DeviceSettings.query.filter_by(is_active=True).all()}
+        timeout = app.config.get('DEVICE_LIVE_CAPTURE_TIMEOUT', 5)
+        with _listeners_lock:
+            for device_id, listener in list(_listeners.items()):
+                device = devices.get(device_id)
+                if not listener.is_alive():
+                    del _listeners[device_id]
+                elif device is None or listener.address != (device.device_ip, device.device_port):
+                    listener.stop()
+            for device_id, device in devices.items():
+                if device_id in _listeners:
+                    continue
+                listener = DeviceListener(app, device, timeout=timeout)
+                if acquire_lease(listener.lease, listener.holder, SYNC_LEASE_TTL):
+                    _listeners[device_id] = listener
+                    listener.start()
+            return len(_listeners)
+
+def stop_listeners(timeout=None):
+    """Stop every listener in this process; waits up to `timeout` seconds for each"""
+    with _listeners_lock:
+        listeners = list(_listeners.values())
+        _listeners.clear()
+    for listener in listeners:
+        listener.stop()
+    for listener in listeners:
+        listener.join(timeout)
+
+@contextmanager
+def take_over_device(app, ip, port, wait):
+    """Have the listener holding the device at ip:port (in another process) hand it over for
+    the block. Raises DeviceBusy when it doesn't let go within `wait` seconds.
+    """
+    requested = {}  # lease name -> time of our latest request
+    try:
+        with app.app_context():
+            try:
+                leases = [lease_name(device_id) for device_id in _device_ids_at(ip, port)]
+                deadline = time.monotonic() + wait
+                while leases:
+                    waiting = []
+                    for lease in leases:
+                        state = request_lease_yield(lease)
+                        if state is not None:
+                            requested[lease], yielded = state
+                            if not yielded:
+                                waiting.append(lease)
+                    leases = waiting
+                    if leases and time.monotonic() >= deadline:
+                        raise DeviceBusy(f'Device {ip}:{port} is held by a live capture listener in another process')
+                    if leases:
+                        time.sleep(HANDOVER_WAIT_POLL_SECONDS)
+            except DeviceUnavailable:
+                raise
+            except Exception as e:
+                raise DeviceUnavailable(f'Could not check live capture on device {ip}:{port}: {str(e)}') from e
+        yield
+    finally:
+        if requested:
+            with app.app_context():
+                for lease, requested_at in requested.items():
+                    end_lease_yield(lease, requested_at)
+
+@contextmanager
+def device_handover(app, ip, port, wait):
+    """device_sessions.handover: take the device over from a listener in another process.
+    A listener in this process already sees the borrow through device_sessions' waiters.
+    """
+    with _listeners_lock:
+        local = any(listener.address == (ip, int(port)) for listener in _listeners.values())
+    if local:
+        yield
+    else:
+        with take_over_device(app, ip, port, wait):
+            yield
+
+def _device_ids_at(ip, port):
+    from sqlalchemy import select
+    from extensions import db
+    from models import DeviceSettings
+
+    with db.engine.connect() as conn:
+        return conn.execute(
+            select(DeviceSettings.id).where(DeviceSettings.device_ip == ip, DeviceSettings.device_port == int(port))
+        ).scalars().all()
+
+def init_live_capture(app):
+    """Make device operations in this process take devices over from listeners elsewhere"""
+    device_sessions.handover = partial(device_handover, app)
+
+def devices_due_for_sync(devices, reconcile_seconds):
+    """The devices the periodic sync should poll: those without a listener anywhere in the
+    cluster, plus listened-to ones not reconciled in the last reconcile_seconds.
+
+    When the lease table can't be read none are due: polling a listened-to device would
+    compete with its listener, and the next cycle tries again.
+    """
+    try:
+        reconciled = lease_reconciled_at(lease_name(device.id) for device in devices)
+    except Exception as e:
+        logging.error(f'Could not read live capture leases; skipping this sync cycle: {str(e)}')
+        return []
+    cutoff = datetime.utcnow() - timedelta(seconds=reconcile_seconds)
+    due = []
+    for device in devices:
+        lease = lease_name(device.id)
+        if lease not in reconciled or reconciled[lease] is None or reconciled[lease] <= cutoff:
+            due.append(device)
+    return due
+
+def mark_reconciled(device_ids):
+    """Record a successful sync of listened-to devices (see devices_due_for_sync)"""
+    mark_leases_reconciled(lease_name(device_id) for device_id in device_ids)
+
+def listener_stats():
+    with _listeners_lock:
+        return {str(device_id): listener.stats() for device_id, listener in _listeners.items()}
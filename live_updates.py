@@ -0,0 +1,215 @@
+"""
+Live update channel for Server-Sent Events (/attendance/stream).
+
+Publishers (the device sync) post small events on a channel; every open stream forwards
+the ones that concern users in its scope. Events are relayed through the application cache
+backend under a per-channel sequence number, so with CACHE_BACKEND=sqlite or redis a sync
+running in one worker reaches streams held by the others. Streams in the publishing process
+are woken immediately; streams in other processes notice on their next poll.
+
+Each open stream holds one of the worker's server threads, so streams are capped per process
+(a few per worker) and only offered when the cache backend is shared - with the per-process
+memory backend a sync in one worker would never reach streams in the others. Everyone else gets
+204 No Content, which tells EventSource to stop and the page polls instead.
+
+Those polls are conditional (@conditional_poll): the response carries an ETag built from the
+live attendance sequence and the cache tag versions of the tables the view reads, and the
+browser sends it back in If-None-Match. While nothing was published or written, the answer is
+304 Not Modified from the cache backend alone - the view and its queries don't run.
+"""
+
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, date
+from functools import wraps
+from collections import defaultdict
+
+from cache import cache
+
+# Published events are kept this long for streams that are catching up
+EVENT_TTL = 300
+
+# A stream that falls further behind than this sends one unscoped "something changed" event
+MAX_BACKLOG = 50
+
+# Browser reconnect delay after a stream ends (EventSource retry field)
+RETRY_MS = 3000
+
+_condition = threading.Condition()
+_open_streams = 0
+
+def _sequence_tag(channel):
+    return f'live:{channel}'
+
+def _event_key(channel, sequence):
+    return f'live_updates:{channel}:{sequence}'
+
+def current_sequence(channel):
+    return cache.backend.tag_versions((_sequence_tag(channel),))[0]
+
+def publish(channel, pairs):
+    """Announce changes to (user_id, date) pairs; returns the event's sequence number.
+
+    Call after the changes are committed. Failures are logged and never raised.
+    """
+    days_by_user = defaultdict(set)
+    for user_id, day in pairs:
+        days_by_user[str(user_id)].add(day.isoformat())
+    if not days_by_user:
+        return None
+    users = {user_id: sorted(days) for user_id, days in days_by_user.items()}
+
+    event = {'type': channel, 'users': users, 'at': datetime.now().isoformat(timespec='seconds')}
+    try:
+        backend = cache.backend
+        backend.bump_tags((_sequence_tag(channel),))
+        sequence = current_sequence(channel)
+        backend.set(_event_key(channel, sequence), json.dumps(event).encode(), EVENT_TTL)
+    except Exception as e:
+        logging.warning(f'Could not publish live {channel} event: {str(e)}')
+        return None
+
+    with _condition:
+        _condition.notify_all()
+    return sequence
+
+def _load_event(channel, sequence):
+    raw = cache.backend.get(_event_key(channel, sequence))
+    # Expired, evicted or lost to a concurrent publish: tell the client something changed
+    return json.loads(raw) if raw else {'type': channel, 'users': None}
+
+def _scoped(event, user_ids):
+    """Client payload for a scope (None = every user), or None when the event is out of scope"""
+    users = event['users']
+    if users is not None and user_ids is not None:
+        users = {user_id: days for user_id, days in users.items() if int(user_id) in user_ids}
+        if not users:
+            return None
+    payload = {'type': event['type'], 'at': event.get('at')}
+    if users is not None:
+        payload['user_ids'] = sorted(int(user_id) for user_id in users)
+        payload['days'] = sorted({day for days in users.values() for day in days})
+    return payload
+
+def _frame(event_type, sequence, payload):
+    return f'id: {sequence}\nevent: {event_type}\ndata: {json.dumps(payload)}\n\n'
+
+class LiveStream:
+    """Iterable SSE body for one client; close() (called by the WSGI server) frees its slot.
+
+    Runs after the request context is gone, so it only touches the cache backend.
+    """
+
+    def __init__(self, user_ids, channels=('attendance',), heartbeat=15, max_seconds=300, poll=2):
+        self.user_ids = None if user_ids is None else set(user_ids)
+        self.channels = channels
+        self.heartbeat = heartbeat
+        self.max_seconds = max_seconds
+        self.poll = poll
+        self._closed = False
+
+    @staticmethod
+    def open(max_streams, shared_only=False, **kwargs):
+        """Take a stream slot; returns None when the process is at max_streams, or when
+        shared_only is set and the cache backend doesn't reach the other worker processes"""
+        global _open_streams
+        if shared_only and not getattr(cache.backend, 'shared', False):
+            return None
+        with _condition:
+            if _open_streams >= max_streams:
+                return None
+            _open_streams += 1
+        return LiveStream(**kwargs)
+
+    def close(self):
+        global _open_streams
+        with _condition:
+            if not self._closed:
+                self._closed = True
+                _open_streams -= 1
+
+    def __iter__(self):
+        started = last_write = time.monotonic()
+        try:
+            seen = {channel: current_sequence(channel) for channel in self.channels}
+        except Exception as e:
+            logging.warning(f'Live update stream could not start: {str(e)}')
+            return
+        yield f'retry: {RETRY_MS}\n\n'
+
+        while not self._closed and time.monotonic() - started < self.max_seconds:
+            with _condition:
+                _condition.wait(self.poll)
+            for channel in self.channels:
+                try:
+                    latest = current_sequence(channel)
+                    if latest <= seen[channel]:
+                        continue
+                    if latest - seen[channel] > MAX_BACKLOG:
+                        events = [(latest, {'type': channel, 'users': None})]
+                    else:
+                        events = [(sequence, _load_event(channel, sequence))
+                                  for sequence in range(seen[channel] + 1, latest + 1)]
+                    seen[channel] = latest
+                except Exception as e:
+                    logging.warning(f'Live update stream could not read {channel} events: {str(e)}')
+                    continue
+                for sequence, event in events:
+                    payload = _scoped(event, self.user_ids)
+                    if payload is not None:
+                        last_write = time.monotonic()
+                        yield _frame(channel, sequence, payload)
+            # Comment lines keep proxies from timing out an idle stream
+            if time.monotonic() - last_write >= self.heartbeat:
+                last_write = time.monotonic()
+                yield ': keep-alive\n\n'
+
+def poll_etag(tables, scope):
+    """ETag for a poll response: changes with the live attendance sequence, the versions of
+    `tables` (cache tags are table names), the day and the scope (user and URL).
+
+    None when the cache backend isn't shared, since its versions miss other workers' writes.
+    """
+    backend = cache.backend
+    if not getattr(backend, 'shared', False):
+        return None
+    versions = backend.tag_versions((_sequence_tag('attendance'),) + tuple(tables))
+    version = repr((versions, date.today().isoformat(), scope))
+    return hashlib.sha1(version.encode()).hexdigest()
+
+def conditional_poll(*tables):
+    """Decorator for endpoints pages poll: answer 304 Not Modified without running the view
+    while no attendance event was published and none of `tables` was written since the
+    client's copy. Responses are marked for revalidation, so browsers send If-None-Match
+    on every fetch() without any change to the page scripts.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            from flask import request, make_response, current_app
+            from flask_login import current_user
+
+            try:
+                etag = poll_etag(tables, (current_user.get_id(), request.full_path))
+            except Exception as e:
+                logging.warning(f'Could not read poll versions, answering in full: {str(e)}')
+                etag = None
+            if etag is None:
+                return f(*args, **kwargs)
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+def stream_stats():
+    return {'open_streams': _open_streams}
@@ -0,0 +1,39 @@
+"""Add attendance_dirty_days table for incremental DailyAttendance recompute
+
+Revision ID: add_attendance_dirty_days
+Revises: add_daily_attendance_unique_key
+Create Date: 2026-01-27 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_attendance_dirty_days'
+down_revision = 'add_daily_attendance_unique_key'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attendance_dirty_days',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('marked_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'date')
+    )
+    # Backfill: every day with punches but no DailyAttendance row yet (previously filled in on report load)
+    op.execute("""
+        INSERT INTO attendance_dirty_days (user_id, date, marked_at)
+        SELECT DISTINCT l.user_id, CAST(l.timestamp AS DATE), NOW()
+        FROM attendance_logs l
+        WHERE NOT EXISTS (
+            SELECT 1 FROM daily_attendance d
+            WHERE d.user_id = l.user_id AND d.date = CAST(l.timestamp AS DATE)
+        )
+    """)
+
+
+def downgrade():
+    op.drop_table('attendance_dirty_days')
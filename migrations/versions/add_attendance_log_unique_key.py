@@ -0,0 +1,46 @@
+"""Add unique (user_id, timestamp) key to attendance_logs
+
+Revision ID: add_attendance_unique_key
+Revises: add_sync_lease
+Create Date: 2026-01-19 11:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_attendance_unique_key'
+down_revision = 'add_sync_lease'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Detach check-in/out pair links that point at duplicates we are about to remove
+    op.execute("""
+        WITH duplicates AS (
+            SELECT a.id FROM attendance_logs a
+            JOIN attendance_logs b
+              ON a.user_id = b.user_id AND a.timestamp = b.timestamp AND a.id > b.id
+        )
+        UPDATE attendance_logs SET
+            check_in_id = CASE WHEN check_in_id IN (SELECT id FROM duplicates) THEN NULL ELSE check_in_id END,
+            check_out_id = CASE WHEN check_out_id IN (SELECT id FROM duplicates) THEN NULL ELSE check_out_id END
+        WHERE check_in_id IN (SELECT id FROM duplicates) OR check_out_id IN (SELECT id FROM duplicates)
+    """)
+    # Keep the oldest row for every (user_id, timestamp) pair
+    op.execute("""
+        DELETE FROM attendance_logs a
+        USING attendance_logs b
+        WHERE a.user_id = b.user_id AND a.timestamp = b.timestamp AND a.id > b.id
+    """)
+    with op.batch_alter_table('attendance_logs', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_attendance_user_timestamp', ['user_id', 'timestamp'])
+        # The unique constraint's index replaces the plain (user_id, timestamp) index
+        batch_op.drop_index('idx_attendance_user_timestamp')
+
+
+def downgrade():
+    with op.batch_alter_table('attendance_logs', schema=None) as batch_op:
+        batch_op.create_index('idx_attendance_user_timestamp', ['user_id', 'timestamp'], unique=False)
+        batch_op.drop_constraint('uq_attendance_user_timestamp', type_='unique')
@@ -0,0 +1,31 @@
+"""Add unique (user_id, date) key to daily_attendance
+
+Revision ID: add_daily_attendance_unique_key
+Revises: add_attendance_unique_key
+Create Date: 2026-01-26 15:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_daily_attendance_unique_key'
+down_revision = 'add_attendance_unique_key'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the most recently written row for every (user_id, date) pair
+    op.execute("""
+        DELETE FROM daily_attendance a
+        USING daily_attendance b
+        WHERE a.user_id = b.user_id AND a.date = b.date AND a.id < b.id
+    """)
+    with op.batch_alter_table('daily_attendance', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_daily_attendance_user_date', ['user_id', 'date'])
+
+
+def downgrade():
+    with op.batch_alter_table('daily_attendance', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_daily_attendance_user_date', type_='unique')
@@ -0,0 +1,30 @@
+"""Add incremental sync cursor to device settings
+
+Revision ID: add_device_sync_cursor
+Revises: add_manager_fields_permission
+Create Date: 2026-01-12 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_device_sync_cursor'
+down_revision = 'add_manager_fields_permission'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Per-device high-water mark so scheduled syncs only ingest new punches
+    with op.batch_alter_table('device_settings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_sync_timestamp', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('last_sync_record_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('last_full_sync_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('device_settings', schema=None) as batch_op:
+        batch_op.drop_column('last_full_sync_at')
+        batch_op.drop_column('last_sync_record_count')
+        batch_op.drop_column('last_sync_timestamp')
@@ -0,0 +1,26 @@
+"""Remember the last ingested record on each device
+
+Revision ID: add_device_sync_record_key
+Revises: add_export_job_storage
+Create Date: 2026-03-02 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_device_sync_record_key'
+down_revision = 'add_export_job_storage'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Locates the already-ingested part of the device log so new records are found by position
+    with op.batch_alter_table('device_settings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_sync_record_key', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('device_settings', schema=None) as batch_op:
+        batch_op.drop_column('last_sync_record_key')
@@ -0,0 +1,34 @@
+"""Store export job files in the database and lease jobs to the process running them
+
+Revision ID: add_export_job_storage
+Revises: add_sync_lease_handover
+Create Date: 2026-02-25 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_export_job_storage'
+down_revision = 'add_sync_lease_handover'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Finished files used to live in a per-container directory; drop the jobs that point there
+    op.execute("DELETE FROM export_jobs WHERE status = 'done'")
+    with op.batch_alter_table('export_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('worker', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+        batch_op.drop_column('file_path')
+
+
+def downgrade():
+    op.execute("DELETE FROM export_jobs WHERE status = 'done'")
+    with op.batch_alter_table('export_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_path', sa.String(length=500), nullable=True))
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('worker')
+        batch_op.drop_column('content')
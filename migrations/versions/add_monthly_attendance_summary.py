@@ -0,0 +1,46 @@
+"""Add monthly_attendance_summary table
+
+Revision ID: add_monthly_attendance_summary
+Revises: add_attendance_dirty_days
+Create Date: 2026-01-28 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_monthly_attendance_summary'
+down_revision = 'add_attendance_dirty_days'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('monthly_attendance_summary',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Integer(), nullable=False),
+        sa.Column('recorded_days', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('recorded_weekend_days', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('present_days', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('half_days', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('absent_days', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('leave_days', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('paid_leave_days', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('day_off_days', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('incomplete_days', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_working_hours', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('permission_hours', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('extra_time_hours', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'year', 'month', name='uq_monthly_attendance_summary_user_month')
+    )
+    # Populated from daily_attendance by `flask prepare-database` (schema_setup.prepare_database)
+    # while the table is empty; `flask rebuild-monthly-summary` rebuilds it on demand
+
+
+def downgrade():
+    op.drop_table('monthly_attendance_summary')
@@ -0,0 +1,27 @@
+"""Add (created_at, id) indexes for keyset-paginated request and ticket lists
+
+Revision ID: add_request_keyset_indexes
+Revises: add_export_jobs_table
+Create Date: 2026-01-30 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_request_keyset_indexes'
+down_revision = 'add_export_jobs_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_leave_created_id', 'leave_requests', ['created_at', 'id'], unique=False)
+    op.create_index('idx_permission_created_id', 'permission_requests', ['created_at', 'id'], unique=False)
+    op.create_index('idx_ticket_created_id', 'tickets', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_ticket_created_id', table_name='tickets')
+    op.drop_index('idx_permission_created_id', table_name='permission_requests')
+    op.drop_index('idx_leave_created_id', table_name='leave_requests')
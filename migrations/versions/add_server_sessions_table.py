@@ -0,0 +1,30 @@
+"""Add server_sessions table for database-backed Flask sessions
+
+Revision ID: add_server_sessions_table
+Revises: add_email_outbox_table
+Create Date: 2026-02-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_server_sessions_table'
+down_revision = 'add_email_outbox_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('server_sessions',
+    sa.Column('id', sa.String(length=255), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_server_sessions_expires_at', 'server_sessions', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_server_sessions_expires_at', table_name='server_sessions')
+    op.drop_table('server_sessions')
@@ -0,0 +1,33 @@
+"""Add sync_batches table for idempotent sync agent uploads
+
+Revision ID: add_sync_batches_table
+Revises: add_request_keyset_indexes
+Create Date: 2026-02-03 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sync_batches_table'
+down_revision = 'add_request_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_batches',
+    sa.Column('idempotency_key', sa.String(length=128), nullable=False),
+    sa.Column('device_key', sa.String(length=100), nullable=True),
+    sa.Column('payload_hash', sa.String(length=64), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.Column('result', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('idempotency_key')
+    )
+    op.create_index('idx_sync_batch_created', 'sync_batches', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_sync_batch_created', table_name='sync_batches')
+    op.drop_table('sync_batches')
@@ -0,0 +1,27 @@
+"""Add reconciliation and hand-over columns to sync_leases
+
+Revision ID: add_sync_lease_handover
+Revises: add_server_sessions_table
+Create Date: 2026-02-24 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sync_lease_handover'
+down_revision = 'add_server_sessions_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sync_leases', sa.Column('reconciled_at', sa.DateTime(), nullable=True))
+    op.add_column('sync_leases', sa.Column('yield_requested_at', sa.DateTime(), nullable=True))
+    op.add_column('sync_leases', sa.Column('yielded_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('sync_leases', 'yielded_at')
+    op.drop_column('sync_leases', 'yield_requested_at')
+    op.drop_column('sync_leases', 'reconciled_at')
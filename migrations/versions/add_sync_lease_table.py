@@ -0,0 +1,31 @@
+"""Add sync_leases table for cluster-wide sync locking
+
+Revision ID: add_sync_lease
+Revises: add_device_sync_cursor
+Create Date: 2026-01-14 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sync_lease'
+down_revision = 'add_device_sync_cursor'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_leases',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('holder', sa.String(length=64), nullable=False),
+    sa.Column('owner', sa.String(length=255), nullable=True),
+    sa.Column('acquired_at', sa.DateTime(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('sync_leases')
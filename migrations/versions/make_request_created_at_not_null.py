@@ -0,0 +1,38 @@
+"""Backfill and require created_at on keyset-paginated request and ticket lists
+
+Revision ID: make_request_created_at_not_null
+Revises: add_device_sync_record_key
+Create Date: 2026-03-09 09:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'make_request_created_at_not_null'
+down_revision = 'add_device_sync_record_key'
+branch_labels = None
+depends_on = None
+
+TABLES = ('leave_requests', 'permission_requests', 'tickets')
+
+
+def upgrade():
+    # Lists page on (created_at, id): a NULL has no cursor and drops out of every seek.
+    # Rows without one take their last update, or the epoch so they sort oldest.
+    connection = op.get_bind()
+    for table in TABLES:
+        connection.execute(
+            sa.text(f"UPDATE {table} SET created_at = COALESCE(updated_at, :epoch) WHERE created_at IS NULL"),
+            {'epoch': datetime(1970, 1, 1)}
+        )
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
@@ -160,51 +160,35 @@ class User(UserMixin, db.Model):
     
     def get_monthly_working_hours(self, year, month):
         """Get total working hours for a specific month"""
-        from sqlalchemy import func
-        return db.session.query(func.sum(DailyAttendance.total_working_hours))\
-            .filter(
-                DailyAttendance.user_id == self.id,
-                func.extract('year', DailyAttendance.date) == year,
-                func.extract('month', DailyAttendance.date) == month
-            ).scalar() or 0.0
+        from report_helpers.monthly_summary import get_monthly_summary
+        return get_monthly_summary(self.id, year, month).total_working_hours or 0.0
     
     def get_attendance_stats(self, year, month):
         """Get attendance statistics for a specific month"""
-        from sqlalchemy import func
-        from datetime import date, timedelta
-        import calendar
+        from report_helpers.monthly_summary import get_monthly_summary, month_bounds
+        from datetime import timedelta
         
-        # Get all daily attendance records for the month
-        month_start = date(year, month, 1)
-        month_end = date(year, month, calendar.monthrange(year, month)[1])
-        
-        records = DailyAttendance.query.filter(
-            DailyAttendance.user_id == self.id,
-            DailyAttendance.date >= month_start,
-            DailyAttendance.date <= month_end
-        ).all()
+        # Precomputed aggregate of the month's daily attendance records
+        summary = get_monthly_summary(self.id, year, month)
+        month_start, month_end = month_bounds(year, month)
         
         # Calculate statistics
         total_days = (month_end - month_start).days + 1
-        present_days = sum(1 for record in records if record.status == 'present')
-        absent_days = sum(1 for record in records if record.status == 'absent')
-        days_off = sum(1 for record in records if record.status in ['day_off', 'DayOff'] or record.is_day_off)
-        half_days = sum(1 for record in records if record.status == 'half-day')
-        leave_days = sum(1 for record in records if record.status == 'leave')
+        present_days = summary.present_days
+        absent_days = summary.absent_days
+        days_off = summary.day_off_days
+        half_days = summary.half_days
+        leave_days = summary.leave_days
         
-        # Calculate days without any record (weekends or holidays)
-        recorded_dates = {record.date for record in records}
-        days_without_record = 0
-        current_date = month_start
-        while current_date <= month_end:
-            if current_date not in recorded_dates:
-                # Check if it's a weekend (Saturday=5, Sunday=6)
-                if current_date.weekday() >= 5:
-                    days_off += 1
-                else:
-                    absent_days += 1
-                days_without_record += 1
-            current_date += timedelta(days=1)
+        # Days without any record: weekends (Saturday=5, Sunday=6) count as days off, the rest as absent
+        weekend_days = sum(
+            1 for offset in range(total_days)
+            if (month_start + timedelta(days=offset)).weekday() >= 5
+        )
+        days_without_record = total_days - summary.recorded_days
+        missing_weekend_days = weekend_days - summary.recorded_weekend_days
+        days_off += missing_weekend_days
+        absent_days += days_without_record - missing_weekend_days
         
         return {
             'total_days': total_days,
@@ -259,7 +243,7 @@ class LeaveRequest(db.Model):
     admin_updated_at = db.Column(db.DateTime, nullable=True)
     
     
-    created_at = db.Column(db.DateTime, default=get_egypt_time)
+    created_at = db.Column(db.DateTime, nullable=False, default=get_egypt_time)  # Keyset pagination key
     updated_at = db.Column(db.DateTime, default=get_egypt_time, onupdate=get_egypt_time)
     
     def can_edit(self):
@@ -286,6 +270,7 @@ class LeaveRequest(db.Model):
         Index('idx_leave_manager_status', 'manager_status'),
         Index('idx_leave_admin_status', 'admin_status'),
         Index('idx_leave_dates', 'start_date', 'end_date'),
+        Index('idx_leave_created_id', 'created_at', 'id'),  # Keyset pagination of list views
     )
     
     def __repr__(self):
@@ -311,7 +296,7 @@ class PermissionRequest(db.Model):
     admin_comment = db.Column(db.Text, nullable=True)
     admin_updated_at = db.Column(db.DateTime, nullable=True)
     
-    created_at = db.Column(db.DateTime, default=get_egypt_time)
+    created_at = db.Column(db.DateTime, nullable=False, default=get_egypt_time)  # Keyset pagination key
     updated_at = db.Column(db.DateTime, default=get_egypt_time, onupdate=get_egypt_time)
     
     def can_edit(self):
@@ -326,6 +311,11 @@ class PermissionRequest(db.Model):
         else:
             self.status = 'pending'
     
+    # Keyset pagination of list views
+    __table_args__ = (
+        Index('idx_permission_created_id', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f"<PermissionRequest {self.id} - {self.status}>"
 
@@ -420,6 +410,44 @@ class SMTPConfiguration(db.Model):
     def __repr__(self):
         return f"<SMTPConfiguration {self.id} - {self.smtp_server}:{self.smtp_port}>"
 
+class EmailOutbox(db.Model):
+    """Queued outgoing email; request handlers enqueue, the outbox sender (email_outbox.py) delivers"""
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient_email = db.Column(db.String(255), nullable=False)
+    recipient_name = db.Column(db.String(255), nullable=True)
+    subject = db.Column(db.String(500), nullable=False)
+    html_body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Retry backoff
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_email_outbox_due', 'status', 'next_attempt_at'),  # Sender's "what is due" scan
+    )
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} to {self.recipient_email} ({self.status})>'
+
+class ServerSession(db.Model):
+    """Server-side Flask session (SESSION_TYPE = 'database'); read and written by server_sessions.py"""
+    __tablename__ = 'server_sessions'
+
+    id = db.Column(db.String(255), primary_key=True)  # Store id: key prefix + session id from the cookie
+    data = db.Column(db.LargeBinary, nullable=False)  # msgpack-encoded session dict
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_server_sessions_expires_at', 'expires_at'),  # Expired-session sweep
+    )
+
+    def __repr__(self):
+        return f'<ServerSession {self.id} expires {self.expires_at}>'
+
 class AttendanceLog(db.Model):
     __tablename__ = 'attendance_logs'
     
@@ -443,7 +471,7 @@ class AttendanceLog(db.Model):
     
     # Indexes for better query performance
     __table_args__ = (
-        Index('idx_attendance_user_timestamp', 'user_id', 'timestamp'),
+        db.UniqueConstraint('user_id', 'timestamp', name='uq_attendance_user_timestamp'),  # Also serves (user_id, timestamp) lookups
         Index('idx_attendance_timestamp', 'timestamp'),
         Index('idx_attendance_scan_type', 'scan_type'),
         Index('idx_attendance_user_date', 'user_id', db.text('DATE(timestamp)')),
@@ -498,6 +526,10 @@ class DailyAttendance(db.Model):
     leave_type = db.relationship('LeaveType', backref=db.backref('daily_attendance', lazy=True))
     paid_holiday = db.relationship('PaidHoliday', backref=db.backref('daily_attendance', lazy=True))
     
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'date', name='uq_daily_attendance_user_date'),
+    )
+    
     def __repr__(self):
         return f"<DailyAttendance {self.date} - User {self.user_id}>"
     
@@ -519,6 +551,37 @@ class DailyAttendance(db.Model):
             return f"{hours}h {minutes}m"
         return f"{minutes}m"
 
+class MonthlyAttendanceSummary(db.Model):
+    """Per-user monthly rollup of DailyAttendance, kept current by report_helpers.monthly_summary"""
+    __tablename__ = 'monthly_attendance_summary'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    recorded_days = db.Column(db.Integer, nullable=False, default=0)  # Days with a DailyAttendance row
+    recorded_weekend_days = db.Column(db.Integer, nullable=False, default=0)  # Recorded days falling on Sat/Sun
+    present_days = db.Column(db.Integer, nullable=False, default=0)
+    half_days = db.Column(db.Integer, nullable=False, default=0)
+    absent_days = db.Column(db.Integer, nullable=False, default=0)  # Rows with status 'absent' (days without a row are not counted)
+    leave_days = db.Column(db.Integer, nullable=False, default=0)
+    paid_leave_days = db.Column(db.Integer, nullable=False, default=0)  # Paid holiday days
+    day_off_days = db.Column(db.Integer, nullable=False, default=0)
+    incomplete_days = db.Column(db.Integer, nullable=False, default=0)
+    total_working_hours = db.Column(db.Float, nullable=False, default=0.0)
+    permission_hours = db.Column(db.Float, nullable=False, default=0.0)  # Approved permissions starting in the month
+    extra_time_hours = db.Column(db.Float, nullable=False, default=0.0)  # Hours over 9 on complete present days without leave/permission
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    user = db.relationship('User', backref=db.backref('monthly_attendance_summaries', lazy=True, passive_deletes=True))
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year', 'month', name='uq_monthly_attendance_summary_user_month'),
+    )
+    
+    def __repr__(self):
+        return f"<MonthlyAttendanceSummary {self.year}-{self.month:02d} - User {self.user_id}>"
+
 class FingerPrintFailure(db.Model):
     """Model for tracking failed fingerprint attempts"""
     __tablename__ = 'fingerprint_failures'
@@ -558,6 +621,11 @@ class DeviceSettings(db.Model):
     device_port = db.Column(db.Integer, nullable=False, default=4370)
     device_name = db.Column(db.String(100), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
+    # Incremental sync cursor (high-water mark of what has already been ingested)
+    last_sync_timestamp = db.Column(db.DateTime, nullable=True)  # Newest punch timestamp ingested from this device
+    last_sync_record_count = db.Column(db.Integer, nullable=True)  # Record count reported by the device at last sync
+    last_sync_record_key = db.Column(db.String(64), nullable=True)  # Fingerprint number|timestamp of the last record in device order
+    last_full_sync_at = db.Column(db.DateTime, nullable=True)  # When the last full reconciliation scan completed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -572,6 +640,52 @@ class DeviceSettings(db.Model):
         """Get display name for the device"""
         return self.device_name or f"Device {self.id} ({self.device_ip})"
 
+class SyncLease(db.Model):
+    """Cluster-wide lease so only one process (across gunicorn workers/containers) runs a sync job"""
+    __tablename__ = 'sync_leases'
+
+    name = db.Column(db.String(50), primary_key=True)  # Lease name, e.g. 'attendance_sync'
+    holder = db.Column(db.String(64), nullable=False)  # Operation ID currently holding the lease
+    owner = db.Column(db.String(255), nullable=True)  # host:pid of the holding process (for diagnostics)
+    acquired_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)  # Lease can be taken over once this passes
+    reconciled_at = db.Column(db.DateTime, nullable=True)  # Last sync of the leased device (live capture leases)
+    yield_requested_at = db.Column(db.DateTime, nullable=True)  # Another process asked the holder to hand its device over
+    yielded_at = db.Column(db.DateTime, nullable=True)  # The holder let go of the device for that request
+
+    def __repr__(self):
+        return f'<SyncLease {self.name} held by {self.holder} until {self.expires_at}>'
+
+class SyncBatch(db.Model):
+    """Log batch uploaded by the sync agent, kept by idempotency key so a retried upload is answered, not re-applied"""
+    __tablename__ = 'sync_batches'
+
+    idempotency_key = db.Column(db.String(128), primary_key=True)
+    device_key = db.Column(db.String(100), nullable=True)  # Device id as configured in the agent, e.g. 'device_ground_floor'
+    payload_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the uncompressed body; a key reused for another body is rejected
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.Text, nullable=False)  # JSON response returned for the batch
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_sync_batch_created', 'created_at'),  # Retention purge
+    )
+
+    def __repr__(self):
+        return f'<SyncBatch {self.idempotency_key} ({self.record_count} logs)>'
+
+class AttendanceDirtyDay(db.Model):
+    """(user, day) pairs whose DailyAttendance row must be recomputed after new punches or request changes"""
+    __tablename__ = 'attendance_dirty_days'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    marked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Last time the day was marked dirty
+
+    def __repr__(self):
+        return f'<AttendanceDirtyDay user={self.user_id} date={self.date}>'
+
 class DeviceUser(db.Model):
     """Model for storing users found on devices that haven't been added to the system yet"""
     __tablename__ = 'device_users'
@@ -909,7 +1023,7 @@ class Ticket(db.Model):
     description = db.Column(db.Text, nullable=False)
     priority = db.Column(db.String(20), nullable=False, default='medium')  # low, medium, high, critical
     status = db.Column(db.String(20), nullable=False, default='open')  # open, in_progress, resolved, closed
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Keyset pagination key
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
@@ -925,6 +1039,7 @@ class Ticket(db.Model):
         Index('idx_ticket_status', 'status'),
         Index('idx_ticket_priority', 'priority'),
         Index('idx_ticket_created', 'created_at'),
+        Index('idx_ticket_created_id', 'created_at', 'id'),
     )
     
     def __repr__(self):
@@ -1090,3 +1205,45 @@ class ActivityLog(db.Model):
     
     def __repr__(self):
         return f'<ActivityLog {self.id} - {self.action} by User {self.user_id}>'
+
+class ExportJob(db.Model):
+    """Report export running in the background; the finished file is stored in the row"""
+    __tablename__ = 'export_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)  # Export builder to run, e.g. routes.final_report.build_final_report_export
+    params = db.Column(db.Text, nullable=True)  # JSON {"args": [[key, value], ...]} query arguments
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    filename = db.Column(db.String(255), nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    content = db.deferred(db.Column(db.LargeBinary, nullable=True))  # The finished file
+    file_size = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)  # File and row are removed after this
+    worker = db.Column(db.String(100), nullable=True)  # host:pid of the process that runs the job
+    lease_expires_at = db.Column(db.DateTime, nullable=True)  # Renewed by that process while queued or running
+    
+    user = db.relationship('User', backref=db.backref('export_jobs', lazy=True, passive_deletes=True))
+    
+    __table_args__ = (
+        Index('idx_export_job_user_created', 'user_id', 'created_at'),
+        Index('idx_export_job_status', 'status'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'file_size': self.file_size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.endpoint} {self.status}>'
@@ -0,0 +1,193 @@
+"""
+Dashboard statistics service.
+
+Every counter a dashboard shows for a scope of users (request counts by status, headcount,
+departments, present today) is computed in one round trip: one conditional-aggregation
+subquery per table (COUNT(*) FILTER (WHERE ...)), cross-joined into a single row. Chart
+series come from one (day, user, MIN(timestamp)) grouped attendance query, which also
+gives late arrivals, plus one query for the approved leaves overlapping the window.
+
+Scopes are a list of user ids, a SELECT of user ids, or None for every user.
+"""
+
+from datetime import datetime, date, time, timedelta
+from collections import defaultdict
+from sqlalchemy import select, func, true, distinct
+from models import db, User, Department, LeaveRequest, PermissionRequest, AttendanceLog, LeaveBalance, LeaveType
+
+# First scan after this time of day counts as a late arrival
+LATE_AFTER = time(9, 0)
+
+def staff_user_ids(excluded_roles):
+    """Users counted on the company-wide dashboards: active and enrolled on a device"""
+    return select(User.id).where(
+        User.status == 'active',
+        User.role.notin_(excluded_roles),
+        User.fingerprint_number != None,
+        User.fingerprint_number != ''
+    )
+
+def _in_scope(column, user_ids):
+    return true() if user_ids is None else column.in_(user_ids)
+
+def _day_range(first_day, last_day):
+    """[start, end) datetimes covering first_day..last_day"""
+    return datetime.combine(first_day, time.min), datetime.combine(last_day + timedelta(days=1), time.min)
+
+def _as_date(value):
+    """func.date() returns a date on PostgreSQL and an ISO string on SQLite"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+def scope_counters(request_user_ids=None, present_user_ids=None, headcounts=None,
+                   count_departments=False, today=None):
+    """Request, headcount and attendance counters for a scope in a single query.
+
+    request_user_ids scopes the leave/permission counts and present_user_ids the "present
+    today" count (skipped when not given). headcounts maps result keys to user scopes to
+    count. Returns a dict of ints.
+    """
+    today = today or date.today()
+    leave_status = LeaveRequest.status
+    permission_status = PermissionRequest.status
+
+    parts = [
+        select(
+            func.count().filter(leave_status == 'pending').label('leave_pending'),
+            func.count().filter(leave_status == 'pending', LeaveRequest.manager_status == 'pending').label('leave_pending_manager'),
+            func.count().filter(leave_status == 'approved').label('leave_approved'),
+            func.count().filter(leave_status == 'rejected').label('leave_rejected')
+        ).where(_in_scope(LeaveRequest.user_id, request_user_ids)).subquery('leave_counts'),
+        select(
+            func.count().filter(permission_status == 'pending').label('permission_pending'),
+            func.count().filter(permission_status == 'pending', PermissionRequest.admin_status == 'pending').label('permission_pending_admin'),
+            func.count().filter(permission_status == 'approved').label('permission_approved'),
+            func.count().filter(permission_status == 'rejected').label('permission_rejected')
+        ).where(_in_scope(PermissionRequest.user_id, request_user_ids)).subquery('permission_counts')
+    ]
+    if present_user_ids is not None:
+        start, end = _day_range(today, today)
+        parts.append(select(
+            func.count(distinct(AttendanceLog.user_id)).label('present_today')
+        ).where(
+            AttendanceLog.timestamp >= start,
+            AttendanceLog.timestamp < end,
+            AttendanceLog.user_id.in_(present_user_ids)
+        ).subquery('present_counts'))
+    for key, user_ids in (headcounts or {}).items():
+        parts.append(select(
+            func.count().label(key)
+        ).select_from(User).where(User.id.in_(user_ids)).subquery(f'{key}_headcount'))
+    if count_departments:
+        parts.append(select(func.count().label('departments')).select_from(Department).subquery('department_counts'))
+
+    joined = parts[0]
+    for part in parts[1:]:
+        joined = joined.join(part, true())
+    row = db.session.execute(select(*parts).select_from(joined)).one()
+    return {key: int(value or 0) for key, value in row._mapping.items()}
+
+def leave_balance_summaries(user_id=None, year=None):
+    """Leave balances of the year as template dicts; user_id None means every user"""
+    year = year or datetime.now().year
+    query = db.session.query(
+        LeaveType.name, LeaveType.color, LeaveBalance.total_days, LeaveBalance.used_days, LeaveBalance.remaining_days
+    ).join(LeaveType, LeaveBalance.leave_type_id == LeaveType.id).filter(LeaveBalance.year == year)
+    if user_id is not None:
+        query = query.filter(LeaveBalance.user_id == user_id)
+    return [{
+        'leave_type_name': name,
+        'total_days': total_days,
+        'used_days': used_days,
+        'remaining_days': remaining_days,
+        'is_negative': remaining_days < 0,
+        'color': color
+    } for name, color, total_days, used_days, remaining_days in query.all()]
+
+def first_scans_by_day(user_ids, first_day, last_day):
+    """{day: {user_id: first scan}} from one MIN(timestamp) query grouped by day and user"""
+    start, end = _day_range(first_day, last_day)
+    log_day = func.date(AttendanceLog.timestamp)
+    rows = db.session.query(
+        log_day, AttendanceLog.user_id, func.min(AttendanceLog.timestamp)
+    ).filter(
+        AttendanceLog.timestamp >= start,
+        AttendanceLog.timestamp < end,
+        AttendanceLog.user_id.in_(user_ids)
+    ).group_by(log_day, AttendanceLog.user_id).all()
+
+    first_scans = defaultdict(dict)
+    for day, user_id, first_scan in rows:
+        first_scans[_as_date(day)][user_id] = first_scan
+    return first_scans
+
+def approved_leaves_by_day(user_ids, first_day, last_day):
+    """{day: number of approved leave requests covering it} for the window"""
+    counts = defaultdict(int)
+    for start_date, end_date in db.session.query(LeaveRequest.start_date, LeaveRequest.end_date).filter(
+        LeaveRequest.user_id.in_(user_ids),
+        LeaveRequest.start_date <= last_day,
+        LeaveRequest.end_date >= first_day,
+        LeaveRequest.status == 'approved'
+    ):
+        day = max(start_date, first_day)
+        while day <= min(end_date, last_day):
+            counts[day] += 1
+            day += timedelta(days=1)
+    return counts
+
+def weekly_chart_data(user_ids, today=None, days=7):
+    """Attendance rate, leaves and today's team status for the last `days` days"""
+    today = today or date.today()
+    user_ids = list(user_ids)
+    first_day = today - timedelta(days=days - 1)
+    first_scans = first_scans_by_day(user_ids, first_day, today)
+    leaves = approved_leaves_by_day(user_ids, first_day, today)
+
+    total = len(user_ids)
+    weekly_attendance, weekly_leaves, day_labels = [], [], []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        present = len(first_scans.get(day, {}))
+        weekly_attendance.append(round((present / total * 100) if total > 0 else 0, 1))
+        weekly_leaves.append(leaves.get(day, 0))
+        day_labels.append(day.strftime('%a'))
+
+    late_threshold = datetime.combine(today, LATE_AFTER)
+    today_scans = first_scans.get(today, {})
+    present_count = len(today_scans)
+    late_count = sum(1 for first_scan in today_scans.values() if first_scan > late_threshold)
+    on_leave_count = leaves.get(today, 0)
+
+    return {
+        'weekly_attendance': weekly_attendance,
+        'weekly_leaves': weekly_leaves,
+        # Attendance rate doubles as the productivity proxy
+        'weekly_productivity': list(weekly_attendance),
+        'day_labels': day_labels,
+        'team_status': {
+            'present': max(0, present_count - late_count),  # Present but not late
+            'on_leave': on_leave_count,
+            'late': late_count,
+            'absent': max(0, total - present_count - on_leave_count)
+        },
+        'total_team': total
+    }
+
+def department_request_breakdown(department_ids):
+    """{department_id: {'employees', 'leaves', 'permissions'}} with approved request counts"""
+    breakdown = {dept_id: {'employees': 0, 'leaves': 0, 'permissions': 0} for dept_id in department_ids}
+    if not breakdown:
+        return breakdown
+    for dept_id, count in db.session.query(User.department_id, func.count(User.id)).filter(
+        User.department_id.in_(department_ids)
+    ).group_by(User.department_id):
+        breakdown[dept_id]['employees'] = count
+    for model, key in ((LeaveRequest, 'leaves'), (PermissionRequest, 'permissions')):
+        for dept_id, count in db.session.query(User.department_id, func.count(model.id)).join(
+            User, model.user_id == User.id
+        ).filter(
+            User.department_id.in_(department_ids),
+            model.status == 'approved'
+        ).group_by(User.department_id):
+            breakdown[dept_id][key] = count
+    return breakdown
@@ -0,0 +1,104 @@
+"""
+Streaming Excel writer for large exports.
+
+Exports are written through an openpyxl write-only workbook: each row is serialized as soon as
+it is appended and every cell points at one of a few shared named styles, so memory stays flat
+regardless of how many rows a report has. The finished file is spooled to a temporary file and
+streamed to the client instead of being copied into a BytesIO.
+"""
+
+import tempfile
+from flask import Response, request
+from werkzeug.wsgi import wrap_file
+
+EXCEL_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Spool files up to this size in memory before rolling over to disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+def _export_styles():
+    """Named styles shared by every streamed export (same look as the in-memory exports)"""
+    from openpyxl.styles import NamedStyle, Font, Alignment, PatternFill, Border, Side
+    from openpyxl.styles.fonts import DEFAULT_FONT
+
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    return [
+        NamedStyle(name='export_title', font=Font(bold=True, size=14), alignment=Alignment(horizontal='center')),
+        NamedStyle(
+            name='export_header',
+            font=Font(bold=True, color="FFFFFF"),
+            fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+            border=border,
+            alignment=Alignment(horizontal='center')
+        ),
+        NamedStyle(
+            name='export_section',
+            font=Font(bold=True, size=12),
+            fill=PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
+        ),
+        NamedStyle(name='export_cell', font=DEFAULT_FONT, border=border),
+    ]
+
+class StreamingExcelSheet:
+    """Single-sheet write-only workbook with the standard export layout helpers"""
+
+    def __init__(self, title, column_widths):
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+
+        self.workbook = Workbook(write_only=True)
+        for style in _export_styles():
+            self.workbook.add_named_style(style)
+        self.sheet = self.workbook.create_sheet(title=title)
+        # Column dimensions must be set before the first row is written
+        for col, width in enumerate(column_widths, 1):
+            self.sheet.column_dimensions[get_column_letter(col)].width = width
+        self.row_count = 0
+
+    def _cell(self, value, style):
+        from openpyxl.cell import WriteOnlyCell
+
+        cell = WriteOnlyCell(self.sheet, value=value)
+        cell.style = style
+        return cell
+
+    def _append(self, cells):
+        self.sheet.append(cells)
+        self.row_count += 1
+
+    def _merge(self, last_column):
+        from openpyxl.utils import get_column_letter
+
+        self.sheet.merged_cells.add(f'A{self.row_count}:{get_column_letter(last_column)}{self.row_count}')
+
+    def title(self, value, merge_columns):
+        """Centered title row merged across merge_columns columns"""
+        self._append([self._cell(value, 'export_title')])
+        self._merge(merge_columns)
+
+    def section(self, value, merge_columns):
+        """Grey section header row (e.g. a date) merged across merge_columns columns"""
+        self._append([self._cell(value, 'export_section')])
+        self._merge(merge_columns)
+
+    def header(self, values):
+        self._append([self._cell(value, 'export_header') for value in values])
+
+    def row(self, values):
+        self._append([self._cell(value, 'export_cell') for value in values])
+
+    def blank(self):
+        self._append([])
+
+    def response(self, filename):
+        """Save the workbook and stream it back as an attachment"""
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self.workbook.save(output)
+        size = output.tell()
+        output.seek(0)
+
+        response = Response(wrap_file(request.environ, output), mimetype=EXCEL_MIMETYPE, direct_passthrough=True)
+        response.headers['Content-Length'] = size
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
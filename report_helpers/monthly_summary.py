@@ -0,0 +1,276 @@
+"""
+Materialized monthly attendance summary.
+
+MonthlyAttendanceSummary holds one row per (user, year, month) aggregated from DailyAttendance.
+Rows are refreshed incrementally: every flush that touches a DailyAttendance or PermissionRequest
+row queues its (user, month), and the queued months are recomputed just before the transaction
+commits.
+Bulk writes that bypass the ORM (rollups, query-level deletes) queue their months explicitly
+with mark_monthly_summary_dirty / mark_monthly_summary_range_dirty.
+"""
+
+from datetime import datetime, date
+from collections import defaultdict
+from models import db, DailyAttendance, MonthlyAttendanceSummary, PermissionRequest
+from sqlalchemy import event, inspect
+import calendar
+import logging
+
+# session.info key holding the queued (user_id, year, month) keys; user_id None means every user
+SUMMARY_KEYS = 'monthly_summary_keys'
+
+STANDARD_WORKING_HOURS = 9
+
+SUMMARY_FIELDS = (
+    'recorded_days', 'recorded_weekend_days', 'present_days', 'half_days', 'absent_days',
+    'leave_days', 'paid_leave_days', 'day_off_days', 'incomplete_days',
+    'total_working_hours', 'permission_hours', 'extra_time_hours'
+)
+
+def month_bounds(year, month):
+    """First and last date of a month"""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+def months_in_range(start_date, end_date):
+    """(year, month) pairs covered by an inclusive date range"""
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def mark_monthly_summary_dirty(pairs, session=None):
+    """Queue the months of (user_id, date) pairs for refresh at the next commit"""
+    session = session or db.session
+    keys = session.info.setdefault(SUMMARY_KEYS, set())
+    for user_id, day in pairs:
+        keys.add((user_id, day.year, day.month))
+
+def mark_monthly_summary_range_dirty(start_date, end_date, session=None):
+    """Queue every user's months in the range, for bulk changes whose users aren't known"""
+    session = session or db.session
+    keys = session.info.setdefault(SUMMARY_KEYS, set())
+    for year, month in months_in_range(start_date, end_date):
+        keys.add((None, year, month))
+
+def _empty_summary():
+    summary = {field: 0 for field in SUMMARY_FIELDS}
+    summary.update({'total_working_hours': 0.0, 'permission_hours': 0.0, 'extra_time_hours': 0.0})
+    return summary
+
+def _stored_values(values):
+    """Summary values as refresh_monthly_summaries stores them (hours rounded to 2 places)"""
+    values = dict(values)
+    values['permission_hours'] = round(values['permission_hours'], 2)
+    values['extra_time_hours'] = round(values['extra_time_hours'], 2)
+    return values
+
+def compute_monthly_summaries(keys, session=None):
+    """Aggregate DailyAttendance and approved permissions for (user_id, year, month) keys.
+
+    Keys with user_id None expand to every user that has DailyAttendance rows or an
+    existing summary in that month. Returns {(user_id, year, month): values}.
+    """
+    session = session or db.session
+    keys = set(keys)
+    wildcard_months = {(year, month) for user_id, year, month in keys if user_id is None}
+    user_months = defaultdict(set)
+    for user_id, year, month in keys:
+        if user_id is not None and (year, month) not in wildcard_months:
+            user_months[(year, month)].add(user_id)
+
+    summaries = {}
+    for year, month in sorted(wildcard_months | set(user_months)):
+        month_start, month_end = month_bounds(year, month)
+        user_ids = user_months.get((year, month))  # None for wildcard months
+
+        record_query = session.query(
+            DailyAttendance.user_id, DailyAttendance.date, DailyAttendance.status,
+            DailyAttendance.is_day_off, DailyAttendance.is_incomplete_day, DailyAttendance.is_paid_holiday,
+            DailyAttendance.total_working_hours, DailyAttendance.leave_request_id
+        ).filter(DailyAttendance.date >= month_start, DailyAttendance.date <= month_end)
+        permission_query = session.query(
+            PermissionRequest.user_id, PermissionRequest.start_time, PermissionRequest.end_time
+        ).filter(
+            PermissionRequest.start_time >= datetime.combine(month_start, datetime.min.time()),
+            PermissionRequest.start_time <= datetime.combine(month_end, datetime.max.time()),
+            PermissionRequest.status == 'approved'
+        )
+        if user_ids is not None:
+            record_query = record_query.filter(DailyAttendance.user_id.in_(list(user_ids)))
+            permission_query = permission_query.filter(PermissionRequest.user_id.in_(list(user_ids)))
+            month_users = set(user_ids)
+        else:
+            month_users = {row[0] for row in session.query(MonthlyAttendanceSummary.user_id).filter_by(year=year, month=month)}
+
+        permission_days = set()
+        month_summaries = defaultdict(_empty_summary)
+        for user_id, start_time, end_time in permission_query.all():
+            permission_days.add((user_id, start_time.date()))
+            month_summaries[user_id]['permission_hours'] += (end_time - start_time).total_seconds() / 3600
+
+        for record in record_query.all():
+            summary = month_summaries[record.user_id]
+            summary['recorded_days'] += 1
+            if record.date.weekday() >= 5:
+                summary['recorded_weekend_days'] += 1
+            if record.status == 'present':
+                summary['present_days'] += 1
+            elif record.status == 'half-day':
+                summary['half_days'] += 1
+            elif record.status == 'absent':
+                summary['absent_days'] += 1
+            elif record.status == 'leave':
+                summary['leave_days'] += 1
+            if record.is_paid_holiday or record.status == 'paid_holiday':
+                summary['paid_leave_days'] += 1
+            if record.status in ['day_off', 'DayOff'] or record.is_day_off:
+                summary['day_off_days'] += 1
+            if record.is_incomplete_day:
+                summary['incomplete_days'] += 1
+            summary['total_working_hours'] += record.total_working_hours or 0.0
+            if (record.status == 'present' and record.total_working_hours and not record.is_incomplete_day
+                    and not record.leave_request_id and (record.user_id, record.date) not in permission_days):
+                summary['extra_time_hours'] += record.total_working_hours - STANDARD_WORKING_HOURS
+
+        # Users that lost all their rows still get a (zeroed) summary
+        for user_id in month_users | set(month_summaries):
+            summaries[(user_id, year, month)] = month_summaries[user_id]
+
+    return summaries
+
+def refresh_monthly_summaries(keys, session=None):
+    """Recompute and upsert the summaries for the given keys. Does not commit."""
+    from routes.attendance import _dialect_insert
+
+    session = session or db.session
+    summaries = compute_monthly_summaries(keys, session=session)
+    if not summaries:
+        return 0
+
+    now = datetime.utcnow()
+    rows = []
+    for (user_id, year, month), values in summaries.items():
+        row = {'user_id': user_id, 'year': year, 'month': month, 'updated_at': now}
+        row.update(_stored_values(values))
+        rows.append(row)
+
+    table = MonthlyAttendanceSummary.__table__
+    insert = _dialect_insert()
+    batch_size = 1000
+    for i in range(0, len(rows), batch_size):
+        stmt = insert(table).values(rows[i:i + batch_size])
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id', 'year', 'month'],
+            set_={field: getattr(stmt.excluded, field) for field in SUMMARY_FIELDS + ('updated_at',)}
+        ))
+    return len(rows)
+
+def populate_monthly_summaries():
+    """Build the summary table if it is empty (first deploy with it). Commits. Returns the rows built."""
+    if db.session.query(MonthlyAttendanceSummary.id).first() is not None:
+        return 0
+    return rebuild_monthly_summaries()
+
+def rebuild_monthly_summaries(start_date=None, end_date=None):
+    """Rebuild the summary table from DailyAttendance, for every month or only a date range. Commits."""
+    if start_date is None or end_date is None:
+        first, last = db.session.query(db.func.min(DailyAttendance.date), db.func.max(DailyAttendance.date)).one()
+        if first is None:
+            return 0
+        start_date = start_date or first
+        end_date = end_date or last
+
+    months = months_in_range(start_date, end_date)
+    rebuilt = 0
+    for year, month in months:
+        # One month per transaction keeps memory and lock time bounded
+        rebuilt += refresh_monthly_summaries({(None, year, month)})
+        db.session.commit()
+    logging.info(f'Rebuilt {rebuilt} monthly attendance summaries for {len(months)} months')
+    return rebuilt
+
+def get_monthly_summary(user_id, year, month):
+    """Summary row for a user's month.
+
+    A missing row (a month without attendance, or one not rebuilt yet) is computed and returned
+    as a transient row without writing anything, so read-only pages never issue a write or take
+    a lock; rows are stored by the commit listeners and rebuild_monthly_summaries.
+    """
+    summary = MonthlyAttendanceSummary.query.filter_by(user_id=user_id, year=year, month=month).first()
+    if summary is None:
+        values = compute_monthly_summaries({(user_id, year, month)})[(user_id, year, month)]
+        summary = MonthlyAttendanceSummary(user_id=user_id, year=year, month=month, **_stored_values(values))
+    return summary
+
+def _moved_from(state, user_attr, date_attr, user_id, day):
+    """The (user_id, date) a pending change moves a row away from, or None"""
+    old_user_ids = state.attrs[user_attr].history.deleted
+    old_days = state.attrs[date_attr].history.deleted
+    if not (old_user_ids or old_days):
+        return None
+    old_user_id = old_user_ids[0] if old_user_ids else user_id
+    old_day = old_days[0] if old_days else day
+    if old_user_id is None or old_day is None:
+        return None
+    return old_user_id, old_day
+
+def _capture_summary_changes(session, flush_context, instances):
+    """Queue the months of DailyAttendance and PermissionRequest rows being inserted, updated or deleted"""
+    pairs = []
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, DailyAttendance):
+            user_attr, date_attr = 'user_id', 'date'
+        elif isinstance(instance, PermissionRequest):
+            # Permission hours count towards the month of start_time (and the status decides
+            # whether they count at all, so any change to the row refreshes it)
+            user_attr, date_attr = 'user_id', 'start_time'
+        else:
+            continue
+        user_id, day = getattr(instance, user_attr), getattr(instance, date_attr)
+        if user_id is not None and day is not None:
+            pairs.append((user_id, day))
+        # A row moved to another user/month also changes the month it left
+        moved_from = _moved_from(inspect(instance), user_attr, date_attr, user_id, day)
+        if moved_from:
+            pairs.append(moved_from)
+    if pairs:
+        mark_monthly_summary_dirty(pairs, session=session)
+
+def _refresh_before_commit(session):
+    """Recompute the queued months inside the committing transaction"""
+    for _ in range(5):
+        session.flush()
+        keys = session.info.pop(SUMMARY_KEYS, None)
+        if not keys:
+            return
+        try:
+            # Savepoint so a failed refresh never blocks the underlying write;
+            # rebuild_monthly_summaries repairs any drift
+            with session.begin_nested():
+                refresh_monthly_summaries(keys, session=session)
+        except Exception as e:
+            logging.error(f'Error refreshing monthly attendance summaries: {str(e)}')
+            return
+
+def _clear_after_rollback(session):
+    session.info.pop(SUMMARY_KEYS, None)
+
+# Attributes whose previous value tells which month a row moved away from
+_MOVABLE_ATTRIBUTES = (DailyAttendance.user_id, DailyAttendance.date, PermissionRequest.user_id, PermissionRequest.start_time)
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    """No-op 'set' listener; registering it with active_history loads the old value of an
+    expired attribute before it is replaced, so the month a row left is in its history"""
+
+def register_monthly_summary_listeners(session=None):
+    """Keep monthly_attendance_summary current on every commit of the given session"""
+    session = session or db.session
+    for attribute in _MOVABLE_ATTRIBUTES:
+        if not event.contains(attribute, 'set', _keep_old_value):
+            event.listen(attribute, 'set', _keep_old_value, active_history=True)
+    if not event.contains(session, 'before_flush', _capture_summary_changes):
+        event.listen(session, 'before_flush', _capture_summary_changes)
+        event.listen(session, 'before_commit', _refresh_before_commit)
+        event.listen(session, 'after_rollback', _clear_after_rollback)
@@ -6,7 +6,8 @@ This ensures all reports use identical calculation logic based on the Final Repo
 from datetime import datetime, timedelta, date
 from models import DailyAttendance, LeaveRequest, PermissionRequest, AttendanceLog, PaidHoliday, Note, db
 from sqlalchemy import or_, and_, func
-from collections import namedtuple
+from sqlalchemy.orm import joinedload
+from collections import namedtuple, defaultdict
 import logging
 
 # Define a structure for summary metrics to ensure consistency
@@ -33,37 +34,150 @@ UserReport = namedtuple('UserReport', [
     'permission_requests'
 ])
 
-def calculate_unified_report_data(user, start_date, end_date):
+class ReportPrefetch:
+    """
+    Every row calculate_unified_report_data needs for a set of users and a date range,
+    loaded with one query per table and indexed in memory by user and (user, date).
+    include_logs=False skips the attendance logs and notes for callers that stream logs themselves.
+    """
+
+    def __init__(self, user_ids, start_date, end_date, include_logs=True):
+        user_ids = list(set(user_ids))
+        self.start_date = start_date
+        self.end_date = end_date
+        start_datetime = datetime.combine(start_date, datetime.min.time())
+        end_datetime = datetime.combine(end_date, datetime.max.time())
+
+        self._attendance_records = defaultdict(list)
+        self._attendance_by_day = {}
+        self._leave_requests = defaultdict(list)
+        self._permission_requests = defaultdict(list)
+        self._approved_permissions = {}
+        self._logs = defaultdict(list)
+        self._notes = defaultdict(list)
+
+        if user_ids:
+            for record in DailyAttendance.query.filter(
+                DailyAttendance.user_id.in_(user_ids),
+                DailyAttendance.date >= start_date,
+                DailyAttendance.date <= end_date
+            ).order_by(DailyAttendance.user_id, DailyAttendance.date.desc()).all():
+                self._attendance_records[record.user_id].append(record)
+                self._attendance_by_day.setdefault((record.user_id, record.date), record)
+
+            for leave_request in LeaveRequest.query.options(joinedload(LeaveRequest.leave_type)).filter(
+                LeaveRequest.user_id.in_(user_ids),
+                LeaveRequest.start_date <= end_date,
+                LeaveRequest.end_date >= start_date,
+                LeaveRequest.status.in_(['approved', 'pending'])
+            ).order_by(LeaveRequest.start_date.desc(), LeaveRequest.id).all():
+                self._leave_requests[leave_request.user_id].append(leave_request)
+
+            for permission_request in PermissionRequest.query.filter(
+                PermissionRequest.user_id.in_(user_ids),
+                PermissionRequest.start_time <= end_datetime,
+                PermissionRequest.end_time >= start_datetime,
+                PermissionRequest.status.in_(['approved', 'pending'])
+            ).order_by(PermissionRequest.start_time.desc(), PermissionRequest.id).all():
+                self._permission_requests[permission_request.user_id].append(permission_request)
+
+            # Approved permissions by the day they start on (first by id wins, like .first())
+            for permission_request in PermissionRequest.query.filter(
+                PermissionRequest.user_id.in_(user_ids),
+                PermissionRequest.start_time.between(start_datetime, end_datetime),
+                PermissionRequest.status == 'approved'
+            ).order_by(PermissionRequest.id).all():
+                self._approved_permissions.setdefault(
+                    (permission_request.user_id, permission_request.start_time.date()), permission_request
+                )
+
+        if user_ids and include_logs:
+            for log in AttendanceLog.query.filter(
+                AttendanceLog.user_id.in_(user_ids),
+                AttendanceLog.timestamp.between(start_datetime, end_datetime)
+            ).order_by(AttendanceLog.timestamp, AttendanceLog.id).all():
+                self._logs[(log.user_id, log.timestamp.date())].append(log)
+
+            for note in Note.query.filter(
+                Note.user_id.in_(user_ids),
+                Note.start_date <= end_date,
+                Note.end_date >= start_date
+            ).order_by(Note.id).all():
+                self._notes[note.user_id].append(note)
+
+        # Holidays overlapping the range (used for the summary counts)
+        self.paid_holidays = PaidHoliday.query.filter(
+            PaidHoliday.start_date <= end_date,
+            db.or_(
+                PaidHoliday.end_date.is_(None),
+                PaidHoliday.end_date >= start_date
+            )
+        ).order_by(PaidHoliday.id).all()
+
+        # Holidays that match a day in the range (used for the per-day status)
+        self._day_holidays = PaidHoliday.query.filter(
+            or_(
+                and_(PaidHoliday.holiday_type == 'day',
+                     PaidHoliday.start_date >= start_date,
+                     PaidHoliday.start_date <= end_date),
+                and_(PaidHoliday.holiday_type == 'range',
+                     PaidHoliday.start_date <= end_date,
+                     PaidHoliday.end_date >= start_date)
+            )
+        ).order_by(PaidHoliday.id).all()
+
+    def attendance_records(self, user_id):
+        return self._attendance_records.get(user_id, [])
+
+    def attendance_record_for_day(self, user_id, day):
+        return self._attendance_by_day.get((user_id, day))
+
+    def leave_requests(self, user_id):
+        return self._leave_requests.get(user_id, [])
+
+    def permission_requests(self, user_id):
+        return self._permission_requests.get(user_id, [])
+
+    def logs_for_day(self, user_id, day):
+        return self._logs.get((user_id, day), [])
+
+    def notes_for_day(self, user_id, day):
+        return [note for note in self._notes.get(user_id, []) if note.start_date <= day <= note.end_date]
+
+    def approved_leave_for_day(self, user_id, day):
+        approved = [
+            leave_request for leave_request in self._leave_requests.get(user_id, [])
+            if leave_request.status == 'approved' and leave_request.start_date <= day <= leave_request.end_date
+        ]
+        return min(approved, key=lambda leave_request: leave_request.id) if approved else None
+
+    def approved_permission_for_day(self, user_id, day):
+        return self._approved_permissions.get((user_id, day))
+
+    def paid_holiday_for_day(self, day):
+        return next((
+            holiday for holiday in self._day_holidays
+            if (holiday.holiday_type == 'day' and holiday.start_date == day)
+            or (holiday.holiday_type == 'range' and holiday.start_date <= day <= holiday.end_date)
+        ), None)
+
+def calculate_unified_report_data(user, start_date, end_date, prefetch=None):
     """
     Calculate comprehensive report data for a single user using the EXACT same logic 
     as the Final Report web view. This ensures consistency across all reports and exports.
+
+    Pass a ReportPrefetch covering the user and range to avoid querying per user.
     """
-    # Get attendance records for the user in the date range
-    attendance_records = DailyAttendance.query.filter(
-        DailyAttendance.user_id == user.id,
-        DailyAttendance.date >= start_date,
-        DailyAttendance.date <= end_date
-    ).order_by(DailyAttendance.date.desc()).all()
+    from helpers import format_hours_minutes
+    from routes.attendance import determine_attendance_type_dynamic
     
-    # Get leave requests for the user in the date range
-    leave_requests = LeaveRequest.query.filter(
-        LeaveRequest.user_id == user.id,
-        LeaveRequest.start_date <= end_date,
-        LeaveRequest.end_date >= start_date,
-        LeaveRequest.status.in_(['approved', 'pending'])
-    ).order_by(LeaveRequest.start_date.desc()).all()
+    if prefetch is None:
+        prefetch = ReportPrefetch([user.id], start_date, end_date)
     
-    # Get permission requests for the user in the date range
-    # Convert dates to datetime for comparison
-    start_datetime = datetime.combine(start_date, datetime.min.time())
-    end_datetime = datetime.combine(end_date, datetime.max.time())
-    
-    permission_requests = PermissionRequest.query.filter(
-        PermissionRequest.user_id == user.id,
-        PermissionRequest.start_time <= end_datetime,
-        PermissionRequest.end_time >= start_datetime,
-        PermissionRequest.status.in_(['approved', 'pending'])
-    ).order_by(PermissionRequest.start_time.desc()).all()
+    # Attendance records, leave requests and permission requests for the user in the date range
+    attendance_records = prefetch.attendance_records(user.id)
+    leave_requests = prefetch.leave_requests(user.id)
+    permission_requests = prefetch.permission_requests(user.id)
     
     # Calculate summary metrics using the EXACT same logic as the main final_report function
     total_days = (end_date - start_date).days + 1
@@ -81,12 +195,7 @@ def calculate_unified_report_data(user, start_date, end_date):
         # Note: absent_days will be calculated later based on missing days in the date range
 
         # Attach all logs for the day to each DailyAttendance record
-        start_of_day = datetime.combine(record.date, datetime.min.time())
-        end_of_day = datetime.combine(record.date, datetime.max.time())
-        raw_logs = AttendanceLog.query.filter(
-            AttendanceLog.user_id == user.id,
-            AttendanceLog.timestamp.between(start_of_day, end_of_day)
-        ).order_by(AttendanceLog.timestamp).all()
+        raw_logs = prefetch.logs_for_day(user.id, record.date)
         record.all_logs = [
             {
                 'id': log.id,
@@ -96,12 +205,7 @@ def calculate_unified_report_data(user, start_date, end_date):
         ]
         
         # Attach notes for this date to the record
-        notes = Note.query.filter(
-            Note.user_id == user.id,
-            Note.start_date <= record.date,
-            Note.end_date >= record.date
-        ).all()
-        record.notes = notes
+        record.notes = prefetch.notes_for_day(user.id, record.date)
         
         # FIX: Count incomplete days only if there is exactly 1 log (not based on database flag)
         if len(raw_logs) == 1:
@@ -135,18 +239,12 @@ def calculate_unified_report_data(user, start_date, end_date):
             extra_time = 0.0
         
         # Format hours_worked to 'Xh Ym' format
-        from helpers import format_hours_minutes
         record.formatted_hours_worked = format_hours_minutes(hours_worked) if hours_worked > 0 else "-"
         record.hours_worked = hours_worked # Keep raw value for other calculations if needed
         record.extra_time = extra_time
         
         # FIX: Check for approved leave requests and update status accordingly
-        leave_request_for_date = LeaveRequest.query.filter(
-            LeaveRequest.user_id == user.id,
-            LeaveRequest.start_date <= record.date,
-            LeaveRequest.end_date >= record.date,
-            LeaveRequest.status == 'approved'
-        ).first()
+        leave_request_for_date = prefetch.approved_leave_for_day(user.id, record.date)
         
         if leave_request_for_date:
             # Update status to show leave type instead of Absent
@@ -186,13 +284,7 @@ def calculate_unified_report_data(user, start_date, end_date):
                 annual_leave_days += days_count
     
     # Add paid holidays to paid leave days - only count holidays within the date range
-    paid_holidays = PaidHoliday.query.filter(
-        PaidHoliday.start_date <= end_date,
-        db.or_(
-            PaidHoliday.end_date.is_(None),
-            PaidHoliday.end_date >= start_date
-        )
-    ).all()
+    paid_holidays = prefetch.paid_holidays
     
     for paid_holiday in paid_holidays:
         # Calculate the actual overlap with the date range
@@ -242,37 +334,17 @@ def calculate_unified_report_data(user, start_date, end_date):
             status = 'Future Date'
         else:
             # Check for paid holidays first (same as Calendar Attendance Report)
-            paid_holiday = PaidHoliday.query.filter(
-                or_(
-                    and_(PaidHoliday.holiday_type == 'day', PaidHoliday.start_date == current_date),
-                    and_(PaidHoliday.holiday_type == 'range', 
-                         PaidHoliday.start_date <= current_date, 
-                         PaidHoliday.end_date >= current_date)
-                )
-            ).first()
+            paid_holiday = prefetch.paid_holiday_for_day(current_date)
+            
+            # Get attendance logs for this date
+            today_logs = prefetch.logs_for_day(user.id, current_date)
             
             if paid_holiday:
                 # Check if user has attendance logs
-                start_datetime = datetime.combine(current_date, datetime.min.time())
-                end_datetime = datetime.combine(current_date, datetime.max.time())
-                today_logs = AttendanceLog.query.filter(
-                    AttendanceLog.user_id == user.id,
-                    AttendanceLog.timestamp.between(start_datetime, end_datetime)
-                ).order_by(AttendanceLog.timestamp).all()
-                
                 if today_logs:
                     status = f"Present - {paid_holiday.description}"
                 else:
                     status = paid_holiday.description
-            else:
-                # Get attendance logs for this date
-                start_datetime = datetime.combine(current_date, datetime.min.time())
-                end_datetime = datetime.combine(current_date, datetime.max.time())
-                
-                today_logs = AttendanceLog.query.filter(
-                    AttendanceLog.user_id == user.id,
-                    AttendanceLog.timestamp.between(start_datetime, end_datetime)
-                ).order_by(AttendanceLog.timestamp).all()
             
             # Process logs using same logic as Calendar Attendance Report
             # Clear processed_logs for each date
@@ -293,7 +365,6 @@ def calculate_unified_report_data(user, start_date, end_date):
             
             # Use dynamic attendance processing for each user
             for user_id_key, data in processed_logs.items():
-                from routes.attendance import determine_attendance_type_dynamic
                 attendance_result = determine_attendance_type_dynamic(data['all_logs'])
                 
                 data['check_in'] = attendance_result['check_in']
@@ -320,11 +391,7 @@ def calculate_unified_report_data(user, start_date, end_date):
                     is_incomplete = processed_logs[user.id].get('is_incomplete', False)
                     
                     # Check for permission requests on day off
-                    permission_request = PermissionRequest.query.filter(
-                        PermissionRequest.user_id == user.id,
-                        func.date(PermissionRequest.start_time) == current_date,
-                        PermissionRequest.status == 'approved'
-                    ).first()
+                    permission_request = prefetch.approved_permission_for_day(user.id, current_date)
                     
                     # Only calculate extra time for complete days (not incomplete) and no permission request
                     if check_in and check_out and not is_incomplete and not permission_request:
@@ -336,19 +403,10 @@ def calculate_unified_report_data(user, start_date, end_date):
                     status = 'Day Off'
             else:
                 # Check for leave requests
-                leave_request = LeaveRequest.query.filter(
-                    LeaveRequest.user_id == user.id,
-                    LeaveRequest.start_date <= current_date,
-                    LeaveRequest.end_date >= current_date,
-                    LeaveRequest.status == 'approved'
-                ).first()
+                leave_request = prefetch.approved_leave_for_day(user.id, current_date)
                 
                 # Check for permission requests
-                permission_request = PermissionRequest.query.filter(
-                    PermissionRequest.user_id == user.id,
-                    func.date(PermissionRequest.start_time) == current_date,
-                    PermissionRequest.status == 'approved'
-                ).first()
+                permission_request = prefetch.approved_permission_for_day(user.id, current_date)
                 
                 # Check if user has attendance logs
                 has_attendance_logs = user.id in processed_logs
@@ -470,13 +528,7 @@ def calculate_unified_report_data(user, start_date, end_date):
                 
                 # If no DailyAttendance record found, check for raw attendance logs
                 if not has_attendance:
-                    start_datetime = datetime.combine(current_date, datetime.min.time())
-                    end_datetime = datetime.combine(current_date, datetime.max.time())
-                    today_logs_count = AttendanceLog.query.filter(
-                        AttendanceLog.user_id == user.id,
-                        AttendanceLog.timestamp.between(start_datetime, end_datetime)
-                    ).count()
-                    if today_logs_count > 0:
+                    if prefetch.logs_for_day(user.id, current_date):
                         has_attendance = True
                 
                 # Check for leave requests on this date (both approved and pending should exclude from absent)
@@ -543,12 +595,15 @@ def calculate_unified_report_data(user, start_date, end_date):
 def calculate_multiple_users_report_data(users, start_date, end_date):
     """
     Calculate report data for multiple users efficiently using unified logic.
+    All source rows are prefetched once for the whole user set and date range.
     Returns a list of UserReport objects.
     """
+    users = list(users)
+    prefetch = ReportPrefetch([user.id for user in users], start_date, end_date)
     all_user_reports = []
     
     for user in users:
-        user_report = calculate_unified_report_data(user, start_date, end_date)
+        user_report = calculate_unified_report_data(user, start_date, end_date, prefetch=prefetch)
         all_user_reports.append(user_report)
     
     return all_user_reports
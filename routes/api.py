@@ -1,19 +1,23 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, date, timedelta
-from models import db, User, LeaveRequest, PermissionRequest, DailyAttendance, Department, LeaveBalance, LeaveType, PaidHoliday, AttendanceLog
-from helpers import role_required, get_dashboard_stats, get_employees_for_manager
+from models import db, User, LeaveRequest, PermissionRequest, DailyAttendance, Department, LeaveBalance, LeaveType, PaidHoliday, AttendanceLog, Ticket
+from sqlalchemy.orm import joinedload
+from helpers import role_required, get_dashboard_stats, get_employees_for_manager, get_tickets_query_for_user, apply_list_filters, keyset_paginate, count_by_status, LIST_PAGE_SIZE
 from security import rate_limit, require_human
+from live_updates import conditional_poll
 import logging
 import hashlib
 import hmac
 import os
+import json
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 @api_bp.route('/dashboard/stats')
 @login_required
 @rate_limit(max_requests=60, window=60)  # 60 requests per minute
+@conditional_poll('users', 'departments', 'leave_requests', 'permission_requests', 'attendance_logs', 'leave_balances', 'leave_types')
 def dashboard_stats():
     """API endpoint to get dashboard statistics for auto-fetch"""
     try:
@@ -32,6 +36,7 @@ def dashboard_stats():
 @api_bp.route('/dashboard/charts')
 @login_required
 @rate_limit(max_requests=60, window=60)
+@conditional_poll('users', 'departments', 'attendance_logs', 'leave_requests')
 def dashboard_charts():
     """API endpoint to get chart data for dashboard analytics"""
     try:
@@ -39,18 +44,17 @@ def dashboard_charts():
         
         # Get employees based on role
         if current_user.role == 'employee':
-            employees = [current_user] if current_user.status == 'active' else []
+            employee_ids = [current_user.id] if current_user.status == 'active' else []
         elif current_user.role == 'manager':
-            employees = get_employees_for_manager(current_user.id)
+            employee_ids = [emp.id for emp in get_employees_for_manager(current_user.id) if emp.status == 'active']
         elif current_user.role in ['admin', 'product_owner', 'director']:
-            employees = User.query.filter(
+            # Only the ids are needed, so don't load every user row
+            employee_ids = [user_id for (user_id,) in db.session.query(User.id).filter(
                 User.status == 'active',
                 User.role.notin_(['admin', 'product_owner', 'director'])
-            ).all()
+            )]
         else:
-            employees = []
-        
-        employee_ids = [emp.id for emp in employees if emp.status == 'active']
+            employee_ids = []
         
         if not employee_ids:
             return jsonify({
@@ -68,96 +72,11 @@ def dashboard_charts():
                 }
             })
         
-        # Calculate weekly data (last 7 days)
-        weekly_data = {'attendance': [], 'leaves': [], 'productivity': []}
-        day_labels = []
-        
-        for i in range(6, -1, -1):  # Last 7 days
-            target_date = today - timedelta(days=i)
-            day_labels.append(target_date.strftime('%a'))
-            
-            # Get attendance rate for this day
-            start_datetime = datetime.combine(target_date, datetime.min.time())
-            end_datetime = datetime.combine(target_date, datetime.max.time())
-            
-            # Count present employees
-            present_count = db.session.query(AttendanceLog.user_id).filter(
-                AttendanceLog.timestamp.between(start_datetime, end_datetime),
-                AttendanceLog.user_id.in_(employee_ids)
-            ).distinct().count()
-            
-            # Calculate attendance rate
-            total_active = len(employee_ids)
-            attendance_rate = round((present_count / total_active * 100) if total_active > 0 else 0, 1)
-            weekly_data['attendance'].append(attendance_rate)
-            
-            # Count leave requests for this day
-            leave_count = LeaveRequest.query.filter(
-                LeaveRequest.user_id.in_(employee_ids),
-                LeaveRequest.start_date <= target_date,
-                LeaveRequest.end_date >= target_date,
-                LeaveRequest.status == 'approved'
-            ).count()
-            weekly_data['leaves'].append(leave_count)
-            
-            # Calculate productivity (based on working hours)
-            # For simplicity, use attendance rate as productivity proxy
-            weekly_data['productivity'].append(attendance_rate)
-        
-        # Calculate team status for today
-        start_datetime = datetime.combine(today, datetime.min.time())
-        end_datetime = datetime.combine(today, datetime.max.time())
-        
-        # Get present employees
-        present_user_ids = db.session.query(AttendanceLog.user_id).filter(
-            AttendanceLog.timestamp.between(start_datetime, end_datetime),
-            AttendanceLog.user_id.in_(employee_ids)
-        ).distinct().all()
-        present_ids_list = [uid[0] for uid in present_user_ids]
-        present_count = len(present_ids_list)
-        
-        # Count late employees (check-in after 9:00 AM)
-        late_threshold = datetime.combine(today, datetime.strptime('09:00', '%H:%M').time())
-        late_count = 0
-        for user_id in present_ids_list:
-            first_log = AttendanceLog.query.filter(
-                AttendanceLog.user_id == user_id,
-                AttendanceLog.timestamp.between(start_datetime, end_datetime)
-            ).order_by(AttendanceLog.timestamp.asc()).first()
-            
-            if first_log and first_log.timestamp > late_threshold:
-                late_count += 1
-        
-        # Count employees on leave today
-        on_leave_count = LeaveRequest.query.filter(
-            LeaveRequest.user_id.in_(employee_ids),
-            LeaveRequest.start_date <= today,
-            LeaveRequest.end_date >= today,
-            LeaveRequest.status == 'approved'
-        ).count()
-        
-        # Absent = total - present (excluding those on leave)
-        absent_count = len(employee_ids) - present_count
-        
-        # Adjust: if someone is on leave, they shouldn't be counted as absent
-        # Present count already excludes leave, so we need to adjust
-        team_status = {
-            'present': max(0, present_count - late_count),  # Present but not late
-            'on_leave': on_leave_count,
-            'late': late_count,
-            'absent': max(0, absent_count - on_leave_count)
-        }
-        
+        # Weekly series and today's team status from two grouped queries
+        from report_helpers.dashboard_stats import weekly_chart_data
         return jsonify({
             'status': 'success',
-            'data': {
-                'weekly_attendance': weekly_data['attendance'],
-                'weekly_leaves': weekly_data['leaves'],
-                'weekly_productivity': weekly_data['productivity'],
-                'day_labels': day_labels,
-                'team_status': team_status,
-                'total_team': len(employee_ids)
-            }
+            'data': weekly_chart_data(employee_ids, today)
         })
         
     except Exception as e:
@@ -601,24 +520,9 @@ def company_analytics():
 def requests_overview():
     """API endpoint to get all requests overview for director"""
     try:
-        # Get all requests
-        all_leave_requests = LeaveRequest.query.all()
-        all_permission_requests = PermissionRequest.query.all()
-        
         # Calculate summary statistics
-        leave_summary = {
-            'total': len(all_leave_requests),
-            'pending': len([r for r in all_leave_requests if r.status == 'pending']),
-            'approved': len([r for r in all_leave_requests if r.status == 'approved']),
-            'rejected': len([r for r in all_leave_requests if r.status == 'rejected'])
-        }
-        
-        permission_summary = {
-            'total': len(all_permission_requests),
-            'pending': len([r for r in all_permission_requests if r.status == 'pending']),
-            'approved': len([r for r in all_permission_requests if r.status == 'approved']),
-            'rejected': len([r for r in all_permission_requests if r.status == 'rejected'])
-        }
+        leave_summary = count_by_status(LeaveRequest.query, LeaveRequest)
+        permission_summary = count_by_status(PermissionRequest.query, PermissionRequest)
         
         return jsonify({
             'status': 'success',
@@ -642,16 +546,14 @@ def requests_overview():
 @login_required
 @rate_limit(max_requests=60, window=60)
 def leave_requests():
-    """API endpoint to get leave requests"""
+    """API endpoint to get leave requests, one keyset page at a time (?after=/?before= cursors)"""
     try:
         user_role = current_user.role
-        leave_requests = []
+        query = LeaveRequest.query.filter(db.false())
         
         if user_role == 'employee':
             # Employee sees only their own requests
-            leave_requests = LeaveRequest.query.filter_by(
-                user_id=current_user.id
-            ).order_by(LeaveRequest.created_at.desc()).all()
+            query = LeaveRequest.query.filter_by(user_id=current_user.id)
             
         elif user_role == 'manager':
             # Manager sees team requests
@@ -659,17 +561,31 @@ def leave_requests():
             employee_ids = [emp.id for emp in employees]
             
             if employee_ids:
-                leave_requests = LeaveRequest.query.filter(
-                    LeaveRequest.user_id.in_(employee_ids)
-                ).order_by(LeaveRequest.created_at.desc()).all()
+                query = LeaveRequest.query.filter(LeaveRequest.user_id.in_(employee_ids))
         
         elif user_role in ['admin', 'product_owner', 'director']:
             # Admin/Technical Support/Director sees all requests
-            leave_requests = LeaveRequest.query.order_by(LeaveRequest.created_at.desc()).all()
+            query = LeaveRequest.query
+        
+        query = apply_list_filters(
+            query, LeaveRequest,
+            status=request.args.get('status'),
+            department_id=request.args.get('department_id', type=int),
+            date_range=request.args.get('date_range'),
+            date_from=request.args.get('date_from', type=date.fromisoformat),
+            date_to=request.args.get('date_to', type=date.fromisoformat)
+        ).options(joinedload(LeaveRequest.user), joinedload(LeaveRequest.leave_type))
+        page = keyset_paginate(
+            query, LeaveRequest,
+            after=request.args.get('after'),
+            before=request.args.get('before'),
+            total=request.args.get('total', type=int),
+            per_page=min(request.args.get('per_page', LIST_PAGE_SIZE, type=int), 100)
+        )
         
         # Convert to JSON-serializable format
         requests_data = []
-        for lr in leave_requests:
+        for lr in page.items:
             requests_data.append({
                 'id': lr.id,
                 'user_name': f"{lr.user.first_name} {lr.user.last_name}",
@@ -686,7 +602,8 @@ def leave_requests():
         return jsonify({
             'status': 'success',
             'data': {
-                'requests': requests_data
+                'requests': requests_data,
+                'pagination': page.to_dict()
             }
         })
         
@@ -697,6 +614,122 @@ def leave_requests():
             'message': 'Failed to fetch leave requests'
         }), 500
 
+@api_bp.route('/permission/requests')
+@login_required
+@rate_limit(max_requests=60, window=60)
+def permission_requests():
+    """API endpoint to get permission requests, one keyset page at a time (?after=/?before= cursors)"""
+    try:
+        user_role = current_user.role
+        query = PermissionRequest.query.filter(db.false())
+        
+        if user_role == 'employee':
+            query = PermissionRequest.query.filter_by(user_id=current_user.id)
+        
+        elif user_role == 'manager':
+            employees = get_employees_for_manager(current_user.id)
+            employee_ids = [emp.id for emp in employees]
+            
+            if employee_ids:
+                query = PermissionRequest.query.filter(PermissionRequest.user_id.in_(employee_ids))
+        
+        elif user_role in ['admin', 'product_owner', 'director']:
+            query = PermissionRequest.query
+        
+        query = apply_list_filters(
+            query, PermissionRequest,
+            status=request.args.get('status'),
+            department_id=request.args.get('department_id', type=int),
+            date_range=request.args.get('date_range'),
+            date_from=request.args.get('date_from', type=date.fromisoformat),
+            date_to=request.args.get('date_to', type=date.fromisoformat)
+        ).options(joinedload(PermissionRequest.user))
+        page = keyset_paginate(
+            query, PermissionRequest,
+            after=request.args.get('after'),
+            before=request.args.get('before'),
+            total=request.args.get('total', type=int),
+            per_page=min(request.args.get('per_page', LIST_PAGE_SIZE, type=int), 100)
+        )
+        
+        requests_data = []
+        for pr in page.items:
+            requests_data.append({
+                'id': pr.id,
+                'user_name': f"{pr.user.first_name} {pr.user.last_name}",
+                'status': pr.status,
+                'start_time': pr.start_time.isoformat(),
+                'end_time': pr.end_time.isoformat(),
+                'reason': pr.reason,
+                'created_at': pr.created_at.isoformat(),
+                'manager_status': pr.manager_status,
+                'admin_status': pr.admin_status
+            })
+        
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'requests': requests_data,
+                'pagination': page.to_dict()
+            }
+        })
+        
+    except Exception as e:
+        logging.error(f"Error fetching permission requests: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to fetch permission requests'
+        }), 500
+
+@api_bp.route('/tickets')
+@login_required
+@rate_limit(max_requests=60, window=60)
+def tickets():
+    """API endpoint to get the tickets visible to the user, one keyset page at a time"""
+    try:
+        query = get_tickets_query_for_user(current_user, show_own_only=request.args.get('own') == '1')
+        
+        status_filter = request.args.get('status', 'all')
+        if status_filter != 'all':
+            query = query.filter(Ticket.status == status_filter)
+        priority_filter = request.args.get('priority', 'all')
+        if priority_filter != 'all':
+            query = query.filter(Ticket.priority == priority_filter)
+        
+        page = keyset_paginate(
+            query.options(joinedload(Ticket.category)), Ticket,
+            after=request.args.get('after'),
+            before=request.args.get('before'),
+            total=request.args.get('total', type=int),
+            per_page=min(request.args.get('per_page', LIST_PAGE_SIZE, type=int), 100)
+        )
+        
+        tickets_data = []
+        for ticket in page.items:
+            tickets_data.append({
+                'id': ticket.id,
+                'title': ticket.title,
+                'category': ticket.category.name if ticket.category else None,
+                'priority': ticket.priority,
+                'status': ticket.status,
+                'created_at': ticket.created_at.isoformat()
+            })
+        
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'tickets': tickets_data,
+                'pagination': page.to_dict()
+            }
+        })
+        
+    except Exception as e:
+        logging.error(f"Error fetching tickets: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': 'Failed to fetch tickets'
+        }), 500
+
 @api_bp.route('/leave/types')
 @login_required
 def leave_types():
@@ -777,6 +810,7 @@ def leave_balances():
 
 @api_bp.route('/attendance/data')
 @login_required
+@conditional_poll('users', 'departments', 'daily_attendance')
 def attendance_data():
     """API endpoint to get attendance data"""
     try:
@@ -833,6 +867,7 @@ def attendance_data():
 
 @api_bp.route('/attendance/stats')
 @login_required
+@conditional_poll('users', 'departments', 'daily_attendance')
 def attendance_stats():
     """API endpoint to get attendance statistics"""
     try:
@@ -951,21 +986,182 @@ def verify_sync_signature(payload, signature):
     ).hexdigest()
     return hmac.compare_digest(signature, expected_signature)
 
+# Per-log statuses reported back to the sync agent
+AGENT_LOG_STATUSES = ('inserted', 'updated', 'unchanged', 'duplicate', 'unmatched', 'invalid')
+
+# Logs upserted per statement
+AGENT_UPSERT_CHUNK = 1000
+
+class SyncBatchTooLarge(Exception):
+    """Decompressed batch exceeds SYNC_BATCH_MAX_BYTES or SYNC_BATCH_MAX_LOGS"""
+
+def _parse_agent_timestamp(value):
+    """Device-local wall-clock time; an offset, if sent, is dropped rather than converted"""
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+
+def _resolve_agent_users(fingerprints):
+    """{device user id: system user id}, one IN lookup by fingerprint plus one for processed device users"""
+    fingerprints = {str(fingerprint) for fingerprint in fingerprints}
+    if not fingerprints:
+        return {}
+    users = dict(db.session.query(User.fingerprint_number, User.id).filter(
+        User.fingerprint_number.in_(fingerprints)
+    ).all())
+    missing = fingerprints - users.keys()
+    if missing:
+        from models import DeviceUser
+        for device_user_id, system_user_id in db.session.query(DeviceUser.device_user_id, DeviceUser.system_user_id).filter(
+            DeviceUser.device_user_id.in_(missing),
+            DeviceUser.is_processed == True,
+            DeviceUser.system_user_id != None
+        ):
+            users.setdefault(device_user_id, system_user_id)
+    return users
+
+def ingest_agent_logs(logs, device_ip):
+    """Bulk-upsert logs sent by the sync agent ({'user_id': device user id, 'timestamp': ISO}).
+
+    Returns (summary, results, errors, touched): counts per status, one status per input log
+    (see AGENT_LOG_STATUSES), the first 50 problems and the (user_id, date) pairs written.
+    Touched days are queued for recompute. Does not commit.
+    """
+    from models import DeviceSettings
+    from routes.attendance import upsert_attendance_logs, mark_attendance_dirty, determine_attendance_type
+    
+    results = [None] * len(logs)
+    errors = []
+    parsed = []
+    for index, log in enumerate(logs):
+        try:
+            fingerprint = log.get('user_id')
+            if fingerprint in (None, ''):
+                raise ValueError('missing user_id')
+            parsed.append((index, str(fingerprint), _parse_agent_timestamp(log.get('timestamp'))))
+        except (AttributeError, TypeError, ValueError) as e:
+            results[index] = 'invalid'
+            errors.append({'index': index, 'error': str(e) if log is not None else 'not a JSON object'})
+    
+    device = DeviceSettings.query.filter_by(device_ip=device_ip).first() if device_ip else None
+    users = _resolve_agent_users(fingerprint for _, fingerprint, _ in parsed)
+    rows = []
+    row_index = {}
+    for index, fingerprint, timestamp in parsed:
+        user_id = users.get(fingerprint)
+        if user_id is None:
+            results[index] = 'unmatched'
+            errors.append({'index': index, 'error': f'no user with fingerprint {fingerprint}'})
+            continue
+        if (user_id, timestamp) in row_index:
+            results[index] = 'duplicate'
+            continue
+        row_index[(user_id, timestamp)] = index
+        rows.append({
+            'user_id': user_id,
+            'timestamp': timestamp,
+            'scan_type': determine_attendance_type(timestamp),
+            'device_ip': device_ip,
+            'device_id': device.id if device else None
+        })
+    
+    statuses = {}
+    touched = set()
+    for i in range(0, len(rows), AGENT_UPSERT_CHUNK):
+        counts = upsert_attendance_logs(rows[i:i + AGENT_UPSERT_CHUNK])
+        statuses.update(counts['results'])
+        touched.update(counts['touched'])
+    for key, index in row_index.items():
+        results[index] = statuses.get(key, 'unchanged')
+    mark_attendance_dirty(touched)
+    
+    summary = {status: 0 for status in AGENT_LOG_STATUSES}
+    for status in results:
+        summary[status] += 1
+    summary['received'] = len(logs)
+    errors.sort(key=lambda error: error['index'])
+    return summary, results, errors[:50], touched
+
+def _after_agent_sync(touched):
+    """Announce and roll up committed agent logs.
+
+    Only the days this upload touched are recomputed; the rest of the queue (leave and
+    holiday edits, earlier failures) is left to the periodic drain.
+    """
+    if not touched:
+        return
+    from live_updates import publish
+    from routes.attendance import recompute_dirty_attendance
+    
+    publish('attendance', touched)
+    try:
+        recompute_dirty_attendance(only=touched)
+    except Exception as recompute_error:
+        # The days stay queued and are picked up by the next sync
+        db.session.rollback()
+        logging.error(f"Error recomputing attendance after agent sync: {str(recompute_error)}")
+
+def _inflate_agent_batch(raw, content_encoding, max_bytes):
+    """The uncompressed body of a batch sent with Content-Encoding gzip or identity"""
+    import zlib
+    
+    content_encoding = (content_encoding or 'identity').lower()
+    if content_encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(raw, max_bytes + 1)
+        except zlib.error as e:
+            raise ValueError(f'invalid gzip body: {str(e)}')
+        if len(body) > max_bytes or decompressor.unconsumed_tail:
+            raise SyncBatchTooLarge(f'batch exceeds {max_bytes} bytes uncompressed')
+        if not decompressor.eof:
+            raise ValueError('truncated gzip body')
+    elif content_encoding == 'identity':
+        body = raw
+        if len(body) > max_bytes:
+            raise SyncBatchTooLarge(f'batch exceeds {max_bytes} bytes')
+    else:
+        raise ValueError(f'unsupported Content-Encoding {content_encoding}')
+    return body
+
+def _parse_agent_batch(body, mimetype):
+    """Logs from an NDJSON or JSON {"logs": [...]} body.
+
+    NDJSON lines that aren't valid JSON come back as None and are reported as invalid.
+    """
+    text = body.decode('utf-8')
+    if mimetype == 'application/json':
+        data = json.loads(text)
+        logs = data.get('logs') if isinstance(data, dict) else data
+        if not isinstance(logs, list):
+            raise ValueError('expected a list of logs')
+        return logs
+    
+    logs = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            logs.append(json.loads(line))
+        except ValueError:
+            logs.append(None)
+    return logs
+
 @api_bp.route('/sync_logs', methods=['POST'])
 def sync_attendance_logs():
     """
     Secure endpoint for local sync agent to upload attendance logs
+    (v1; the agent now uses /api/v2/sync/logs)
     Expected payload:
     {
         "device_id": "device_001",
+        "device_ip": "192.168.11.253",
         "logs": [
             {
                 "user_id": 123,
-                "timestamp": "2024-01-15T09:30:00",
-                "action": "check_in"
+                "timestamp": "2024-01-15T09:30:00"
             }
         ]
     }
+    user_id is the user's id on the device (fingerprint number).
     """
     try:
         # Verify signature
@@ -1000,71 +1196,19 @@ def sync_attendance_logs():
                 'message': 'Missing device_id or logs'
             }), 400
         
-        processed_logs = 0
-        skipped_logs = 0
-        errors = []
-        
-        for log_data in logs:
-            try:
-                user_id = log_data.get('user_id')
-                timestamp_str = log_data.get('timestamp')
-                action = log_data.get('action', 'check_in')
-                
-                if not user_id or not timestamp_str:
-                    errors.append(f"Missing user_id or timestamp in log: {log_data}")
-                    continue
-                
-                # Parse timestamp
-                try:
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                except ValueError:
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                
-                # Check if user exists
-                user = User.query.get(user_id)
-                if not user:
-                    errors.append(f"User {user_id} not found")
-                    continue
-                
-                # Check for duplicate log (same user, same timestamp, same action)
-                existing_log = AttendanceLog.query.filter_by(
-                    user_id=user_id,
-                    timestamp=timestamp,
-                    action=action
-                ).first()
-                
-                if existing_log:
-                    skipped_logs += 1
-                    continue
-                
-                # Create new attendance log
-                new_log = AttendanceLog(
-                    user_id=user_id,
-                    timestamp=timestamp,
-                    action=action,
-                    device_id=device_id,
-                    created_at=datetime.utcnow()
-                )
-                
-                db.session.add(new_log)
-                processed_logs += 1
-                
-            except Exception as log_error:
-                errors.append(f"Error processing log {log_data}: {str(log_error)}")
-                continue
-        
-        # Commit all changes
-        if processed_logs > 0:
-            db.session.commit()
-            logging.info(f"Sync successful: {processed_logs} logs processed from device {device_id}")
+        device_ip = (data.get('device_ip') or request.remote_addr or 'sync-agent')[:15]
+        summary, results, errors, touched = ingest_agent_logs(logs, device_ip)
+        db.session.commit()
+        logging.info(f"Sync successful: {summary['inserted']} logs added, {summary['updated']} updated from device {device_id}")
+        _after_agent_sync(touched)
         
         return jsonify({
             'status': 'success',
             'message': f'Sync completed',
-            'processed': processed_logs,
-            'skipped': skipped_logs,
-            'errors': len(errors),
-            'error_details': errors[:10]  # Limit error details
+            'processed': summary['inserted'] + summary['updated'],
+            'skipped': summary['unchanged'] + summary['duplicate'],
+            'errors': summary['unmatched'] + summary['invalid'],
+            'error_details': [f"Log {error['index']}: {error['error']}" for error in errors[:10]]  # Limit error details
         })
         
     except Exception as e:
@@ -1074,3 +1218,106 @@ def sync_attendance_logs():
             'status': 'error',
             'message': 'Internal server error during sync'
         }), 500
+
+@api_bp.route('/v2/sync/logs', methods=['POST'])
+def sync_logs_v2():
+    """
+    Batch upload endpoint for the sync agent.
+    
+    Body: NDJSON, one {"user_id": <device user id>, "timestamp": "2024-01-15T09:30:00"} per line
+    (or application/json {"logs": [...]}), optionally gzip-compressed (Content-Encoding: gzip).
+    Headers:
+        X-Sync-Signature  HMAC-SHA256 of the raw (compressed) body
+        Idempotency-Key   unique per batch; a retried batch gets the stored response back
+        X-Device-Id       agent device id, X-Device-IP the device's address
+    Response: per-status summary plus "results", one status per input line, in order.
+    """
+    from sqlalchemy.exc import IntegrityError
+    from models import SyncBatch
+    
+    signature = request.headers.get('X-Sync-Signature')
+    raw = request.get_data(cache=False)
+    if not signature or not verify_sync_signature(raw, signature):
+        logging.warning(f"Invalid v2 sync signature from IP: {request.remote_addr}")
+        return jsonify({'status': 'error', 'message': 'Invalid signature'}), 401
+    
+    idempotency_key = (request.headers.get('Idempotency-Key') or '').strip()
+    if not idempotency_key or len(idempotency_key) > 128:
+        return jsonify({'status': 'error', 'message': 'Idempotency-Key header (max 128 characters) is required'}), 400
+    
+    config = current_app.config
+    try:
+        body = _inflate_agent_batch(raw, request.headers.get('Content-Encoding'),
+                                    config.get('SYNC_BATCH_MAX_BYTES', 32 * 1024 * 1024))
+    except SyncBatchTooLarge as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Malformed batch: {str(e)}'}), 400
+    # Hash the uncompressed body: gzip headers carry a timestamp, so a re-encoded retry
+    # of the same batch has different raw bytes
+    payload_hash = hashlib.sha256(body).hexdigest()
+    
+    def replay(batch):
+        if batch.payload_hash != payload_hash:
+            return jsonify({'status': 'error', 'message': 'Idempotency-Key was already used for a different batch'}), 422
+        result = json.loads(batch.result)
+        result['replayed'] = True
+        return jsonify(result)
+    
+    try:
+        stored = db.session.get(SyncBatch, idempotency_key)
+        if stored:
+            return replay(stored)
+        
+        try:
+            logs = _parse_agent_batch(body, request.mimetype)
+            if len(logs) > config.get('SYNC_BATCH_MAX_LOGS', 20000):
+                raise SyncBatchTooLarge(f"batch has more than {config.get('SYNC_BATCH_MAX_LOGS', 20000)} logs")
+        except SyncBatchTooLarge as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 413
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': f'Malformed batch: {str(e)}'}), 400
+        
+        device_key = request.headers.get('X-Device-Id')
+        device_ip = (request.headers.get('X-Device-IP') or request.remote_addr or 'sync-agent')[:15]
+        summary, results, errors, touched = ingest_agent_logs(logs, device_ip)
+        result = {
+            'status': 'success',
+            'idempotency_key': idempotency_key,
+            'replayed': False,
+            'summary': summary,
+            'results': results,
+            'errors': errors
+        }
+        
+        db.session.add(SyncBatch(
+            idempotency_key=idempotency_key,
+            device_key=device_key[:100] if device_key else None,
+            payload_hash=payload_hash,
+            record_count=len(logs),
+            result=json.dumps(result)
+        ))
+        retention = timedelta(days=config.get('SYNC_BATCH_RETENTION_DAYS', 7))
+        SyncBatch.query.filter(SyncBatch.created_at < datetime.utcnow() - retention).delete(synchronize_session=False)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # The same batch was committed by a concurrent retry
+            db.session.rollback()
+            stored = db.session.get(SyncBatch, idempotency_key)
+            if stored:
+                return replay(stored)
+            raise
+        
+        logging.info(f"v2 sync from {device_key or device_ip}: {len(logs)} logs, {summary['inserted']} inserted, "
+                     f"{summary['updated']} updated, {summary['unmatched']} unmatched, {summary['invalid']} invalid")
+        _after_agent_sync(touched)
+        return jsonify(result)
+    
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error in v2 sync endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': 'Internal server error during sync'
+        }), 500
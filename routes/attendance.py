@@ -1,14 +1,18 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, abort, make_response
 # from flask_apscheduler import STATE_PAUSED, STATE_RUNNING, STATE_STOPPED  # Not needed anymore
 from flask_login import login_required, current_user
+from export_jobs import background_export
+from live_updates import conditional_poll
 from models import db, User, AttendanceLog, DailyAttendance, LeaveRequest, PermissionRequest, FingerPrintFailure, DeviceSettings, DeviceUser, Note
-from sqlalchemy import or_, and_, func
+from sqlalchemy import or_, and_, func, tuple_, literal, literal_column, case, null
 from helpers import role_required, sync_users_from_device, get_fingerprint_filter, has_valid_fingerprint
 from forms import DeviceSettingsForm
 from datetime import datetime, timedelta, date
-from zk import ZK
+from device_sessions import device_sessions, DeviceUnavailable, DeviceBusy
 import logging
 from collections import defaultdict, OrderedDict
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 import socket
 import time
 import threading
@@ -324,64 +328,13 @@ def update_daily_attendance(user_id, attendance_date, check_in=None, check_out=N
     db.session.commit()
     return daily_record
 
-def process_daily_attendance(user_id, attendance_date):
-    """Process all attendance logs for a user on a specific date"""
-    # Get all logs for this user on this date, ordered by timestamp
-    start_of_day = datetime.combine(attendance_date, datetime.min.time())
-    end_of_day = datetime.combine(attendance_date, datetime.max.time())
-    daily_logs_raw = AttendanceLog.query.filter(
-        AttendanceLog.user_id == user_id,
-        AttendanceLog.timestamp.between(start_of_day, end_of_day)
-    ).order_by(AttendanceLog.timestamp).all()
-    
-    # Remove duplicate logs before processing
-    daily_logs = deduplicate_attendance_logs(daily_logs_raw)
-
-    user = User.query.get(user_id)
-    if user and user.joining_date and attendance_date < user.joining_date:
-        # If the attendance date is before the user's joining date, ignore it
-        return None
-
-    if not daily_logs:
-        return None
+def compute_daily_attendance_values(daily_logs, paid_holiday=None, leave_request=None, permission_request=None):
+    """Apply the daily attendance business rules to one user's logs for one day.
 
-    # Initialize scan_order and update existing logs
-    for i, log in enumerate(daily_logs):
-        log.scan_order = i + 1
-        log.is_extra_scan = (i + 1) > 2  # Mark as extra scan if it's the 3rd or subsequent scan
-        db.session.add(log) # Add to session to ensure updates are tracked
-
-    # Commit the changes to scan_order and is_extra_scan
-    db.session.commit()
-    
-    # Check if this date is a paid holiday
-    from models import PaidHoliday
-    paid_holiday = PaidHoliday.query.filter(
-        or_(
-            # Single day holiday
-            and_(PaidHoliday.holiday_type == 'day',
-                 PaidHoliday.start_date == attendance_date),
-            # Range holiday that includes this date
-            and_(PaidHoliday.holiday_type == 'range',
-                 PaidHoliday.start_date <= attendance_date,
-                 PaidHoliday.end_date >= attendance_date)
-        )
-    ).first()
-    
-    # Get leave/permission requests for this date
-    leave_request = LeaveRequest.query.filter(
-        LeaveRequest.user_id == user_id,
-        LeaveRequest.start_date <= attendance_date,
-        LeaveRequest.end_date >= attendance_date,
-        LeaveRequest.status == 'approved'
-    ).first()
-    
-    permission_request = PermissionRequest.query.filter(
-        PermissionRequest.user_id == user_id,
-        func.date(PermissionRequest.start_time) == attendance_date,
-        PermissionRequest.status == 'approved'
-    ).first()
-    
+    daily_logs must already be deduplicated. Pure function (no queries, no writes) so the
+    per-day path (process_daily_attendance) and the batched rollup share identical rules.
+    Leave/permission/holiday fields are only included when the matching record exists.
+    """
     # Use dynamic attendance processing - first log = check-in, last log = check-out
     attendance_result = determine_attendance_type_dynamic(daily_logs)
 
@@ -480,6 +433,96 @@ def process_daily_attendance(user_id, attendance_date):
             # Safety case - should not happen with new logic
             status_reason = "Present (attendance logs found)"
     
+    values = {
+        'first_check_in': first_check_in,
+        'last_check_out': last_check_out,
+        'total_working_hours': total_working_minutes / 60,
+        'total_breaks': 0,  # Not calculating breaks in new logic
+        'entry_count': len(daily_logs),  # Total number of logs
+        'status': status,
+        'status_reason': status_reason,
+        # Set incomplete day flag based on business rules:
+        # Single log entry (any date) = incomplete, Multiple logs = complete
+        'is_incomplete_day': is_incomplete_day
+    }
+    
+    # Store leave and permission information
+    if leave_request:
+        values['leave_request_id'] = leave_request.id
+        values['leave_type_id'] = leave_request.leave_type_id
+        if leave_request.leave_type:
+            values['leave_type_name'] = leave_request.leave_type.name
+    
+    if permission_request:
+        values['permission_request_id'] = permission_request.id
+    
+    if paid_holiday:
+        values['paid_holiday_id'] = paid_holiday.id
+        values['is_paid_holiday'] = True
+        values['holiday_name'] = paid_holiday.description
+    
+    return values
+
+def process_daily_attendance(user_id, attendance_date):
+    """Process all attendance logs for a user on a specific date"""
+    # Get all logs for this user on this date, ordered by timestamp
+    start_of_day = datetime.combine(attendance_date, datetime.min.time())
+    end_of_day = datetime.combine(attendance_date, datetime.max.time())
+    daily_logs_raw = AttendanceLog.query.filter(
+        AttendanceLog.user_id == user_id,
+        AttendanceLog.timestamp.between(start_of_day, end_of_day)
+    ).order_by(AttendanceLog.timestamp).all()
+    
+    # Remove duplicate logs before processing
+    daily_logs = deduplicate_attendance_logs(daily_logs_raw)
+
+    user = User.query.get(user_id)
+    if user and user.joining_date and attendance_date < user.joining_date:
+        # If the attendance date is before the user's joining date, ignore it
+        return None
+
+    if not daily_logs:
+        return None
+
+    # Initialize scan_order and update existing logs
+    for i, log in enumerate(daily_logs):
+        log.scan_order = i + 1
+        log.is_extra_scan = (i + 1) > 2  # Mark as extra scan if it's the 3rd or subsequent scan
+        db.session.add(log) # Add to session to ensure updates are tracked
+
+    # Commit the changes to scan_order and is_extra_scan
+    db.session.commit()
+    
+    # Check if this date is a paid holiday
+    from models import PaidHoliday
+    paid_holiday = PaidHoliday.query.filter(
+        or_(
+            # Single day holiday
+            and_(PaidHoliday.holiday_type == 'day',
+                 PaidHoliday.start_date == attendance_date),
+            # Range holiday that includes this date
+            and_(PaidHoliday.holiday_type == 'range',
+                 PaidHoliday.start_date <= attendance_date,
+                 PaidHoliday.end_date >= attendance_date)
+        )
+    ).first()
+    
+    # Get leave/permission requests for this date
+    leave_request = LeaveRequest.query.filter(
+        LeaveRequest.user_id == user_id,
+        LeaveRequest.start_date <= attendance_date,
+        LeaveRequest.end_date >= attendance_date,
+        LeaveRequest.status == 'approved'
+    ).first()
+    
+    permission_request = PermissionRequest.query.filter(
+        PermissionRequest.user_id == user_id,
+        func.date(PermissionRequest.start_time) == attendance_date,
+        PermissionRequest.status == 'approved'
+    ).first()
+    
+    values = compute_daily_attendance_values(daily_logs, paid_holiday, leave_request, permission_request)
+    
     # Update or create daily attendance record
     daily_record = DailyAttendance.query.filter_by(
         user_id=user_id,
@@ -493,36 +536,323 @@ def process_daily_attendance(user_id, attendance_date):
         )
         db.session.add(daily_record)
     
-    daily_record.first_check_in = first_check_in
-    daily_record.last_check_out = last_check_out
+    for field, value in values.items():
+        setattr(daily_record, field, value)
     logging.debug(f"[ATTENDANCE_DEBUG] After daily_record assignment: daily_record.first_check_in={daily_record.first_check_in}, daily_record.last_check_out={daily_record.last_check_out}")
     
-    daily_record.total_working_hours = total_working_minutes / 60
-    daily_record.total_breaks = 0  # Not calculating breaks in new logic
-    daily_record.entry_count = len(daily_logs)  # Total number of logs
-    daily_record.status = status
-    daily_record.status_reason = status_reason
+    return daily_record
+
+def rollup_daily_attendance(start_date, end_date, user_ids=None, only_missing=False, replace=False, keys=None):
+    """Batched equivalent of calling process_daily_attendance for every (user, day) with logs.
+
+    Loads logs, users, paid holidays, leaves and permissions for the whole range with one
+    query each, applies compute_daily_attendance_values in memory and writes all
+    DailyAttendance rows with a bulk upsert. Business rules are identical to the per-day path.
+
+    Args:
+        start_date, end_date: inclusive date range
+        user_ids: optional iterable of user IDs to limit the rollup to
+        only_missing: only create rows for (user, day) pairs that have no DailyAttendance yet
+        replace: overwrite leave/permission/holiday links and flags as if the row were
+                 deleted and recreated (used by reprocessing), instead of keeping existing ones
+        keys: optional set of (user_id, date) pairs; only these days are rolled up. With
+              replace, those of them that no longer produce a row (all their logs deleted,
+              or before the joining date) lose what their logs put in DailyAttendance
+
+    Does not commit. Returns the number of DailyAttendance rows written.
+    """
+    from models import PaidHoliday
+    from sqlalchemy.orm import joinedload
     
-    # Set incomplete day flag based on business rules:
-    # Single log entry (any date) = incomplete, Multiple logs = complete
-    daily_record.is_incomplete_day = is_incomplete_day
+    if user_ids is not None:
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return 0
     
-    # Store leave and permission information
-    if leave_request:
-        daily_record.leave_request_id = leave_request.id
-        daily_record.leave_type_id = leave_request.leave_type_id
-        if leave_request.leave_type:
-            daily_record.leave_type_name = leave_request.leave_type.name
+    start_datetime = datetime.combine(start_date, datetime.min.time())
+    end_datetime = datetime.combine(end_date, datetime.max.time())
     
-    if permission_request:
-        daily_record.permission_request_id = permission_request.id
+    # 1. All logs in range, grouped by (user, day)
+    log_query = AttendanceLog.query.filter(AttendanceLog.timestamp.between(start_datetime, end_datetime))
+    if user_ids is not None:
+        log_query = log_query.filter(AttendanceLog.user_id.in_(user_ids))
+    logs_by_day = defaultdict(list)
+    for log in log_query.order_by(AttendanceLog.user_id, AttendanceLog.timestamp).all():
+        logs_by_day[(log.user_id, log.timestamp.date())].append(log)
     
-    if paid_holiday:
-        daily_record.paid_holiday_id = paid_holiday.id
-        daily_record.is_paid_holiday = True
-        daily_record.holiday_name = paid_holiday.description
+    if keys is not None:
+        logs_by_day = {key: day_logs for key, day_logs in logs_by_day.items() if key in keys}
     
-    return daily_record
+    if only_missing and logs_by_day:
+        existing_query = db.session.query(DailyAttendance.user_id, DailyAttendance.date).filter(
+            DailyAttendance.date >= start_date,
+            DailyAttendance.date <= end_date
+        )
+        if user_ids is not None:
+            existing_query = existing_query.filter(DailyAttendance.user_id.in_(user_ids))
+        for key in existing_query.all():
+            logs_by_day.pop((key[0], key[1]), None)
+    
+    if not logs_by_day:
+        if keys is not None and replace:
+            clear_days_without_logs(keys)
+        return 0
+    
+    day_user_ids = list({user_id for user_id, _ in logs_by_day})
+    
+    # 2. Joining dates, holidays, approved leaves and permissions - one query each
+    joining_dates = dict(db.session.query(User.id, User.joining_date).filter(User.id.in_(day_user_ids)).all())
+    
+    paid_holidays = PaidHoliday.query.filter(
+        or_(
+            and_(PaidHoliday.holiday_type == 'day',
+                 PaidHoliday.start_date >= start_date,
+                 PaidHoliday.start_date <= end_date),
+            and_(PaidHoliday.holiday_type == 'range',
+                 PaidHoliday.start_date <= end_date,
+                 PaidHoliday.end_date >= start_date)
+        )
+    ).order_by(PaidHoliday.id).all()
+    
+    leaves_by_user = defaultdict(list)
+    for leave in LeaveRequest.query.options(joinedload(LeaveRequest.leave_type)).filter(
+        LeaveRequest.user_id.in_(day_user_ids),
+        LeaveRequest.start_date <= end_date,
+        LeaveRequest.end_date >= start_date,
+        LeaveRequest.status == 'approved'
+    ).order_by(LeaveRequest.id).all():
+        leaves_by_user[leave.user_id].append(leave)
+    
+    permissions_by_day = {}
+    for permission in PermissionRequest.query.filter(
+        PermissionRequest.user_id.in_(day_user_ids),
+        PermissionRequest.start_time.between(start_datetime, end_datetime),
+        PermissionRequest.status == 'approved'
+    ).order_by(PermissionRequest.id).all():
+        permissions_by_day.setdefault((permission.user_id, permission.start_time.date()), permission)
+    
+    holiday_by_date = {}
+    def holiday_for(day):
+        if day not in holiday_by_date:
+            holiday_by_date[day] = next((
+                h for h in paid_holidays
+                if (h.holiday_type == 'day' and h.start_date == day)
+                or (h.holiday_type == 'range' and h.start_date <= day and h.end_date and h.end_date >= day)
+            ), None)
+        return holiday_by_date[day]
+    
+    # 3. Compute every day in memory
+    conditional_fields = ('leave_request_id', 'leave_type_id', 'leave_type_name',
+                          'paid_holiday_id', 'is_paid_holiday', 'holiday_name')
+    table_columns = set(DailyAttendance.__table__.columns.keys())
+    rows = []
+    for (user_id, day), raw_logs in logs_by_day.items():
+        joining_date = joining_dates.get(user_id)
+        if joining_date and day < joining_date:
+            # If the attendance date is before the user's joining date, ignore it
+            continue
+        
+        daily_logs = deduplicate_attendance_logs(raw_logs)
+        if not daily_logs:
+            continue
+        
+        # Maintain scan_order/is_extra_scan on the logs, touching only rows that change
+        for i, log in enumerate(daily_logs):
+            if log.scan_order != i + 1:
+                log.scan_order = i + 1
+            if log.is_extra_scan != ((i + 1) > 2):
+                log.is_extra_scan = (i + 1) > 2
+        
+        leave_request = next((
+            leave for leave in leaves_by_user.get(user_id, [])
+            if leave.start_date <= day <= leave.end_date
+        ), None)
+        values = compute_daily_attendance_values(
+            daily_logs,
+            paid_holiday=holiday_for(day),
+            leave_request=leave_request,
+            permission_request=permissions_by_day.get((user_id, day))
+        )
+        row = {field: None for field in conditional_fields}
+        row['is_paid_holiday'] = False
+        # permission_request_id is not a DailyAttendance column, so it is never persisted
+        row.update({field: value for field, value in values.items() if field in table_columns})
+        row.update({'user_id': user_id, 'date': day})
+        if replace:
+            row.update({'is_day_off': False, 'is_late': False})
+        rows.append(row)
+    
+    db.session.flush()  # Write scan_order/is_extra_scan changes
+    
+    # 4. Bulk upsert
+    table = DailyAttendance.__table__
+    insert = _dialect_insert()
+    batch_size = 1000
+    for i in range(0, len(rows), batch_size):
+        stmt = insert(table).values(rows[i:i + batch_size])
+        excluded = stmt.excluded
+        set_values = {
+            field: getattr(excluded, field)
+            for field in ('first_check_in', 'last_check_out', 'total_working_hours', 'total_breaks',
+                          'entry_count', 'status', 'status_reason', 'is_incomplete_day')
+        }
+        set_values['updated_at'] = datetime.utcnow()
+        if replace:
+            for field in conditional_fields + ('is_day_off', 'is_late'):
+                set_values[field] = getattr(excluded, field)
+        else:
+            # Same as process_daily_attendance: links are only set when the record exists, never cleared
+            set_values.update({
+                'leave_request_id': func.coalesce(excluded.leave_request_id, table.c.leave_request_id),
+                'leave_type_id': case((excluded.leave_request_id.isnot(None), excluded.leave_type_id), else_=table.c.leave_type_id),
+                'leave_type_name': func.coalesce(excluded.leave_type_name, table.c.leave_type_name),
+                'paid_holiday_id': func.coalesce(excluded.paid_holiday_id, table.c.paid_holiday_id),
+                'is_paid_holiday': case((excluded.paid_holiday_id.isnot(None), excluded.is_paid_holiday), else_=table.c.is_paid_holiday),
+                'holiday_name': case((excluded.paid_holiday_id.isnot(None), excluded.holiday_name), else_=table.c.holiday_name),
+            })
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['user_id', 'date'], set_=set_values))
+    
+    # The bulk upsert bypasses the ORM, so queue the monthly summaries explicitly
+    from report_helpers.monthly_summary import mark_monthly_summary_dirty
+    mark_monthly_summary_dirty((row['user_id'], row['date']) for row in rows)
+    
+    if keys is not None and replace:
+        clear_days_without_logs(set(keys) - {(row['user_id'], row['date']) for row in rows})
+    
+    logging.info(f'Rolled up {len(rows)} daily attendance records for {start_date} to {end_date}')
+    return len(rows)
+
+def clear_days_without_logs(keys):
+    """Undo what attendance logs put in the DailyAttendance rows of (user_id, date) days that no
+    longer produce a row.
+
+    Rows built from logs alone are deleted. Rows that also carry a leave or paid holiday keep it
+    and go back to what the leave and holiday code creates for a day without punches. Rows that
+    never came from logs (entry_count 0) are left alone. Does not commit. Returns the number of
+    rows deleted or reset.
+    """
+    keys = list(keys)
+    if not keys:
+        return 0
+    
+    from_logs = and_(
+        tuple_(DailyAttendance.user_id, DailyAttendance.date).in_(keys),
+        DailyAttendance.entry_count > 0
+    )
+    linked = or_(DailyAttendance.leave_request_id.isnot(None), DailyAttendance.paid_holiday_id.isnot(None))
+    on_leave = DailyAttendance.leave_request_id.isnot(None)
+    deleted = DailyAttendance.query.filter(from_logs, ~linked).delete(synchronize_session=False)
+    reset = DailyAttendance.query.filter(from_logs, linked).update({
+        'first_check_in': None,
+        'last_check_out': None,
+        'total_working_hours': 0,
+        'total_breaks': 0,
+        'entry_count': 0,
+        'is_incomplete_day': False,
+        'status': case((on_leave, 'leave'), else_='paid_holiday'),
+        'status_reason': case((on_leave, null()), else_=literal('Paid Leave - ') + DailyAttendance.holiday_name),
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    
+    # Bulk statements bypass the ORM, so queue the monthly summaries explicitly
+    from report_helpers.monthly_summary import mark_monthly_summary_dirty
+    mark_monthly_summary_dirty(keys)
+    
+    if deleted or reset:
+        logging.info(f'Cleared {deleted} daily attendance records without logs and reset {reset} leave/holiday days')
+    return deleted + reset
+
+def mark_attendance_dirty(pairs):
+    """Queue (user_id, date) pairs for recompute by recompute_dirty_attendance.
+
+    Re-marking an already queued day just bumps marked_at. Does not commit.
+    """
+    from models import AttendanceDirtyDay
+    
+    marked_at = datetime.utcnow()
+    rows = [{'user_id': user_id, 'date': day, 'marked_at': marked_at} for user_id, day in set(pairs)]
+    if not rows:
+        return 0
+    
+    insert = _dialect_insert()
+    batch_size = 1000
+    for i in range(0, len(rows), batch_size):
+        stmt = insert(AttendanceDirtyDay.__table__).values(rows[i:i + batch_size])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id', 'date'],
+            set_={'marked_at': stmt.excluded.marked_at}
+        ))
+    return len(rows)
+
+def mark_attendance_range_dirty(start_date, end_date, user_ids=None):
+    """Mark every day in the range that has attendance logs dirty, e.g. after a leave or holiday change.
+
+    Days without logs are not rolled up anyway, so they are not queued. Does not commit.
+    """
+    start_datetime = datetime.combine(start_date, datetime.min.time())
+    end_datetime = datetime.combine(end_date, datetime.max.time())
+    query = db.session.query(AttendanceLog.user_id, AttendanceLog.timestamp).filter(
+        AttendanceLog.timestamp.between(start_datetime, end_datetime)
+    )
+    if user_ids is not None:
+        query = query.filter(AttendanceLog.user_id.in_(list(user_ids)))
+    return mark_attendance_dirty((user_id, timestamp.date()) for user_id, timestamp in query.all())
+
+# Dirty days at most this many days apart are rolled up together
+DIRTY_DAY_GROUP_GAP = 7
+
+def group_dirty_days(keys, max_gap=DIRTY_DAY_GROUP_GAP):
+    """Split (user_id, date) keys into runs of nearby dates, so a rollup never loads the logs of
+    the whole span between an old backlog day and today. Returns a list of (start, end, keys).
+    """
+    groups = []
+    for user_id, day in sorted(keys, key=lambda key: key[1]):
+        if groups and (day - groups[-1][1]).days <= max_gap:
+            groups[-1][1] = day
+            groups[-1][2].add((user_id, day))
+        else:
+            groups.append([day, day, {(user_id, day)}])
+    return [tuple(group) for group in groups]
+
+def recompute_dirty_attendance(only=None):
+    """Recompute DailyAttendance for every queued dirty day and clear the queue.
+
+    Queued days are rolled up in runs of nearby dates, each for the users dirty in that run.
+    Days re-marked while the recompute ran keep their entry and are picked up next time.
+    only: optional (user_id, date) pairs; just those queued days are recomputed and the rest
+    of the queue is left for the periodic drain.
+    Commits. Returns the number of DailyAttendance rows written.
+    """
+    from models import AttendanceDirtyDay
+    
+    started_at = datetime.utcnow()
+    dirty_query = db.session.query(AttendanceDirtyDay.user_id, AttendanceDirtyDay.date)
+    if only is not None:
+        only = list(set(only))
+        if not only:
+            return 0
+        dirty_query = dirty_query.filter(tuple_(AttendanceDirtyDay.user_id, AttendanceDirtyDay.date).in_(only))
+    dirty_days = dirty_query.all()
+    if not dirty_days:
+        return 0
+    
+    keys = {(user_id, day) for user_id, day in dirty_days}
+    written = 0
+    for start_date, end_date, group_keys in group_dirty_days(keys):
+        written += rollup_daily_attendance(
+            start_date,
+            end_date,
+            user_ids={user_id for user_id, _ in group_keys},
+            replace=True,
+            keys=group_keys
+        )
+    AttendanceDirtyDay.query.filter(
+        tuple_(AttendanceDirtyDay.user_id, AttendanceDirtyDay.date).in_(list(keys)),
+        AttendanceDirtyDay.marked_at <= started_at
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    logging.info(f'Recomputed {written} daily attendance records for {len(keys)} dirty days')
+    return written
 
 def process_permission_requests_for_date(attendance_date):
     """Process permission requests for a given date and create daily attendance records"""
@@ -792,12 +1122,9 @@ def test_device_connection():
         # 3. ZK Connection Test
         logging.info(f'Attempting ZK connection to {device_ip}:{device_port}...')
         logging.info('Testing ZK connection...')
-        zk = ZK(device_ip, port=device_port, timeout=30)
-        conn = None
-        
         try:
-            conn = zk.connect()
-            if conn:
+            # An explicit test ignores the reconnect backoff
+            with device_sessions.borrow(device_ip, device_port, retry_now=True) as conn:
                 diagnostics['zk'] = True
                 diagnostics['details'].append('ZK connection successful')
                 
@@ -813,15 +1140,9 @@ def test_device_connection():
                     diagnostics['details'].append(f'Device info: {json.dumps(info)}')
                 except Exception as e:
                     diagnostics['details'].append(f'Error getting device info: {str(e)}')
-            else:
-                diagnostics['details'].append('ZK connection failed')
-                logging.error(f'ZK connection failed for {device_ip}:{device_port}')
         except Exception as e:
             diagnostics['details'].append(f'ZK error: {str(e)}')
             logging.error(f'ZK connection error for {device_ip}:{device_port}: {str(e)}')
-        finally:
-            if conn:
-                conn.disconnect()
         
         return diagnostics['zk'], diagnostics
         
@@ -855,70 +1176,237 @@ def log_fingerprint_failure(error_type, error_message, device_ip, employee_id=No
             db.session.rollback()
         return None
 
-def sync_attendance_from_device(device):
-    """Sync attendance data from a specific device"""
-    conn = None
+def _dialect_insert():
+    """Return the INSERT construct supporting ON CONFLICT for the current database"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def upsert_attendance_logs(rows):
+    """Insert-or-update AttendanceLog rows in one statement, keyed on (user_id, timestamp).
+
+    Existing rows are only rewritten when device/scan type actually changed.
+    Does not commit. Returns a dict with 'inserted', 'updated' and 'unchanged' counts,
+    'touched', the (user_id, date) pairs of the inserted/updated rows, and 'results', which maps
+    the (user_id, timestamp) key of each inserted/updated row to 'inserted' or 'updated'.
+    """
+    # ON CONFLICT can't touch the same row twice in one statement - keep the last occurrence per key
+    rows = list({(row['user_id'], row['timestamp']): row for row in rows}.values())
+    if not rows:
+        return {'inserted': 0, 'updated': 0, 'unchanged': 0, 'touched': set(), 'results': {}}
+    
+    table = AttendanceLog.__table__
+    dialect = db.session.get_bind().dialect.name
+    insert = _dialect_insert()
+    
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'timestamp'],
+        set_={
+            'device_id': stmt.excluded.device_id,
+            'device_ip': stmt.excluded.device_ip,
+            'scan_type': stmt.excluded.scan_type
+        },
+        where=or_(
+            table.c.device_id.is_distinct_from(stmt.excluded.device_id),
+            table.c.device_ip.is_distinct_from(stmt.excluded.device_ip),
+            table.c.scan_type.is_distinct_from(stmt.excluded.scan_type)
+        )
+    )
+    
+    if dialect == 'postgresql':
+        # xmax = 0 only for freshly inserted tuples; untouched conflicting rows return nothing
+        returned = db.session.execute(stmt.returning(
+            table.c.user_id, table.c.timestamp, literal_column('(xmax = 0)').label('inserted')
+        )).all()
+        results = {(row.user_id, row.timestamp): 'inserted' if row.inserted else 'updated' for row in returned}
+    else:
+        existing = set(db.session.query(AttendanceLog.user_id, AttendanceLog.timestamp).filter(
+            tuple_(AttendanceLog.user_id, AttendanceLog.timestamp).in_([(r['user_id'], r['timestamp']) for r in rows])
+        ).all())
+        returned = db.session.execute(stmt.returning(table.c.user_id, table.c.timestamp)).all()
+        results = {(row.user_id, row.timestamp): 'updated' if (row.user_id, row.timestamp) in existing else 'inserted'
+                   for row in returned}
+    inserted = sum(1 for status in results.values() if status == 'inserted')
+    updated = len(results) - inserted
+    
+    return {
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': len(rows) - inserted - updated,
+        'touched': {(row.user_id, row.timestamp.date()) for row in returned},
+        'results': results
+    }
+
+def device_record_key(record):
+    """Identity of a record in a device's attendance log: fingerprint number and punch time"""
+    return f'{record.user_id}|{record.timestamp.isoformat()}'
+
+def update_device_sync_cursor(device, newest_timestamp, record_count, last_record_key=None, full_sync=False):
+    """Advance the device's incremental sync cursor after a successful ingest"""
+    if newest_timestamp and (not device.last_sync_timestamp or newest_timestamp > device.last_sync_timestamp):
+        device.last_sync_timestamp = newest_timestamp
+    device.last_sync_record_count = record_count
+    device.last_sync_record_key = last_record_key
+    if full_sync:
+        device.last_full_sync_at = datetime.now()
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f'Error saving sync cursor for device {device.get_display_name()}: {str(e)}')
+
+def device_fetch_info(device):
+    """Snapshot the device fields the network fetch stage needs, so it can run without DB access"""
+    return {
+        'id': device.id,
+        'name': device.get_display_name(),
+        'ip': device.device_ip,
+        'port': device.device_port,
+        'last_sync_timestamp': device.last_sync_timestamp,
+        'last_sync_record_count': device.last_sync_record_count
+    }
+
+def fetch_device_attendance(device_info, full_sync=False):
+    """Network stage of a device sync: download attendance records over the device's session.
+
+    Touches no database state so it can run in a worker thread. Returns a dict with
+    'status', 'records' (None when the size probe shows nothing new) and 'fetch_seconds'.
+    """
+    name = device_info['name']
+    started = time.monotonic()
+    
+    def result(**kwargs):
+        kwargs['fetch_seconds'] = round(time.monotonic() - started, 3)
+        return kwargs
+    
     try:
-        logging.info(f'Syncing data from device {device.get_display_name()} ({device.device_ip}:{device.device_port})')
+        logging.info(f'Syncing data from device {name} ({device_info["ip"]}:{device_info["port"]})')
+        with device_sessions.borrow(device_info['ip'], device_info['port']) as conn:
+            # Cheap size probe: if the device holds exactly as many records as last time,
+            # nothing new has been punched and the full log download can be skipped. A full
+            # device may be overwriting its oldest records at a constant count, so it is
+            # always downloaded.
+            if not full_sync and device_info['last_sync_record_count'] is not None and device_info['last_sync_timestamp']:
+                try:
+                    conn.read_sizes()
+                    at_capacity = bool(conn.rec_cap) and conn.records >= conn.rec_cap
+                    if conn.records == device_info['last_sync_record_count'] and not at_capacity:
+                        logging.info(f'No new records on {name} ({conn.records} stored, cursor {device_info["last_sync_timestamp"]})')
+                        return result(status='success', records=None)
+                except Exception as size_error:
+                    logging.warning(f'Could not read record count from {name}: {str(size_error)}')
+            
+            logging.info(f'Fetching attendance records from {name}...')
+            attendance_records = conn.get_attendance()
         
-        # Connect to device with increased timeout protection (30 seconds for large datasets)
-        zk = ZK(device.device_ip, port=device.device_port, timeout=30)
-        try:
-            conn = zk.connect()
-        except Exception as conn_error:
-            error_msg = f'Connection error to device {device.get_display_name()}: {str(conn_error)}'
-            logging.error(error_msg)
-            return {
-                'status': 'error',
-                'message': error_msg,
-                'records_added': 0,
-                'records_updated': 0
-            }
+        total_records = len(attendance_records) if attendance_records else 0
+        logging.info(f'Retrieved {total_records} records from {name}')
         
-        if not conn:
-            error_msg = f'Could not connect to device {device.get_display_name()}'
-            logging.error(error_msg)
-            return {
-                'status': 'error',
-                'message': error_msg,
-                'records_added': 0,
-                'records_updated': 0
-            }
+        # Log date range to verify we're getting all available data
+        if attendance_records and total_records > 0:
+            timestamps = [r.timestamp for r in attendance_records]
+            oldest = min(timestamps)
+            newest = max(timestamps)
+            days_span = (newest - oldest).days
+            logging.info(f'Date range in device records: {oldest.strftime("%Y-%m-%d %H:%M:%S")} to {newest.strftime("%Y-%m-%d %H:%M:%S")} ({days_span} days)')
         
-        # Get attendance records from device with error handling and timeout protection
-        try:
-            logging.info(f'Fetching attendance records from {device.get_display_name()}...')
-            attendance_records = conn.get_attendance()
-            total_records = len(attendance_records) if attendance_records else 0
-            logging.info(f'Retrieved {total_records} records from {device.get_display_name()}')
-            
-            # Log date range to verify we're getting all available data
-            if attendance_records and total_records > 0:
-                timestamps = [r.timestamp for r in attendance_records]
-                oldest = min(timestamps)
-                newest = max(timestamps)
-                days_span = (newest - oldest).days
-                logging.info(f'Date range in device records: {oldest.strftime("%Y-%m-%d %H:%M:%S")} to {newest.strftime("%Y-%m-%d %H:%M:%S")} ({days_span} days)')
-        except Exception as get_error:
-            error_msg = f'Error retrieving attendance from device {device.get_display_name()}: {str(get_error)}'
-            logging.error(error_msg, exc_info=True)
-            return {
-                'status': 'error',
-                'message': error_msg,
-                'records_added': 0,
-                'records_updated': 0
-            }
+        return result(status='success', records=attendance_records or [])
+    
+    except DeviceUnavailable as e:
+        error_msg = str(e)
+        logging.error(error_msg)
+        return result(status='error', message=error_msg, records=None)
+    except Exception as e:
+        error_msg = f'Error retrieving attendance from device {name}: {str(e)}'
+        logging.error(error_msg, exc_info=True)
+        return result(status='error', message=error_msg, records=None)
+
+def incremental_sync_position(device, records):
+    """Index of the first record on the device not covered by the sync cursor, or None when
+    the already-ingested part of the log can't be located (a full scan is needed)"""
+    if device.last_sync_record_key:
+        # Search from the end: the last ingested record is usually near the tail
+        for index in range(len(records) - 1, -1, -1):
+            if device_record_key(records[index]) == device.last_sync_record_key:
+                return index + 1
+        return None
+    # Cursors saved before record keys existed only know the count
+    if device.last_sync_record_count is not None and len(records) < device.last_sync_record_count:
+        return None
+    return device.last_sync_record_count or 0
+
+def ingest_device_attendance(device, fetched, full_sync=False, check_lease=None):
+    """Database stage of a device sync: merge fetched records into attendance_logs.
+
+    Must run on the thread that owns the app context/session; callers serialize it.
+    check_lease, when given, is called before every commit and raises SyncLeaseLost once the
+    sync lease is gone; the uncommitted batch is rolled back and the error propagates.
+    """
+    from connection_manager import SyncLeaseLost
+    if fetched['status'] != 'success':
+        return {
+            'status': 'error',
+            'message': fetched.get('message'),
+            'records_added': 0,
+            'records_updated': 0
+        }
+    
+    if fetched['records'] is None:
+        return {
+            'status': 'success',
+            'message': f'No new records found on {device.get_display_name()}',
+            'records_added': 0,
+            'records_updated': 0,
+            'records_unchanged': 0,
+            'unmatched': 0,
+            'total_fetched': 0,
+            'total_processed': 0,
+            'sync_mode': 'incremental'
+        }
+    
+    attendance_records = fetched['records']
+    try:
         if not attendance_records:
+            if check_lease:
+                check_lease()
+            update_device_sync_cursor(device, None, 0, full_sync=full_sync)
             return {
                 'status': 'success',
                 'message': f'No new records found on {device.get_display_name()}',
-                'records_added': 0
+                'records_added': 0,
+                'sync_mode': 'full' if full_sync else 'incremental'
             }
         
+        device_record_count = len(attendance_records)
+        device_newest_timestamp = max(r.timestamp for r in attendance_records)
+        device_last_key = device_record_key(attendance_records[-1])
+        
+        # Incremental mode: the device appends records in punch order, so everything after the
+        # last record we ingested is new - including punches stamped earlier by a device whose
+        # clock went back. Records at or after the cursor timestamp are taken as well, for
+        # punches in the cursor's own second; the upsert skips the ones already stored. When the
+        # last ingested record is gone (log cleared or wrapped past it), fall back to a full scan.
+        sync_mode = 'full' if full_sync else 'incremental'
+        cursor = device.last_sync_timestamp
+        if not full_sync and cursor:
+            position = incremental_sync_position(device, attendance_records)
+            if position is None:
+                logging.info(f'Last ingested record is no longer on {device.get_display_name()} ({device.last_sync_record_count} -> {device_record_count} records), running full scan')
+                sync_mode = 'full'
+            else:
+                attendance_records = [r for index, r in enumerate(attendance_records)
+                                      if index >= position or r.timestamp >= cursor]
+                logging.info(f'{len(attendance_records)} of {device_record_count} records on {device.get_display_name()} are past cursor {cursor}')
+        
         # Process records in batches for better performance
         records_added = 0
         records_updated = 0
+        records_unchanged = 0
         unmatched_records = 0
+        batch_failed = False
         batch_size = 500  # Increased batch size for better performance
         
         total_records = len(attendance_records) if attendance_records else 0
@@ -937,8 +1425,32 @@ def sync_attendance_from_device(device):
             )
             user_cache = {str(u.fingerprint_number): u for u in cached_users if u.fingerprint_number}
         
-        # Pre-fetch existing records in batches to reduce queries
         new_records = []
+        # (user_id, day) pairs with committed new or changed punches, announced on the live stream
+        touched_days = set()
+        
+        def flush_batch(batch):
+            """Upsert one batch; returns False if it could not be committed"""
+            nonlocal records_added, records_updated, records_unchanged
+            try:
+                counts = upsert_attendance_logs(batch)
+                # Queue the touched days in the same transaction so no punch is left unprocessed
+                mark_attendance_dirty(counts['touched'])
+                if check_lease:
+                    check_lease()
+                db.session.commit()
+            except SyncLeaseLost:
+                db.session.rollback()
+                raise
+            except Exception as commit_error:
+                db.session.rollback()
+                logging.error(f'Error committing batch: {str(commit_error)}')
+                return False
+            records_added += counts['inserted']
+            records_updated += counts['updated']
+            records_unchanged += counts['unchanged']
+            touched_days.update(counts['touched'])
+            return True
         
         for idx, record in enumerate(attendance_records):
             # Find user from cache
@@ -964,105 +1476,45 @@ def sync_attendance_from_device(device):
                 'device_id': device.id
             })
             
-            # Commit in batches
+            # Upsert in batches - one round trip per batch
             if len(new_records) >= batch_size:
-                # Batch check for existing records
-                timestamps = [r['timestamp'] for r in new_records]
-                user_ids = list(set(r['user_id'] for r in new_records))
-                
-                existing_records = safe_db_query(
-                    lambda: AttendanceLog.query.filter(
-                        AttendanceLog.user_id.in_(user_ids),
-                        AttendanceLog.timestamp.in_(timestamps)
-                    ).all(),
-                    default=[]
-                )
-                
-                existing_map = {(r.user_id, r.timestamp): r for r in existing_records}
-                
-                # Process batch
-                for rec_data in new_records:
-                    key = (rec_data['user_id'], rec_data['timestamp'])
-                    existing = existing_map.get(key)
-                    
-                    if existing:
-                        if existing.device_id != device.id:
-                            existing.device_ip = rec_data['device_ip']
-                            existing.device_id = rec_data['device_id']
-                            records_updated += 1
-                        else:
-                            existing.scan_type = rec_data['scan_type']
-                            records_updated += 1
-                    else:
-                        attendance_log = AttendanceLog(**rec_data)
-                        db.session.add(attendance_log)
-                        records_added += 1
-                
-                # Commit batch
-                try:
-                    db.session.commit()
-                    # Log progress periodically
-                    if (idx + 1) % progress_interval == 0 or (idx + 1) == total_records:
-                        logging.info(f'Progress: {idx + 1}/{total_records} records processed ({records_added} added, {records_updated} updated)')
-                except Exception as commit_error:
-                    db.session.rollback()
-                    logging.error(f'Error committing batch: {str(commit_error)}')
-                    # Continue with next batch
-                
+                if not flush_batch(new_records):
+                    batch_failed = True  # Continue with next batch
+                elif (idx + 1) % progress_interval == 0 or (idx + 1) == total_records:
+                    logging.info(f'Progress: {idx + 1}/{total_records} records processed ({records_added} added, {records_updated} updated, {records_unchanged} unchanged)')
                 new_records = []
         
         # Process remaining records
         if new_records:
-            timestamps = [r['timestamp'] for r in new_records]
-            user_ids = list(set(r['user_id'] for r in new_records))
-            
-            existing_records = safe_db_query(
-                lambda: AttendanceLog.query.filter(
-                    AttendanceLog.user_id.in_(user_ids),
-                    AttendanceLog.timestamp.in_(timestamps)
-                ).all(),
-                default=[]
-            )
-            
-            existing_map = {(r.user_id, r.timestamp): r for r in existing_records}
-            
-            for rec_data in new_records:
-                key = (rec_data['user_id'], rec_data['timestamp'])
-                existing = existing_map.get(key)
-                
-                if existing:
-                    if existing.device_id != device.id:
-                        existing.device_ip = rec_data['device_ip']
-                        existing.device_id = rec_data['device_id']
-                        records_updated += 1
-                    else:
-                        existing.scan_type = rec_data['scan_type']
-                        records_updated += 1
-                else:
-                    attendance_log = AttendanceLog(**rec_data)
-                    db.session.add(attendance_log)
-                    records_added += 1
-        
-        # Commit remaining changes
-        if new_records:
-            try:
-                db.session.commit()
-                logging.info(f'Committed final batch: {total_records} records processed')
-            except Exception as commit_error:
-                db.session.rollback()
-                error_msg = f'Error committing final batch: {str(commit_error)}'
+            if not flush_batch(new_records):
+                error_msg = f'Error committing final batch for {device.get_display_name()}'
                 logging.error(error_msg)
                 raise Exception(error_msg)
+            logging.info(f'Committed final batch: {total_records} records processed')
+        
+        # Only move the cursor forward when every batch landed, so a failed batch is retried next cycle
+        if batch_failed:
+            logging.warning(f'Not advancing sync cursor for {device.get_display_name()} - a batch failed to commit')
+        else:
+            if check_lease:
+                check_lease()
+            update_device_sync_cursor(device, device_newest_timestamp, device_record_count, device_last_key,
+                                      full_sync=(sync_mode == 'full'))
+        
+        if touched_days:
+            from live_updates import publish
+            publish('attendance', touched_days)
         
         # Calculate summary statistics
         total_fetched = total_records
-        total_processed = records_added + records_updated
+        total_processed = records_added + records_updated + records_unchanged
         total_skipped = unmatched_records
         
         logging.info(f'Sync completed for {device.get_display_name()}:')
         logging.info(f'  Total fetched from device: {total_fetched}')
         logging.info(f'  Records added: {records_added}')
         logging.info(f'  Records updated: {records_updated}')
+        logging.info(f'  Records unchanged: {records_unchanged}')
         logging.info(f'  Total processed: {total_processed}')
         logging.info(f'  Unmatched (skipped): {unmatched_records}')
         
@@ -1075,11 +1527,16 @@ def sync_attendance_from_device(device):
             'message': f'Synced {records_added} new records from {device.get_display_name()} (fetched {total_fetched}, processed {total_processed}, unmatched {unmatched_records})',
             'records_added': records_added,
             'records_updated': records_updated,
+            'records_unchanged': records_unchanged,
             'unmatched': unmatched_records,
             'total_fetched': total_fetched,
-            'total_processed': total_processed
+            'total_processed': total_processed,
+            'sync_mode': sync_mode
         }
         
+    except SyncLeaseLost:
+        db.session.rollback()
+        raise
     except Exception as e:
         logging.error(f'Error syncing device {device.get_display_name()}: {str(e)}')
         db.session.rollback()
@@ -1088,14 +1545,49 @@ def sync_attendance_from_device(device):
             'message': f'Error syncing {device.get_display_name()}: {str(e)}',
             'records_added': 0
         }
-    finally:
-        # Always disconnect from device, even if there was an error
-        if conn:
-            try:
-                conn.disconnect()
-                logging.info(f'Disconnected from device {device.get_display_name()}')
-            except Exception as disconnect_error:
-                logging.warning(f'Error disconnecting from device {device.get_display_name()}: {str(disconnect_error)}')
+
+def sync_attendance_from_device(device, full_sync=False):
+    """Sync attendance data from a specific device.
+
+    By default only records newer than the device's sync cursor are ingested.
+    Pass full_sync=True to re-scan the device's whole history (reconciliation).
+    """
+    fetched = fetch_device_attendance(device_fetch_info(device), full_sync=full_sync)
+    ingest_started = time.monotonic()
+    result = ingest_device_attendance(device, fetched, full_sync=full_sync)
+    result['fetch_seconds'] = fetched['fetch_seconds']
+    result['ingest_seconds'] = round(time.monotonic() - ingest_started, 3)
+    return result
+
+def ingest_live_punch(device, record):
+    """Store one punch pushed by the device's live capture listener (live_capture.py).
+
+    Leaves the sync cursor alone, so the periodic sync still picks up anything the listener
+    missed while it was down. Commits, recomputes the punch's day and announces it on the
+    live stream. Returns 'inserted', 'updated', 'unchanged' or 'unmatched'.
+    """
+    user = find_user_for_device_record(device, record.user_id)
+    if not user:
+        logging.warning(f'No user found for live punch by fingerprint number {record.user_id} on device {device.get_display_name()}')
+        return 'unmatched'
+    
+    counts = upsert_attendance_logs([{
+        'user_id': user.id,
+        'timestamp': record.timestamp,
+        'scan_type': determine_attendance_type(record.timestamp),
+        'device_ip': device.device_ip,
+        'device_id': device.id
+    }])
+    mark_attendance_dirty(counts['touched'])
+    db.session.commit()
+    if not counts['touched']:
+        return 'unchanged'
+    
+    # Only this punch's day: the rest of the queue is the periodic sync's job
+    recompute_dirty_attendance(only=counts['touched'])
+    from live_updates import publish
+    publish('attendance', counts['touched'])
+    return 'inserted' if counts['inserted'] else 'updated'
 
 def find_user_for_device_record(device, device_user_id):
     """Find system user for a device record using fingerprint number"""
@@ -1148,14 +1640,21 @@ def find_user_for_device_record(device, device_user_id):
 
 
 def sync_attendance_task(full_sync=False):
-    """Sync attendance data from all active fingerprint devices"""
+    """Sync attendance data from all active fingerprint devices.
+
+    Runs incrementally from each device's sync cursor unless full_sync=True,
+    which re-scans every device's full history (reconciliation mode).
+    """
     from flask import current_app
-    from connection_manager import safe_sync_operation, managed_db_session
+    from connection_manager import safe_sync_operation, check_sync_lease, SyncLeaseLost
     import uuid
     
     # Generate unique operation ID
     operation_id = str(uuid.uuid4())
     
+    def check_lease():
+        check_sync_lease(operation_id)
+    
     @safe_sync_operation(operation_id)
     def _sync_attendance():
         try:
@@ -1175,25 +1674,111 @@ def sync_attendance_task(full_sync=False):
                     'message': error_msg
                 }
             
+            # With live capture on, devices with a running listener are only polled to
+            # reconcile, once per DEVICE_LIVE_CAPTURE_RECONCILE_SECONDS
+            live_capture_enabled = current_app.config.get('DEVICE_LIVE_CAPTURE', False)
+            if live_capture_enabled and not full_sync:
+                from live_capture import devices_due_for_sync
+                active_devices = devices_due_for_sync(
+                    active_devices, current_app.config.get('DEVICE_LIVE_CAPTURE_RECONCILE_SECONDS', 900)
+                )
+                if not active_devices:
+                    # Nothing to poll, but days dirtied by request edits or agent uploads still
+                    # have to be recomputed
+                    days_recomputed = 0
+                    check_lease()
+                    try:
+                        days_recomputed = recompute_dirty_attendance()
+                    except Exception as recompute_error:
+                        db.session.rollback()
+                        logging.error(f'Error recomputing dirty attendance days: {str(recompute_error)}')
+                    return {
+                        'status': 'success',
+                        'message': 'All devices are live-captured; next reconciliation is not due yet',
+                        'records_added': 0,
+                        'records_updated': 0,
+                        'unmatched': 0,
+                        'days_recomputed': days_recomputed,
+                        'device_results': [],
+                        'devices_synced': []
+                    }
+            
             # Sync from all active devices
             total_records_added = 0
             total_records_updated = 0
             total_unmatched = 0
             device_results = []
+            synced_device_ids = []
+            
+            # Fetch from all devices in parallel (network only) and merge each result
+            # as it arrives on this thread, so all DB work stays on one session
+            max_workers = max(1, min(len(active_devices), current_app.config.get('DEVICE_SYNC_MAX_WORKERS', 4)))
+            deadline_seconds = current_app.config.get('DEVICE_SYNC_DEADLINE', 90)
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='device-fetch')
+            futures = {
+                executor.submit(fetch_device_attendance, device_fetch_info(device), full_sync): device
+                for device in active_devices
+            }
             
-            for device in active_devices:
-                logging.info(f'Syncing from device: {device.get_display_name()}')
-                result = sync_attendance_from_device(device)
+            def merge_device(device, fetched):
+                logging.info(f'Merging records from device: {device.get_display_name()}')
+                ingest_started = time.monotonic()
+                result = ingest_device_attendance(device, fetched, full_sync=full_sync, check_lease=check_lease)
+                result['fetch_seconds'] = fetched['fetch_seconds']
+                result['ingest_seconds'] = round(time.monotonic() - ingest_started, 3)
                 device_results.append({
                     'device_name': device.get_display_name(),
-                    'result': result
+                    'result': result,
+                    'fetch_seconds': result['fetch_seconds'],
+                    'ingest_seconds': result['ingest_seconds']
                 })
-                
+                if result['status'] == 'success':
+                    synced_device_ids.append(device.id)
+                return result
+            
+            results = []
+            pending = dict(futures)
+            try:
+                for future in as_completed(futures, timeout=deadline_seconds):
+                    results.append(merge_device(pending.pop(future), future.result()))
+            except FuturesTimeoutError:
+                logging.warning(f'Device fetch deadline of {deadline_seconds}s exceeded; continuing with the devices that responded')
+            finally:
+                # Don't wait for stragglers - their records are picked up next cycle
+                executor.shutdown(wait=False, cancel_futures=True)
+            
+            for future, device in pending.items():
+                if future.done() and not future.cancelled():
+                    fetched = future.result()
+                else:
+                    fetched = {
+                        'status': 'error',
+                        'message': f'Timed out fetching from {device.get_display_name()} after {deadline_seconds}s',
+                        'records': None,
+                        'fetch_seconds': deadline_seconds
+                    }
+                    logging.error(fetched['message'])
+                results.append(merge_device(device, fetched))
+            
+            for result in results:
                 if result['status'] == 'success':
                     total_records_added += result.get('records_added', 0)
                     total_records_updated += result.get('records_updated', 0)
                     total_unmatched += result.get('unmatched', 0)
             
+            check_lease()
+            if live_capture_enabled:
+                from live_capture import mark_reconciled
+                mark_reconciled(synced_device_ids)
+            
+            # Post-sync stage: recompute only the days touched by this (or an earlier) sync
+            days_recomputed = 0
+            try:
+                days_recomputed = recompute_dirty_attendance()
+            except Exception as recompute_error:
+                db.session.rollback()
+                logging.error(f'Error recomputing dirty attendance days: {str(recompute_error)}')
+            
             device_names = [device.get_display_name() for device in active_devices]
             return {
                 'status': 'success',
@@ -1201,10 +1786,20 @@ def sync_attendance_task(full_sync=False):
                 'records_added': total_records_added,
                 'records_updated': total_records_updated,
                 'unmatched': total_unmatched,
+                'days_recomputed': days_recomputed,
                 'device_results': device_results,
                 'devices_synced': device_names
             }
         
+        except SyncLeaseLost as e:
+            # Another worker may own the sync now: leave the rest (cursors, dirty days) to it
+            db.session.rollback()
+            error_msg = f'Sync stopped: {str(e)}'
+            logging.error(error_msg)
+            return {
+                'status': 'error',
+                'message': error_msg
+            }
         except Exception as e:
             error_msg = f'Error during sync: {str(e)}'
             logging.error(error_msg)
@@ -1422,7 +2017,7 @@ def manual_sync():
                 try:
                     # Use a signal or timeout wrapper if needed (for very long operations)
                     # For now, we rely on proper error handling and logging
-                    sync_results = sync_attendance_task(full_sync=True)
+                    sync_results = sync_attendance_task()
                     
                     # Log completion
                     if sync_results:
@@ -1678,7 +2273,7 @@ def index():
                                 logging.error(f'Error during cleanup on page load: {str(e)}')
                         
                         # Then run sync
-                        sync_attendance_task(full_sync=True)
+                        sync_attendance_task()
                 except Exception as e:
                     logging.error(f'Error auto-syncing data on page load: {str(e)}')
             
@@ -2435,16 +3030,142 @@ def index():
                           user_absent_days=user_absent_days)
 
 
-@attendance_bp.route('/export-daily-attendance')
-@login_required
-def export_daily_attendance():
-    """Export daily attendance data to Excel or PDF"""
+def iter_historical_attendance(users, start_date, end_date, log_user_id=None):
+    """Yield (date_key, date_data) for each day from start_date to end_date, one day at a time.
+
+    users are the rows to report on, already scoped to the viewer; log_user_id limits the logs read
+    to one user. Logs stream through a server-side cursor so only one day's logs are in memory.
+    Daily records, approved leaves and permissions and paid holidays for the whole range are
+    loaded once by a ReportPrefetch instead of per user and day.
+    """
+    from models import PaidHoliday
+    from report_helpers.report_calculations import ReportPrefetch
+    
+    query = AttendanceLog.query\
+        .filter(AttendanceLog.timestamp.between(datetime.combine(start_date, datetime.min.time()),
+                                                datetime.combine(end_date, datetime.max.time())))\
+        .join(User, AttendanceLog.user_id == User.id)
+    if log_user_id:
+        query = query.filter(AttendanceLog.user_id == log_user_id)
+    
+    # Stream logs oldest-first through a server-side cursor instead of loading the whole range
+    historical_logs = query.order_by(AttendanceLog.timestamp.asc())\
+        .execution_options(stream_results=True).yield_per(1000)
+    
+    prefetch = ReportPrefetch([user.id for user in users], start_date, end_date, include_logs=False)
+    # Paid holidays the daily records point at that still exist
+    holiday_ids = {
+        record.paid_holiday_id for user in users for record in prefetch.attendance_records(user.id)
+        if record.paid_holiday_id
+    }
+    existing_holiday_ids = {
+        holiday_id for (holiday_id,) in db.session.query(PaidHoliday.id).filter(PaidHoliday.id.in_(holiday_ids))
+    } if holiday_ids else set()
+    
+    log_days = groupby(historical_logs, key=lambda log: log.timestamp.date())
+    pending_day = next(log_days, None)
+    
+    date_obj = start_date
+    while date_obj <= end_date:
+        date_key = date_obj.strftime('%Y-%m-%d')
+        logs = []
+        if pending_day and pending_day[0] == date_obj:
+            # Newest first, matching the order the day's logs were processed in before
+            logs = list(pending_day[1])[::-1]
+            pending_day = next(log_days, None)
+        processed_historical_logs = process_attendance_logs(logs)
+        historical_weekday = date_obj.weekday()
+        is_historical_weekend = (historical_weekday == 4 or historical_weekday == 5)
+        
+        # Check if this date is a paid holiday
+        paid_holiday = prefetch.paid_holiday_for_day(date_obj)
+        
+        all_users = {}
+        
+        for user in users:
+            if user.joining_date and date_obj < user.joining_date:
+                all_users[user.id] = {
+                    'user': user,
+                    'check_in': None,
+                    'check_out': None,
+                    'duration': None,
+                    'status': 'Not Yet Joined'
+                }
+                continue
+            
+            daily_record = prefetch.attendance_record_for_day(user.id, date_obj)
+            
+            leave_request = prefetch.approved_leave_for_day(user.id, date_obj)
+            is_on_leave = leave_request is not None
+            
+            permission_request = prefetch.approved_permission_for_day(user.id, date_obj)
+            has_permission = permission_request is not None
+            
+            user_data = {
+                'user': user,
+                'check_in': None,
+                'check_out': None,
+                'duration': None,
+                'status': 'Absent'
+            }
+            
+            if user.id in processed_historical_logs:
+                user_data = processed_historical_logs[user.id].copy()
+                user_data['user'] = user
+                
+                if is_on_leave:
+                    user_data['status'] = 'Present'
+                    user_data['leave_request'] = leave_request
+                    if daily_record and daily_record.leave_type_name:
+                        user_data['leave_type_name'] = daily_record.leave_type_name
+                elif has_permission:
+                    user_data['status'] = 'Present'
+                    user_data['permission_request'] = permission_request
+                elif user_data['status'] == 'present':
+                    user_data['status'] = 'Present'
+            else:
+                if is_on_leave:
+                    user_data['status'] = daily_record.leave_type_name if daily_record and daily_record.leave_type_name else 'Leave Request'
+                    user_data['leave_request'] = leave_request
+                elif has_permission:
+                    user_data['status'] = 'Permission'
+                    user_data['permission_request'] = permission_request
+                elif daily_record and daily_record.status == 'paid_holiday' and daily_record.paid_holiday_id:
+                    # Check if paid holiday still exists
+                    if daily_record.paid_holiday_id in existing_holiday_ids:
+                        user_data['status'] = daily_record.holiday_name if daily_record.holiday_name else 'Paid Holiday'
+                        user_data['holiday_name'] = daily_record.holiday_name
+                    else:
+                        user_data['status'] = 'DayOff' if is_historical_weekend else 'Absent'
+                else:
+                    user_data['status'] = 'DayOff' if is_historical_weekend else 'Absent'
+            
+            all_users[user.id] = user_data
+        
+        # Sort users by name
+        sorted_users = {}
+        if all_users:
+            user_items = list(all_users.items())
+            user_items.sort(key=lambda x: (x[1]['user'].first_name, x[1]['user'].last_name))
+            sorted_users = {user_id: data for user_id, data in user_items}
+        
+        yield date_key, {
+            'attendance_data': sorted_users,
+            'date': date_obj,
+            'paid_holiday': paid_holiday.description if paid_holiday else None,
+            'is_paid_holiday': paid_holiday is not None
+        }
+        date_obj += timedelta(days=1)
+
+
+def build_daily_attendance_export(viewer, query_args):
+    """Export daily attendance data to Excel or PDF for viewer, from the export's query_args"""
     try:
         # Get parameters
-        start_date_str = request.args.get('start_date')
-        end_date_str = request.args.get('end_date')
-        employee_id = request.args.get('employee_id', type=int)
-        export_format = request.args.get('format', 'excel').lower()
+        start_date_str = query_args.get('start_date')
+        end_date_str = query_args.get('end_date')
+        employee_id = query_args.get('employee_id', type=int)
+        export_format = query_args.get('format', 'excel').lower()
         
         # Determine if viewing today or date range
         today = date.today()
@@ -2465,11 +3186,11 @@ def export_daily_attendance():
         is_today_view = (start_date == today and end_date == today)
         
         # Get data similar to index route
-        is_admin = current_user.is_authenticated and current_user.is_admin()
-        is_employee_viewing_own_data = current_user.role == 'employee'
+        is_admin = viewer.is_authenticated and viewer.is_admin()
+        is_employee_viewing_own_data = viewer.role == 'employee'
         
         # Get users based on role (similar to index route)
-        if current_user.role in ['admin', 'product_owner', 'director']:
+        if viewer.role in ['admin', 'product_owner', 'director']:
             user_query = User.query.filter_by(status='active').filter(
                 *get_fingerprint_filter(),
                 User.first_name != None,
@@ -2483,9 +3204,9 @@ def export_daily_attendance():
                 lambda: user_query.order_by(User.first_name.desc(), User.last_name.desc()).all(),
                 default=[]
             )
-        elif current_user.role == 'manager':
-            if current_user.department_id:
-                user_query = User.query.filter_by(status='active', department_id=current_user.department_id).filter(
+        elif viewer.role == 'manager':
+            if viewer.department_id:
+                user_query = User.query.filter_by(status='active', department_id=viewer.department_id).filter(
                     *get_fingerprint_filter(),
                     User.first_name != None,
                     User.first_name != '',
@@ -2500,7 +3221,7 @@ def export_daily_attendance():
                 )
             else:
                 all_active_users = safe_db_query(
-                    lambda: User.query.filter_by(id=current_user.id, status='active').filter(
+                    lambda: User.query.filter_by(id=viewer.id, status='active').filter(
                     *get_fingerprint_filter(),
                     User.first_name != None,
                     User.first_name != '',
@@ -2511,7 +3232,7 @@ def export_daily_attendance():
                 )
         else:
             all_active_users = safe_db_query(
-                lambda: User.query.filter_by(id=current_user.id, status='active').filter(
+                lambda: User.query.filter_by(id=viewer.id, status='active').filter(
                 *get_fingerprint_filter(),
                 User.first_name != None,
                 User.first_name != '',
@@ -2533,7 +3254,7 @@ def export_daily_attendance():
             if employee_id:
                 today_logs_query = today_logs_query.filter(AttendanceLog.user_id == employee_id)
             elif is_employee_viewing_own_data:
-                today_logs_query = today_logs_query.filter(AttendanceLog.user_id == current_user.id)
+                today_logs_query = today_logs_query.filter(AttendanceLog.user_id == viewer.id)
             
             today_logs = safe_db_query(
                 lambda: today_logs_query.order_by(AttendanceLog.timestamp.desc()).all(),
@@ -2553,7 +3274,7 @@ def export_daily_attendance():
             for user in all_active_users:
                 if employee_id and user.id != employee_id:
                     continue
-                if is_employee_viewing_own_data and user.id != current_user.id:
+                if is_employee_viewing_own_data and user.id != viewer.id:
                     continue
                 
                 # Check leave/permission/holiday status
@@ -2596,226 +3317,96 @@ def export_daily_attendance():
                              PaidHoliday.start_date <= today,
                              PaidHoliday.end_date >= today)
                     )
-                ).first()
-                
-                if user.id in processed_logs:
-                    user_data = processed_logs[user.id].copy()
-                    if is_on_leave:
-                        user_data['status'] = 'present'
-                        user_data['leave_request'] = leave_request
-                        if daily_record and daily_record.leave_type_name:
-                            user_data['leave_type_name'] = daily_record.leave_type_name
-                    elif has_permission:
-                        user_data['status'] = 'present'
-                        user_data['permission_request'] = permission_request
-                    elif daily_record and daily_record.status == 'paid_holiday':
-                        user_data['status'] = 'present'
-                        user_data['holiday_name'] = daily_record.holiday_name if daily_record else (paid_holiday.description if paid_holiday else None)
-                    elif is_weekend and user_data['status'] == 'present':
-                        user_data['status'] = 'DayOff / Present'
-                    present_users[user.id] = user_data
-                else:
-                    if is_on_leave:
-                        absent_users[user.id] = {
-                            'user': user,
-                            'check_in': None,
-                            'check_out': None,
-                            'duration': None,
-                            'status': 'leave',
-                            'leave_request': leave_request,
-                            'leave_type_name': daily_record.leave_type_name if daily_record else None
-                        }
-                    elif has_permission:
-                        absent_users[user.id] = {
-                            'user': user,
-                            'check_in': None,
-                            'check_out': None,
-                            'duration': None,
-                            'status': 'permission',
-                            'permission_request': permission_request
-                        }
-                    elif daily_record and daily_record.status == 'paid_holiday':
-                        absent_users[user.id] = {
-                            'user': user,
-                            'check_in': None,
-                            'check_out': None,
-                            'duration': None,
-                            'status': daily_record.holiday_name if daily_record.holiday_name else 'Paid Holiday',
-                            'holiday_name': daily_record.holiday_name if daily_record else (paid_holiday.description if paid_holiday else None)
-                        }
-                    else:
-                        absent_users[user.id] = {
-                            'user': user,
-                            'check_in': None,
-                            'check_out': None,
-                            'duration': None,
-                            'status': 'DayOff' if is_weekend else 'Absent'
-                        }
-            
-            sorted_present_users = {}
-            if present_users:
-                present_items = list(present_users.items())
-                present_items.sort(key=lambda x: (x[1]['check_in'] is None, 
-                                                -x[1]['check_in'].timestamp.timestamp() if x[1]['check_in'] else 0))
-                sorted_present_users = {user_id: data for user_id, data in present_items}
-            
-            daily_attendance = {**sorted_present_users, **absent_users}
-            
-            # Export today's data
-            if export_format == 'pdf':
-                return export_daily_attendance_to_pdf(daily_attendance, today, today, employee_id)
-            else:
-                return export_daily_attendance_to_excel(daily_attendance, today, today, employee_id)
-        else:
-            # Export historical data (date range)
-            start_datetime_obj = datetime.combine(start_date, datetime.min.time())
-            end_datetime_obj = datetime.combine(end_date, datetime.max.time())
-            
-            query = AttendanceLog.query\
-                .filter(AttendanceLog.timestamp.between(start_datetime_obj, end_datetime_obj))\
-                .join(User, AttendanceLog.user_id == User.id)
-            
-            if (is_admin and employee_id) or is_employee_viewing_own_data:
-                if employee_id:
-                    employee_id = int(employee_id)
-                else:
-                    employee_id = current_user.id
-                query = query.filter(AttendanceLog.user_id == employee_id)
-            
-            historical_logs = query.order_by(AttendanceLog.timestamp.desc()).all()
-            
-            # Generate all dates in the range
-            all_dates = []
-            current_date = start_date
-            while current_date <= end_date:
-                all_dates.append(current_date)
-                current_date += timedelta(days=1)
-            
-            # Group logs by date
-            date_grouped_logs = defaultdict(list)
-            for log in historical_logs:
-                date_key = log.timestamp.strftime('%Y-%m-%d')
-                date_grouped_logs[date_key].append(log)
-            
-            # Build historical_attendance structure
-            historical_attendance = OrderedDict()
-            
-            for date_obj in all_dates:
-                date_key = date_obj.strftime('%Y-%m-%d')
-                logs = date_grouped_logs.get(date_key, [])
-                processed_historical_logs = process_attendance_logs(logs)
-                historical_weekday = date_obj.weekday()
-                is_historical_weekend = (historical_weekday == 4 or historical_weekday == 5)
-                
-                # Check if this date is a paid holiday
-                from models import PaidHoliday
-                paid_holiday = PaidHoliday.query.filter(
-                    or_(
-                        # Single day holiday
-                        and_(PaidHoliday.holiday_type == 'day',
-                             PaidHoliday.start_date == date_obj),
-                        # Range holiday that includes this date
-                        and_(PaidHoliday.holiday_type == 'range',
-                             PaidHoliday.start_date <= date_obj,
-                             PaidHoliday.end_date >= date_obj)
-                    )
-                ).first()
-                
-                all_users = {}
-                
-                for user in all_active_users:
-                    if (is_admin and employee_id and user.id != employee_id) or (is_employee_viewing_own_data and user.id != current_user.id):
-                        continue
-                    
-                    if user.joining_date and date_obj < user.joining_date:
-                        all_users[user.id] = {
-                            'user': user,
-                            'check_in': None,
-                            'check_out': None,
-                            'duration': None,
-                            'status': 'Not Yet Joined'
-                        }
-                        continue
-                    
-                    daily_record = DailyAttendance.query.filter_by(
-                        user_id=user.id,
-                        date=date_obj
-                    ).first()
-                    
-                    leave_request = LeaveRequest.query.filter(
-                        LeaveRequest.user_id == user.id,
-                        LeaveRequest.status == 'approved',
-                        LeaveRequest.start_date <= date_obj,
-                        LeaveRequest.end_date >= date_obj
-                    ).first()
-                    is_on_leave = leave_request is not None
-                    
-                    permission_request = PermissionRequest.query.filter(
-                        PermissionRequest.user_id == user.id,
-                        PermissionRequest.status == 'approved',
-                        func.date(PermissionRequest.start_time) == date_obj
-                    ).first()
-                    has_permission = permission_request is not None
-                    
-                    user_data = {
-                        'user': user,
-                        'check_in': None,
-                        'check_out': None,
-                        'duration': None,
-                        'status': 'Absent'
-                    }
-                    
-                    if user.id in processed_historical_logs:
-                        user_data = processed_historical_logs[user.id].copy()
-                        user_data['user'] = user
-                        
-                        if is_on_leave:
-                            user_data['status'] = 'Present'
-                            user_data['leave_request'] = leave_request
-                            if daily_record and daily_record.leave_type_name:
-                                user_data['leave_type_name'] = daily_record.leave_type_name
-                        elif has_permission:
-                            user_data['status'] = 'Present'
-                            user_data['permission_request'] = permission_request
-                        elif user_data['status'] == 'present':
-                            user_data['status'] = 'Present'
-                    else:
-                        if is_on_leave:
-                            user_data['status'] = daily_record.leave_type_name if daily_record and daily_record.leave_type_name else 'Leave Request'
-                            user_data['leave_request'] = leave_request
-                        elif has_permission:
-                            user_data['status'] = 'Permission'
-                            user_data['permission_request'] = permission_request
-                        elif daily_record and daily_record.status == 'paid_holiday' and daily_record.paid_holiday_id:
-                            # Check if paid holiday still exists
-                            paid_holiday_check = PaidHoliday.query.get(daily_record.paid_holiday_id)
-                            if paid_holiday_check:
-                                user_data['status'] = daily_record.holiday_name if daily_record.holiday_name else 'Paid Holiday'
-                                user_data['holiday_name'] = daily_record.holiday_name
-                            else:
-                                user_data['status'] = 'DayOff' if is_historical_weekend else 'Absent'
-                        else:
-                            user_data['status'] = 'DayOff' if is_historical_weekend else 'Absent'
-                    
-                    all_users[user.id] = user_data
-                
-                # Sort users by name
-                sorted_users = {}
-                if all_users:
-                    user_items = list(all_users.items())
-                    user_items.sort(key=lambda x: (x[1]['user'].first_name, x[1]['user'].last_name))
-                    sorted_users = {user_id: data for user_id, data in user_items}
+                ).first()
                 
-                historical_attendance[date_key] = {
-                    'attendance_data': sorted_users,
-                    'date': date_obj,
-                    'paid_holiday': paid_holiday.description if paid_holiday else None,
-                    'is_paid_holiday': paid_holiday is not None
-                }
+                if user.id in processed_logs:
+                    user_data = processed_logs[user.id].copy()
+                    if is_on_leave:
+                        user_data['status'] = 'present'
+                        user_data['leave_request'] = leave_request
+                        if daily_record and daily_record.leave_type_name:
+                            user_data['leave_type_name'] = daily_record.leave_type_name
+                    elif has_permission:
+                        user_data['status'] = 'present'
+                        user_data['permission_request'] = permission_request
+                    elif daily_record and daily_record.status == 'paid_holiday':
+                        user_data['status'] = 'present'
+                        user_data['holiday_name'] = daily_record.holiday_name if daily_record else (paid_holiday.description if paid_holiday else None)
+                    elif is_weekend and user_data['status'] == 'present':
+                        user_data['status'] = 'DayOff / Present'
+                    present_users[user.id] = user_data
+                else:
+                    if is_on_leave:
+                        absent_users[user.id] = {
+                            'user': user,
+                            'check_in': None,
+                            'check_out': None,
+                            'duration': None,
+                            'status': 'leave',
+                            'leave_request': leave_request,
+                            'leave_type_name': daily_record.leave_type_name if daily_record else None
+                        }
+                    elif has_permission:
+                        absent_users[user.id] = {
+                            'user': user,
+                            'check_in': None,
+                            'check_out': None,
+                            'duration': None,
+                            'status': 'permission',
+                            'permission_request': permission_request
+                        }
+                    elif daily_record and daily_record.status == 'paid_holiday':
+                        absent_users[user.id] = {
+                            'user': user,
+                            'check_in': None,
+                            'check_out': None,
+                            'duration': None,
+                            'status': daily_record.holiday_name if daily_record.holiday_name else 'Paid Holiday',
+                            'holiday_name': daily_record.holiday_name if daily_record else (paid_holiday.description if paid_holiday else None)
+                        }
+                    else:
+                        absent_users[user.id] = {
+                            'user': user,
+                            'check_in': None,
+                            'check_out': None,
+                            'duration': None,
+                            'status': 'DayOff' if is_weekend else 'Absent'
+                        }
+            
+            sorted_present_users = {}
+            if present_users:
+                present_items = list(present_users.items())
+                present_items.sort(key=lambda x: (x[1]['check_in'] is None, 
+                                                -x[1]['check_in'].timestamp.timestamp() if x[1]['check_in'] else 0))
+                sorted_present_users = {user_id: data for user_id, data in present_items}
+            
+            daily_attendance = {**sorted_present_users, **absent_users}
+            
+            # Export today's data
+            if export_format == 'pdf':
+                return export_daily_attendance_to_pdf(daily_attendance, today, today, employee_id)
+            else:
+                return export_daily_attendance_to_excel(daily_attendance, today, today, employee_id)
+        else:
+            # Export historical data (date range)
+            if (is_admin and employee_id) or is_employee_viewing_own_data:
+                if employee_id:
+                    employee_id = int(employee_id)
+                else:
+                    employee_id = viewer.id
+                log_user_id = employee_id
+            else:
+                log_user_id = None
+            export_users = [
+                user for user in all_active_users
+                if not ((is_admin and employee_id and user.id != employee_id)
+                        or (is_employee_viewing_own_data and user.id != viewer.id))
+            ]
+            historical_attendance = iter_historical_attendance(export_users, start_date, end_date, log_user_id)
             
             # Export historical data
             if export_format == 'pdf':
-                return export_daily_attendance_to_pdf(None, start_date, end_date, employee_id, historical_attendance)
+                return export_daily_attendance_to_pdf(None, start_date, end_date, employee_id, OrderedDict(historical_attendance))
             else:
                 return export_daily_attendance_to_excel(None, start_date, end_date, employee_id, historical_attendance)
                 
@@ -2824,6 +3415,50 @@ def export_daily_attendance():
         return jsonify({'error': f'Export failed: {str(e)}'}), 500
 
 
+@attendance_bp.route('/export-daily-attendance')
+@login_required
+@background_export(build_daily_attendance_export)
+def export_daily_attendance():
+    """Export daily attendance data to Excel or PDF"""
+    return build_daily_attendance_export(current_user, request.args)
+
+
+def _daily_attendance_export_rows(daily_attendance, historical_attendance=None):
+    """Yield ('date', label), ('row', values) and ('spacer', None) items for the daily attendance sheet"""
+    def build_row(data):
+        user = data['user']
+        fingerprint_id = user.fingerprint_number or 'Not Assigned'
+        employee_name = user.get_full_name()
+        check_in = data['check_in'].timestamp.strftime('%I:%M %p') if data['check_in'] else '-'
+        check_out = data['check_out'].timestamp.strftime('%I:%M %p') if data['check_out'] else '-'
+        duration = data['duration'] or '-'
+        status = data['status']
+        
+        # Build details string
+        details = []
+        if data.get('leave_type_name'):
+            details.append(f"Leave: {data['leave_type_name']}")
+        if data.get('holiday_name'):
+            details.append(f"Holiday: {data['holiday_name']}")
+        if data.get('permission_request'):
+            details.append("Permission")
+        details_str = ', '.join(details) if details else '-'
+        
+        return [fingerprint_id, employee_name, check_in, check_out, duration, status, details_str]
+    
+    if historical_attendance:
+        # Historical data (multiple dates); accepts a mapping or a stream of (date_key, date_data) pairs
+        date_items = historical_attendance.items() if hasattr(historical_attendance, 'items') else historical_attendance
+        for date_key, date_data in date_items:
+            yield 'date', f"Date: {date_data['date'].strftime('%Y-%m-%d')}"
+            for user_id, data in date_data['attendance_data'].items():
+                yield 'row', build_row(data)
+            yield 'spacer', None  # Add spacing between dates
+    else:
+        for user_id, data in daily_attendance.items():
+            yield 'row', build_row(data)
+
+
 def export_daily_attendance_to_excel(daily_attendance, start_date, end_date, employee_id=None, historical_attendance=None):
     """Export daily attendance to Excel format"""
     try:
@@ -2833,6 +3468,37 @@ def export_daily_attendance_to_excel(daily_attendance, start_date, end_date, emp
     except ImportError:
         return jsonify({'error': 'Excel export not available. Please install openpyxl package.'}), 500
     
+    # Add title
+    if start_date == end_date:
+        title = f"Daily Attendance - {start_date.strftime('%Y-%m-%d')}"
+    else:
+        title = f"Daily Attendance ({start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')})"
+    
+    # Create filename
+    if start_date == end_date:
+        filename = f"Daily_Attendance_{start_date.strftime('%Y%m%d')}.xlsx"
+    else:
+        filename = f"Daily_Attendance_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.xlsx"
+    
+    headers = ['Fingerprint ID', 'Employee', 'Check In', 'Check Out', 'Duration', 'Status', 'Details']
+    rows = _daily_attendance_export_rows(daily_attendance, historical_attendance)
+    
+    if current_app.config.get('EXCEL_STREAMING_EXPORT', True):
+        from report_helpers.excel_export import StreamingExcelSheet
+        
+        sheet = StreamingExcelSheet("Daily Attendance", [18] * 7)
+        sheet.title(title, 8)
+        sheet.blank()
+        sheet.header(headers)
+        for kind, value in rows:
+            if kind == 'date':
+                sheet.section(value, 8)
+            elif kind == 'row':
+                sheet.row(value)
+            else:
+                sheet.blank()
+        return sheet.response(filename)
+    
     wb = Workbook()
     ws = wb.active
     ws.title = "Daily Attendance"
@@ -2847,19 +3513,12 @@ def export_daily_attendance_to_excel(daily_attendance, start_date, end_date, emp
         bottom=Side(style='thin')
     )
     
-    # Add title
-    if start_date == end_date:
-        title = f"Daily Attendance - {start_date.strftime('%Y-%m-%d')}"
-    else:
-        title = f"Daily Attendance ({start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')})"
-    
     ws.merge_cells('A1:H1')
     ws['A1'] = title
     ws['A1'].font = Font(bold=True, size=14)
     ws['A1'].alignment = Alignment(horizontal='center')
     
     # Headers
-    headers = ['Fingerprint ID', 'Employee', 'Check In', 'Check Out', 'Duration', 'Status', 'Details']
     for col, header in enumerate(headers, 1):
         cell = ws.cell(row=3, column=col, value=header)
         cell.font = header_font
@@ -2868,79 +3527,17 @@ def export_daily_attendance_to_excel(daily_attendance, start_date, end_date, emp
         cell.alignment = Alignment(horizontal='center')
     
     row = 4
-    
-    if historical_attendance:
-        # Export historical data (multiple dates)
-        for date_key, date_data in historical_attendance.items():
-            date_obj = date_data['date']
-            attendance = date_data['attendance_data']
-            
+    for kind, value in rows:
+        if kind == 'date':
             # Add date header
             ws.merge_cells(f'A{row}:H{row}')
-            date_cell = ws.cell(row=row, column=1, value=f"Date: {date_obj.strftime('%Y-%m-%d')}")
+            date_cell = ws.cell(row=row, column=1, value=value)
             date_cell.font = Font(bold=True, size=12)
             date_cell.fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
-            row += 1
-            
-            # Add data for this date
-            for user_id, data in attendance.items():
-                user = data['user']
-                fingerprint_id = user.fingerprint_number or 'Not Assigned'
-                employee_name = user.get_full_name()
-                check_in = data['check_in'].timestamp.strftime('%I:%M %p') if data['check_in'] else '-'
-                check_out = data['check_out'].timestamp.strftime('%I:%M %p') if data['check_out'] else '-'
-                duration = data['duration'] or '-'
-                status = data['status']
-                
-                # Build details string
-                details = []
-                if data.get('leave_type_name'):
-                    details.append(f"Leave: {data['leave_type_name']}")
-                if data.get('holiday_name'):
-                    details.append(f"Holiday: {data['holiday_name']}")
-                if data.get('permission_request'):
-                    details.append("Permission")
-                details_str = ', '.join(details) if details else '-'
-                
-                ws.cell(row=row, column=1, value=fingerprint_id).border = border
-                ws.cell(row=row, column=2, value=employee_name).border = border
-                ws.cell(row=row, column=3, value=check_in).border = border
-                ws.cell(row=row, column=4, value=check_out).border = border
-                ws.cell(row=row, column=5, value=duration).border = border
-                ws.cell(row=row, column=6, value=status).border = border
-                ws.cell(row=row, column=7, value=details_str).border = border
-                row += 1
-            
-            row += 1  # Add spacing between dates
-    else:
-        # Export today's data
-        for user_id, data in daily_attendance.items():
-            user = data['user']
-            fingerprint_id = user.fingerprint_number or 'Not Assigned'
-            employee_name = user.get_full_name()
-            check_in = data['check_in'].timestamp.strftime('%I:%M %p') if data['check_in'] else '-'
-            check_out = data['check_out'].timestamp.strftime('%I:%M %p') if data['check_out'] else '-'
-            duration = data['duration'] or '-'
-            status = data['status']
-            
-            # Build details string
-            details = []
-            if data.get('leave_type_name'):
-                details.append(f"Leave: {data['leave_type_name']}")
-            if data.get('holiday_name'):
-                details.append(f"Holiday: {data['holiday_name']}")
-            if data.get('permission_request'):
-                details.append("Permission")
-            details_str = ', '.join(details) if details else '-'
-            
-            ws.cell(row=row, column=1, value=fingerprint_id).border = border
-            ws.cell(row=row, column=2, value=employee_name).border = border
-            ws.cell(row=row, column=3, value=check_in).border = border
-            ws.cell(row=row, column=4, value=check_out).border = border
-            ws.cell(row=row, column=5, value=duration).border = border
-            ws.cell(row=row, column=6, value=status).border = border
-            ws.cell(row=row, column=7, value=details_str).border = border
-            row += 1
+        elif kind == 'row':
+            for col, cell_value in enumerate(value, 1):
+                ws.cell(row=row, column=col, value=cell_value).border = border
+        row += 1
     
     # Auto-adjust column widths
     for col in range(1, 8):
@@ -2951,12 +3548,6 @@ def export_daily_attendance_to_excel(daily_attendance, start_date, end_date, emp
     wb.save(output)
     output.seek(0)
     
-    # Create filename
-    if start_date == end_date:
-        filename = f"Daily_Attendance_{start_date.strftime('%Y%m%d')}.xlsx"
-    else:
-        filename = f"Daily_Attendance_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.xlsx"
-    
     # Create response
     response = make_response(output.getvalue())
     response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
@@ -3139,8 +3730,6 @@ def sync_fingerprint():
                 'diagnostics': diagnostics
             }), 500
         
-        conn = None
-        zk = ZK(device.device_ip, port=device.device_port, timeout=5)
         sync_results = {
             'records_found': 0,
             'records_added': 0,
@@ -3150,37 +3739,10 @@ def sync_fingerprint():
         }
         
         try:
-            # Attempt to connect with retry
-            retries = 3
-            for attempt in range(retries):
-                try:
-                    logging.info(f'Connection attempt {attempt + 1} to device...')
-                    logging.debug(f'Attempting connection to {device.device_ip}:{device.device_port}')
-                    conn = zk.connect()
-                    if conn:
-                        logging.info('Successfully connected to device')
-                        break
-                    logging.warning(f'Connection attempt {attempt + 1} failed, retrying...')
-                    time.sleep(2)  # Wait before retry
-                except Exception as e:
-                    if attempt == retries - 1:
-                        raise
-                    logging.warning(f'Connection attempt {attempt + 1} failed: {str(e)}')
-                    time.sleep(2)
-            
-            if not conn:
-                error_msg = 'Failed to establish connection with the device after multiple attempts'
-                sync_results['errors'].append(error_msg)
-                logging.error(error_msg)
-                return jsonify({
-                    'status': 'error',
-                    'message': error_msg,
-                    'results': sync_results
-                }), 500
-            
-            # Get attendance records
+            # Get attendance records over the device session the connection test just opened
             logging.info('Retrieving attendance records...')
-            attendance_records = conn.get_attendance()
+            with device_sessions.borrow(device.device_ip, device.device_port) as conn:
+                attendance_records = conn.get_attendance()
             sync_results['records_found'] = len(attendance_records) if attendance_records else 0
             
             if not attendance_records:
@@ -4618,6 +5180,7 @@ def my_attendance_sync_status():
 # Add a new route for AJAX updates
 @attendance_bp.route('/attendance-updates')
 @login_required
+@conditional_poll('users', 'attendance_logs')
 def attendance_updates():
     """Get attendance updates for AJAX refresh"""
     try:
@@ -4654,6 +5217,39 @@ def attendance_updates():
             'message': str(e)
         }), 500
 
+@attendance_bp.route('/stream')
+@login_required
+def attendance_stream():
+    """Server-Sent Events: an 'attendance' event whenever a sync commits punches in the user's scope"""
+    from live_updates import LiveStream
+    
+    if current_user.role in ['admin', 'product_owner', 'director']:
+        user_ids = None
+    elif current_user.role == 'manager':
+        from helpers import get_employees_for_manager
+        user_ids = {employee.id for employee in get_employees_for_manager(current_user.id)}
+        user_ids.add(current_user.id)
+    else:
+        user_ids = {current_user.id}
+    
+    config = current_app.config
+    stream = LiveStream.open(
+        config.get('LIVE_UPDATES_MAX_STREAMS', 2),
+        shared_only=True,
+        user_ids=user_ids,
+        heartbeat=config.get('LIVE_UPDATES_HEARTBEAT', 15),
+        max_seconds=config.get('LIVE_UPDATES_STREAM_SECONDS', 300),
+        poll=config.get('LIVE_UPDATES_POLL_SECONDS', 2)
+    )
+    if stream is None:
+        # No free stream slot or no shared cache backend: 204 stops EventSource and the page keeps polling
+        return '', 204
+    
+    response = current_app.response_class(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
 @attendance_bp.route('/user-stats')
 @login_required
 def user_stats():
@@ -4676,20 +5272,27 @@ def user_stats():
         # Get today's date
         today = date.today()
         
-        # Get daily attendance records for the current month
-        month_start = today.replace(day=1)
-        user_records = DailyAttendance.query.filter(
+        # Current month's precomputed summary
+        from report_helpers.monthly_summary import get_monthly_summary, month_bounds
+        month_start, month_end = month_bounds(today.year, today.month)
+        summary = get_monthly_summary(user_id, today.year, today.month)
+        
+        # The summary covers the whole month; the stats run to today, so take out the
+        # rows dated later (paid holidays and approved leave are recorded ahead)
+        later_records = db.session.query(DailyAttendance.status, DailyAttendance.total_working_hours).filter(
             DailyAttendance.user_id == user_id,
-            DailyAttendance.date.between(month_start, today)
+            DailyAttendance.date > today,
+            DailyAttendance.date <= month_end
         ).all()
         
         # Calculate statistics
         total_days = (today - month_start).days + 1
-        present_days = sum(1 for r in user_records if r.status == 'present')
-        half_days = sum(1 for r in user_records if r.status == 'half-day')
+        present_days = summary.present_days - sum(1 for r in later_records if r.status == 'present')
+        half_days = summary.half_days - sum(1 for r in later_records if r.status == 'half-day')
         absent_days = total_days - present_days - half_days
-        total_hours = sum(r.total_working_hours or 0 for r in user_records)
-        avg_hours = total_hours / len(user_records) if user_records else 0
+        total_hours = summary.total_working_hours - sum(r.total_working_hours or 0 for r in later_records)
+        recorded_days = summary.recorded_days - len(later_records)
+        avg_hours = total_hours / recorded_days if recorded_days else 0
         
         return jsonify({
             'status': 'success',
@@ -4815,8 +5418,11 @@ def is_private_ip(ip):
                    (first == 172 and 16 <= second <= 31)
         return False
 
-def get_device_status(device_ip, device_port):
-    """Get basic device status for a specific IP and port"""
+def get_device_status(device_ip, device_port, wait=10):
+    """Get basic device status for a specific IP and port.
+
+    Waits up to `wait` seconds for an operation already using the device (e.g. a sync).
+    """
     device_status = {
         'connected': False,
         'device_info': None,
@@ -4841,20 +5447,22 @@ def get_device_status(device_ip, device_port):
             return device_status
     
     # First, test if we can reach the device with a socket connection
-    # This helps determine if it's a network issue or ZK protocol issue
-    socket_reachable = False
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(10)  # Increased timeout for slower networks
-        result = sock.connect_ex((device_ip, device_port))
-        sock.close()
-        if result == 0:
-            socket_reachable = True
-            logging.info(f'Socket connection to {device_ip}:{device_port} successful')
-        else:
-            logging.warning(f'Socket connection to {device_ip}:{device_port} failed with code: {result}')
-    except Exception as sock_error:
-        logging.warning(f'Socket test error for {device_ip}:{device_port}: {str(sock_error)}')
+    # This helps determine if it's a network issue or ZK protocol issue.
+    # An open device session already proves the port is reachable.
+    socket_reachable = device_sessions.is_connected(device_ip, device_port)
+    if not socket_reachable:
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(10)  # Increased timeout for slower networks
+            result = sock.connect_ex((device_ip, device_port))
+            sock.close()
+            if result == 0:
+                socket_reachable = True
+                logging.info(f'Socket connection to {device_ip}:{device_port} successful')
+            else:
+                logging.warning(f'Socket connection to {device_ip}:{device_port} failed with code: {result}')
+        except Exception as sock_error:
+            logging.warning(f'Socket test error for {device_ip}:{device_port}: {str(sock_error)}')
     
     # If socket is not reachable, device is likely offline or firewall is blocking
     if not socket_reachable:
@@ -4865,11 +5473,9 @@ def get_device_status(device_ip, device_port):
             device_status['error'] = f'Cannot reach device on port {device_port} - check firewall or device is offline'
         return device_status
     
-    # Socket is reachable, now try ZK protocol connection
+    # Socket is reachable, now use the device's ZK session
     try:
-        zk = ZK(device_ip, port=device_port, timeout=15)  # Increased timeout for ZK connection
-        conn = zk.connect()
-        if conn:
+        with device_sessions.borrow(device_ip, device_port, wait=wait) as conn:
             device_status['connected'] = True
             try:
                 # Get basic device information
@@ -4900,16 +5506,15 @@ def get_device_status(device_ip, device_port):
                 device_status['device_info'] = device_info
             except Exception as e:
                 logging.warning(f'Error getting device info: {str(e)}')
-            finally:
-                conn.disconnect()
-        else:
-            # Socket is reachable but ZK connection failed - device might be wrong type or protocol issue
-            device_status['error'] = 'Port is reachable but ZK protocol connection failed - device may not be a ZKTeco device or wrong port'
+    except DeviceBusy:
+        device_status['error'] = 'Device is busy with another operation (e.g. a sync) - try again shortly'
     except Exception as e:
         error_msg = str(e)
         # Socket is reachable but ZK connection failed
-        if 'timeout' in error_msg.lower():
-            device_status['error'] = f'ZK connection timeout - device port is reachable but not responding to ZK protocol (timeout after 15s)'
+        if 'retrying in' in error_msg:
+            device_status['error'] = error_msg
+        elif 'timeout' in error_msg.lower() or 'timed out' in error_msg.lower():
+            device_status['error'] = f'ZK connection timeout - device port is reachable but not responding to ZK protocol (timeout after {device_sessions.timeout}s)'
         elif 'connection' in error_msg.lower():
             device_status['error'] = f'ZK connection refused - device port is reachable but rejected ZK protocol connection'
         else:
@@ -4937,79 +5542,61 @@ def get_device_status_info():
     logging.info(f'Attempting to connect to device at {device.device_ip}:{device.device_port}')
     
     try:
-        zk = ZK(device.device_ip, port=device.device_port, timeout=5)
-        conn = None
-        
-        try:
-            conn = zk.connect()
-            if conn:
-                device_status['connected'] = True
-                logging.info('Successfully connected to device.')
+        with device_sessions.borrow(device.device_ip, device.device_port, wait=10) as conn:
+            device_status['connected'] = True
+            logging.info('Successfully connected to device.')
+            try:
+                # Get device information with proper error handling for each call
+                device_info = {}
+                
                 try:
-                    # Get device information with proper error handling for each call
-                    device_info = {}
-                    
-                    try:
-                        device_info['firmware_version'] = conn.get_firmware_version()
-                    except Exception as e:
-                        device_info['firmware_version'] = 'Unknown'
-                        logging.warning(f'Error getting firmware version: {str(e)}')
-                    
-                    try:
-                        device_info['serial_number'] = conn.get_serialnumber()
-                    except Exception as e:
-                        device_info['serial_number'] = 'Unknown'
-                        logging.warning(f'Error getting serial number: {str(e)}')
-                    
-                    try:
-                        device_info['platform'] = conn.get_platform()
-                    except Exception as e:
-                        device_info['platform'] = 'Unknown'
-                        logging.warning(f'Error getting platform: {str(e)}')
-                    
-                    try:
-                        device_info['device_name'] = conn.get_device_name() or 'X628-TC/ID'
-                    except Exception as e:
-                        device_info['device_name'] = 'X628-TC/ID'
-                        logging.warning(f'Error getting device name: {str(e)}')
-                    
-                    try:
-                        users = conn.get_users()
-                        device_info['users'] = len(users) if users else 0
-                    except Exception as e:
-                        device_info['users'] = 0
-                        logging.warning(f'Error getting users: {str(e)}')
-                    
-                    device_status['device_info'] = device_info
-                    logging.info(f'Device info retrieved: {device_info}')
-                    
-                    # Get last sync time
-                    last_log = AttendanceLog.query.order_by(AttendanceLog.created_at.desc()).first()
-                    if last_log:
-                        device_status['last_sync'] = last_log.created_at.isoformat()
-                        logging.info(f'Last sync time: {device_status["last_sync"]}')
-                    
+                    device_info['firmware_version'] = conn.get_firmware_version()
                 except Exception as e:
-                    device_status['error'] = f'Error retrieving device information: {str(e)}'
-                    logging.error(f'Error retrieving device information: {str(e)}')
+                    device_info['firmware_version'] = 'Unknown'
+                    logging.warning(f'Error getting firmware version: {str(e)}')
+                
+                try:
+                    device_info['serial_number'] = conn.get_serialnumber()
+                except Exception as e:
+                    device_info['serial_number'] = 'Unknown'
+                    logging.warning(f'Error getting serial number: {str(e)}')
+                
+                try:
+                    device_info['platform'] = conn.get_platform()
+                except Exception as e:
+                    device_info['platform'] = 'Unknown'
+                    logging.warning(f'Error getting platform: {str(e)}')
                 
-            else:
-                logging.warning('ZK connection object is None after connect attempt.')
-        except Exception as e:
-            device_status['error'] = f'Error connecting to device: {str(e)}'
-            logging.error(f'Error connecting to device: {str(e)}')
-            
-        finally:
-            if conn:
                 try:
-                    conn.disconnect()
-                    logging.info('Disconnected from device.')
+                    device_info['device_name'] = conn.get_device_name() or 'X628-TC/ID'
                 except Exception as e:
-                    logging.warning(f'Error disconnecting from device: {str(e)}')
+                    device_info['device_name'] = 'X628-TC/ID'
+                    logging.warning(f'Error getting device name: {str(e)}')
                 
+                try:
+                    users = conn.get_users()
+                    device_info['users'] = len(users) if users else 0
+                except Exception as e:
+                    device_info['users'] = 0
+                    logging.warning(f'Error getting users: {str(e)}')
+                
+                device_status['device_info'] = device_info
+                logging.info(f'Device info retrieved: {device_info}')
+            except Exception as e:
+                device_status['error'] = f'Error retrieving device information: {str(e)}'
+                logging.error(f'Error retrieving device information: {str(e)}')
+        
+        # Get last sync time (after giving the device back)
+        last_log = AttendanceLog.query.order_by(AttendanceLog.created_at.desc()).first()
+        if last_log:
+            device_status['last_sync'] = last_log.created_at.isoformat()
+            logging.info(f'Last sync time: {device_status["last_sync"]}')
+    except DeviceUnavailable as e:
+        device_status['error'] = f'Error connecting to device: {str(e)}'
+        logging.error(f'Error connecting to device: {str(e)}')
     except Exception as e:
-        device_status['error'] = f'Error initializing device connection: {str(e)}'
-        logging.error(f'Error initializing device connection: {str(e)}')
+        device_status['error'] = f'Error reading device status: {str(e)}'
+        logging.error(f'Error reading device status: {str(e)}')
     
     logging.info(f'Final device_status: {device_status}')
     return device_status
@@ -5023,8 +5610,7 @@ def get_device_status_info():
 def get_realtime_employee_status():
     """Get real-time employee check-in/out status from the fingerprint device"""
     try:
-        device_ip = '192.168.11.2'
-        device_port = 4370
+        device = get_active_device()
         
         # Get today's date range
         today = datetime.now().date()
@@ -5034,18 +5620,12 @@ def get_realtime_employee_status():
         # Get all users with fingerprint numbers
         users_dict = {str(user.fingerprint_number): user for user in User.query.all() if user.fingerprint_number}
         
-        # Connect to device
-        zk = ZK(device_ip, port=device_port, timeout=30)
-        conn = None
         employee_status = []
         
         try:
-            conn = zk.connect()
-            if not conn:
-                raise Exception('Could not connect to device')
-            
             # Get attendance records from device
-            attendance_records = conn.get_attendance()
+            with device_sessions.borrow(device.device_ip, device.device_port) as conn:
+                attendance_records = conn.get_attendance()
             if attendance_records:
                 # Filter today's records and sort by timestamp
                 today_records = [
@@ -5087,10 +5667,6 @@ def get_realtime_employee_status():
         except Exception as e:
             logging.error(f'Error getting real-time status: {str(e)}')
             raise
-        
-        finally:
-            if conn:
-                conn.disconnect()
                 
         return employee_status
         
@@ -5178,39 +5754,10 @@ def reprocess_attendance_data():
                 'message': f'User with ID {user_id} not found'
             }), 404
         
-        processed_count = 0
-        current_date = start_date
-        
-        while current_date <= end_date:
-            # Check if there are logs for this date
-            start_datetime = datetime.combine(current_date, datetime.min.time())
-            end_datetime = datetime.combine(current_date, datetime.max.time())
-            
-            logs = AttendanceLog.query.filter(
-                AttendanceLog.user_id == user_id,
-                AttendanceLog.timestamp.between(start_datetime, end_datetime)
-            ).all()
-            
-            if logs:
-                # Delete existing DailyAttendance record
-                existing_record = DailyAttendance.query.filter_by(
-                    user_id=user_id,
-                    date=current_date
-                ).first()
-                
-                if existing_record:
-                    db.session.delete(existing_record)
-                    db.session.flush()
-                
-                # Re-process the attendance for this date
-                new_record = process_daily_attendance(user_id, current_date)
-                
-                if new_record:
-                    db.session.commit()
-                    processed_count += 1
-                    logging.info(f"Reprocessed {current_date} for user {user.get_full_name()}: Check-in: {new_record.first_check_in}, Check-out: {new_record.last_check_out}")
-            
-            current_date += timedelta(days=1)
+        # Recompute every day with logs in one batch, replacing the existing records
+        processed_count = rollup_daily_attendance(start_date, end_date, user_ids=[user.id], replace=True)
+        db.session.commit()
+        logging.info(f"Reprocessed {processed_count} days for user {user.get_full_name()} ({start_date} to {end_date})")
         
         return jsonify({
             'success': True,
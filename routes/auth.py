@@ -5,7 +5,7 @@ from flask_wtf.csrf import CSRFError
 from forms import LoginForm, RegistrationForm
 from models import db, User, Department, LeaveType, LeaveBalance
 from datetime import datetime
-from helpers import log_activity
+from helpers import log_activity, get_departments
 import logging
 import os
 
@@ -147,7 +147,7 @@ def register():
     form = RegistrationForm()
     
     # Populate department dropdown
-    departments = Department.query.all()
+    departments = get_departments()
     form.department_id.choices = [(0, 'No Department')] + [(d.id, d.department_name) for d in departments]
     
     # Filter role choices: Admins cannot assign product_owner role
@@ -1,5 +1,6 @@
-from flask import Blueprint, render_template, jsonify, request, redirect, url_for, make_response, send_file
+from flask import Blueprint, render_template, jsonify, request, redirect, url_for, make_response, send_file, current_app
 from flask_login import login_required, current_user
+from export_jobs import background_export
 from datetime import datetime, timedelta, date
 from models import LeaveRequest, PermissionRequest, User, Department, AttendanceLog, DailyAttendance, db
 from helpers import role_required
@@ -25,7 +26,7 @@ def index():
             from routes.attendance import sync_attendance_task
             def sync_task():
                 try:
-                    sync_attendance_task(full_sync=True)
+                    sync_attendance_task()
                 except Exception as e:
                     logging.error(f'Error auto-syncing data on calendar main page load: {str(e)}')
             
@@ -56,13 +57,63 @@ def index():
     """Show the calendar page"""
     return render_template('calendar/index.html', title='Calendar', all_users=all_users)
 
+# Longest range /calendar/events computes in one request (FullCalendar month views ask for ~6 weeks)
+MAX_EVENTS_RANGE_DAYS = 366
+
+# Cached calendar events are dropped when any of these tables change
+CALENDAR_EVENT_TABLES = ('attendance_logs', 'leave_requests', 'permission_requests', 'paid_holidays', 'users')
+
+def _calendar_event_range():
+    """Inclusive date range from FullCalendar's start/end params (end is exclusive); -30/+30 days by default"""
+    today = datetime.today().date()
+    try:
+        start_date = date.fromisoformat(request.args['start'][:10])
+        end_date = date.fromisoformat(request.args['end'][:10]) - timedelta(days=1)
+    except (KeyError, ValueError):
+        return today - timedelta(days=30), today + timedelta(days=30)
+    if end_date < start_date:
+        end_date = start_date
+    return start_date, min(end_date, start_date + timedelta(days=MAX_EVENTS_RANGE_DAYS))
+
+def _as_date(value):
+    """func.date() returns a date on PostgreSQL and an ISO string on SQLite"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+def _daily_attendance_bounds(user_ids, start_date, end_date):
+    """{(user_id, date): (first_log, last_log)} from one grouped query over the range"""
+    if not user_ids or end_date < start_date:
+        return {}
+    log_day = func.date(AttendanceLog.timestamp)
+    rows = db.session.query(
+        AttendanceLog.user_id,
+        log_day,
+        func.min(AttendanceLog.timestamp),
+        func.max(AttendanceLog.timestamp),
+        func.count(AttendanceLog.id)
+    ).filter(
+        AttendanceLog.user_id.in_(user_ids),
+        AttendanceLog.timestamp >= datetime.combine(start_date, datetime.min.time()),
+        AttendanceLog.timestamp < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    ).group_by(AttendanceLog.user_id, log_day).all()
+    return {(user_id, _as_date(day)): (first_log, last_log) for user_id, day, first_log, last_log, count in rows if count}
+
+def _attendance_status(first_log, last_log):
+    """Same check-in/check-out split as Daily Attendance: morning logs check in, afternoon logs check out"""
+    has_check_in = first_log.hour < 12
+    has_check_out = last_log.hour >= 12
+    if has_check_in and has_check_out:
+        return 'present'
+    if has_check_in:
+        return 'in_office'
+    return 'absent'
+
 @calendar_bp.route('/events')
 @login_required
 def events():
     """API endpoint to get calendar events based on user role"""
     try:
         import logging
-        from flask import g
+        from cache import cache
         
         logging.info(f"Calendar events request started for user {current_user.id} with role {current_user.role}")
         
@@ -70,17 +121,10 @@ def events():
         if request.args.get('test') == 'true':
             return jsonify({'test': 'success', 'user_id': current_user.id, 'role': current_user.role})
         
-        # Simple caching to prevent repeated processing
-        cache_key = f"calendar_events_{current_user.id}_{request.args.get('user_id', 'all')}"
-        if hasattr(g, cache_key):
-            return jsonify(g.cache_key)
-            
         filter_user_id = request.args.get('user_id', type=int)
         user_role = current_user.role
         logging.info(f"Calendar events request - User: {current_user.id}, Role: {user_role}, Filter User ID: {filter_user_id}")
-        # Extended date range to show all past days and future data
-        start_date = datetime.today().date() - timedelta(days=30)   # Show from 1 month ago
-        end_date = datetime.today().date() + timedelta(days=30)    # Show 1 month ahead
+        start_date, end_date = _calendar_event_range()
         
         events = []
         
@@ -106,14 +150,27 @@ def events():
                 pass
         else:
             # No specific user filter - show data based on role
-            if user_role == 'manager':
-                from helpers import get_employees_for_manager
-                managed_employees = get_employees_for_manager(current_user.id)
+            if user_role in ['manager', 'admin', 'product_owner', 'director']:
                 user_id = None  # Will be handled in the query
-            elif user_role in ['admin', 'product_owner', 'director']:
-                user_id = None  # Will show all users
             else:
                 user_id = current_user.id
+        
+        # Everyone allowed to see a scope gets the same events, so cache per scope rather than per viewer
+        if user_id:
+            scope = ('user', user_id)
+        elif user_role == 'manager':
+            scope = ('manager', current_user.id)
+        else:
+            scope = ('all',)
+        cached_events = cache.entry(
+            'calendar.events',
+            scope + (start_date.isoformat(), end_date.isoformat()),
+            tags=CALENDAR_EVENT_TABLES,
+            ttl=current_app.config.get('CALENDAR_EVENTS_CACHE_TTL', 300)
+        )
+        if cached_events.hit:
+            logging.info(f"Returning {len(cached_events.value)} cached events for calendar")
+            return jsonify(cached_events.value)
             
         # Get users based on role and filter
         try:
@@ -146,33 +203,27 @@ def events():
             raise
         
         logging.info(f"Processing {len(users)} users for calendar events")
+        user_ids = [user.id for user in users]
+        request_user_ids = [user_id] if user_id else user_ids
         
         # Get leaves and permissions for the date range
         try:
-            if user_id:
-                leaves = LeaveRequest.query.filter(
-                    LeaveRequest.user_id == user_id,
-                    LeaveRequest.start_date <= end_date,
-                    LeaveRequest.end_date >= start_date
-                ).all()
-                permissions = PermissionRequest.query.filter(
-                    PermissionRequest.user_id == user_id,
-                    func.date(PermissionRequest.start_time) >= start_date,
-                    func.date(PermissionRequest.start_time) <= end_date
-                ).all()
-            else:
-                # Get leaves and permissions for all users
-                user_ids = [user.id for user in users]
-                leaves = LeaveRequest.query.filter(
-                    LeaveRequest.user_id.in_(user_ids),
-                    LeaveRequest.start_date <= end_date,
-                    LeaveRequest.end_date >= start_date
-                ).all()
-                permissions = PermissionRequest.query.filter(
-                    PermissionRequest.user_id.in_(user_ids),
-                    func.date(PermissionRequest.start_time) >= start_date,
-                    func.date(PermissionRequest.start_time) <= end_date
-                ).all()
+            from sqlalchemy.orm import joinedload
+            leaves = LeaveRequest.query.options(
+                joinedload(LeaveRequest.user),
+                joinedload(LeaveRequest.leave_type)
+            ).filter(
+                LeaveRequest.user_id.in_(request_user_ids),
+                LeaveRequest.start_date <= end_date,
+                LeaveRequest.end_date >= start_date
+            ).order_by(LeaveRequest.id).all()
+            permissions = PermissionRequest.query.options(
+                joinedload(PermissionRequest.user)
+            ).filter(
+                PermissionRequest.user_id.in_(request_user_ids),
+                PermissionRequest.start_time >= datetime.combine(start_date, datetime.min.time()),
+                PermissionRequest.start_time < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+            ).order_by(PermissionRequest.id).all()
             
             logging.info(f"Found {len(leaves)} leave requests and {len(permissions)} permission requests")
         except Exception as e:
@@ -207,12 +258,12 @@ def events():
                 'type': 'permission'
             })
         
-        # Add paid holiday events
+        # Add paid holiday events (including ranges that started before the visible range)
         try:
             from models import PaidHoliday
             paid_holidays = PaidHoliday.query.filter(
-                PaidHoliday.start_date >= start_date,
-                PaidHoliday.start_date <= end_date
+                PaidHoliday.start_date <= end_date,
+                func.coalesce(PaidHoliday.end_date, PaidHoliday.start_date) >= start_date
             ).all()
             
             for holiday in paid_holidays:
@@ -235,7 +286,7 @@ def events():
                         'id': f"holiday_{holiday.id}",
                         'title': f"🏖️ {holiday.description}",
                         'start': holiday.start_date.isoformat(),
-                        'end': (holiday.end_date + timedelta(days=1)).isoformat(),
+                        'end': ((holiday.end_date or holiday.start_date) + timedelta(days=1)).isoformat(),
                         'color': '#6f42c1',  # Purple color for holidays
                         'url': f"/dashboard/paid-holidays",
                         'status': 'holiday',
@@ -248,95 +299,44 @@ def events():
         # Process attendance only for past dates and today (not future dates)
         try:
             today = datetime.today().date()
-            current_date = start_date
-            while current_date <= end_date:
-                # Skip future dates for attendance processing
-                if current_date > today:
-                    current_date += timedelta(days=1)
+            last_attendance_date = min(end_date, today)
+            attendance_bounds = _daily_attendance_bounds(user_ids, start_date, last_attendance_date)
+            
+            # Approved leave / permission per (user, day); the oldest request wins as before
+            approved_leaves = {}
+            for leave in leaves:
+                if leave.status != 'approved':
                     continue
-                    
-                # Get attendance logs for this date
-                start_datetime = datetime.combine(current_date, datetime.min.time())
-                end_datetime = datetime.combine(current_date, datetime.max.time())
-                
-                # Optimize query - only get logs for users we care about
-                user_ids_list = [user.id for user in users]
-                today_logs = AttendanceLog.query.filter(
-                    AttendanceLog.timestamp.between(start_datetime, end_datetime),
-                    AttendanceLog.user_id.in_(user_ids_list)
-                ).order_by(AttendanceLog.timestamp.desc()).all()
+                day = max(leave.start_date, start_date)
+                while day <= min(leave.end_date, last_attendance_date):
+                    approved_leaves.setdefault((leave.user_id, day), leave)
+                    day += timedelta(days=1)
+            approved_permission_days = {
+                (permission.user_id, permission.start_time.date())
+                for permission in permissions if permission.status == 'approved'
+            }
             
-                # Process logs using same logic as Daily Attendance
-                processed_logs = {}
-                for log in today_logs:
-                    if log.user_id not in processed_logs:
-                        processed_logs[log.user_id] = {
-                            'user': log.user,
-                            'check_in': None,
-                            'check_out': None,
-                            'duration': None,
-                            'status': 'absent',
-                            'all_logs': []  # Store all logs for this user
-                        }
-                    
-                    # Add log to all_logs
-                    processed_logs[log.user_id]['all_logs'].append(log)
-                    
-                    # Determine check-in/check-out using same logic as Daily Attendance
-                    log_type = 'check-in' if log.timestamp.hour < 12 else 'check-out'
-                    if log_type == 'check-in' and (not processed_logs[log.user_id]['check_in'] or 
-                                                  log.timestamp < processed_logs[log.user_id]['check_in'].timestamp):
-                        processed_logs[log.user_id]['check_in'] = log
-                        processed_logs[log.user_id]['status'] = 'in_office'
-                    elif log_type == 'check-out' and (not processed_logs[log.user_id]['check_out'] or 
-                                                     log.timestamp > processed_logs[log.user_id]['check_out'].timestamp):
-                        processed_logs[log.user_id]['check_out'] = log
-                    
-                    # Calculate duration and update status if both exist
-                    if processed_logs[log.user_id]['check_in'] and processed_logs[log.user_id]['check_out']:
-                        duration = processed_logs[log.user_id]['check_out'].timestamp - processed_logs[log.user_id]['check_in'].timestamp
-                        processed_logs[log.user_id]['duration'] = duration
-                        processed_logs[log.user_id]['status'] = 'present'
-                
-                # Sort all_logs by timestamp for each user
-                for user_id_key, data in processed_logs.items():
-                    data['all_logs'].sort(key=lambda x: x.timestamp)
+            current_date = start_date
+            while current_date <= last_attendance_date:
+                is_weekend = current_date.weekday() in [4, 5]  # Friday/Saturday
                 
-                # Only show users who have actual attendance records, leave, or permission for this date
                 for user in users:
-                    is_weekend = current_date.weekday() in [4, 5]  # Friday/Saturday
-                    
                     # Check if before joining date
                     if user.joining_date and current_date < user.joining_date:
                         continue  # Don't show users before their joining date
                     
-                    # Don't show attendance data for future dates
-                    if current_date > today:
-                        continue  # Skip future dates
-                    
-                    # Check for leave
-                    leave_request = LeaveRequest.query.filter(
-                        LeaveRequest.user_id == user.id,
-                        LeaveRequest.status == 'approved',
-                        LeaveRequest.start_date <= current_date,
-                        LeaveRequest.end_date >= current_date
-                    ).first()
-                    
-                    # Check for permission
-                    permission_request = PermissionRequest.query.filter(
-                        PermissionRequest.user_id == user.id,
-                        func.date(PermissionRequest.start_time) == current_date,
-                        PermissionRequest.status == 'approved'
-                    ).first()
+                    leave_request = approved_leaves.get((user.id, current_date))
+                    has_permission = (user.id, current_date) in approved_permission_days
+                    bounds = attendance_bounds.get((user.id, current_date))
                     
                     # Only show user if they have attendance, leave, or permission records
                     should_show_user = False
                     status = ''
                     color = '#6c757d'
                     
-                    if user.id in processed_logs:
+                    if bounds:
                         # User has attendance logs
-                        user_data = processed_logs[user.id]
+                        attendance_status = _attendance_status(*bounds)
                         should_show_user = True
                         
                         if leave_request:
@@ -344,16 +344,16 @@ def events():
                             leave_type_name = leave_request.leave_type.name if leave_request.leave_type else 'Leave Request'
                             status = leave_type_name
                             color = '#ffc107'  # Yellow for leave
-                        elif permission_request:
+                        elif has_permission:
                             status = 'Permission'
                             color = '#17a2b8'  # Blue for permission
-                        elif is_weekend and user_data['status'] == 'present':
+                        elif is_weekend and attendance_status == 'present':
                             status = 'Day Off / Present'
                             color = '#28a745'  # Green for present on weekend
-                        elif user_data['status'] == 'present':
+                        elif attendance_status == 'present':
                             status = 'Present'
                             color = '#28a745'  # Green for present
-                        elif user_data['status'] == 'in_office':
+                        elif attendance_status == 'in_office':
                             status = 'In Office'
                             color = '#6f42c1'  # Purple for in office
                         else:
@@ -368,7 +368,7 @@ def events():
                         status = leave_type_name
                         color = '#ffc107'  # Yellow for leave
                         
-                    elif permission_request:
+                    elif has_permission:
                         # User has permission but no attendance
                         should_show_user = True
                         status = 'Permission'
@@ -398,8 +398,7 @@ def events():
             logging.error(f"Error processing attendance logs: {str(e)}")
             raise
         
-        # Store in cache for this request
-        setattr(g, cache_key, events)
+        cached_events.store(events)
         
         logging.info(f"Returning {len(events)} events for calendar")
         if filter_user_id:
@@ -692,17 +691,14 @@ def summary():
         'extra_hours': round(extra_hours, 2)
     })
 
-@calendar_bp.route('/export-attendance-report')
-@login_required
-@role_required(['admin', 'product_owner'])
-def export_attendance_report():
-    """Export attendance report to Excel or PDF"""
+def build_attendance_report_export(viewer, query_args):
+    """Export attendance report to Excel or PDF for viewer, from the export's query_args"""
     
     # Get the same parameters as the attendance report
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    user_ids = request.args.getlist('user_ids', type=int)
-    export_format = request.args.get('format', 'excel').lower()  # excel or pdf
+    start_date_str = query_args.get('start_date')
+    end_date_str = query_args.get('end_date')
+    user_ids = query_args.getlist('user_ids', type=int)
+    export_format = query_args.get('format', 'excel').lower()  # excel or pdf
     
     if not start_date_str or not end_date_str:
         return jsonify({'error': 'Start date and end date are required'}), 400
@@ -714,11 +710,11 @@ def export_attendance_report():
         return jsonify({'error': 'Invalid date format'}), 400
     
     # Get users for export based on role
-    if current_user.role == 'manager':
+    if viewer.role == 'manager':
         from helpers import get_employees_for_manager
-        employees = get_employees_for_manager(current_user.id)
-        users = [emp for emp in employees if emp.status == 'active'] + [current_user]
-    elif current_user.role in ['admin', 'product_owner', 'director']:
+        employees = get_employees_for_manager(viewer.id)
+        users = [emp for emp in employees if emp.status == 'active'] + [viewer]
+    elif viewer.role in ['admin', 'product_owner', 'director']:
         # Admin/Technical Support/Director sees all active users (same as regular report)
         users = User.query.filter(
             User.status == 'active',
@@ -728,7 +724,7 @@ def export_attendance_report():
             User.last_name != ''             # Exclude users without last names
         ).all()
     else:
-        users = [current_user] if current_user.status == 'active' else []
+        users = [viewer] if viewer.status == 'active' else []
     
     # Filter users if specific users are selected
     if user_ids:
@@ -756,6 +752,31 @@ def export_attendance_report():
     else:
         return export_to_excel(all_user_reports, start_date, end_date)
 
+@calendar_bp.route('/export-attendance-report')
+@login_required
+@role_required(['admin', 'product_owner'])
+@background_export(build_attendance_report_export, roles=['admin', 'product_owner'])
+def export_attendance_report():
+    """Export attendance report to Excel or PDF"""
+    return build_attendance_report_export(current_user, request.args)
+
+def _attendance_report_export_rows(all_user_reports):
+    """Yield one summary row per user report for the attendance report sheet"""
+    for user_report in all_user_reports:
+        user = user_report.user
+        metrics = user_report.summary_metrics
+        
+        yield [
+            f"{user.first_name} {user.last_name}",
+            metrics.present_days,
+            metrics.absent_days,
+            metrics.annual_leave_days + metrics.paid_leave_days,
+            metrics.day_off_days,
+            f"{metrics.extra_time_hours:.2f}",
+            metrics.total_days,
+            metrics.total_working_days
+        ]
+
 def export_to_excel(all_user_reports, start_date, end_date):
     """Export attendance report to Excel format"""
     try:
@@ -765,6 +786,23 @@ def export_to_excel(all_user_reports, start_date, end_date):
     except ImportError:
         return jsonify({'error': 'Excel export not available. Please install openpyxl package.'}), 500
     
+    title = f"Attendance Report ({start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')})"
+    headers = ['Employee', 'Present Days', 'Absent Days', 'Leave Days', 'Day Off', 'Extra Hours', 'Total Days', 'Effective Days']
+    
+    # Create filename
+    filename = f"Attendance_Report_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.xlsx"
+    
+    if current_app.config.get('EXCEL_STREAMING_EXPORT', True):
+        from report_helpers.excel_export import StreamingExcelSheet
+        
+        sheet = StreamingExcelSheet("Attendance Report", [15] * 8)
+        sheet.title(title, 8)
+        sheet.blank()
+        sheet.header(headers)
+        for values in _attendance_report_export_rows(all_user_reports):
+            sheet.row(values)
+        return sheet.response(filename)
+    
     # Create workbook and worksheet
     wb = Workbook()
     ws = wb.active
@@ -781,14 +819,12 @@ def export_to_excel(all_user_reports, start_date, end_date):
     )
     
     # Add title
-    title = f"Attendance Report ({start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')})"
     ws.merge_cells('A1:H1')
     ws['A1'] = title
     ws['A1'].font = Font(bold=True, size=14)
     ws['A1'].alignment = Alignment(horizontal='center')
     
     # Add headers
-    headers = ['Employee', 'Present Days', 'Absent Days', 'Leave Days', 'Day Off', 'Extra Hours', 'Total Days', 'Effective Days']
     for col, header in enumerate(headers, 1):
         cell = ws.cell(row=3, column=col, value=header)
         cell.font = header_font
@@ -798,19 +834,9 @@ def export_to_excel(all_user_reports, start_date, end_date):
     
     # Add data
     row = 4
-    for user_report in all_user_reports:
-        user = user_report.user
-        metrics = user_report.summary_metrics
-        
-        ws.cell(row=row, column=1, value=f"{user.first_name} {user.last_name}").border = border
-        ws.cell(row=row, column=2, value=metrics.present_days).border = border
-        ws.cell(row=row, column=3, value=metrics.absent_days).border = border
-        ws.cell(row=row, column=4, value=metrics.annual_leave_days + metrics.paid_leave_days).border = border
-        ws.cell(row=row, column=5, value=metrics.day_off_days).border = border
-        ws.cell(row=row, column=6, value=f"{metrics.extra_time_hours:.2f}").border = border
-        ws.cell(row=row, column=7, value=metrics.total_days).border = border
-        ws.cell(row=row, column=8, value=metrics.total_working_days).border = border
-        
+    for values in _attendance_report_export_rows(all_user_reports):
+        for col, value in enumerate(values, 1):
+            ws.cell(row=row, column=col, value=value).border = border
         row += 1
     
     # Auto-adjust column widths
@@ -822,9 +848,6 @@ def export_to_excel(all_user_reports, start_date, end_date):
     wb.save(output)
     output.seek(0)
     
-    # Create filename
-    filename = f"Attendance_Report_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.xlsx"
-    
     # Create response
     response = make_response(output.getvalue())
     response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
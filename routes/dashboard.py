@@ -3,12 +3,14 @@ import os
 import logging
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, date
-from sqlalchemy import cast
+from collections import defaultdict
+from sqlalchemy import cast, func, case
 from sqlalchemy.dialects.postgresql import DATE as PostgresDate, TIMESTAMP as PostgresTimestamp, BOOLEAN as PostgresBoolean
 from pytz import timezone, utc
 from app import db
 from models import User, LeaveRequest, PermissionRequest, DailyAttendance, Department, SMTPConfiguration, LeaveBalance, PaidHoliday, LeaveType
-from helpers import role_required, get_dashboard_stats, log_activity
+from helpers import role_required, get_dashboard_stats, log_activity, count_by_status, get_departments
+from live_updates import conditional_poll
 from forms import UserEditForm, EmployeeAttachmentForm, SMTPConfigurationForm # Assuming UserEditForm is defined in forms.py
 
 # Helper function to cast date columns for PostgreSQL compatibility
@@ -313,27 +315,20 @@ def manager():
             
             # Get pending requests that need approval (only for managers)
             if current_user.role == 'manager':
-                for employee in employees:
-                    # Skip if this is the manager's own request (we'll display in a separate section)
-                    if employee.id == current_user.id:
-                        continue
-                        
-                    # Get leave requests needing manager approval
-                    leave_requests = LeaveRequest.query.filter_by(
-                        user_id=employee.id,
-                        status='pending',
-                        manager_status='pending'
+                # Skip the manager's own requests (we'll display them in a separate section)
+                team_ids = [employee.id for employee in employees if employee.id != current_user.id]
+                if team_ids:
+                    # Leave and permission requests needing manager approval, one query each
+                    pending_leave_requests = LeaveRequest.query.filter(
+                        LeaveRequest.user_id.in_(team_ids),
+                        LeaveRequest.status == 'pending',
+                        LeaveRequest.manager_status == 'pending'
                     ).order_by(LeaveRequest.created_at.desc()).all()
-                    
-                    # Get permission requests needing manager approval
-                    permission_requests = PermissionRequest.query.filter_by(
-                        user_id=employee.id,
-                        status='pending',
-                        manager_status='pending'
+                    pending_permission_requests = PermissionRequest.query.filter(
+                        PermissionRequest.user_id.in_(team_ids),
+                        PermissionRequest.status == 'pending',
+                        PermissionRequest.manager_status == 'pending'
                     ).order_by(PermissionRequest.created_at.desc()).all()
-                    
-                    pending_leave_requests.extend(leave_requests)
-                    pending_permission_requests.extend(permission_requests)
         else:
             employees = []
     
@@ -541,27 +536,17 @@ def admin():
         all_users = User.query.order_by(User.created_at.desc()).limit(10).all()
         departments = Department.query.all()
     
-    # Get department data for analytics
+    # Get department data for analytics (grouped counts instead of three queries per department)
+    from report_helpers.dashboard_stats import department_request_breakdown
+    breakdown = department_request_breakdown([dept.id for dept in departments])
     department_data = []
     
     for dept in departments:
-        dept_employees = User.query.filter_by(department_id=dept.id).count()
-        dept_leaves = LeaveRequest.query.join(User, LeaveRequest.user_id == User.id).filter(
-            User.department_id == dept.id,
-            LeaveRequest.status == 'approved'
-        ).count()
-        dept_permissions = PermissionRequest.query.join(
-            User, PermissionRequest.user_id == User.id
-        ).filter(
-            User.department_id == dept.id,
-            PermissionRequest.status == 'approved'
-        ).count()
-        
         department_data.append({
             'name': dept.department_name,
-            'employees': dept_employees,
-            'leaves': dept_leaves,
-            'permissions': dept_permissions
+            'employees': breakdown[dept.id]['employees'],
+            'leaves': breakdown[dept.id]['leaves'],
+            'permissions': breakdown[dept.id]['permissions']
         })
     
     # Get leave management data
@@ -636,7 +621,7 @@ def users():
     all_users.sort(key=lambda user: int(user.fingerprint_number) if user.fingerprint_number is not None and (isinstance(user.fingerprint_number, int) or (isinstance(user.fingerprint_number, str) and user.fingerprint_number.isdigit())) else 0)
     
     # Get all departments for filtering
-    departments = Department.query.all()
+    departments = get_departments()
     
     return render_template('dashboard/users.html',
                           title=title,
@@ -818,7 +803,7 @@ def edit_user(user_id):
             flash('❌ Access Denied: Directors can only edit their own account.', 'danger')
             return redirect(url_for('dashboard.users'))
     
-    departments = Department.query.all()
+    departments = get_departments()
 
     # Check if the user being edited is a Technical Support
     is_editing_product_owner = user.role == 'product_owner'
@@ -1091,19 +1076,9 @@ def director():
     
     stats = get_dashboard_stats(current_user)
     
-    # Get ALL permission requests for director view (not limited)
-    all_permission_requests = PermissionRequest.query.order_by(PermissionRequest.created_at.desc()).all()
-    
-    # Separate by status for easy filtering in template
-    pending_permissions = [p for p in all_permission_requests if p.status == 'pending']
-    approved_permissions = [p for p in all_permission_requests if p.status == 'approved']
-    rejected_permissions = [p for p in all_permission_requests if p.status == 'rejected']
-    
-    # Get leave request statistics for overview
-    all_leave_requests = LeaveRequest.query.order_by(LeaveRequest.created_at.desc()).all()
-    pending_leave_requests = LeaveRequest.query.filter_by(status='pending').order_by(LeaveRequest.created_at.desc()).all()
-    approved_leave_requests = LeaveRequest.query.filter_by(status='approved').order_by(LeaveRequest.created_at.desc()).all()
-    rejected_leave_requests = LeaveRequest.query.filter_by(status='rejected').order_by(LeaveRequest.created_at.desc()).all()
+    # Status counts for the overview cards (one GROUP BY each instead of loading every request)
+    permission_counts = count_by_status(PermissionRequest.query, PermissionRequest)
+    leave_counts = count_by_status(LeaveRequest.query, LeaveRequest)
     
     # Get pending leave requests for table (limited to 5)
     pending_leave_requests_table = LeaveRequest.query.filter_by(status='pending').order_by(LeaveRequest.created_at.desc()).limit(5).all()
@@ -1125,33 +1100,31 @@ def director():
     leave_type_stats = []
     total_leave_requests = 0
     
+    # Per-type totals, status counts and recent counts in one grouped query
+    recent_date = datetime.now() - timedelta(days=30)
+    type_rows = db.session.query(
+        LeaveRequest.leave_type_id,
+        func.count(LeaveRequest.id),
+        func.sum(case((LeaveRequest.status == 'pending', 1), else_=0)),
+        func.sum(case((LeaveRequest.status == 'approved', 1), else_=0)),
+        func.sum(case((LeaveRequest.status == 'rejected', 1), else_=0)),
+        func.sum(case((LeaveRequest.created_at >= recent_date, 1), else_=0))
+    ).group_by(LeaveRequest.leave_type_id).all()
+    type_counts = {row[0]: row[1:] for row in type_rows}
+    
+    # Approved days per type, read as plain column tuples
+    approved_days = defaultdict(int)
+    for leave_type_id, start_date, end_date in db.session.query(
+        LeaveRequest.leave_type_id, LeaveRequest.start_date, LeaveRequest.end_date
+    ).filter(LeaveRequest.status == 'approved'):
+        if start_date and end_date:
+            approved_days[leave_type_id] += (end_date - start_date).days + 1
+    
     for leave_type in leave_types:
-        # Count all leave requests for this type
-        total_count = LeaveRequest.query.filter_by(leave_type_id=leave_type.id).count()
-        
-        # Count by status
-        pending_count = LeaveRequest.query.filter_by(leave_type_id=leave_type.id, status='pending').count()
-        approved_count = LeaveRequest.query.filter_by(leave_type_id=leave_type.id, status='approved').count()
-        rejected_count = LeaveRequest.query.filter_by(leave_type_id=leave_type.id, status='rejected').count()
-        
-        # Count recent requests (last 30 days)
-        from datetime import timedelta
-        recent_date = datetime.now() - timedelta(days=30)
-        recent_count = LeaveRequest.query.filter(
-            LeaveRequest.leave_type_id == leave_type.id,
-            LeaveRequest.created_at >= recent_date
-        ).count()
-        
-        # Calculate total leave days used
-        approved_requests = LeaveRequest.query.filter_by(
-            leave_type_id=leave_type.id, 
-            status='approved'
-        ).all()
-        
-        total_days_used = 0
-        for request in approved_requests:
-            if request.start_date and request.end_date:
-                total_days_used += (request.end_date - request.start_date).days + 1
+        total_count, pending_count, approved_count, rejected_count, recent_count = (
+            int(value or 0) for value in type_counts.get(leave_type.id, (0, 0, 0, 0, 0))
+        )
+        total_days_used = approved_days[leave_type.id]
         
         # Generate consistent color based on leave type name
         color_hash = hash(leave_type.name) % 360
@@ -1211,14 +1184,8 @@ def director():
     return render_template('dashboard/director.html',
                           title='Director Dashboard',
                           stats=stats,
-                          all_permission_requests=all_permission_requests,
-                          pending_permissions=pending_permissions,
-                          approved_permissions=approved_permissions,
-                          rejected_permissions=rejected_permissions,
-                          all_leave_requests=all_leave_requests,
-                          pending_leave_requests=pending_leave_requests,
-                          approved_leave_requests=approved_leave_requests,
-                          rejected_leave_requests=rejected_leave_requests,
+                          permission_counts=permission_counts,
+                          leave_counts=leave_counts,
                           pending_leave_requests_table=pending_leave_requests_table,
                           recent_leave_balances=recent_leave_balances,
                           upcoming_paid_holidays=upcoming_paid_holidays,
@@ -1226,12 +1193,12 @@ def director():
                           total_leave_requests=total_leave_requests,
                           recent_activities=recent_activities,
                           # Auto-fetch data attributes
-                          pending_leave_requests_count=len(pending_leave_requests),
-                          pending_permission_requests_count=len(pending_permissions),
-                          approved_leave_requests_count=len(approved_leave_requests),
-                          approved_permission_requests_count=len(approved_permissions),
-                          rejected_leave_requests_count=len(rejected_leave_requests),
-                          rejected_permission_requests_count=len(rejected_permissions),
+                          pending_leave_requests_count=leave_counts['pending'],
+                          pending_permission_requests_count=permission_counts['pending'],
+                          approved_leave_requests_count=leave_counts['approved'],
+                          approved_permission_requests_count=permission_counts['approved'],
+                          rejected_leave_requests_count=leave_counts['rejected'],
+                          rejected_permission_requests_count=permission_counts['rejected'],
                           total_employees=stats.get('total_employees', 0),
                           total_departments=stats.get('total_departments', 0),
                           attendance_rate=stats.get('attendance_rate', 0),
@@ -2305,6 +2272,7 @@ def my_leave_balance():
 
 @dashboard_bp.route('/api/stats')
 @login_required
+@conditional_poll('users', 'departments', 'leave_requests', 'permission_requests', 'attendance_logs', 'leave_balances', 'leave_types')
 def api_stats():
     """API endpoint to get dashboard statistics"""
     try:
@@ -0,0 +1,35 @@
+from flask import Blueprint, jsonify, send_file, abort
+from flask_login import login_required, current_user
+from models import ExportJob
+import io
+
+exports_bp = Blueprint('exports', __name__, url_prefix='/exports')
+
+def _get_own_job(job_id):
+    """Export job owned by the current user, or 404"""
+    job = ExportJob.query.get(job_id)
+    if not job or job.user_id != current_user.id:
+        abort(404)
+    return job
+
+@exports_bp.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Poll the status of a background export"""
+    return jsonify(_get_own_job(job_id).to_dict())
+
+@exports_bp.route('/jobs/<job_id>/download')
+@login_required
+def download(job_id):
+    """Download the file produced by a finished export"""
+    job = _get_own_job(job_id)
+    if job.status != 'done':
+        return jsonify({'error': 'Export is not ready', 'status': job.status}), 409
+    if job.content is None:
+        return jsonify({'error': 'Export file has expired'}), 410
+    return send_file(
+        io.BytesIO(job.content),
+        as_attachment=True,
+        download_name=job.filename,
+        mimetype=job.mimetype
+    )
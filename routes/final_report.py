@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, current_app, send_file
 from flask_login import login_required, current_user
+from export_jobs import background_export
 from functools import wraps
 from datetime import datetime, date, timedelta
 from models import User, DailyAttendance, LeaveRequest, PermissionRequest, AttendanceLog, PaidHoliday, Note, Department, db
@@ -14,7 +15,7 @@ import io
 import os
 # Import shared calculation function
 from report_helpers.report_calculations import calculate_unified_report_data, calculate_multiple_users_report_data
-from helpers import format_hours_minutes
+from helpers import format_hours_minutes, get_departments
 
 final_report_bp = Blueprint('final_report', __name__)
 
@@ -456,51 +457,18 @@ def role_required(roles):
     return decorator
 
 def ensure_attendance_logs_processed(start_date, end_date):
-    """Ensure all attendance logs in the date range are processed into DailyAttendance records"""
-    from models import AttendanceLog, User, DailyAttendance
-    from routes.attendance import process_daily_attendance
-    from sqlalchemy import func, and_
+    """Ensure all attendance logs in the date range are processed into DailyAttendance records.
+
+    DailyAttendance is kept fresh by the post-sync recompute, so this only drains days that
+    are still queued as dirty (normally none) instead of scanning the whole range.
+    """
+    from routes.attendance import recompute_dirty_attendance
     import logging
     
     try:
-        # Get all attendance logs in the date range
-        attendance_logs = AttendanceLog.query.filter(
-            func.date(AttendanceLog.timestamp) >= start_date,
-            func.date(AttendanceLog.timestamp) <= end_date
-        ).all()
-        
-        # Group by user and date (convert to Python date objects)
-        user_dates = set()
-        for log in attendance_logs:
-            log_date = log.timestamp.date()  # Convert to Python date object
-            user_dates.add((log.user_id, log_date))
-        
-        # Check which ones already have DailyAttendance records
-        user_dates_to_process = []
-        for user_id, log_date in user_dates:
-            existing_record = DailyAttendance.query.filter_by(
-                user_id=user_id,
-                date=log_date
-            ).first()
-            
-            if not existing_record:
-                user_dates_to_process.append((user_id, log_date))
-        
-        # Only process user-date combinations that don't have DailyAttendance records
-        processed_count = 0
-        for user_id, log_date in user_dates_to_process:
-            try:
-                # Ensure we're using a fresh session for each processing
-                db.session.rollback()  # Clear any pending transactions
-                process_daily_attendance(user_id, log_date)
-                db.session.commit()  # Commit each one individually
-                processed_count += 1
-            except Exception as e:
-                logging.error(f"Error processing daily attendance for user {user_id} on {log_date}: {str(e)}")
-                db.session.rollback()  # Rollback on error
-                continue
-        
-        logging.info(f"Processed {processed_count} new user-date combinations for attendance logs")
+        processed_count = recompute_dirty_attendance()
+        if processed_count:
+            logging.info(f"Processed {processed_count} pending dirty days before report for {start_date} to {end_date}")
         
     except Exception as e:
         logging.error(f"Error in ensure_attendance_logs_processed: {str(e)}")
@@ -528,7 +496,7 @@ def final_report():
             def sync_task():
                 try:
                     with current_app.app_context():
-                        sync_attendance_task(full_sync=True)
+                        sync_attendance_task()
                 except Exception as e:
                     logging.error(f'Error auto-syncing data on final report page load: {str(e)}')
             
@@ -581,7 +549,7 @@ def final_report():
     users = sorted(users, key=get_fingerprint_sort_key)
     
     # Get all departments for filter dropdown
-    departments = Department.query.all()
+    departments = get_departments()
     
     # Get date range from query parameters (no default - user must choose)
     start_date_str = request.args.get('start_date')
@@ -646,9 +614,9 @@ def final_report():
     # Generate report data using unified calculation logic
     all_user_reports = []
     
-    for user in users:
-        # Use the unified calculation function to ensure exact same logic across all reports
-        user_report = calculate_unified_report_data(user, start_date, end_date)
+    # Use the unified calculation function to ensure exact same logic across all reports;
+    # source rows for all users are prefetched once
+    for user, user_report in zip(users, calculate_multiple_users_report_data(users, start_date, end_date)):
     
         # Use the unified calculation result
         summary_metrics = user_report.summary_metrics
@@ -749,16 +717,13 @@ def final_report():
                              departments=departments,
                              error_message=f"Error loading report: {str(e)}")
 
-@final_report_bp.route('/final-report/export')
-@login_required
-@role_required(['admin', 'product_owner'])
-def export_final_report():
-    """Export final report to Excel"""
+def build_final_report_export(viewer, query_args):
+    """Export final report to Excel for viewer, from the export's query_args"""
     
     # Get the same parameters as the final report
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    user_ids = request.args.getlist('user_ids', type=int)
+    start_date_str = query_args.get('start_date')
+    end_date_str = query_args.get('end_date')
+    user_ids = query_args.getlist('user_ids', type=int)
     
     if not start_date_str or not end_date_str:
         return jsonify({'error': 'Start date and end date are required'}), 400
@@ -770,15 +735,15 @@ def export_final_report():
         return jsonify({'error': 'Invalid date format'}), 400
     
     # Get users for export based on role
-    if current_user.role == 'employee':
+    if viewer.role == 'employee':
         # Employees can only export their own data
-        users = [current_user] if current_user.status == 'active' else []
-    elif current_user.role == 'manager':
+        users = [viewer] if viewer.status == 'active' else []
+    elif viewer.role == 'manager':
         # Managers can export their employees AND themselves
         from helpers import get_employees_for_manager
-        team_members = get_employees_for_manager(current_user.id)
+        team_members = get_employees_for_manager(viewer.id)
         # Include manager themselves
-        users = [current_user] + list(team_members)
+        users = [viewer] + list(team_members)
         # Filter to active users only
         users = [u for u in users if u.status == 'active' and 
                  not u.first_name.startswith('User') and 
@@ -797,14 +762,14 @@ def export_final_report():
     # Filter users if specific users are selected
     if user_ids:
         # For employees, ensure they can only export themselves
-        if current_user.role == 'employee':
-            user_ids = [current_user.id] if current_user.id in user_ids else []
+        if viewer.role == 'employee':
+            user_ids = [viewer.id] if viewer.id in user_ids else []
         # For managers, ensure they can only export their own employees and themselves
-        elif current_user.role == 'manager':
+        elif viewer.role == 'manager':
             manager_employee_ids = [u.id for u in users]
             # Always allow manager to export themselves
-            if current_user.id not in manager_employee_ids:
-                manager_employee_ids.append(current_user.id)
+            if viewer.id not in manager_employee_ids:
+                manager_employee_ids.append(viewer.id)
             user_ids = [uid for uid in user_ids if uid in manager_employee_ids]
         users = [user for user in users if user.id in user_ids]
     
@@ -822,12 +787,7 @@ def export_final_report():
     users = sorted(users, key=get_fingerprint_sort_key)
     
     # Generate report data using the EXACT SAME logic as the main route
-    all_user_reports = []
-    
-    for user in users:
-        # Use the unified calculation function to ensure exact same logic as web view
-        user_report = calculate_unified_report_data(user, start_date, end_date)
-        all_user_reports.append(user_report)
+    all_user_reports = calculate_multiple_users_report_data(users, start_date, end_date)
     
     # Create Excel workbook
     wb = Workbook()
@@ -929,6 +889,15 @@ def export_final_report():
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
 
+
+@final_report_bp.route('/final-report/export')
+@login_required
+@role_required(['admin', 'product_owner'])
+@background_export(build_final_report_export, roles=['admin', 'product_owner'])
+def export_final_report():
+    """Export final report to Excel"""
+    return build_final_report_export(current_user, request.args)
+
 def role_required(roles):
     """Decorator to check if user has required role"""
     def decorator(f):
@@ -963,7 +932,7 @@ def detailed_attendance_report():
             def sync_task():
                 try:
                     with current_app.app_context():
-                        sync_attendance_task(full_sync=True)
+                        sync_attendance_task()
                 except Exception as e:
                     logging.error(f'Error auto-syncing data on detailed attendance report page load: {str(e)}')
             
@@ -1027,7 +996,7 @@ def detailed_attendance_report():
     users = sorted(users, key=get_fingerprint_sort_key)
     
     # Get all departments for filter dropdown
-    departments = Department.query.all()
+    departments = get_departments()
     
     # Get date range from query parameters (no default - user must choose)
     start_date_str = request.args.get('start_date')
@@ -1076,10 +1045,8 @@ def detailed_attendance_report():
     # Generate report data with duplicate removal - using exact same logic as final_report
     all_user_reports = []
     
-    for user in users:
-        # Use the unified calculation function to ensure exact same logic as Final Report web view
-        user_report = calculate_unified_report_data(user, start_date, end_date)
-        
+    # Use the unified calculation function to ensure exact same logic as Final Report web view
+    for user, user_report in zip(users, calculate_multiple_users_report_data(users, start_date, end_date)):
         all_user_reports.append({
             'user': user,
             'summary_metrics': user_report.summary_metrics,
@@ -1421,16 +1388,13 @@ def get_employee_logs(user_id):
         logging.error(f"Unhandled error in get_employee_logs for user {user_id}: {e}", exc_info=True)
         return jsonify({'success': False, 'error': 'Internal Server Error', 'message': str(e)}), 500
 
-@final_report_bp.route('/detailed-attendance-report/export')
-@login_required
-@role_required(['admin', 'director', 'support', 'product_owner', 'manager'])
-def export_detailed_attendance_report():
-    """Export detailed attendance report to Excel with summary and daily attendance details"""
+def build_detailed_attendance_report_export(viewer, query_args):
+    """Export detailed attendance report to Excel (summary and daily details) for viewer, from the export's query_args"""
     
     # Get the same parameters as the detailed attendance report
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    user_ids = request.args.getlist('user_ids', type=int)
+    start_date_str = query_args.get('start_date')
+    end_date_str = query_args.get('end_date')
+    user_ids = query_args.getlist('user_ids', type=int)
     
     if not start_date_str or not end_date_str:
         return jsonify({'error': 'Start date and end date are required'}), 400
@@ -1442,12 +1406,12 @@ def export_detailed_attendance_report():
         return jsonify({'error': 'Invalid date format'}), 400
     
     # Get users for export based on role
-    if current_user.role == 'manager':
+    if viewer.role == 'manager':
         # Managers can export their employees AND themselves
         from helpers import get_employees_for_manager
-        team_members = get_employees_for_manager(current_user.id)
+        team_members = get_employees_for_manager(viewer.id)
         # Include manager themselves
-        users = [current_user] + list(team_members)
+        users = [viewer] + list(team_members)
         # Filter to active users only
         users = [u for u in users if u.status == 'active' and 
                  not u.first_name.startswith('User') and 
@@ -1466,11 +1430,11 @@ def export_detailed_attendance_report():
     # Filter users if specific users are selected
     if user_ids:
         # For managers, ensure they can only export their own employees and themselves
-        if current_user.role == 'manager':
+        if viewer.role == 'manager':
             manager_employee_ids = [u.id for u in users]
             # Always allow manager to export themselves
-            if current_user.id not in manager_employee_ids:
-                manager_employee_ids.append(current_user.id)
+            if viewer.id not in manager_employee_ids:
+                manager_employee_ids.append(viewer.id)
             user_ids = [uid for uid in user_ids if uid in manager_employee_ids]
         users = [user for user in users if user.id in user_ids]
     
@@ -1488,12 +1452,7 @@ def export_detailed_attendance_report():
     users = sorted(users, key=get_fingerprint_sort_key)
     
     # Generate report data using the unified calculation logic
-    all_user_reports = []
-    
-    for user in users:
-        # Use the unified calculation function to ensure exact same logic as Final Report web view
-        user_report = calculate_unified_report_data(user, start_date, end_date)
-        all_user_reports.append(user_report)
+    all_user_reports = calculate_multiple_users_report_data(users, start_date, end_date)
     
     # Create Excel workbook
     wb = Workbook()
@@ -1846,16 +1805,22 @@ def export_detailed_attendance_report():
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
 
-@final_report_bp.route('/detailed-attendance-report/export-pdf')
+
+@final_report_bp.route('/detailed-attendance-report/export')
 @login_required
 @role_required(['admin', 'director', 'support', 'product_owner', 'manager'])
-def export_detailed_attendance_report_pdf():
-    """Export detailed attendance report to PDF"""
+@background_export(build_detailed_attendance_report_export, roles=['admin', 'director', 'support', 'product_owner', 'manager'])
+def export_detailed_attendance_report():
+    """Export detailed attendance report to Excel with summary and daily attendance details"""
+    return build_detailed_attendance_report_export(current_user, request.args)
+
+def build_detailed_attendance_report_pdf_export(viewer, query_args):
+    """Export detailed attendance report to PDF for viewer, from the export's query_args"""
     
     # Get the same parameters as the detailed attendance report
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    user_ids = request.args.getlist('user_ids', type=int)
+    start_date_str = query_args.get('start_date')
+    end_date_str = query_args.get('end_date')
+    user_ids = query_args.getlist('user_ids', type=int)
     
     if not start_date_str or not end_date_str:
         return jsonify({'error': 'Start date and end date are required'}), 400
@@ -1876,10 +1841,10 @@ def export_detailed_attendance_report_pdf():
         return jsonify({'error': 'PDF export not available. Please install reportlab package: pip install reportlab'}), 500
     
     # Get users for export based on role (same logic as Excel export)
-    if current_user.role == 'manager':
+    if viewer.role == 'manager':
         from helpers import get_employees_for_manager
-        team_members = get_employees_for_manager(current_user.id)
-        users = [current_user] + list(team_members)
+        team_members = get_employees_for_manager(viewer.id)
+        users = [viewer] + list(team_members)
         users = [u for u in users if u.status == 'active' and 
                  not u.first_name.startswith('User') and 
                  not u.first_name.startswith('NN-') and
@@ -1895,10 +1860,10 @@ def export_detailed_attendance_report_pdf():
     
     # Filter users if specific users are selected
     if user_ids:
-        if current_user.role == 'manager':
+        if viewer.role == 'manager':
             manager_employee_ids = [u.id for u in users]
-            if current_user.id not in manager_employee_ids:
-                manager_employee_ids.append(current_user.id)
+            if viewer.id not in manager_employee_ids:
+                manager_employee_ids.append(viewer.id)
             user_ids = [uid for uid in user_ids if uid in manager_employee_ids]
         users = [user for user in users if user.id in user_ids]
     
@@ -1916,10 +1881,7 @@ def export_detailed_attendance_report_pdf():
     users = sorted(users, key=get_fingerprint_sort_key)
     
     # Generate report data
-    all_user_reports = []
-    for user in users:
-        user_report = calculate_unified_report_data(user, start_date, end_date)
-        all_user_reports.append(user_report)
+    all_user_reports = calculate_multiple_users_report_data(users, start_date, end_date)
     
     # Pre-fetch all data for all users (same as Excel export)
     user_data_cache = {}
@@ -2305,15 +2267,21 @@ def export_detailed_attendance_report_pdf():
         mimetype='application/pdf'
     )
 
-@final_report_bp.route('/final-report/export-pdf')
+
+@final_report_bp.route('/detailed-attendance-report/export-pdf')
 @login_required
-@role_required(['admin', 'product_owner'])
-def export_final_report_pdf():
-    """Export final report to PDF"""
+@role_required(['admin', 'director', 'support', 'product_owner', 'manager'])
+@background_export(build_detailed_attendance_report_pdf_export, roles=['admin', 'director', 'support', 'product_owner', 'manager'])
+def export_detailed_attendance_report_pdf():
+    """Export detailed attendance report to PDF"""
+    return build_detailed_attendance_report_pdf_export(current_user, request.args)
+
+def build_final_report_pdf_export(viewer, query_args):
+    """Export final report to PDF for viewer, from the export's query_args"""
     
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    user_ids = request.args.getlist('user_ids', type=int)
+    start_date_str = query_args.get('start_date')
+    end_date_str = query_args.get('end_date')
+    user_ids = query_args.getlist('user_ids', type=int)
     
     if not start_date_str or not end_date_str:
         return jsonify({'error': 'Start date and end date are required'}), 400
@@ -2334,12 +2302,12 @@ def export_final_report_pdf():
         return jsonify({'error': 'PDF export not available. Please install reportlab package: pip install reportlab'}), 500
     
     # Get users (same logic as Excel export)
-    if current_user.role == 'employee':
-        users = [current_user] if current_user.status == 'active' else []
-    elif current_user.role == 'manager':
+    if viewer.role == 'employee':
+        users = [viewer] if viewer.status == 'active' else []
+    elif viewer.role == 'manager':
         from helpers import get_employees_for_manager
-        team_members = get_employees_for_manager(current_user.id)
-        users = [current_user] + list(team_members)
+        team_members = get_employees_for_manager(viewer.id)
+        users = [viewer] + list(team_members)
         users = [u for u in users if u.status == 'active' and 
                  not u.first_name.startswith('User') and 
                  not u.first_name.startswith('NN-') and
@@ -2354,12 +2322,12 @@ def export_final_report_pdf():
         ).all()
     
     if user_ids:
-        if current_user.role == 'employee':
-            user_ids = [current_user.id] if current_user.id in user_ids else []
-        elif current_user.role == 'manager':
+        if viewer.role == 'employee':
+            user_ids = [viewer.id] if viewer.id in user_ids else []
+        elif viewer.role == 'manager':
             manager_employee_ids = [u.id for u in users]
-            if current_user.id not in manager_employee_ids:
-                manager_employee_ids.append(current_user.id)
+            if viewer.id not in manager_employee_ids:
+                manager_employee_ids.append(viewer.id)
             user_ids = [uid for uid in user_ids if uid in manager_employee_ids]
         users = [user for user in users if user.id in user_ids]
     
@@ -2377,10 +2345,7 @@ def export_final_report_pdf():
     users = sorted(users, key=get_fingerprint_sort_key)
     
     # Generate report data
-    all_user_reports = []
-    for user in users:
-        user_report = calculate_unified_report_data(user, start_date, end_date)
-        all_user_reports.append(user_report)
+    all_user_reports = calculate_multiple_users_report_data(users, start_date, end_date)
     
     # Create PDF
     output = io.BytesIO()
@@ -2487,6 +2452,15 @@ def export_final_report_pdf():
         mimetype='application/pdf'
     )
 
+
+@final_report_bp.route('/final-report/export-pdf')
+@login_required
+@role_required(['admin', 'product_owner'])
+@background_export(build_final_report_pdf_export, roles=['admin', 'product_owner'])
+def export_final_report_pdf():
+    """Export final report to PDF"""
+    return build_final_report_pdf_export(current_user, request.args)
+
 @final_report_bp.route('/api/employees-by-department', methods=['GET'])
 @login_required
 @role_required(['admin', 'product_owner', 'manager', 'director', 'support'])
@@ -6,8 +6,9 @@ from forms import LeaveRequestForm, ApprovalForm, AdminLeaveRequestForm, UpdateL
 from models import db, LeaveRequest, User, LeaveType, LeaveBalance, PaidHoliday
 from sqlalchemy import or_, and_
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.attributes import flag_modified
-from helpers import role_required, get_user_managers, get_employees_for_manager, send_admin_email_notification, log_activity
+from helpers import role_required, get_user_managers, get_employees_for_manager, send_admin_email_notification, log_activity, apply_list_filters, keyset_paginate, count_by_status, get_departments
 import logging
 import time
 
@@ -36,117 +37,128 @@ def execute_with_retry(operation, max_retries=3, delay=0.1):
 def index():
     """List leave requests based on user role and view parameter"""
     user_role = current_user.role
-    leave_requests = []
+    query = LeaveRequest.query.filter(db.false())
     view_type = request.args.get('view', None)  # Get the view parameter from URL
     page_title = 'Leave Requests'
     
     if user_role == 'employee':
         # Employees see only their own leave requests
-        leave_requests = LeaveRequest.query.filter_by(
-            user_id=current_user.id
-        ).order_by(LeaveRequest.created_at.desc()).all()
+        query = LeaveRequest.query.filter_by(user_id=current_user.id)
     
     elif user_role == 'manager':
         if view_type == 'my':
             # Show only the manager's own requests
             page_title = 'My Leave Requests'
-            leave_requests = LeaveRequest.query.filter_by(
-                user_id=current_user.id
-            ).order_by(LeaveRequest.created_at.desc()).all()
+            query = LeaveRequest.query.filter_by(user_id=current_user.id)
         else:
             # Show team requests (default view for managers)
             page_title = 'Team Leave Requests'
             # Get employees from all departments managed by this manager
             managed_dept_ids = [dept.id for dept in current_user.managed_department]
             if managed_dept_ids:
-                leave_requests = LeaveRequest.query.join(
+                query = LeaveRequest.query.join(
                     User, LeaveRequest.user_id == User.id
                 ).filter(
                     User.department_id.in_(managed_dept_ids),
                     LeaveRequest.user_id != current_user.id  # Exclude manager's own requests
-                ).order_by(LeaveRequest.created_at.desc()).all()
+                )
     
     elif user_role == 'product_owner':
         # Technical Support see all leave requests by default
         if view_type == 'my':
             page_title = 'My Leave Requests'
-            leave_requests = LeaveRequest.query.filter_by(
-                user_id=current_user.id
-            ).order_by(LeaveRequest.created_at.desc()).all()
+            query = LeaveRequest.query.filter_by(user_id=current_user.id)
         else:
             page_title = 'All Leave Requests'
             # Technical Support see all requests regardless of department assignments
-            leave_requests = LeaveRequest.query.order_by(LeaveRequest.created_at.desc()).all()
+            query = LeaveRequest.query
     
     elif user_role == 'admin':
         if view_type == 'my':
             page_title = 'My Leave Requests'
-            leave_requests = LeaveRequest.query.filter_by(
-                user_id=current_user.id
-            ).order_by(LeaveRequest.created_at.desc()).all()
+            query = LeaveRequest.query.filter_by(user_id=current_user.id)
         elif view_type == 'all':
             page_title = 'All Leave Requests'
             # Show all requests if explicitly requested
-            leave_requests = LeaveRequest.query.order_by(LeaveRequest.created_at.desc()).all()
+            query = LeaveRequest.query
         else:
             page_title = 'Leave Requests for Approval'
             # Get requests that need admin approval based on department assignments
             if current_user.managed_department:
                 admin_dept_ids = [dept.id for dept in current_user.managed_department]
-                leave_requests = LeaveRequest.query.join(
+                query = LeaveRequest.query.join(
                     User, LeaveRequest.user_id == User.id
                 ).filter(
                     LeaveRequest.manager_status == 'approved',
                     LeaveRequest.admin_status == 'pending',
                     User.department_id.in_(admin_dept_ids)
-                ).order_by(LeaveRequest.created_at.desc()).all()
+                )
             else:
                 # If not assigned to specific departments, show all pending admin approvals
-                leave_requests = LeaveRequest.query.filter_by(
+                query = LeaveRequest.query.filter_by(
                     manager_status='approved',
                     admin_status='pending'
-                ).order_by(LeaveRequest.created_at.desc()).all()
-    
+                )
     
     elif user_role == 'director':
         # Directors see all leave requests
         page_title = 'All Company Leave Requests'
-        leave_requests = LeaveRequest.query.order_by(LeaveRequest.created_at.desc()).all()
-        
-        # Get leave request statistics for director overview
-        all_leave_requests = leave_requests
-        pending_leave_requests = [req for req in leave_requests if req.status == 'pending']
-        approved_leave_requests = [req for req in leave_requests if req.status == 'approved']
-        rejected_leave_requests = [req for req in leave_requests if req.status == 'rejected']
+        query = LeaveRequest.query
     
-    # Add pagination
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-    leave_requests_paginated = leave_requests[(page-1)*per_page:page*per_page]
-    total_pages = (len(leave_requests) + per_page - 1) // per_page
+    # Filters are applied in SQL so only one page of rows is loaded
+    status_filter = request.args.get('status', '')
+    department_filter = request.args.get('department_id', type=int)
+    date_filter = request.args.get('date_range', '')
+    date_from = request.args.get('date_from', type=date.fromisoformat)
+    date_to = request.args.get('date_to', type=date.fromisoformat)
+    filtered_query = apply_list_filters(
+        query, LeaveRequest,
+        status=status_filter,
+        department_id=department_filter,
+        date_range=date_filter,
+        date_from=date_from,
+        date_to=date_to
+    ).options(
+        joinedload(LeaveRequest.user).joinedload(User.department),
+        joinedload(LeaveRequest.leave_type)
+    )
+    page = keyset_paginate(
+        filtered_query, LeaveRequest,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        total=request.args.get('total', type=int)
+    )
     
     # Get departments for filter dropdown
-    from models import Department
-    departments = Department.query.all()
+    departments = get_departments()
     
     # Prepare template variables
     template_vars = {
         'title': page_title,
-        'leave_requests': leave_requests_paginated,
+        'leave_requests': page.items,
+        'page': page,
         'view_type': view_type,
-        'total_pages': total_pages,
-        'current_page': page,
-        'total_records': len(leave_requests),
+        'total_records': page.total,
+        'status_filter': status_filter,
+        'department_filter': department_filter,
+        'date_filter': date_filter,
+        'date_from': date_from,
+        'date_to': date_to,
+        'filter_params': {k: v for k, v in {
+            'view': view_type,
+            'status': status_filter,
+            'department_id': department_filter,
+            'date_range': date_filter,
+            'date_from': date_from.isoformat() if date_filter == 'custom' and date_from else None,
+            'date_to': date_to.isoformat() if date_filter == 'custom' and date_to else None
+        }.items() if v},
         'departments': departments
     }
     
     # Add director-specific overview data
     if user_role == 'director':
         template_vars.update({
-            'all_leave_requests': all_leave_requests,
-            'pending_leave_requests': pending_leave_requests,
-            'approved_leave_requests': approved_leave_requests,
-            'rejected_leave_requests': rejected_leave_requests,
+            'status_counts': count_by_status(query, LeaveRequest),
             'show_director_overview': True
         })
     
@@ -353,6 +365,11 @@ def create():
         except Exception as e:
             logging.error(f"❌ Exception while sending email notification to manager/admin: {str(e)}", exc_info=True)
         
+        # The request was committed above; commit the emails queued for it
+        from email_outbox import commit_queued_emails
+        if not commit_queued_emails():
+            email_sent = False
+        
         # Show appropriate success message
         if email_sent:
             flash('Your leave request has been submitted and a confirmation email has been sent!', 'success')
@@ -596,6 +613,8 @@ def view(id):
                     # If rejecting an approved leave request, refund the balance
                     if leave_request.manager_status == 'approved' or leave_request.admin_status == 'approved':
                         refund_leave_balance_for_leave(leave_request)
+                        from routes.attendance import mark_attendance_range_dirty
+                        mark_attendance_range_dirty(leave_request.start_date, leave_request.end_date, [leave_request.user_id])
             except Exception as attendance_error:
                 logging.error(f"Error updating attendance/balance: {str(attendance_error)}", exc_info=True)
                 # Continue even if attendance update fails
@@ -725,9 +744,9 @@ def delete(id):
                             daily_record.status = 'absent'
                             daily_record.status_reason = None
                         else:
-                            # If there's actual attendance data, reprocess the day
-                            from routes.attendance import process_daily_attendance
-                            process_daily_attendance(leave_request.user_id, current_date)
+                            # If there's actual attendance data, recompute the day once the leave is gone
+                            from routes.attendance import mark_attendance_dirty
+                            mark_attendance_dirty([(leave_request.user_id, current_date)])
                     
                     current_date += timedelta(days=1)
 
@@ -893,6 +912,7 @@ def admin_create():
         
         # Update daily attendance records and deduct leave balance since it's auto-approved
         update_daily_attendance_for_leave(leave_request)
+        db.session.commit()
         
         # Employee notification removed - will be replaced with SMTP email notifications
         
@@ -1003,6 +1023,7 @@ def edit_leave(leave_id):
             # Update daily attendance records and deduct leave balance if approved
             if form.status.data == 'approved':
                 update_daily_attendance_for_leave(leave_request)
+                db.session.commit()
             
             flash(f'Leave request has been updated successfully!', 'success')
             return redirect(url_for('leave.index'))
@@ -1048,9 +1069,9 @@ def delete_leave(leave_id):
                             daily_record.status = 'absent'
                             daily_record.status_reason = None
                         else:
-                            # If there's actual attendance data, reprocess the day
-                            from routes.attendance import process_daily_attendance
-                            process_daily_attendance(leave_request.user_id, current_date)
+                            # If there's actual attendance data, recompute the day once the leave is gone
+                            from routes.attendance import mark_attendance_dirty
+                            mark_attendance_dirty([(leave_request.user_id, current_date)])
                     
                     current_date += timedelta(days=1)
             
@@ -1141,6 +1162,10 @@ def update_daily_attendance_for_leave(leave_request):
             
             current_date += timedelta(days=1)
         
+        # Days with punches are recomputed from the logs with the leave applied
+        from routes.attendance import mark_attendance_range_dirty
+        mark_attendance_range_dirty(leave_request.start_date, leave_request.end_date, [leave_request.user_id])
+        
         # Update leave balance if the leave type requires balance
         if leave_type.requires_balance:
             update_leave_balance_for_leave(leave_request)
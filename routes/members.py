@@ -2,16 +2,16 @@ from flask import Blueprint, render_template, request, jsonify, abort
 from flask_login import login_required, current_user
 from app import db
 from models import User, Department
-from helpers import role_required
+from sqlalchemy.orm import joinedload, selectinload
+from helpers import role_required, get_departments, users_in_order
+from cache import cached
 import re
 
 members_bp = Blueprint('members', __name__, url_prefix='/members')
 
-@members_bp.route('/')
-@login_required
-def index():
-    """Page showing all active and inactive members in the system"""
-    # All users can see all active members, regardless of role
+@cached(tags=('users', 'departments'))
+def _sorted_active_member_ids():
+    """Ids of the active members in directory order (role, department, manager first, then by name)"""
     # Get all active users, sorted by department name, then by last name and first name
     active_users = User.query.filter(
         User.status == 'active',
@@ -79,9 +79,21 @@ def index():
             user.first_name.lower() if user.first_name else ''
         ))
 
-    active_users = sort_users_by_department(active_users)
+    return [user.id for user in sort_users_by_department(active_users)]
+
+def get_sorted_active_members():
+    """Active members in directory order, with their departments loaded; only the order is cached"""
+    return users_in_order(_sorted_active_member_ids(),
+                          joinedload(User.department), selectinload(User.managed_department))
+
+@members_bp.route('/')
+@login_required
+def index():
+    """Page showing all active and inactive members in the system"""
+    # All users can see all active members, regardless of role
+    active_users = get_sorted_active_members()
     # Get all departments for filtering
-    departments = Department.query.all()
+    departments = get_departments()
     
     return render_template('members/index.html', title='Company Members', active_users=active_users, departments=departments)
 
@@ -3,7 +3,7 @@ from flask_login import login_required, current_user
 from datetime import datetime, date
 from forms import NoteForm
 from models import db, Note, User
-from helpers import role_required, get_employees_for_manager, log_activity
+from helpers import role_required, get_employees_for_manager, log_activity, get_departments
 from sqlalchemy import or_, and_
 import logging
 
@@ -83,8 +83,7 @@ def index():
     total_pages = (len(notes) + per_page - 1) // per_page
     
     # Get departments for filter dropdown
-    from models import Department
-    departments = Department.query.all()
+    departments = get_departments()
     
     return render_template('notes/index.html',
                           title=page_title,
@@ -221,6 +221,10 @@ def create_paid_holiday_attendance(holiday):
                     )
                     db.session.add(attendance)
         
+        # Days with punches are recomputed from the logs with the holiday applied
+        from routes.attendance import mark_attendance_range_dirty
+        mark_attendance_range_dirty(dates[0], dates[-1])
+        
         db.session.commit()
         logging.info(f'Created paid holiday attendance records for {len(active_employees)} employees')
         
@@ -247,6 +251,11 @@ def update_paid_holiday_attendance(holiday, old_start_date, old_end_date):
                 paid_holiday_id=holiday.id,
                 date=old_date
             ).delete()
+        if old_dates:
+            from routes.attendance import mark_attendance_range_dirty
+            from report_helpers.monthly_summary import mark_monthly_summary_range_dirty
+            mark_attendance_range_dirty(old_dates[0], old_dates[-1])
+            mark_monthly_summary_range_dirty(old_dates[0], old_dates[-1])
         
         # Create new attendance records
         create_paid_holiday_attendance(holiday)
@@ -286,6 +295,12 @@ def remove_paid_holiday_attendance(holiday):
             DailyAttendance.holiday_name == holiday.description
         ).delete()
         
+        # Days with punches get their regular record back on the next recompute
+        from routes.attendance import mark_attendance_range_dirty
+        from report_helpers.monthly_summary import mark_monthly_summary_range_dirty
+        mark_attendance_range_dirty(holiday.start_date, holiday.end_date or holiday.start_date)
+        mark_monthly_summary_range_dirty(holiday.start_date, holiday.end_date or holiday.start_date)
+        
         db.session.commit()
         
         logging.info(f'Removed paid holiday attendance records for holiday {holiday.id}')
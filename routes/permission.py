@@ -3,7 +3,8 @@ from flask_login import login_required, current_user
 from datetime import datetime, date, time
 from forms import PermissionRequestForm, ApprovalForm, AdminPermissionRequestForm
 from models import db, PermissionRequest, User
-from helpers import role_required, get_user_managers, get_employees_for_manager, send_admin_email_notification, log_activity
+from sqlalchemy.orm import joinedload
+from helpers import role_required, get_user_managers, get_employees_for_manager, send_admin_email_notification, log_activity, apply_list_filters, keyset_paginate, count_by_status, get_departments
 import logging
 
 permission_bp = Blueprint('permission', __name__, url_prefix='/permission')
@@ -13,19 +14,19 @@ permission_bp = Blueprint('permission', __name__, url_prefix='/permission')
 def index():
     """List permission requests based on user role and view parameter"""
     user_role = current_user.role
-    permission_requests = []
+    query = PermissionRequest.query.filter(db.false())
     view_type = request.args.get('view', None)  # Get the view parameter from URL
     page_title = 'Permission Requests'
     
     if user_role == 'employee':
         # Employees see only their own permission requests
-        permission_requests = PermissionRequest.query.filter_by(user_id=current_user.id).order_by(PermissionRequest.created_at.desc()).all()
+        query = PermissionRequest.query.filter_by(user_id=current_user.id)
     
     elif user_role == 'manager':
         if view_type == 'my':
             # Show only the manager's own requests
             page_title = 'My Permission Requests'
-            permission_requests = PermissionRequest.query.filter_by(user_id=current_user.id).order_by(PermissionRequest.created_at.desc()).all()
+            query = PermissionRequest.query.filter_by(user_id=current_user.id)
         else:
             # Show team requests (default view for managers)
             page_title = 'Team Permission Requests'
@@ -33,60 +34,85 @@ def index():
             employee_ids = [emp.id for emp in employees]
             
             if employee_ids:
-                permission_requests = PermissionRequest.query.filter(
+                query = PermissionRequest.query.filter(
                     PermissionRequest.user_id.in_(employee_ids)
-                ).order_by(PermissionRequest.created_at.desc()).all()
+                )
     
     elif user_role == 'product_owner':
         # Technical Support see all permission requests regardless of department assignments
         page_title = 'All Permission Requests'
-        permission_requests = PermissionRequest.query.order_by(PermissionRequest.created_at.desc()).all()
+        query = PermissionRequest.query
     
     elif user_role == 'admin':
         if view_type == 'my':
             page_title = 'My Permission Requests'
-            permission_requests = PermissionRequest.query.filter_by(
-                user_id=current_user.id
-            ).order_by(PermissionRequest.created_at.desc()).all()
+            query = PermissionRequest.query.filter_by(user_id=current_user.id)
         elif view_type == 'all':
             page_title = 'All Permission Requests'
             # Show all requests if explicitly requested
-            permission_requests = PermissionRequest.query.order_by(PermissionRequest.created_at.desc()).all()
+            query = PermissionRequest.query
         else:
             # Default: Show requests pending admin approval
             page_title = 'Permission Requests for Approval'
             # Get requests that need admin approval based on department assignments
             if current_user.managed_department:
                 admin_dept_ids = [dept.id for dept in current_user.managed_department]
-                permission_requests = PermissionRequest.query.join(
+                query = PermissionRequest.query.join(
                     User, PermissionRequest.user_id == User.id
                 ).filter(
                     PermissionRequest.manager_status == 'approved',
                     PermissionRequest.admin_status == 'pending',
                     User.department_id.in_(admin_dept_ids)
-                ).order_by(PermissionRequest.created_at.desc()).all()
+                )
             else:
                 # If not assigned to specific departments, show all pending admin approvals
-                permission_requests = PermissionRequest.query.filter_by(
+                query = PermissionRequest.query.filter_by(
                     manager_status='approved',
                     admin_status='pending'
-                ).order_by(PermissionRequest.created_at.desc()).all()
+                )
     
     elif user_role == 'director':
         # Directors see all permission requests
         page_title = 'All Company Permission Requests'
-        permission_requests = PermissionRequest.query.order_by(PermissionRequest.created_at.desc()).all()
+        query = PermissionRequest.query
+    
+    # Filters are applied in SQL so only one page of rows is loaded
+    status_filter = request.args.get('status', 'all')
+    department_filter = request.args.get('department_id', type=int)
+    date_filter = request.args.get('date_range', 'all')
+    filtered_query = apply_list_filters(
+        query, PermissionRequest,
+        status=status_filter,
+        department_id=department_filter,
+        date_range=date_filter
+    ).options(joinedload(PermissionRequest.user).joinedload(User.department))
+    page = keyset_paginate(
+        filtered_query, PermissionRequest,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        total=request.args.get('total', type=int)
+    )
     
     # Get departments for filtering (for admin and director roles)
     departments = []
     if user_role in ['admin', 'director']:
-        from models import Department
-        departments = Department.query.all()
+        departments = get_departments()
     
     return render_template('permission/index.html', 
                            title=page_title, 
-                           permission_requests=permission_requests,
+                           permission_requests=page.items,
+                           page=page,
+                           status_counts=count_by_status(query, PermissionRequest) if user_role == 'director' else None,
                            view_type=view_type,
+                           status_filter=status_filter,
+                           department_filter=department_filter,
+                           date_filter=date_filter,
+                           filter_params={k: v for k, v in {
+                               'view': view_type,
+                               'status': status_filter if status_filter != 'all' else None,
+                               'department_id': department_filter,
+                               'date_range': date_filter if date_filter != 'all' else None
+                           }.items() if v},
                            departments=departments)
 
 @permission_bp.route('/create', methods=['GET', 'POST'])
@@ -227,6 +253,10 @@ def create():
         except Exception as e:
             logging.error(f"❌ Exception while sending email notification to manager/admin: {str(e)}", exc_info=True)
         
+        # The request was committed above; commit the emails queued for it
+        from email_outbox import commit_queued_emails
+        commit_queued_emails()
+        
         flash('Your permission request has been submitted successfully!', 'success')
         return redirect(url_for('permission.index'))
     
@@ -394,6 +424,13 @@ def view(id):
                     db.session.add(permission_request)
                     logging.info(f"Before commit - Permission request #{permission_request.id} status: {final_status}, manager_status: {permission_request.manager_status}, admin_status: {permission_request.admin_status}")
                 
+                # Recompute the day's attendance when the permission starts or stops applying
+                # (approved, or a previously approved request rejected)
+                if permission_request.status == 'approved' or before_status['overall_status'] == 'approved':
+                    from routes.attendance import mark_attendance_range_dirty
+                    permission_date = permission_request.start_time.date()
+                    mark_attendance_range_dirty(permission_date, permission_date, [permission_request.user_id])
+                
                 # Commit all changes including status update
                 db.session.commit()
                 
@@ -526,6 +563,13 @@ def view(id):
                     db.session.add(permission_request)
                     logging.info(f"Before commit - Permission request #{permission_request.id} status: {final_status}, manager_status: {permission_request.manager_status}, admin_status: {permission_request.admin_status}")
                 
+                # Recompute the day's attendance when the permission starts or stops applying
+                # (approved, or a previously approved request rejected)
+                if permission_request.status == 'approved' or before_status['overall_status'] == 'approved':
+                    from routes.attendance import mark_attendance_range_dirty
+                    permission_date = permission_request.start_time.date()
+                    mark_attendance_range_dirty(permission_date, permission_date, [permission_request.user_id])
+                
                 # Commit all changes including status update
                 db.session.commit()
                 
@@ -727,6 +771,11 @@ def admin_create():
         permission_request.admin_status = 'approved'
         
         db.session.add(permission_request)
+        
+        # Recompute the day's attendance with the permission applied
+        from routes.attendance import mark_attendance_range_dirty
+        permission_date = permission_request.start_time.date()
+        mark_attendance_range_dirty(permission_date, permission_date, [permission_request.user_id])
         db.session.commit()
         
         # Employee notification removed - will be replaced with SMTP email notifications
@@ -2,7 +2,8 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from forms import TicketSubmissionForm, TicketCommentForm, TicketCategoryForm, TicketStatusUpdateForm, TicketEmailTemplateForm
 from models import db, Ticket, TicketCategory, TicketDepartmentMapping, TicketComment, TicketAttachment, TicketStatusHistory, TicketEmailTemplate, User, Department
-from helpers import role_required, get_tickets_for_user, can_user_view_ticket, can_user_reply_to_ticket, route_ticket_to_departments, send_ticket_created_notification, send_ticket_reply_notification, send_ticket_status_update_notification, send_ticket_resolved_notification
+from sqlalchemy.orm import joinedload
+from helpers import role_required, get_tickets_query_for_user, keyset_paginate, can_user_view_ticket, can_user_reply_to_ticket, route_ticket_to_departments, send_ticket_created_notification, send_ticket_reply_notification, send_ticket_status_update_notification, send_ticket_resolved_notification, get_departments
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import os
@@ -72,21 +73,29 @@ def save_attachment(file, ticket_id, comment_id=None):
 @login_required
 def index():
     """Employee ticket list - shows only their own tickets"""
-    tickets = get_tickets_for_user(current_user, show_own_only=True)
+    query = get_tickets_query_for_user(current_user, show_own_only=True)
     
     # Filter by status if provided
     status_filter = request.args.get('status', 'all')
     if status_filter != 'all':
-        tickets = [t for t in tickets if t.status == status_filter]
+        query = query.filter(Ticket.status == status_filter)
     
     # Filter by priority if provided
     priority_filter = request.args.get('priority', 'all')
     if priority_filter != 'all':
-        tickets = [t for t in tickets if t.priority == priority_filter]
+        query = query.filter(Ticket.priority == priority_filter)
+    
+    page = keyset_paginate(
+        query.options(joinedload(Ticket.category)), Ticket,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        total=request.args.get('total', type=int)
+    )
     
     return render_template('tickets/index.html',
                          title='My Tickets',
-                         tickets=tickets,
+                         tickets=page.items,
+                         page=page,
                          status_filter=status_filter,
                          priority_filter=priority_filter)
 
@@ -129,15 +138,15 @@ def submit():
                 except ValueError as e:
                     flash(f'Attachment error: {str(e)}', 'warning')
             
-            db.session.commit()
-            
-            # Send email notifications
+            # Queue the email notifications with the ticket
             try:
                 send_ticket_created_notification(ticket)
             except Exception as e:
                 logger.error(f"Error sending ticket created notification: {str(e)}")
                 # Don't fail the ticket creation if email fails
             
+            db.session.commit()
+            
             flash('Ticket submitted successfully!', 'success')
             return redirect(url_for('tickets.detail', id=ticket.id))
             
@@ -241,14 +250,14 @@ def add_comment(id):
             # Update ticket updated_at
             ticket.updated_at = datetime.utcnow()
             
-            db.session.commit()
-            
-            # Send email notifications
+            # Queue the email notifications with the comment
             try:
                 send_ticket_reply_notification(ticket, comment)
             except Exception as e:
                 logger.error(f"Error sending ticket reply notification: {str(e)}")
             
+            db.session.commit()
+            
             flash('Comment added successfully!', 'success')
             return redirect(url_for('tickets.detail', id=id))
             
@@ -297,9 +306,8 @@ def update_status(id):
             )
             
             db.session.add(status_history)
-            db.session.commit()
             
-            # Send email notifications
+            # Queue the email notifications with the status change
             try:
                 send_ticket_status_update_notification(ticket, old_status, new_status)
                 
@@ -309,6 +317,8 @@ def update_status(id):
             except Exception as e:
                 logger.error(f"Error sending ticket status notification: {str(e)}")
             
+            db.session.commit()
+            
             flash(f'Ticket status updated to {new_status.replace("_", " ").title()}!', 'success')
             return redirect(url_for('tickets.detail', id=id))
             
@@ -378,32 +388,39 @@ def inbox():
         return redirect(url_for('tickets.index'))
     
     # Get tickets for user's department
-    tickets = get_tickets_for_user(current_user)
+    query = get_tickets_query_for_user(current_user)
     
     # Apply filters
     status_filter = request.args.get('status', 'all')
     if status_filter != 'all':
-        tickets = [t for t in tickets if t.status == status_filter]
+        query = query.filter(Ticket.status == status_filter)
     
     priority_filter = request.args.get('priority', 'all')
     if priority_filter != 'all':
-        tickets = [t for t in tickets if t.priority == priority_filter]
+        query = query.filter(Ticket.priority == priority_filter)
     
     category_filter = request.args.get('category', 'all')
     if category_filter != 'all':
         try:
-            category_id = int(category_filter)
-            tickets = [t for t in tickets if t.category_id == category_id]
+            query = query.filter(Ticket.category_id == int(category_filter))
         except ValueError:
             pass
     
+    page = keyset_paginate(
+        query.options(joinedload(Ticket.category), joinedload(Ticket.user)), Ticket,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        total=request.args.get('total', type=int)
+    )
+    
     # Get department name
     department = Department.query.get(current_user.department_id)
     department_name = department.department_name if department else 'Unknown'
     
     return render_template('tickets/inbox.html',
                          title='Ticket Inbox',
-                         tickets=tickets,
+                         tickets=page.items,
+                         page=page,
                          status_filter=status_filter,
                          priority_filter=priority_filter,
                          category_filter=category_filter,
@@ -464,7 +481,7 @@ def create_category():
     form = TicketCategoryForm()
     
     # Populate department choices
-    departments = Department.query.all()
+    departments = get_departments()
     form.departments.choices = [(d.id, d.department_name) for d in departments]
     
     if form.validate_on_submit():
@@ -512,7 +529,7 @@ def edit_category(id):
     form = TicketCategoryForm()
     
     # Populate department choices (must be done before form processing)
-    departments = Department.query.all()
+    departments = get_departments()
     form.departments.choices = [(d.id, d.department_name) for d in departments]
     
     if request.method == 'GET':
@@ -0,0 +1,955 @@
+"""
+One-time database preparation: `flask prepare-database`.
+
+Run once per deploy, before the new workers take traffic, instead of on every boot:
+
+1. the Alembic migrations, every branch (`flask db upgrade heads`). A database without an
+   alembic_version table is stamped first: an empty one gets the current schema and is stamped
+   at the heads, one the app built before it was migrated is stamped at BASELINE_REVISIONS
+2. the tables created outside the migrations (employee attachments, documentation pages,
+   email templates, tickets, scheduled reminders) and the departments id sequence
+3. the monthly attendance summary table, built from daily_attendance while it is empty
+4. the default email templates
+
+create_app() used to run 2 on the first request of every worker and 4 at import time; it now
+touches the database for neither. The container start command (nixpacks.toml) runs this
+before gunicorn; on PostgreSQL an advisory lock keeps containers starting together from
+migrating at the same time. /health reports whether the schema is at the migration head.
+"""
+
+import logging
+from contextlib import contextmanager
+
+from sqlalchemy import text, inspect
+
+from extensions import db
+
+DEFAULT_EMAIL_TEMPLATES = [
+    {
+        'template_name': 'leave_manager_notification',
+        'template_type': 'leave_manager_notification',
+        'subject': 'New Leave Request from {employee_name} - Action Required',
+        'body_html': '''
+                    <html>
+                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+                                <h2 style="margin: 0; font-size: 24px;">New Leave Request</h2>
+                            </div>
+                            
+                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
+                                <h3 style="color: #667eea; margin-top: 0;">Hello {manager_name},</h3>
+                                <p>A new leave request has been submitted by <strong>{employee_name}</strong> and requires your review.</p>
+                                
+                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
+                                    <p style="margin: 5px 0;"><strong>Start Date:</strong> {start_date}</p>
+                                    <p style="margin: 5px 0;"><strong>End Date:</strong> {end_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
+                                    <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
+                                </div>
+                                
+                                <div style="margin: 20px 0; padding: 15px; background: #e3f2fd; border-radius: 6px;">
+                                    <p style="margin: 0; font-size: 14px; color: #1565c0;">
+                                        <strong>Action Required:</strong> Please review and approve or reject this request.
+                                    </p>
+                                    <p style="margin: 10px 0 0 0;">
+                                        <a href="{approval_link}" style="background: #667eea; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Review Request</a>
+                                    </p>
+                                </div>
+                            </div>
+                            
+                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
+                                <p style="margin: 0; font-size: 12px; color: #666;">
+                                    This is an automated message from Everlast HR System.<br>
+                                    Please do not reply to this email.
+                                </p>
+                            </div>
+                        </div>
+                    </body>
+                    </html>
+                    ''',
+        'footer': None,
+        'signature': None
+    },
+    {
+        'template_name': 'leave_admin_notification',
+        'template_type': 'leave_admin_notification',
+        'subject': 'Leave Request Approved by Manager - Final Approval Required',
+        'body_html': '''
+                    <html>
+                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+                                <h2 style="margin: 0; font-size: 24px;">Leave Request - Final Approval</h2>
+                            </div>
+                            
+                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
+                                <h3 style="color: #667eea; margin-top: 0;">Hello {admin_name},</h3>
+                                <p>A leave request from <strong>{employee_name}</strong> has been approved by their manager <strong>{manager_name}</strong> and now requires your final approval.</p>
+                                
+                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                                    <p style="margin: 5px 0;"><strong>Employee:</strong> {employee_name}</p>
+                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
+                                    <p style="margin: 5px 0;"><strong>Start Date:</strong> {start_date}</p>
+                                    <p style="margin: 5px 0;"><strong>End Date:</strong> {end_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
+                                    <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
+                                    <p style="margin: 5px 0;"><strong>Manager Comment:</strong> {comment}</p>
+                                </div>
+                                
+                                <div style="margin: 20px 0; padding: 15px; background: #e3f2fd; border-radius: 6px;">
+                                    <p style="margin: 0; font-size: 14px; color: #1565c0;">
+                                        <strong>Action Required:</strong> Please review and provide final approval or rejection.
+                                    </p>
+                                    <p style="margin: 10px 0 0 0;">
+                                        <a href="{approval_link}" style="background: #667eea; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Review Request</a>
+                                    </p>
+                                </div>
+                            </div>
+                            
+                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
+                                <p style="margin: 0; font-size: 12px; color: #666;">
+                                    This is an automated message from Everlast HR System.<br>
+                                    Please do not reply to this email.
+                                </p>
+                            </div>
+                        </div>
+                    </body>
+                    </html>
+                    ''',
+        'footer': None,
+        'signature': None
+    },
+    {
+        'template_name': 'leave_employee_confirmation',
+        'template_type': 'leave_employee_confirmation',
+        'subject': 'Your Leave Request Has Been Approved',
+        'body_html': '''
+                    <html>
+                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                            <div style="background: linear-gradient(135deg, #28a745 0%, #20c997 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+                                <h2 style="margin: 0; font-size: 24px;">✓ Leave Request Approved</h2>
+                            </div>
+                            
+                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #28a745;">
+                                <h3 style="color: #28a745; margin-top: 0;">Hello {employee_name},</h3>
+                                <p>Great news! Your leave request has been fully approved.</p>
+                                
+                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
+                                    <p style="margin: 5px 0;"><strong>Start Date:</strong> {start_date}</p>
+                                    <p style="margin: 5px 0;"><strong>End Date:</strong> {end_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
+                                    <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #28a745; font-weight: bold;">{status}</span></p>
+                                </div>
+                                
+                                <div style="margin: 20px 0; padding: 15px; background: #d4edda; border-radius: 6px; border-left: 4px solid #28a745;">
+                                    <p style="margin: 0; font-size: 14px; color: #155724;">
+                                        <strong>Approved by:</strong> {admin_name}<br>
+                                        <strong>Comment:</strong> {comment}
+                                    </p>
+                                </div>
+                                
+                                <p>Your leave balance has been updated accordingly. Please ensure your team is informed about your absence.</p>
+                            </div>
+                            
+                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
+                                <p style="margin: 0; font-size: 12px; color: #666;">
+                                    This is an automated message from Everlast HR System.<br>
+                                    Please do not reply to this email.
+                                </p>
+                            </div>
+                        </div>
+                    </body>
+                    </html>
+                    ''',
+        'footer': None,
+        'signature': None
+    },
+    {
+        'template_name': 'leave_employee_rejection',
+        'template_type': 'leave_employee_rejection',
+        'subject': 'Your Leave Request Has Been Rejected',
+        'body_html': '''
+                    <html>
+                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                            <div style="background: linear-gradient(135deg, #dc3545 0%, #c82333 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+                                <h2 style="margin: 0; font-size: 24px;">Leave Request Rejected</h2>
+                            </div>
+                            
+                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #dc3545;">
+                                <h3 style="color: #dc3545; margin-top: 0;">Hello {employee_name},</h3>
+                                <p>We regret to inform you that your leave request has been rejected.</p>
+                                
+                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
+                                    <p style="margin: 5px 0;"><strong>Start Date:</strong> {start_date}</p>
+                                    <p style="margin: 5px 0;"><strong>End Date:</strong> {end_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
+                                    <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #dc3545; font-weight: bold;">{status}</span></p>
+                                </div>
+                                
+                                <div style="margin: 20px 0; padding: 15px; background: #f8d7da; border-radius: 6px; border-left: 4px solid #dc3545;">
+                                    <p style="margin: 0; font-size: 14px; color: #721c24;">
+                                        <strong>Rejection Reason:</strong><br>
+                                        {comment}
+                                    </p>
+                                </div>
+                                
+                                <p>If you have any questions or concerns, please contact your manager or HR department.</p>
+                            </div>
+                            
+                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
+                                <p style="margin: 0; font-size: 12px; color: #666;">
+                                    This is an automated message from Everlast HR System.<br>
+                                    Please do not reply to this email.
+                                </p>
+                            </div>
+                        </div>
+                    </body>
+                    </html>
+                    ''',
+        'footer': None,
+        'signature': None
+    },
+    {
+        'template_name': 'permission_manager_notification',
+        'template_type': 'permission_manager_notification',
+        'subject': 'New Permission Request from {employee_name} - Action Required',
+        'body_html': '''
+                    <html>
+                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+                                <h2 style="margin: 0; font-size: 24px;">New Permission Request</h2>
+                            </div>
+                            
+                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
+                                <h3 style="color: #667eea; margin-top: 0;">Hello {manager_name},</h3>
+                                <p>A new permission request has been submitted by <strong>{employee_name}</strong> and requires your review.</p>
+                                
+                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
+                                    <p style="margin: 5px 0;"><strong>Date:</strong> {start_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Time:</strong> {end_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
+                                    <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
+                                </div>
+                                
+                                <div style="margin: 20px 0; padding: 15px; background: #e3f2fd; border-radius: 6px;">
+                                    <p style="margin: 0; font-size: 14px; color: #1565c0;">
+                                        <strong>Action Required:</strong> Please review and approve or reject this request.
+                                    </p>
+                                    <p style="margin: 10px 0 0 0;">
+                                        <a href="{approval_link}" style="background: #667eea; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Review Request</a>
+                                    </p>
+                                </div>
+                            </div>
+                            
+                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
+                                <p style="margin: 0; font-size: 12px; color: #666;">
+                                    This is an automated message from Everlast HR System.<br>
+                                    Please do not reply to this email.
+                                </p>
+                            </div>
+                        </div>
+                    </body>
+                    </html>
+                    ''',
+        'footer': None,
+        'signature': None
+    },
+    {
+        'template_name': 'permission_admin_notification',
+        'template_type': 'permission_admin_notification',
+        'subject': 'Permission Request Approved by Manager - Final Approval Required',
+        'body_html': '''
+                    <html>
+                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+                                <h2 style="margin: 0; font-size: 24px;">Permission Request - Final Approval</h2>
+                            </div>
+                            
+                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
+                                <h3 style="color: #667eea; margin-top: 0;">Hello {admin_name},</h3>
+                                <p>A permission request from <strong>{employee_name}</strong> has been approved by their manager <strong>{manager_name}</strong> and now requires your final approval.</p>
+                                
+                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                                    <p style="margin: 5px 0;"><strong>Employee:</strong> {employee_name}</p>
+                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
+                                    <p style="margin: 5px 0;"><strong>Date:</strong> {start_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Time:</strong> {end_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
+                                    <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
+                                    <p style="margin: 5px 0;"><strong>Manager Comment:</strong> {comment}</p>
+                                </div>
+                                
+                                <div style="margin: 20px 0; padding: 15px; background: #e3f2fd; border-radius: 6px;">
+                                    <p style="margin: 0; font-size: 14px; color: #1565c0;">
+                                        <strong>Action Required:</strong> Please review and provide final approval or rejection.
+                                    </p>
+                                    <p style="margin: 10px 0 0 0;">
+                                        <a href="{approval_link}" style="background: #667eea; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Review Request</a>
+                                    </p>
+                                </div>
+                            </div>
+                            
+                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
+                                <p style="margin: 0; font-size: 12px; color: #666;">
+                                    This is an automated message from Everlast HR System.<br>
+                                    Please do not reply to this email.
+                                </p>
+                            </div>
+                        </div>
+                    </body>
+                    </html>
+                    ''',
+        'footer': None,
+        'signature': None
+    },
+    {
+        'template_name': 'permission_employee_confirmation',
+        'template_type': 'permission_employee_confirmation',
+        'subject': 'Your Permission Request Has Been Approved',
+        'body_html': '''
+                    <html>
+                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                            <div style="background: linear-gradient(135deg, #28a745 0%, #20c997 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+                                <h2 style="margin: 0; font-size: 24px;">✓ Permission Request Approved</h2>
+                            </div>
+                            
+                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #28a745;">
+                                <h3 style="color: #28a745; margin-top: 0;">Hello {employee_name},</h3>
+                                <p>Great news! Your permission request has been fully approved.</p>
+                                
+                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
+                                    <p style="margin: 5px 0;"><strong>Date:</strong> {start_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Time:</strong> {end_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
+                                    <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #28a745; font-weight: bold;">{status}</span></p>
+                                </div>
+                                
+                                <div style="margin: 20px 0; padding: 15px; background: #d4edda; border-radius: 6px; border-left: 4px solid #28a745;">
+                                    <p style="margin: 0; font-size: 14px; color: #155724;">
+                                        <strong>Approved by:</strong> {admin_name}<br>
+                                        <strong>Comment:</strong> {comment}
+                                    </p>
+                                </div>
+                                
+                                <p>Please ensure your team is informed about your absence during this time.</p>
+                            </div>
+                            
+                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
+                                <p style="margin: 0; font-size: 12px; color: #666;">
+                                    This is an automated message from Everlast HR System.<br>
+                                    Please do not reply to this email.
+                                </p>
+                            </div>
+                        </div>
+                    </body>
+                    </html>
+                    ''',
+        'footer': None,
+        'signature': None
+    },
+    {
+        'template_name': 'permission_employee_rejection',
+        'template_type': 'permission_employee_rejection',
+        'subject': 'Your Permission Request Has Been Rejected',
+        'body_html': '''
+                    <html>
+                    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                            <div style="background: linear-gradient(135deg, #dc3545 0%, #c82333 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+                                <h2 style="margin: 0; font-size: 24px;">Permission Request Rejected</h2>
+                            </div>
+                            
+                            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #dc3545;">
+                                <h3 style="color: #dc3545; margin-top: 0;">Hello {employee_name},</h3>
+                                <p>We regret to inform you that your permission request has been rejected.</p>
+                                
+                                <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                                    <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
+                                    <p style="margin: 5px 0;"><strong>Date:</strong> {start_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Time:</strong> {end_date}</p>
+                                    <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
+                                    <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #dc3545; font-weight: bold;">{status}</span></p>
+                                </div>
+                                
+                                <div style="margin: 20px 0; padding: 15px; background: #f8d7da; border-radius: 6px; border-left: 4px solid #dc3545;">
+                                    <p style="margin: 0; font-size: 14px; color: #721c24;">
+                                        <strong>Rejection Reason:</strong><br>
+                                        {comment}
+                                    </p>
+                                </div>
+                                
+                                <p>If you have any questions or concerns, please contact your manager or HR department.</p>
+                            </div>
+                            
+                            <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
+                                <p style="margin: 0; font-size: 12px; color: #666;">
+                                    This is an automated message from Everlast HR System.<br>
+                                    Please do not reply to this email.
+                                </p>
+                            </div>
+                        </div>
+                    </body>
+                    </html>
+                    ''',
+        'footer': None,
+        'signature': None
+    },
+    {
+        'template_name': 'leave_employee_submission_confirmation',
+        'template_type': 'leave_employee_submission_confirmation',
+        'subject': 'Your Leave Request Has Been Submitted - Pending Review',
+        'body_html': '''<html>
+<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+            <h2 style="margin: 0; font-size: 24px;">Leave Request Submitted</h2>
+        </div>
+        
+        <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
+            <h3 style="color: #667eea; margin-top: 0;">Hello {employee_name},</h3>
+            <p>Your leave request has been successfully submitted and is now pending manager review.</p>
+            
+            <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
+                <p style="margin: 5px 0;"><strong>Start Date:</strong> {start_date}</p>
+                <p style="margin: 5px 0;"><strong>End Date:</strong> {end_date}</p>
+                <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
+                <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
+                <p style="margin: 5px 0;"><strong>Submitted On:</strong> {submission_date} at {submission_time}</p>
+                <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #ffc107; font-weight: bold;">{status}</span></p>
+            </div>
+            
+            <div style="margin: 20px 0; padding: 15px; background: #fff3cd; border-radius: 6px; border-left: 4px solid #ffc107;">
+                <p style="margin: 0; font-size: 14px; color: #856404;">
+                    <strong>Next Steps:</strong> Your request is now pending manager review. You will be notified once your manager has reviewed your request.
+                </p>
+            </div>
+        </div>
+        
+        <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
+            <p style="margin: 0; font-size: 12px; color: #666;">
+                This is an automated message from Everlast HR System.<br>
+                Please do not reply to this email.
+            </p>
+        </div>
+    </div>
+</body>
+</html>''',
+        'footer': None,
+        'signature': None
+    },
+    {
+        'template_name': 'permission_employee_submission_confirmation',
+        'template_type': 'permission_employee_submission_confirmation',
+        'subject': 'Your Permission Request Has Been Submitted - Pending Review',
+        'body_html': '''<html>
+<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px;">
+            <h2 style="margin: 0; font-size: 24px;">Permission Request Submitted</h2>
+        </div>
+        
+        <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea;">
+            <h3 style="color: #667eea; margin-top: 0;">Hello {employee_name},</h3>
+            <p>Your permission request has been successfully submitted and is now pending manager review.</p>
+            
+            <div style="background: white; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                <p style="margin: 5px 0;"><strong>Request Type:</strong> {request_type}</p>
+                <p style="margin: 5px 0;"><strong>Date:</strong> {start_date}</p>
+                <p style="margin: 5px 0;"><strong>Time:</strong> {end_date}</p>
+                <p style="margin: 5px 0;"><strong>Duration:</strong> {duration}</p>
+                <p style="margin: 5px 0;"><strong>Reason:</strong> {reason}</p>
+                <p style="margin: 5px 0;"><strong>Submitted On:</strong> {submission_date} at {submission_time}</p>
+                <p style="margin: 5px 0;"><strong>Status:</strong> <span style="color: #ffc107; font-weight: bold;">{status}</span></p>
+            </div>
+            
+            <div style="margin: 20px 0; padding: 15px; background: #fff3cd; border-radius: 6px; border-left: 4px solid #ffc107;">
+                <p style="margin: 0; font-size: 14px; color: #856404;">
+                    <strong>Next Steps:</strong> Your request is now pending manager review. You will be notified once your manager has reviewed your request.
+                </p>
+            </div>
+        </div>
+        
+        <div style="margin-top: 20px; padding: 15px; background: #f5f5f5; border-radius: 8px; text-align: center;">
+            <p style="margin: 0; font-size: 12px; color: #666;">
+                This is an automated message from Everlast HR System.<br>
+                Please do not reply to this email.
+            </p>
+        </div>
+    </div>
+</body>
+</html>''',
+        'footer': None,
+        'signature': None
+    }
+]
+
+def ensure_legacy_tables():
+    """Create the tables that predate the migrations and fix the departments id sequence.
+    Idempotent; PostgreSQL only (the DDL uses SERIAL, arrays and DO blocks)."""
+    if db.engine.dialect.name != 'postgresql':
+        logging.info(f"Skipping legacy table setup on {db.engine.dialect.name}")
+        return
+    try:
+        from psycopg2 import OperationalError
+        from sqlalchemy.exc import OperationalError as SQLAlchemyOperationalError
+        
+        # Create employee_attachments table if missing
+        try:
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS employee_attachments (
+                        id SERIAL PRIMARY KEY,
+                        user_id INTEGER NOT NULL,
+                        file_name VARCHAR(255) NOT NULL,
+                        display_name VARCHAR(255) NOT NULL,
+                        file_path VARCHAR(500) NOT NULL,
+                        file_size INTEGER,
+                        file_type VARCHAR(100),
+                        description TEXT,
+                        uploaded_by INTEGER,
+                        created_at TIMESTAMP,
+                        updated_at TIMESTAMP,
+                        CONSTRAINT fk_employee_attachments_user 
+                            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                        CONSTRAINT fk_employee_attachments_uploader 
+                            FOREIGN KEY (uploaded_by) REFERENCES users(id) ON DELETE SET NULL
+                    )
+                """))
+            db.session.commit()
+            logging.info("✅ employee_attachments table checked/created")
+        except (OperationalError, SQLAlchemyOperationalError) as e:
+            # Connection errors - don't log as warning, just skip silently
+            # The connection will be retried on actual database operations
+            db.session.rollback()
+            return  # Skip remaining operations if we can't connect
+        except Exception as e:
+            logging.warning(f"employee_attachments table check: {e}")
+            db.session.rollback()
+        
+        # Create documentation_pages table if missing
+        try:
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS documentation_pages (
+                        id SERIAL PRIMARY KEY,
+                        title VARCHAR(255) NOT NULL,
+                        slug VARCHAR(255) NOT NULL UNIQUE,
+                        content TEXT NOT NULL,
+                        category VARCHAR(100) NOT NULL,
+                        tags VARCHAR(100)[],
+                        visible_roles VARCHAR(20)[],
+                        is_published BOOLEAN DEFAULT FALSE,
+                        view_count INTEGER DEFAULT 0,
+                        created_by INTEGER,
+                        updated_by INTEGER,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        CONSTRAINT fk_doc_created_by 
+                            FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL,
+                        CONSTRAINT fk_doc_updated_by 
+                            FOREIGN KEY (updated_by) REFERENCES users(id) ON DELETE SET NULL
+                    )
+                """))
+            
+            # Add slug column if table exists but column doesn't
+            db.session.execute(text("""
+                    DO $$ 
+                    BEGIN
+                        IF NOT EXISTS (
+                            SELECT 1 FROM information_schema.columns 
+                            WHERE table_name='documentation_pages' AND column_name='slug'
+                        ) THEN
+                            ALTER TABLE documentation_pages ADD COLUMN slug VARCHAR(255);
+                            -- Update existing rows with slugs generated from titles
+                            UPDATE documentation_pages SET slug = LOWER(REGEXP_REPLACE(REGEXP_REPLACE(title, '[^a-zA-Z0-9\s-]', '', 'g'), '\s+', '-', 'g')) WHERE slug IS NULL;
+                            ALTER TABLE documentation_pages ALTER COLUMN slug SET NOT NULL;
+                            CREATE UNIQUE INDEX IF NOT EXISTS idx_doc_slug ON documentation_pages(slug);
+                        END IF;
+                    END $$;
+                """))
+            # Create indexes
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_doc_category ON documentation_pages(category)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_doc_published ON documentation_pages(is_published)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_doc_created_at ON documentation_pages(created_at)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_doc_slug ON documentation_pages(slug)
+                """))
+            db.session.commit()
+            logging.info("✅ documentation_pages table checked/created")
+        except (OperationalError, SQLAlchemyOperationalError) as e:
+            db.session.rollback()
+        except Exception as e:
+            logging.warning(f"documentation_pages table check: {e}")
+            db.session.rollback()
+        
+        # Create email_templates table if missing
+        try:
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS email_templates (
+                        id SERIAL PRIMARY KEY,
+                        template_name VARCHAR(100) NOT NULL UNIQUE,
+                        template_type VARCHAR(50) NOT NULL,
+                        subject VARCHAR(255) NOT NULL,
+                        body_html TEXT NOT NULL,
+                        footer TEXT,
+                        signature TEXT,
+                        is_active BOOLEAN DEFAULT TRUE,
+                        created_by INTEGER,
+                        updated_by INTEGER,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        CONSTRAINT fk_email_template_created_by 
+                            FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL,
+                        CONSTRAINT fk_email_template_updated_by 
+                            FOREIGN KEY (updated_by) REFERENCES users(id) ON DELETE SET NULL
+                    )
+                """))
+            # Create indexes
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_email_template_type ON email_templates(template_type)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_email_template_active ON email_templates(is_active)
+                """))
+            db.session.commit()
+            logging.info("✅ email_templates table checked/created")
+        except (OperationalError, SQLAlchemyOperationalError) as e:
+            db.session.rollback()
+        except Exception as e:
+            logging.warning(f"email_templates table check: {e}")
+            db.session.rollback()
+        
+        # Create ticket tables if missing
+        try:
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS ticket_categories (
+                        id SERIAL PRIMARY KEY,
+                        name VARCHAR(100) NOT NULL UNIQUE,
+                        description TEXT,
+                        is_active BOOLEAN DEFAULT TRUE,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """))
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS ticket_department_mapping (
+                        id SERIAL PRIMARY KEY,
+                        category_id INTEGER NOT NULL,
+                        department_id INTEGER NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        CONSTRAINT fk_ticket_dept_mapping_category 
+                            FOREIGN KEY (category_id) REFERENCES ticket_categories(id) ON DELETE CASCADE,
+                        CONSTRAINT fk_ticket_dept_mapping_dept 
+                            FOREIGN KEY (department_id) REFERENCES departments(id) ON DELETE CASCADE,
+                        CONSTRAINT uq_category_department UNIQUE (category_id, department_id)
+                    )
+                """))
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS tickets (
+                        id SERIAL PRIMARY KEY,
+                        user_id INTEGER NOT NULL,
+                        category_id INTEGER,
+                        title VARCHAR(255) NOT NULL,
+                        description TEXT NOT NULL,
+                        priority VARCHAR(20) NOT NULL DEFAULT 'medium',
+                        status VARCHAR(20) NOT NULL DEFAULT 'open',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        CONSTRAINT fk_ticket_user 
+                            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                        CONSTRAINT fk_ticket_category 
+                            FOREIGN KEY (category_id) REFERENCES ticket_categories(id) ON DELETE SET NULL
+                    )
+                """))
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS ticket_comments (
+                        id SERIAL PRIMARY KEY,
+                        ticket_id INTEGER NOT NULL,
+                        user_id INTEGER,
+                        comment_text TEXT NOT NULL,
+                        is_internal BOOLEAN DEFAULT FALSE,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        CONSTRAINT fk_ticket_comment_ticket 
+                            FOREIGN KEY (ticket_id) REFERENCES tickets(id) ON DELETE CASCADE,
+                        CONSTRAINT fk_ticket_comment_user 
+                            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+                    )
+                """))
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS ticket_attachments (
+                        id SERIAL PRIMARY KEY,
+                        ticket_id INTEGER NOT NULL,
+                        comment_id INTEGER,
+                        filename VARCHAR(255) NOT NULL,
+                        file_path VARCHAR(500) NOT NULL,
+                        file_size INTEGER,
+                        uploaded_by INTEGER,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        CONSTRAINT fk_ticket_attachment_ticket 
+                            FOREIGN KEY (ticket_id) REFERENCES tickets(id) ON DELETE CASCADE,
+                        CONSTRAINT fk_ticket_attachment_comment 
+                            FOREIGN KEY (comment_id) REFERENCES ticket_comments(id) ON DELETE CASCADE,
+                        CONSTRAINT fk_ticket_attachment_uploader 
+                            FOREIGN KEY (uploaded_by) REFERENCES users(id) ON DELETE SET NULL
+                    )
+                """))
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS ticket_status_history (
+                        id SERIAL PRIMARY KEY,
+                        ticket_id INTEGER NOT NULL,
+                        old_status VARCHAR(20),
+                        new_status VARCHAR(20) NOT NULL,
+                        changed_by INTEGER,
+                        comment TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        CONSTRAINT fk_ticket_status_history_ticket 
+                            FOREIGN KEY (ticket_id) REFERENCES tickets(id) ON DELETE CASCADE,
+                        CONSTRAINT fk_ticket_status_history_changer 
+                            FOREIGN KEY (changed_by) REFERENCES users(id) ON DELETE SET NULL
+                    )
+                """))
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS ticket_email_templates (
+                        id SERIAL PRIMARY KEY,
+                        template_type VARCHAR(50) NOT NULL UNIQUE,
+                        subject VARCHAR(255) NOT NULL,
+                        body_html TEXT NOT NULL,
+                        is_active BOOLEAN DEFAULT TRUE,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """))
+            db.session.execute(text("""
+                    CREATE TABLE IF NOT EXISTS scheduled_reminders (
+                        id SERIAL PRIMARY KEY,
+                        subject VARCHAR(255) NOT NULL,
+                        body TEXT NOT NULL,
+                        frequency VARCHAR(20) NOT NULL,
+                        target_recipients TEXT,
+                        is_active BOOLEAN DEFAULT TRUE,
+                        next_send_date TIMESTAMP,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """))
+            # Create indexes
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_category_active ON ticket_categories(is_active)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_dept_mapping_category ON ticket_department_mapping(category_id)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_dept_mapping_dept ON ticket_department_mapping(department_id)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_user ON tickets(user_id)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_category ON tickets(category_id)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_status ON tickets(status)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_priority ON tickets(priority)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_created ON tickets(created_at)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_comment_ticket ON ticket_comments(ticket_id)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_comment_user ON ticket_comments(user_id)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_comment_created ON ticket_comments(created_at)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_attachment_ticket ON ticket_attachments(ticket_id)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_attachment_comment ON ticket_attachments(comment_id)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_status_history_ticket ON ticket_status_history(ticket_id)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_status_history_created ON ticket_status_history(created_at)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_email_template_type ON ticket_email_templates(template_type)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_ticket_email_template_active ON ticket_email_templates(is_active)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_scheduled_reminder_active ON scheduled_reminders(is_active)
+                """))
+            db.session.execute(text("""
+                    CREATE INDEX IF NOT EXISTS idx_scheduled_reminder_next_send ON scheduled_reminders(next_send_date)
+                """))
+            db.session.commit()
+            logging.info("✅ Ticket tables checked/created")
+        except (OperationalError, SQLAlchemyOperationalError) as e:
+            db.session.rollback()
+        except Exception as e:
+            logging.warning(f"Ticket tables check: {e}")
+            db.session.rollback()
+        
+        # Break tables removed
+        
+        # Fix Department sequence
+        try:
+            result = db.session.execute(text("SELECT COALESCE(MAX(id), 0) FROM departments"))
+            max_id = result.scalar() or 0
+            
+            # Ensure sequence exists and is linked
+            db.session.execute(text("""
+                    DO $$ 
+                    BEGIN
+                        IF NOT EXISTS (SELECT 1 FROM pg_sequences WHERE sequencename = 'departments_id_seq') THEN
+                            CREATE SEQUENCE departments_id_seq;
+                        END IF;
+                    END $$;
+                """))
+            db.session.execute(text("ALTER TABLE departments ALTER COLUMN id SET DEFAULT nextval('departments_id_seq')"))
+            db.session.execute(text("ALTER SEQUENCE departments_id_seq OWNED BY departments.id"))
+            db.session.execute(text(f"SELECT setval('departments_id_seq', GREATEST({max_id}, 1), false)"))
+            db.session.commit()
+            logging.info(f"✅ Department sequence fixed")
+        except (OperationalError, SQLAlchemyOperationalError) as e:
+            # Connection errors - skip silently
+            db.session.rollback()
+        except Exception as e:
+            logging.warning(f"Department sequence fix: {e}")
+            db.session.rollback()
+            
+    except (OperationalError, SQLAlchemyOperationalError) as e:
+        # Connection errors - skip silently, connection will be retried later
+        try:
+            db.session.rollback()
+        except:
+            pass
+    except Exception as e:
+        logging.warning(f"Table/sequence check: {e}")
+        try:
+            db.session.rollback()
+        except:
+            pass
+
+def seed_default_email_templates():
+    """Add the default email templates that don't exist yet; returns how many were created"""
+    from models import EmailTemplate, User
+
+    # Get first technical support or admin for created_by
+    creator = User.query.filter(User.role.in_(['product_owner', 'admin'])).first()
+    creator_id = creator.id if creator else None
+
+    existing = {name for (name,) in db.session.query(EmailTemplate.template_name)}
+    created = 0
+    for template_data in DEFAULT_EMAIL_TEMPLATES:
+        if template_data['template_name'] in existing:
+            continue
+        db.session.add(EmailTemplate(
+            template_name=template_data['template_name'],
+            template_type=template_data['template_type'],
+            subject=template_data['subject'],
+            body_html=template_data['body_html'],
+            footer=template_data['footer'],
+            signature=template_data['signature'],
+            is_active=True,
+            created_by=creator_id,
+            updated_by=creator_id
+        ))
+        created += 1
+        logging.info(f"Created default email template: {template_data['template_name']}")
+    db.session.commit()
+    return created
+
+# Where the migration history stood when the app still created its tables itself; a database
+# with application tables but no alembic_version is assumed to be at these revisions
+BASELINE_REVISIONS = ('add_email_to_departments', 'add_manager_fields_permission')
+
+# pg_advisory_lock key serializing prepare-database runs
+PREPARE_LOCK_KEY = 727100
+
+@contextmanager
+def _prepare_lock():
+    """Hold a PostgreSQL advisory lock for the block (no-op on other databases)"""
+    if db.engine.dialect.name != 'postgresql':
+        yield
+        return
+    with db.engine.connect() as connection:
+        connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': PREPARE_LOCK_KEY})
+        try:
+            yield
+        finally:
+            connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': PREPARE_LOCK_KEY})
+
+def stamp_unversioned_database():
+    """Stamp a database that has never been migrated; returns the revisions stamped, if any"""
+    from flask_migrate import stamp
+
+    tables = set(inspect(db.engine).get_table_names())
+    if 'alembic_version' in tables and db.session.execute(text('SELECT 1 FROM alembic_version')).first():
+        return None
+    db.session.rollback()
+    if 'users' not in tables:
+        logging.info("Empty database: creating the current schema")
+        db.create_all()
+        revisions = 'heads'
+    else:
+        logging.warning(f"Database has tables but no migration revision; stamping it at {', '.join(BASELINE_REVISIONS)}")
+        revisions = BASELINE_REVISIONS
+    stamp(revision=revisions)
+    return revisions
+
+def prepare_database(upgrade=True):
+    """Migrate, create the legacy tables and seed defaults. Needs an app context."""
+    with _prepare_lock():
+        if upgrade:
+            from flask_migrate import upgrade as upgrade_schema
+            stamp_unversioned_database()
+            # The migration history has more than one head; bring every branch up to date
+            upgrade_schema(revision='heads')
+        ensure_legacy_tables()
+        from report_helpers.monthly_summary import populate_monthly_summaries
+        populate_monthly_summaries()
+        return seed_default_email_templates()
+
+_migration_heads = None
+
+def schema_status():
+    """The database's migration revision against the migration head, for /health"""
+    global _migration_heads
+    from flask import current_app
+
+    if _migration_heads is None:
+        from alembic.script import ScriptDirectory
+        config = current_app.extensions['migrate'].migrate.get_config()
+        _migration_heads = sorted(ScriptDirectory.from_config(config).get_heads())
+    try:
+        current = sorted(row[0] for row in db.session.execute(text('SELECT version_num FROM alembic_version')))
+    except Exception:
+        db.session.rollback()
+        current = []
+    return {'revision': current, 'head': _migration_heads, 'up_to_date': current == _migration_heads}
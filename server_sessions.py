@@ -0,0 +1,157 @@
+"""
+Database-backed server-side sessions (SESSION_TYPE = 'database').
+
+Sessions live in the server_sessions table, keyed by the id in the session cookie, so every
+worker on every host sees the same sessions. Built on Flask-Session's server-side session
+interface; SESSION_TYPE = 'filesystem' (or any other Flask-Session type) still uses Flask-Session.
+
+- Read-through cache: a loaded or saved session is kept in the application cache (cache.py) for
+  SESSION_CACHE_TTL seconds, so most requests don't query the table. With the per-process memory
+  backend another worker may see a logout or login up to SESSION_CACHE_TTL seconds late; a
+  shared cache backend (sqlite, redis) doesn't have that window.
+- Write on change: a session is written only when its data changed, or - for a session that is
+  merely read - when its expiry is more than SESSION_TOUCH_INTERVAL seconds behind the sliding
+  PERMANENT_SESSION_LIFETIME.
+- Writes use their own connection, never the request's db.session transaction.
+- Expired rows are ignored on load and deleted by the sweep_expired_sessions scheduler job
+  (or `flask session_cleanup`).
+"""
+
+import pickle
+import logging
+from datetime import datetime, timedelta
+
+from flask_session import Session
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+from flask_session.defaults import Defaults
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from cache import cache
+from extensions import db
+
+class DatabaseSession(ServerSideSession):
+    # Expiry of the stored copy; None until the session has been saved
+    expires_at = None
+
+class DatabaseSessionInterface(ServerSideSessionInterface):
+    session_class = DatabaseSession
+    ttl = False  # Expired rows have to be swept
+
+    def __init__(self, app, cache_ttl=5, touch_interval=60):
+        self.cache_ttl = cache_ttl
+        self.touch_interval = touch_interval
+        super().__init__(
+            app,
+            key_prefix=app.config.get('SESSION_KEY_PREFIX', Defaults.SESSION_KEY_PREFIX),
+            permanent=app.config.get('SESSION_PERMANENT', Defaults.SESSION_PERMANENT),
+            sid_length=app.config.get('SESSION_ID_LENGTH', Defaults.SESSION_ID_LENGTH),
+            serialization_format=app.config.get('SESSION_SERIALIZATION_FORMAT', Defaults.SESSION_SERIALIZATION_FORMAT),
+            cleanup_n_requests=None
+        )
+
+    @property
+    def table(self):
+        from models import ServerSession
+        return ServerSession.__table__
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        if sid:
+            data, expires_at = self._load(self._get_store_id(sid))
+            if data is not None:
+                session = self.session_class(data, sid=sid)
+                session.expires_at = expires_at
+                return session
+        return self.session_class(sid=self._generate_sid(self.sid_length), permanent=self.permanent)
+
+    def _load(self, store_id):
+        """(session dict, expiry) from the cache or the table; (None, None) if missing or expired"""
+        stored = None
+        try:
+            payload = cache.backend.get(store_id)
+            if payload is not None:
+                stored = pickle.loads(payload)
+        except Exception as e:
+            logging.warning(f'Session cache read failed: {str(e)}')
+        if stored is None:
+            with db.engine.connect() as connection:
+                row = connection.execute(
+                    select(self.table.c.data, self.table.c.expires_at).where(self.table.c.id == store_id)
+                ).first()
+            if row is None:
+                return None, None
+            stored = (bytes(row.data), row.expires_at)
+            self._cache(store_id, *stored)
+        data, expires_at = stored
+        if expires_at <= datetime.utcnow():
+            return None, None
+        return self.serializer.decode(data), expires_at
+
+    def _cache(self, store_id, data, expires_at):
+        try:
+            cache.backend.set(store_id, pickle.dumps((data, expires_at)), self.cache_ttl)
+        except Exception as e:
+            logging.warning(f'Session cache write failed: {str(e)}')
+
+    def should_set_storage(self, app, session):
+        if session.modified or session.expires_at is None:
+            return True
+        if not app.config['SESSION_REFRESH_EACH_REQUEST']:
+            return False
+        # Only push the expiry back once it lags the sliding lifetime by touch_interval
+        renewed_expiry = datetime.utcnow() + app.permanent_session_lifetime
+        return renewed_expiry - session.expires_at >= timedelta(seconds=self.touch_interval)
+
+    def _retrieve_session_data(self, store_id):
+        return self._load(store_id)[0]
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        expires_at = datetime.utcnow() + session_lifetime
+        data = self.serializer.encode(session)
+        values = {'data': data, 'expires_at': expires_at}
+        with db.engine.begin() as connection:
+            updated = connection.execute(
+                self.table.update().where(self.table.c.id == store_id).values(**values)
+            ).rowcount
+            if not updated:
+                try:
+                    with connection.begin_nested():
+                        connection.execute(self.table.insert().values(id=store_id, **values))
+                except IntegrityError:
+                    # A concurrent request created it first
+                    connection.execute(self.table.update().where(self.table.c.id == store_id).values(**values))
+        session.expires_at = expires_at
+        self._cache(store_id, data, expires_at)
+
+    def _delete_session(self, store_id):
+        with db.engine.begin() as connection:
+            connection.execute(self.table.delete().where(self.table.c.id == store_id))
+        try:
+            cache.backend.delete(store_id)
+        except Exception as e:
+            logging.warning(f'Session cache delete failed: {str(e)}')
+
+    def _delete_expired_sessions(self):
+        with db.engine.begin() as connection:
+            return connection.execute(
+                self.table.delete().where(self.table.c.expires_at <= datetime.utcnow())
+            ).rowcount
+
+def init_sessions(app):
+    """Install the session backend selected by SESSION_TYPE"""
+    if app.config.get('SESSION_TYPE') == 'database':
+        app.session_interface = DatabaseSessionInterface(
+            app,
+            cache_ttl=app.config.get('SESSION_CACHE_TTL', 5),
+            touch_interval=app.config.get('SESSION_TOUCH_INTERVAL', 60)
+        )
+    else:
+        Session(app)
+
+def sweep_expired_sessions(app):
+    """Delete expired database sessions; returns how many were removed (0 for other backends)"""
+    if not isinstance(app.session_interface, DatabaseSessionInterface):
+        return 0
+    with app.app_context():
+        return app.session_interface._delete_expired_sessions()
@@ -4,6 +4,9 @@
 class AutoFetchSystem {
     constructor(options = {}) {
         this.fetchInterval = options.fetchInterval || 15000; // 15 seconds default (more frequent)
+        this.pollInterval = this.fetchInterval;
+        // While the live stream is up, attendance changes are pushed; only a slow safety-net poll remains
+        this.liveFetchInterval = options.liveFetchInterval || 300000; // 5 minutes default
         this.refreshInterval = options.refreshInterval || 60000; // 1 minute default (more frequent)
         this.enabled = options.enabled !== false;
         this.userRole = options.userRole || 'employee';
@@ -41,6 +44,9 @@ class AutoFetchSystem {
         // Start auto-refresh
         this.startAutoRefresh();
         
+        // Fetch on pushed attendance events instead of polling while the stream is up
+        this.startLiveUpdates();
+        
         // Handle page visibility changes
         try {
             document.addEventListener('visibilitychange', () => {
@@ -137,6 +143,33 @@ class AutoFetchSystem {
         }, this.refreshInterval);
     }
     
+    startLiveUpdates() {
+        if (!window.liveUpdates) return;
+        
+        window.liveUpdates.subscribe('attendance', () => {
+            if (this.isRunning && !document.hidden) {
+                console.log('📡 Attendance update pushed, fetching...');
+                this.performFetch();
+            }
+        });
+        window.liveUpdates.onStateChange(live => this.setFetchInterval(live ? this.liveFetchInterval : this.pollInterval));
+    }
+    
+    setFetchInterval(interval) {
+        if (interval === this.fetchInterval) return;
+        
+        this.fetchInterval = interval;
+        this.originalFetchInterval = interval;
+        if (this.isRunning && this.fetchIntervalId) {
+            clearInterval(this.fetchIntervalId);
+            this.fetchIntervalId = setInterval(() => {
+                if (!document.hidden && !document.querySelector('form:focus')) {
+                    this.performFetch();
+                }
+            }, this.fetchInterval);
+        }
+    }
+    
     async performFetch() {
         if (this.fetchInProgress) return;
         
@@ -0,0 +1,71 @@
+// Background Export Jobs for Everlast HR System
+// Starts report exports as server-side jobs, polls until the file is ready, then downloads it
+
+(function() {
+    'use strict';
+    
+    const POLL_INTERVAL = 2000;
+    
+    function withAsyncFlag(url) {
+        return url + (url.indexOf('?') === -1 ? '?' : '&') + 'async=1';
+    }
+    
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+    
+    async function runExportJob(url, button) {
+        const originalHtml = button ? button.innerHTML : null;
+        if (button) {
+            button.classList.add('disabled');
+            button.setAttribute('aria-disabled', 'true');
+            button.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i> Preparing export...';
+        }
+        
+        try {
+            const response = await fetch(withAsyncFlag(url), {
+                headers: { 'Accept': 'application/json', 'X-Requested-With': 'XMLHttpRequest' },
+                credentials: 'same-origin'
+            });
+            const job = await response.json().catch(() => ({}));
+            if (response.status !== 202) {
+                throw new Error(job.error || job.message || 'Could not start the export');
+            }
+            
+            // Poll until the worker has written the file
+            while (true) {
+                await sleep(POLL_INTERVAL);
+                const statusResponse = await fetch(job.status_url, { credentials: 'same-origin' });
+                const status = await statusResponse.json();
+                if (status.status === 'done') {
+                    window.location.href = job.download_url;
+                    return;
+                }
+                if (status.status === 'failed') {
+                    throw new Error(status.error || 'Export failed');
+                }
+            }
+        } catch (error) {
+            console.error('Export job failed:', error);
+            alert('Export failed: ' + error.message);
+        } finally {
+            if (button) {
+                button.classList.remove('disabled');
+                button.removeAttribute('aria-disabled');
+                button.innerHTML = originalHtml;
+            }
+        }
+    }
+    
+    // Links marked with data-export-job run as background jobs
+    document.addEventListener('click', function(event) {
+        const link = event.target.closest('a[data-export-job]');
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        runExportJob(link.href, link);
+    });
+    
+    window.runExportJob = runExportJob;
+})();
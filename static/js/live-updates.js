@@ -0,0 +1,96 @@
+// Everlast HR System - Live updates over Server-Sent Events
+// One EventSource per page on /attendance/stream. Pages subscribe to events and register
+// their refresh functions with poll(); those timers only run while the stream is down
+// (no EventSource support, server at its stream limit, connection lost). The server only
+// has a few stream slots per worker, so most pages poll - the polled endpoints answer with an
+// ETag and the browser revalidates it, so a poll while nothing changed is a bodyless 304.
+
+class LiveUpdates {
+    constructor(url, options = {}) {
+        this.url = url;
+        this.reconnectDelay = options.reconnectDelay || 60000; // Retry after the server closed the stream for good
+        this.handlers = {};
+        this.stateHandlers = [];
+        this.pollers = [];
+        this.live = false;
+        this.source = null;
+
+        this.connect();
+    }
+
+    connect() {
+        if (!window.EventSource) {
+            console.log('📵 EventSource not supported - using polling');
+            return;
+        }
+
+        this.source = new EventSource(this.url);
+        this.source.onopen = () => this.setLive(true);
+        this.source.onerror = () => {
+            this.setLive(false);
+            // CONNECTING: the browser retries by itself. CLOSED: the server refused the stream
+            // (e.g. 204 at the stream limit), so poll for a while before trying again
+            if (this.source.readyState === EventSource.CLOSED) {
+                this.source = null;
+                setTimeout(() => this.connect(), this.reconnectDelay);
+            }
+        };
+        Object.keys(this.handlers).forEach(type => this.listen(type));
+    }
+
+    listen(type) {
+        if (!this.source) return;
+        this.source.addEventListener(type, (event) => {
+            let data = {};
+            try {
+                data = JSON.parse(event.data);
+            } catch (e) {
+                console.debug('Ignoring malformed live update:', event.data);
+            }
+            (this.handlers[type] || []).forEach(handler => handler(data));
+        });
+    }
+
+    // Call handler(data) for every event of the given type
+    subscribe(type, handler) {
+        if (!this.handlers[type]) {
+            this.handlers[type] = [];
+            this.listen(type);
+        }
+        this.handlers[type].push(handler);
+    }
+
+    // Call handler(isLive) whenever the stream goes up or down
+    onStateChange(handler) {
+        this.stateHandlers.push(handler);
+        handler(this.live);
+    }
+
+    // Run fn every interval ms, but only while the stream is down
+    poll(fn, interval) {
+        const poller = { fn: fn, interval: interval, id: null };
+        this.pollers.push(poller);
+        if (!this.live) {
+            poller.id = setInterval(fn, interval);
+        }
+    }
+
+    setLive(live) {
+        if (live === this.live) return;
+        this.live = live;
+        console.log(live ? '📡 Live updates connected - polling paused' : '📵 Live updates unavailable - polling');
+
+        this.pollers.forEach(poller => {
+            if (live && poller.id) {
+                clearInterval(poller.id);
+                poller.id = null;
+            } else if (!live && !poller.id) {
+                poller.id = setInterval(poller.fn, poller.interval);
+            }
+        });
+        this.stateHandlers.forEach(handler => handler(live));
+    }
+}
+
+window.LiveUpdates = LiveUpdates;
+window.liveUpdates = new LiveUpdates('/attendance/stream');
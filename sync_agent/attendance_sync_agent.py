@@ -6,23 +6,35 @@ This script runs on the local network where biometric devices are located.
 It connects to ZKTeco devices, fetches attendance logs, and syncs them 
 to the cloud-deployed Flask application via secure API.
 
+New punches are queued in a local SQLite spool together with a per-device cursor (newest
+timestamp already queued and the device's record count), so each cycle only picks up records
+added since the last one - plus a short overlap window for punches that arrive late or in the
+cursor's own second - and nothing is lost while the server is unreachable. The spool is drained to /api/v2/sync/logs as
+gzip-compressed NDJSON batches, with backoff while uploads fail. Each batch carries an
+idempotency key derived from its content, so a retried upload is never applied twice. A batch
+the server refuses outright is set aside in the spool so it doesn't hold up the rest.
+
 Author: EverLast ERP Team
-Version: 1.0.0
+Version: 2.0.0
 """
 
 import os
 import sys
 import time
 import json
+import gzip
 import logging
 import hashlib
 import hmac
+import sqlite3
 import requests
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import schedule
 from zk import ZK
 import configparser
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 
 # Setup logging
 logging.basicConfig(
@@ -35,6 +47,151 @@ logging.basicConfig(
 )
 logger = logging.getLogger('SyncAgent')
 
+class LogSpool:
+    """Durable queue of fetched logs and per-device fetch cursors in a local SQLite file"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=FULL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS pending_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                device_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                punch INTEGER,
+                UNIQUE (device_id, user_id, timestamp)
+            );
+            -- Recently acknowledged logs, so the overlap window doesn't upload them again
+            CREATE TABLE IF NOT EXISTS sent_logs (
+                device_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                PRIMARY KEY (device_id, user_id, timestamp)
+            );
+            -- Logs of batches the server refused (malformed, too large, key conflict); kept for
+            -- inspection and put back in the queue with --requeue-rejected
+            CREATE TABLE IF NOT EXISTS rejected_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                device_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                punch INTEGER,
+                status_code INTEGER,
+                error TEXT,
+                rejected_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS device_cursors (
+                device_id TEXT PRIMARY KEY,
+                last_timestamp TEXT,      -- newest punch queued from the device
+                record_count INTEGER,     -- records on the device at the last fetch
+                acked_timestamp TEXT,     -- newest punch the server has acknowledged
+                updated_at TEXT
+            );
+        ''')
+        self.conn.commit()
+    
+    def cursor(self, device_id: str) -> Dict:
+        row = self.conn.execute(
+            'SELECT last_timestamp, record_count, acked_timestamp FROM device_cursors WHERE device_id = ?',
+            (device_id,)
+        ).fetchone()
+        last_timestamp, record_count, acked_timestamp = row or (None, None, None)
+        return {'last_timestamp': last_timestamp, 'record_count': record_count, 'acked_timestamp': acked_timestamp}
+    
+    def enqueue(self, device_id: str, logs: List[Dict], last_timestamp: Optional[str], record_count: int,
+                sent_before: Optional[str] = None) -> int:
+        """Queue logs and move the device cursor in one transaction; returns the number queued.
+        
+        Logs already queued or recently acknowledged are skipped. sent_before drops the memory
+        of acknowledged logs older than the overlap window.
+        """
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany('''
+                INSERT OR IGNORE INTO pending_logs (device_id, user_id, timestamp, punch)
+                SELECT ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM sent_logs WHERE device_id = ? AND user_id = ? AND timestamp = ?)
+            ''', [(device_id, str(log['user_id']), log['timestamp'], log.get('punch'),
+                   device_id, str(log['user_id']), log['timestamp']) for log in logs])
+            queued = self.conn.total_changes - before
+            if sent_before:
+                self.conn.execute('DELETE FROM sent_logs WHERE device_id = ? AND timestamp < ?', (device_id, sent_before))
+            self.conn.execute('''
+                INSERT INTO device_cursors (device_id, last_timestamp, record_count, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (device_id) DO UPDATE SET
+                    last_timestamp = COALESCE(excluded.last_timestamp, device_cursors.last_timestamp),
+                    record_count = excluded.record_count,
+                    updated_at = excluded.updated_at
+            ''', (device_id, last_timestamp, record_count, datetime.now().isoformat()))
+        return queued
+    
+    def pending_devices(self) -> List[str]:
+        return [row[0] for row in self.conn.execute('SELECT DISTINCT device_id FROM pending_logs ORDER BY device_id')]
+    
+    def next_batch(self, device_id: str, limit: int):
+        """Oldest queued logs of a device as (row ids, logs)"""
+        rows = self.conn.execute(
+            'SELECT id, user_id, timestamp, punch FROM pending_logs WHERE device_id = ? ORDER BY id LIMIT ?',
+            (device_id, limit)
+        ).fetchall()
+        return [row[0] for row in rows], [{'user_id': user_id, 'timestamp': timestamp, 'punch': punch} for _, user_id, timestamp, punch in rows]
+    
+    def acknowledge(self, device_id: str, row_ids: List[int], newest_timestamp: str):
+        """Drop logs the server has accepted, remembering them for the overlap window"""
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR IGNORE INTO sent_logs (device_id, user_id, timestamp)
+                SELECT device_id, user_id, timestamp FROM pending_logs WHERE id = ?
+            ''', [(row_id,) for row_id in row_ids])
+            self.conn.executemany('DELETE FROM pending_logs WHERE id = ?', [(row_id,) for row_id in row_ids])
+            self.conn.execute('''
+                UPDATE device_cursors SET acked_timestamp = MAX(COALESCE(acked_timestamp, ''), ?), updated_at = ?
+                WHERE device_id = ?
+            ''', (newest_timestamp, datetime.now().isoformat(), device_id))
+    
+    def reject(self, device_id: str, row_ids: List[int], status_code: int, error: str):
+        """Move the logs of a batch the server refused out of the queue, into rejected_logs"""
+        rejected_at = datetime.now().isoformat()
+        with self.conn:
+            self.conn.executemany('''
+                INSERT INTO rejected_logs (device_id, user_id, timestamp, punch, status_code, error, rejected_at)
+                SELECT device_id, user_id, timestamp, punch, ?, ?, ? FROM pending_logs WHERE id = ?
+            ''', [(status_code, error, rejected_at, row_id) for row_id in row_ids])
+            self.conn.executemany('DELETE FROM pending_logs WHERE id = ?', [(row_id,) for row_id in row_ids])
+    
+    def requeue_rejected(self) -> int:
+        """Put rejected logs back in the queue; returns how many were requeued"""
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.execute('''
+                INSERT OR IGNORE INTO pending_logs (device_id, user_id, timestamp, punch)
+                SELECT device_id, user_id, timestamp, punch FROM rejected_logs ORDER BY id
+            ''')
+            requeued = self.conn.total_changes - before
+            self.conn.execute('DELETE FROM rejected_logs')
+        return requeued
+    
+    def pending_count(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM pending_logs').fetchone()[0]
+    
+    def rejected_count(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM rejected_logs').fetchone()[0]
+
+class BatchRejected(Exception):
+    """The server refused a batch for its content; sending it again won't help"""
+    
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"HTTP {status_code} - {message}")
+        self.status_code = status_code
+        self.message = message
+
+# 4xx answers about the agent or the server rather than the batch: back off and retry
+RETRYABLE_CLIENT_ERRORS = (401, 403, 404, 408, 429)
+
 class AttendanceSyncAgent:
     """Local sync agent for biometric device attendance logs"""
     
@@ -46,15 +203,35 @@ class AttendanceSyncAgent:
         # Server configuration
         self.server_url = self.config.get('server', 'url', fallback='https://your-app.coolify.domain')
         self.sync_secret = self.config.get('server', 'sync_secret', fallback='your-sync-secret-key')
-        self.sync_endpoint = f"{self.server_url}/api/sync_logs"
+        self.sync_endpoint = f"{self.server_url}/api/v2/sync/logs"
+        self.user_agent = 'EverLast-Sync-Agent/2.0.0'
+        # One keep-alive connection for every batch of a cycle
+        self.http = requests.Session()
         
         # Device configuration
         self.devices = self._load_device_config()
         
         # Sync configuration
         self.sync_interval = self.config.getint('sync', 'interval_minutes', fallback=5)
-        self.batch_size = self.config.getint('sync', 'batch_size', fallback=100)
+        self.batch_size = self.config.getint('sync', 'batch_size', fallback=5000)
         self.max_retries = self.config.getint('sync', 'max_retries', fallback=3)
+        self.compress = self.config.getboolean('sync', 'compress', fallback=True)
+        # Records this far behind the cursor are read again each cycle (late or same-second punches)
+        self.overlap = timedelta(minutes=self.config.getint('sync', 'overlap_minutes', fallback=10))
+        
+        # Local spool; uploads back off from retry_base_seconds up to retry_max_seconds while failing
+        self.spool = LogSpool(self.config.get('sync', 'spool_path', fallback='sync_spool.db'))
+        self.retry_base_seconds = self.config.getint('sync', 'retry_base_seconds', fallback=30)
+        self.retry_max_seconds = self.config.getint('sync', 'retry_max_seconds', fallback=900)
+        self.drain_failures = 0
+        self.next_drain_at = 0.0
+        
+        # Devices are read in parallel; a cycle waits at most device_deadline_seconds for them
+        self.max_workers = self.config.getint('sync', 'max_workers', fallback=4)
+        self.device_deadline = self.config.getint('sync', 'device_deadline_seconds', fallback=120)
+        self.in_flight = set()
+        self.in_flight_lock = threading.Lock()
+        self.last_cycle_metrics = []
         
         logger.info(f"Sync Agent initialized with {len(self.devices)} devices")
         logger.info(f"Server URL: {self.server_url}")
@@ -102,8 +279,8 @@ class AttendanceSyncAgent:
             logger.error(f"Failed to connect to device {device['name']} ({device['ip']}): {str(e)}")
             return None
     
-    def fetch_attendance_logs(self, device: Dict, conn) -> List[Dict]:
-        """Fetch attendance logs from a device"""
+    def fetch_attendance_logs(self, device: Dict, conn) -> Optional[List[Dict]]:
+        """Fetch attendance logs from a device; None if the device could not be read"""
         try:
             # Get attendance logs
             attendances = conn.get_attendance()
@@ -114,7 +291,7 @@ class AttendanceSyncAgent:
                 log = {
                     'user_id': attendance.user_id,
                     'timestamp': attendance.timestamp.isoformat(),
-                    'action': 'check_in' if attendance.punch == 0 else 'check_out'
+                    'punch': attendance.punch
                 }
                 logs.append(log)
             
@@ -123,90 +300,101 @@ class AttendanceSyncAgent:
             
         except Exception as e:
             logger.error(f"Error fetching logs from device {device['name']}: {str(e)}")
-            return []
+            return None
     
-    def sync_logs_to_server(self, device_id: str, logs: List[Dict]) -> bool:
-        """Send logs to the cloud server"""
+    def _encode_batch(self, logs: List[Dict]) -> bytes:
+        """NDJSON body, gzip-compressed unless disabled in the config.
+        
+        mtime=0 keeps the gzip header free of the current time, so a retried batch is byte-identical.
+        """
+        body = '\n'.join(json.dumps(log, separators=(',', ':')) for log in logs).encode('utf-8')
+        return gzip.compress(body, mtime=0) if self.compress else body
+    
+    def sync_logs_to_server(self, device: Dict, logs: List[Dict]) -> bool:
+        """Send one batch of logs to the cloud server.
+        
+        Returns False if it should be retried later (network error, 5xx, authentication) and
+        raises BatchRejected if the server refused the batch itself.
+        """
         if not logs:
             return True
         
+        device_id = device['id']
         try:
-            # Prepare payload
-            payload_data = {
-                'device_id': device_id,
-                'logs': logs
-            }
-            payload_json = json.dumps(payload_data, separators=(',', ':'))
-            payload_bytes = payload_json.encode('utf-8')
+            payload_bytes = self._encode_batch(logs)
             
-            # Generate signature
-            signature = self._generate_signature(payload_bytes)
+            # The key depends only on the batch content, so a retry - even after a restart -
+            # reuses it and the server answers with the stored result instead of re-applying it
+            idempotency_key = hashlib.sha256(
+                device_id.encode('utf-8') + b'\n' + json.dumps(logs, sort_keys=True).encode('utf-8')
+            ).hexdigest()
             
-            # Prepare headers
             headers = {
-                'Content-Type': 'application/json',
-                'X-Sync-Signature': signature,
-                'User-Agent': 'EverLast-Sync-Agent/1.0.0'
+                'Content-Type': 'application/x-ndjson',
+                'X-Sync-Signature': self._generate_signature(payload_bytes),
+                'Idempotency-Key': idempotency_key,
+                'X-Device-Id': device_id,
+                'X-Device-IP': device['ip'],
+                'User-Agent': self.user_agent
             }
+            if self.compress:
+                headers['Content-Encoding'] = 'gzip'
             
             # Send request with retries
             for attempt in range(self.max_retries):
                 try:
-                    response = requests.post(
+                    response = self.http.post(
                         self.sync_endpoint,
                         data=payload_bytes,
                         headers=headers,
-                        timeout=30
+                        timeout=120
                     )
                     
                     if response.status_code == 200:
-                        result = response.json()
-                        logger.info(f"Sync successful for {device_id}: {result.get('processed', 0)} processed, {result.get('skipped', 0)} skipped")
+                        summary = response.json().get('summary', {})
+                        logger.info(
+                            f"Sync successful for {device_id}: {summary.get('received', len(logs))} sent, "
+                            f"{summary.get('inserted', 0)} inserted, {summary.get('updated', 0)} updated, "
+                            f"{summary.get('unchanged', 0)} unchanged, {summary.get('unmatched', 0)} unmatched, "
+                            f"{summary.get('invalid', 0)} invalid"
+                            + (" (already applied)" if response.json().get('replayed') else "")
+                        )
                         return True
-                    else:
-                        logger.error(f"Sync failed for {device_id}: HTTP {response.status_code} - {response.text}")
+                    
+                    logger.error(f"Sync failed for {device_id}: HTTP {response.status_code} - {response.text[:500]}")
+                    if response.status_code in RETRYABLE_CLIENT_ERRORS:
+                        return False
+                    if response.status_code < 500:
+                        # Rejected batch (size, malformed, key conflict) - retrying won't help
+                        raise BatchRejected(response.status_code, response.text[:500])
                         
                 except requests.exceptions.RequestException as e:
                     logger.error(f"Network error syncing {device_id} (attempt {attempt + 1}): {str(e)}")
-                    if attempt < self.max_retries - 1:
-                        time.sleep(5 * (attempt + 1))  # Exponential backoff
-                        continue
+                
+                if attempt < self.max_retries - 1:
+                    time.sleep(5 * (attempt + 1))  # Back off before retrying
                     
             return False
             
+        except BatchRejected:
+            raise
         except Exception as e:
             logger.error(f"Error syncing logs for {device_id}: {str(e)}")
             return False
     
-    def sync_device(self, device: Dict) -> bool:
-        """Sync attendance logs from a single device"""
-        logger.info(f"Starting sync for device: {device['name']}")
-        
-        # Connect to device
+    def fetch_device(self, device: Dict) -> Dict:
+        """Read a device's log (network only, runs on a worker thread) and time each step"""
+        metrics = {'device': device['name'], 'status': 'error', 'records': None, 'connect_seconds': None, 'fetch_seconds': None}
+        started = time.monotonic()
         conn = self.connect_to_device(device)
+        metrics['connect_seconds'] = round(time.monotonic() - started, 2)
         if not conn:
-            return False
+            return metrics
         
         try:
-            # Fetch logs
+            fetch_started = time.monotonic()
             logs = self.fetch_attendance_logs(device, conn)
-            
-            if logs:
-                # Process logs in batches
-                for i in range(0, len(logs), self.batch_size):
-                    batch = logs[i:i + self.batch_size]
-                    success = self.sync_logs_to_server(device['id'], batch)
-                    if not success:
-                        logger.error(f"Failed to sync batch {i//self.batch_size + 1} for device {device['name']}")
-                        return False
-                    
-                    # Small delay between batches
-                    if i + self.batch_size < len(logs):
-                        time.sleep(1)
-            
-            logger.info(f"Sync completed for device: {device['name']}")
-            return True
-            
+            metrics['fetch_seconds'] = round(time.monotonic() - fetch_started, 2)
         finally:
             # Always disconnect
             try:
@@ -214,52 +402,167 @@ class AttendanceSyncAgent:
                 logger.debug(f"Disconnected from device: {device['name']}")
             except:
                 pass
+        
+        if logs is not None:
+            metrics.update(status='ok', records=len(logs), logs=logs)
+        return metrics
+    
+    def queue_device_logs(self, device: Dict, logs: List[Dict]) -> Dict:
+        """Queue the records past the device's cursor in the local spool (spool thread only)"""
+        # Records appended since the last fetch (the device keeps them in punch order, so this
+        # includes punches stamped earlier by a clock that went back) and records within the
+        # overlap window before the cursor are queued; the spool skips the ones it already
+        # queued or sent. If the device now holds fewer records than before (log cleared),
+        # queue everything again; the server skips what it has.
+        cursor = self.spool.cursor(device['id'])
+        new_logs = logs
+        overlap_start = None
+        if cursor['last_timestamp'] and not (cursor['record_count'] is not None and len(logs) < cursor['record_count']):
+            overlap_start = (datetime.fromisoformat(cursor['last_timestamp']) - self.overlap).isoformat()
+            position = cursor['record_count'] or 0
+            new_logs = [log for index, log in enumerate(logs) if index >= position or log['timestamp'] >= overlap_start]
+        newest = max((log['timestamp'] for log in logs), default=None)
+        
+        queued = self.spool.enqueue(device['id'], new_logs, newest, len(logs), sent_before=overlap_start)
+        return {'new': len(new_logs), 'queued': queued}
+    
+    def sync_device(self, device: Dict) -> bool:
+        """Fetch one device and queue its new records (outside the concurrent cycle)"""
+        metrics = self.fetch_device(device)
+        if metrics['status'] != 'ok':
+            return False
+        metrics.update(self.queue_device_logs(device, metrics.pop('logs')))
+        self._log_device_metrics(metrics)
+        return True
+    
+    def _log_device_metrics(self, metrics: Dict):
+        def seconds(value):
+            return f"{value:.2f}s" if value is not None else '-'
+        logger.info(
+            f"Device {metrics['device']}: status={metrics['status']} records={metrics.get('records')} "
+            f"new={metrics.get('new', 0)} queued={metrics.get('queued', 0)} connect={seconds(metrics.get('connect_seconds'))} "
+            f"fetch={seconds(metrics.get('fetch_seconds'))} total={seconds(metrics.get('total_seconds'))}"
+        )
+    
+    def drain_spool(self, force: bool = False) -> bool:
+        """Upload queued logs batch by batch; returns True once the spool is empty.
+        
+        After a failed upload the spool is left alone until the backoff delay has passed. A batch
+        the server refuses is moved to the spool's rejected logs and draining carries on.
+        """
+        if not force and time.monotonic() < self.next_drain_at:
+            return False
+        
+        devices = {device['id']: device for device in self.devices}
+        for device_id in self.spool.pending_devices():
+            # Devices removed from the config keep their queued logs, sent without a device IP
+            device = devices.get(device_id, {'id': device_id, 'name': device_id, 'ip': ''})
+            while True:
+                row_ids, logs = self.spool.next_batch(device_id, self.batch_size)
+                if not logs:
+                    break
+                try:
+                    sent = self.sync_logs_to_server(device, logs)
+                except BatchRejected as e:
+                    self.spool.reject(device_id, row_ids, e.status_code, e.message)
+                    logger.error(f"Batch of {len(logs)} logs from {device_id} rejected ({e}); moved to rejected logs "
+                                 f"({self.spool.rejected_count()} in total, requeue with --requeue-rejected)")
+                    continue
+                if not sent:
+                    self.drain_failures += 1
+                    delay = min(self.retry_base_seconds * 2 ** (self.drain_failures - 1), self.retry_max_seconds)
+                    self.next_drain_at = time.monotonic() + delay
+                    logger.warning(f"Upload failed; {self.spool.pending_count()} logs stay queued, retrying in {delay}s")
+                    return False
+                self.spool.acknowledge(device_id, row_ids, max(log['timestamp'] for log in logs))
+        
+        if self.drain_failures:
+            logger.info("Server reachable again - spool drained")
+        self.drain_failures = 0
+        self.next_drain_at = 0.0
+        return True
+    
+    def _fetch_worker(self, device: Dict) -> Dict:
+        try:
+            return self.fetch_device(device)
+        finally:
+            with self.in_flight_lock:
+                self.in_flight.discard(device['id'])
     
     def sync_all_devices(self):
-        """Sync attendance logs from all configured devices"""
-        logger.info("=== Starting sync cycle ===")
-        start_time = datetime.now()
+        """Fetch new logs from all devices concurrently, queue each as it arrives, then upload.
         
-        success_count = 0
-        total_devices = len(self.devices)
+        Devices are read by up to max_workers threads; the cycle waits at most
+        device_deadline_seconds for them. Uploads start once every device has answered or
+        missed the deadline, so a slow server never counts against a device. Only this thread
+        touches the spool, which is the upload queue shared by all devices.
+        """
+        logger.info("=== Starting sync cycle ===")
+        start_time = time.monotonic()
+        # A new cycle is a fresh chance to upload, even during backoff
+        self.next_drain_at = 0.0
         
+        # A device still stuck in an earlier cycle's fetch is skipped rather than opened twice
+        with self.in_flight_lock:
+            devices = [device for device in self.devices if device['id'] not in self.in_flight]
+            self.in_flight.update(device['id'] for device in devices)
         for device in self.devices:
+            if device not in devices:
+                logger.warning(f"Skipping {device['name']}: fetch from an earlier cycle is still running")
+        
+        cycle_metrics = []
+        if devices:
+            executor = ThreadPoolExecutor(max_workers=max(1, min(len(devices), self.max_workers)), thread_name_prefix='device-fetch')
+            futures = {executor.submit(self._fetch_worker, device): device for device in devices}
             try:
-                if self.sync_device(device):
-                    success_count += 1
-                else:
-                    logger.warning(f"Sync failed for device: {device['name']}")
-                    
-                # Small delay between devices
-                time.sleep(2)
-                
-            except Exception as e:
-                logger.error(f"Unexpected error syncing device {device['name']}: {str(e)}")
+                for future in as_completed(futures, timeout=self.device_deadline):
+                    device = futures.pop(future)
+                    try:
+                        metrics = future.result()
+                        if metrics['status'] == 'ok':
+                            metrics.update(self.queue_device_logs(device, metrics.pop('logs')))
+                    except Exception as e:
+                        logger.error(f"Unexpected error syncing device {device['name']}: {str(e)}")
+                        metrics = {'device': device['name'], 'status': 'error'}
+                    metrics['total_seconds'] = round(time.monotonic() - start_time, 2)
+                    self._log_device_metrics(metrics)
+                    cycle_metrics.append(metrics)
+            except FuturesTimeoutError:
+                for device in futures.values():
+                    logger.error(f"Device {device['name']}: status=timeout - no answer within {self.device_deadline}s")
+                    cycle_metrics.append({'device': device['name'], 'status': 'timeout'})
+            finally:
+                # Don't wait for stragglers - their records are picked up next cycle
+                executor.shutdown(wait=False, cancel_futures=True)
+        
+        drained = self.drain_spool()
+        self.last_cycle_metrics = cycle_metrics
         
-        duration = datetime.now() - start_time
-        logger.info(f"=== Sync cycle completed: {success_count}/{total_devices} devices successful in {duration.total_seconds():.1f}s ===")
+        success_count = sum(1 for metrics in cycle_metrics if metrics['status'] == 'ok')
+        duration = time.monotonic() - start_time
+        logger.info(f"=== Sync cycle completed: {success_count}/{len(self.devices)} devices read, "
+                    f"{'spool empty' if drained else f'{self.spool.pending_count()} logs queued'} "
+                    f"in {duration:.1f}s ===")
     
     def test_server_connection(self) -> bool:
         """Test connection to the cloud server"""
         try:
-            # Test with empty payload
-            test_payload = json.dumps({'test': True}).encode('utf-8')
-            signature = self._generate_signature(test_payload)
-            
+            # A signed batch without an idempotency key: 400 means the signature was accepted
+            test_payload = b''
             headers = {
-                'Content-Type': 'application/json',
-                'X-Sync-Signature': signature,
-                'User-Agent': 'EverLast-Sync-Agent/1.0.0'
+                'Content-Type': 'application/x-ndjson',
+                'X-Sync-Signature': self._generate_signature(test_payload),
+                'User-Agent': self.user_agent
             }
             
-            response = requests.post(
+            response = self.http.post(
                 self.sync_endpoint,
                 data=test_payload,
                 headers=headers,
                 timeout=10
             )
             
-            if response.status_code in [200, 400]:  # 400 is expected for test payload
+            if response.status_code == 400:
                 logger.info("Server connection test successful")
                 return True
             else:
@@ -278,13 +581,13 @@ class AttendanceSyncAgent:
         """Run the sync agent with scheduled intervals"""
         logger.info(f"Starting sync agent scheduler (every {self.sync_interval} minutes)")
         
-        # Test server connection first
+        # Test server connection first; logs are still fetched and queued while it is down
         if not self.test_server_connection():
-            logger.error("Cannot connect to server. Please check configuration.")
-            return
+            logger.warning("Cannot connect to server - logs will be queued until it is reachable. Please check configuration.")
         
-        # Schedule sync
+        # Schedule sync; queued logs are retried in between as the backoff allows
         schedule.every(self.sync_interval).minutes.do(self.sync_all_devices)
+        schedule.every(1).minutes.do(self.drain_spool)
         
         # Run initial sync
         self.sync_all_devices()
@@ -309,6 +612,7 @@ def main():
     parser.add_argument('--config', default='config.ini', help='Configuration file path')
     parser.add_argument('--once', action='store_true', help='Run sync once and exit')
     parser.add_argument('--test', action='store_true', help='Test server connection and exit')
+    parser.add_argument('--requeue-rejected', action='store_true', help='Put logs of rejected batches back in the queue and exit')
     
     args = parser.parse_args()
     
@@ -329,6 +633,8 @@ def main():
     if args.test:
         success = agent.test_server_connection()
         sys.exit(0 if success else 1)
+    elif args.requeue_rejected:
+        logger.info(f"Requeued {agent.spool.requeue_rejected()} rejected logs")
     elif args.once:
         agent.run_once()
     else:
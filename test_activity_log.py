@@ -0,0 +1,80 @@
+"""
+Tests for the buffered activity log writer (activity_log.py).
+
+Checks that log_activity() leaves the caller's transaction alone and that queued entries are
+written with a single multi-row INSERT, that entries which can't be written are spooled to disk
+and replayed once the database accepts them again, and that torn spool lines are set aside
+without costing the other entries. Uses a temporary SQLite database.
+"""
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import User, Department, ActivityLog
+from activity_log import activity_log_writer
+from helpers import log_activity
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    app = make_app('audit.sqlite3')
+    with app.app_context():
+        db.session.add(User(first_name='Jane', last_name='Doe', email='jane@example.com', password_hash='x',
+                            role='admin', status='active'))
+        db.session.commit()
+    # A long interval: the tests flush explicitly
+    activity_log_writer.configure(app, buffered=True, batch_size=500, flush_interval=60,
+                                  spool_path=str(tmp_path / 'activity_log_spool.jsonl'))
+    return app
+
+def test_entries_are_batched_off_the_callers_transaction(app):
+    inserts = []
+    with app.test_request_context('/', environ_base={'REMOTE_ADDR': '10.1.2.3'}):
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: inserts.append(statement)
+                     if statement.startswith('INSERT INTO activity_logs') else None)
+        db.session.add(Department(department_name='Pending work'))
+        for i in range(3):
+            assert log_activity(1, 'edit_user', 'user', i, before_values={'a': i}, after_values={'a': i + 1})
+        assert ActivityLog.query.count() == 0, 'entries should wait in the queue'
+        db.session.rollback()
+
+        assert activity_log_writer.flush() == 3
+        assert len(inserts) == 1, f'expected one multi-row INSERT, got {len(inserts)}'
+        assert ActivityLog.query.count() == 3
+        assert ActivityLog.query.first().ip_address == '10.1.2.3'
+        assert Department.query.count() == 0, "log_activity must not commit the caller's work"
+
+def test_unwritable_entries_are_spooled_and_replayed(app):
+    with app.test_request_context('/'):
+        ActivityLog.__table__.drop(db.engine)
+        log_activity(1, 'login', description='database is down')
+        assert activity_log_writer.flush() == 0
+        assert os.path.exists(activity_log_writer.spool_path), 'failed entries should be spooled'
+
+        ActivityLog.__table__.create(db.engine)
+        log_activity(1, 'logout')
+        assert activity_log_writer.flush() == 2, 'the spool should be replayed with the queued entry'
+        assert not os.path.exists(activity_log_writer.spool_path)
+        assert sorted(entry.action for entry in ActivityLog.query.all()) == ['login', 'logout']
+
+def test_torn_spool_lines_are_set_aside(app):
+    spool_path = activity_log_writer.spool_path
+    spooled = lambda action: {'user_id': 1, 'action': action, 'created_at': datetime(2025, 3, 3)}
+    with app.test_request_context('/'):
+        activity_log_writer._spool([spooled('login')])
+        with open(spool_path, 'a', encoding='utf-8') as spool:
+            spool.write('{"action": "torn')  # a worker killed mid-append
+        activity_log_writer._spool([spooled('after-torn')])
+        with open(spool_path, 'a', encoding='utf-8') as spool:
+            spool.write('not json\n')
+        activity_log_writer._spool([spooled('last')])
+        log_activity(1, 'logout')
+
+        assert activity_log_writer.flush() == 4, 'queued entries must survive unreadable spool lines'
+        assert sorted(entry.action for entry in ActivityLog.query.all()) == ['after-torn', 'last', 'login', 'logout']
+        assert not os.path.exists(spool_path)
+        with open(f'{spool_path}.corrupt', encoding='utf-8') as corrupt:
+            assert corrupt.read() == '{"action": "torn\nnot json\n'
@@ -0,0 +1,212 @@
+"""
+Tests for the batched DailyAttendance rollup (rollup_daily_attendance in routes/attendance.py)
+and the dirty-day queue that drives it after each sync (recompute_dirty_attendance).
+
+Seeds the same randomised month of punches (with sub-second duplicates), approved and pending
+leaves and permissions, single-day and range paid holidays and a mid-month joiner into two
+databases, processes one with process_daily_attendance per (user, day) and the other with a
+single rollup, and checks that the DailyAttendance rows and the logs' scan order match, and that
+the rollup's query count does not grow with the number of days. Also checks that only queued
+days are recomputed - picking up a leave approved or withdrawn since - and then dequeued, that
+days marked again while a recompute runs stay queued, that queued days far apart are rolled
+up separately, and that queued days left without logs lose what their logs put in
+DailyAttendance. Uses in-memory SQLite databases.
+"""
+import random
+from datetime import datetime, date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import (User, AttendanceLog, DailyAttendance, LeaveRequest, LeaveType, PermissionRequest, PaidHoliday,
+                    AttendanceDirtyDay)
+from routes.attendance import (process_daily_attendance, rollup_daily_attendance, mark_attendance_dirty,
+                               mark_attendance_range_dirty, recompute_dirty_attendance, group_dirty_days)
+
+START, END = date(2025, 3, 1), date(2025, 3, 31)
+USERS = 6
+
+def seed(seed_value=7):
+    """Deterministic month of attendance data"""
+    rng = random.Random(seed_value)
+    for number in range(USERS):
+        db.session.add(User(first_name=f'User{number}', last_name='Test', email=f'user{number}@example.com',
+                            password_hash='x', role='employee', status='active',
+                            fingerprint_number=str(100 + number),
+                            joining_date=date(2025, 3, 12) if number == USERS - 1 else None))
+    annual, sick = LeaveType(name='Annual Leave'), LeaveType(name='Sick Leave')
+    db.session.add_all([annual, sick])
+    db.session.add_all([
+        PaidHoliday(holiday_type='day', start_date=date(2025, 3, 10), description='Founders Day'),
+        PaidHoliday(holiday_type='range', start_date=date(2025, 3, 20), end_date=date(2025, 3, 22), description='Spring Break')
+    ])
+    db.session.flush()
+
+    for user_id in range(1, USERS + 1):
+        for offset in range((END - START).days + 1):
+            day = START + timedelta(days=offset)
+            if rng.random() < 0.2:
+                continue
+            punches = sorted({datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randint(7 * 60, 20 * 60))
+                              for _ in range(rng.choice([1, 2, 2, 3, 4]))})
+            for timestamp in punches:
+                db.session.add(AttendanceLog(user_id=user_id, timestamp=timestamp, device_ip='10.0.0.5', scan_type='check-in'))
+                if rng.random() < 0.1:
+                    # Duplicate read within the same second
+                    db.session.add(AttendanceLog(user_id=user_id, timestamp=timestamp + timedelta(microseconds=500),
+                                                 device_ip='10.0.0.5', scan_type='check-in'))
+        for _ in range(2):
+            start = START + timedelta(days=rng.randint(0, 27))
+            db.session.add(LeaveRequest(user_id=user_id, leave_type_id=rng.choice([annual.id, sick.id]),
+                                        start_date=start, end_date=start + timedelta(days=rng.randint(0, 3)),
+                                        reason='r', status=rng.choice(['approved', 'approved', 'pending'])))
+        for _ in range(3):
+            start = datetime.combine(START + timedelta(days=rng.randint(0, 30)), datetime.min.time()) + timedelta(hours=rng.randint(9, 15))
+            db.session.add(PermissionRequest(user_id=user_id, start_time=start, end_time=start + timedelta(hours=2),
+                                             reason='r', status=rng.choice(['approved', 'rejected'])))
+    db.session.commit()
+
+def attendance_rows():
+    skipped = {'id', 'created_at', 'updated_at'}
+    columns = [column for column in DailyAttendance.__table__.columns.keys() if column not in skipped]
+    return sorted(tuple(getattr(row, column) for column in columns) for row in DailyAttendance.query.all())
+
+def scan_orders():
+    return sorted((log.user_id, log.timestamp, log.scan_order, log.is_extra_scan) for log in AttendanceLog.query.all())
+
+def test_rollup_matches_the_per_day_path(make_app):
+    per_day_app, rollup_app = make_app(), make_app()
+
+    with per_day_app.app_context():
+        seed()
+        days = sorted({(log.user_id, log.timestamp.date()) for log in AttendanceLog.query.all()})
+        for user_id, day in days:
+            process_daily_attendance(user_id, day)
+        db.session.commit()
+        expected_rows, expected_scans = attendance_rows(), scan_orders()
+
+    with rollup_app.app_context():
+        seed()
+        written = rollup_daily_attendance(START, END)
+        db.session.commit()
+        assert written == len(expected_rows), (written, len(expected_rows))
+        assert attendance_rows() == expected_rows
+        assert scan_orders() == expected_scans
+
+    assert any(row for row in expected_rows if 'Founders Day' in row), 'the seed should cover a paid holiday'
+    assert len(expected_rows) > 100
+
+def test_rollup_query_count_does_not_grow_with_the_range(make_app):
+    app = make_app()
+    with app.app_context():
+        seed()
+        counts = []
+        for end in (date(2025, 3, 3), END):
+            DailyAttendance.query.delete()
+            db.session.commit()
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, 'before_cursor_execute', listener)
+            rollup_daily_attendance(START, end, replace=True)
+            db.session.commit()
+            event.remove(db.engine, 'before_cursor_execute', listener)
+            # scan_order updates are flushed per changed log; count the statements that load or write days
+            counts.append(sum(1 for statement in statements if not statement.startswith('UPDATE attendance_logs')))
+        assert counts[0] == counts[1], f'rollup queries should not depend on the number of days: {counts}'
+
+def daily(user_id, day):
+    return DailyAttendance.query.filter_by(user_id=user_id, date=day).one()
+
+def test_only_dirty_days_are_recomputed(make_app):
+    app = make_app()
+    with app.app_context():
+        seed()
+        rollup_daily_attendance(START, END)
+        db.session.commit()
+        leave = LeaveRequest.query.filter_by(status='pending').first()
+        day = next(day for day in (leave.start_date + timedelta(days=offset) for offset in range(4))
+                   if DailyAttendance.query.filter_by(user_id=leave.user_id, date=day).count())
+        assert daily(leave.user_id, day).leave_request_id is None
+        untouched = {(row.user_id, row.date): row.updated_at for row in DailyAttendance.query.all()}
+
+        leave.status = 'approved'
+        mark_attendance_range_dirty(leave.start_date, leave.end_date, [leave.user_id])
+        db.session.commit()
+        queued = {(row.user_id, row.date) for row in AttendanceDirtyDay.query.all()}
+        assert (leave.user_id, day) in queued
+
+        assert recompute_dirty_attendance() == len(queued)
+        assert AttendanceDirtyDay.query.count() == 0, 'recomputed days should leave the queue'
+        assert daily(leave.user_id, day).leave_request_id == leave.id
+        changed = {key for key, updated_at in untouched.items() if daily(*key).updated_at != updated_at}
+        assert changed == queued, 'only queued days should be rewritten'
+
+        # Withdrawn again: the recompute replaces the row, so the link is cleared
+        leave.status = 'rejected'
+        mark_attendance_range_dirty(leave.start_date, leave.end_date, [leave.user_id])
+        db.session.commit()
+        recompute_dirty_attendance()
+        assert daily(leave.user_id, day).leave_request_id is None
+
+def test_days_marked_during_a_recompute_stay_queued(make_app):
+    app = make_app()
+    with app.app_context():
+        seed()
+        mark_attendance_dirty([(1, date(2025, 3, 3)), (2, date(2025, 3, 4))])
+        db.session.commit()
+        # Marked again by a sync that committed after this recompute started
+        AttendanceDirtyDay.query.filter_by(user_id=2).update({'marked_at': datetime.utcnow() + timedelta(minutes=1)})
+        db.session.commit()
+
+        recompute_dirty_attendance()
+        assert [(row.user_id, row.date) for row in AttendanceDirtyDay.query.all()] == [(2, date(2025, 3, 4))]
+        assert recompute_dirty_attendance(only=[(1, date(2025, 3, 3))]) == 0, 'only limits the recompute to the given days'
+        assert AttendanceDirtyDay.query.count() == 1
+
+def test_dirty_days_far_apart_are_rolled_up_separately():
+    keys = {(1, date(2025, 1, 2)), (2, date(2025, 1, 6)), (1, date(2025, 3, 1)), (3, date(2025, 3, 9))}
+    assert group_dirty_days(keys, max_gap=7) == [
+        (date(2025, 1, 2), date(2025, 1, 6), {(1, date(2025, 1, 2)), (2, date(2025, 1, 6))}),
+        (date(2025, 3, 1), date(2025, 3, 1), {(1, date(2025, 3, 1))}),
+        (date(2025, 3, 9), date(2025, 3, 9), {(3, date(2025, 3, 9))})
+    ]
+
+def test_days_left_without_logs_lose_their_rows(make_app):
+    app = make_app()
+    with app.app_context():
+        seed()
+        rollup_daily_attendance(START, END)
+        db.session.commit()
+        rows = {(row.user_id, row.date): row for row in DailyAttendance.query.all()}
+        plain = next(key for key, row in sorted(rows.items()) if row.leave_request_id is None and row.paid_holiday_id is None)
+        on_leave = next(key for key, row in sorted(rows.items()) if row.leave_request_id is not None)
+        leave_type_name = rows[on_leave].leave_type_name
+        # A day without punches that the leave code filled in
+        placeholder = (1, date(2025, 4, 1))
+        db.session.add(DailyAttendance(user_id=1, date=placeholder[1], status='leave', leave_type_name='Annual Leave'))
+        db.session.commit()
+
+        for user_id, day in (plain, on_leave):
+            AttendanceLog.query.filter(
+                AttendanceLog.user_id == user_id,
+                AttendanceLog.timestamp.between(datetime.combine(day, datetime.min.time()),
+                                                datetime.combine(day, datetime.max.time()))
+            ).delete(synchronize_session=False)
+        # The joiner's joining date moved past a day they already had punches on
+        joiner = db.session.get(User, USERS)
+        before_joining = min(day for (user_id, day), row in rows.items()
+                             if user_id == USERS and row.leave_request_id is None and row.paid_holiday_id is None)
+        joiner.joining_date = before_joining + timedelta(days=1)
+        mark_attendance_dirty([plain, on_leave, placeholder, (USERS, before_joining)])
+        db.session.commit()
+
+        recompute_dirty_attendance()
+        assert DailyAttendance.query.filter_by(user_id=plain[0], date=plain[1]).count() == 0, \
+            "a day whose last log was deleted should lose its row"
+        assert DailyAttendance.query.filter_by(user_id=USERS, date=before_joining).count() == 0
+        reset = daily(*on_leave)
+        assert (reset.status, reset.leave_type_name, reset.entry_count, reset.first_check_in, reset.total_working_hours) == \
+            ('leave', leave_type_name, 0, None, 0), 'a leave day keeps its leave once its punches are gone'
+        assert daily(*placeholder).status == 'leave', 'rows that never came from logs are left alone'
+        assert AttendanceDirtyDay.query.count() == 0
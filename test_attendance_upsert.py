@@ -0,0 +1,80 @@
+"""
+Tests for the set-based attendance log upsert (upsert_attendance_logs in routes/attendance.py).
+
+Checks the inserted / updated / unchanged counts and per-row results for new punches, punches
+seen again from another device or with another scan type, and punches seen again unchanged,
+that only rows that were written count as touched days, and that a key repeated within one
+batch is written once. Uses an in-memory SQLite database.
+"""
+from datetime import datetime, date
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import User, DeviceSettings, AttendanceLog
+from routes.attendance import upsert_attendance_logs
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        for fingerprint_number in ('100', '101'):
+            db.session.add(User(first_name='Jane', last_name=fingerprint_number, email=f'{fingerprint_number}@example.com',
+                                password_hash='x', role='employee', status='active',
+                                fingerprint_number=fingerprint_number))
+        db.session.add(DeviceSettings(device_ip='10.0.0.5', device_name='Entrance'))
+        db.session.add(DeviceSettings(device_ip='10.0.0.6', device_name='Back door'))
+        db.session.commit()
+    return app
+
+def punch(user_id, timestamp, device_id=1, scan_type='check-in'):
+    return {'user_id': user_id, 'timestamp': timestamp, 'scan_type': scan_type,
+            'device_ip': f'10.0.0.{4 + device_id}', 'device_id': device_id}
+
+MORNING = datetime(2025, 3, 3, 8, 55)
+EVENING = datetime(2025, 3, 3, 17, 5)
+NEXT_DAY = datetime(2025, 3, 4, 9, 0)
+
+def test_new_changed_and_unchanged_punches_are_counted(app):
+    with app.app_context():
+        counts = upsert_attendance_logs([punch(1, MORNING), punch(1, EVENING, scan_type='check-out'), punch(2, MORNING)])
+        db.session.commit()
+        assert (counts['inserted'], counts['updated'], counts['unchanged']) == (3, 0, 0), counts
+        assert counts['touched'] == {(1, date(2025, 3, 3)), (2, date(2025, 3, 3))}
+
+        counts = upsert_attendance_logs([
+            punch(1, MORNING),                                # seen again, nothing changed
+            punch(1, EVENING, scan_type='check-in'),          # scan type changed
+            punch(2, MORNING, device_id=2),                   # same punch read from the other device
+            punch(2, NEXT_DAY)                                # new
+        ])
+        db.session.commit()
+        assert (counts['inserted'], counts['updated'], counts['unchanged']) == (1, 2, 1), counts
+        assert counts['results'] == {(1, EVENING): 'updated', (2, MORNING): 'updated', (2, NEXT_DAY): 'inserted'}
+        assert counts['touched'] == {(1, date(2025, 3, 3)), (2, date(2025, 3, 3)), (2, date(2025, 3, 4))}
+
+        log = AttendanceLog.query.filter_by(user_id=2, timestamp=MORNING).one()
+        assert (log.device_id, log.device_ip) == (2, '10.0.0.6')
+        assert AttendanceLog.query.count() == 4
+
+def test_unchanged_punches_are_not_rewritten(app):
+    with app.app_context():
+        upsert_attendance_logs([punch(1, MORNING), punch(1, EVENING)])
+        db.session.commit()
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        counts = upsert_attendance_logs([punch(1, MORNING), punch(1, EVENING)])
+        db.session.commit()
+        assert (counts['inserted'], counts['updated'], counts['unchanged']) == (0, 0, 2), counts
+        assert counts['touched'] == set() and counts['results'] == {}
+        assert sum(statement.startswith('INSERT INTO attendance_logs') for statement in statements) == 1, \
+            'a batch should be written with one statement'
+
+def test_repeated_key_in_a_batch_is_written_once(app):
+    with app.app_context():
+        counts = upsert_attendance_logs([punch(1, MORNING, device_id=1), punch(1, MORNING, device_id=2)])
+        db.session.commit()
+        assert (counts['inserted'], counts['updated'], counts['unchanged']) == (1, 0, 0), counts
+        assert AttendanceLog.query.one().device_id == 2, 'the last occurrence should win'
@@ -0,0 +1,204 @@
+"""
+Tests for the application cache (cache.py).
+
+Covers the memory backend's LRU/TTL behaviour, the SQLite backend shared by two cache
+instances (as two workers would share it), tag invalidation on commit through ORM flushes,
+query-level updates and core inserts, and that the team, member and SMTP lookups keep password
+hashes, salaries and the SMTP password out of the shared cache. Uses an in-memory SQLite
+database; no running server or PostgreSQL needed.
+"""
+import sqlite3
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert, update, event
+
+from extensions import db
+from models import Department, User, AttendanceLog
+from cache import Cache, MemoryBackend, SQLiteBackend, cache, cached, register_cache_listeners
+
+@pytest.fixture
+def app(make_app):
+    register_cache_listeners(db.session)
+    cache.configure(MemoryBackend())
+    return make_app()
+
+calls = []
+
+@cached(tags=(Department,))
+def department_names():
+    calls.append('departments')
+    return sorted(d.department_name for d in Department.query.all())
+
+@cached(tags=('departments',))
+def first_department():
+    calls.append('first')
+    return Department.query.order_by(Department.id).first()
+
+def test_memory_lru_and_ttl():
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', b'1', 60)
+    backend.set('b', b'2', 60)
+    backend.get('a')
+    backend.set('c', b'3', 60)
+    assert backend.get('b') is None, 'least recently used entry should be evicted'
+    assert backend.get('a') == b'1'
+    backend.set('d', b'4', -1)
+    assert backend.get('d') is None, 'expired entry should miss'
+
+def test_tag_versions():
+    local = Cache(MemoryBackend())
+    entry = local.entry('ns', 1, tags=('users',))
+    assert not entry.hit
+    entry.store({'value': 1})
+    assert local.entry('ns', 1, tags=('users',)).value == {'value': 1}
+    local.invalidate_tags(['users'])
+    assert not local.entry('ns', 1, tags=('users',)).hit
+    stats = local.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2), stats
+
+def test_sqlite_backend_shared(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    worker_a, worker_b = Cache(SQLiteBackend(path)), Cache(SQLiteBackend(path))
+    worker_a.entry('ns', 'k', tags=('departments',)).store([1, 2, 3])
+    assert worker_b.entry('ns', 'k', tags=('departments',)).value == [1, 2, 3]
+    worker_b.invalidate_tags(['departments'])
+    assert not worker_a.entry('ns', 'k', tags=('departments',)).hit, 'invalidation must reach other workers'
+
+def test_unshared_backend_caps_ttls(make_app, tmp_path):
+    from cache import init_cache
+
+    app = make_app(CACHE_BACKEND='memory', CACHE_UNSHARED_MAX_TTL=10)
+    init_cache(app)
+    assert cache.entry('ns', 'capped', ttl=300).ttl == 10, 'per-process entries should expire quickly'
+    app.config.update(CACHE_BACKEND='sqlite', CACHE_URL=str(tmp_path / 'cache.sqlite3'))
+    init_cache(app)
+    assert cache.entry('ns', 'shared', ttl=300).ttl == 300, 'a shared backend keeps the requested TTL'
+    cache.configure(MemoryBackend())
+
+def test_commit_invalidates_tags(app):
+    with app.app_context():
+        db.session.add(Department(department_name='HR'))
+        db.session.commit()
+        calls.clear()
+        assert department_names() == ['HR']
+        assert department_names() == ['HR']
+        assert calls == ['departments'], calls
+
+        # ORM flush
+        db.session.add(Department(department_name='IT'))
+        db.session.flush()
+        assert department_names() == ['HR'], 'uncommitted writes must not invalidate'
+        db.session.commit()
+        assert department_names() == ['HR', 'IT']
+
+        # Query-level update
+        Department.query.filter_by(department_name='IT').update({'department_name': 'Tech'})
+        db.session.commit()
+        assert department_names() == ['HR', 'Tech']
+
+        # Rolled back writes keep the cache
+        db.session.add(Department(department_name='Ops'))
+        db.session.flush()
+        db.session.rollback()
+        calls.clear()
+        assert department_names() == ['HR', 'Tech']
+        assert calls == [], calls
+
+def test_core_insert_invalidates(app):
+    with app.app_context():
+        user = User(first_name='A', last_name='B', email='a@b', password_hash='x', role='employee', status='active')
+        db.session.add(user)
+        db.session.commit()
+
+        @cached(tags=('attendance_logs',), namespace='test.log_count')
+        def log_count():
+            return AttendanceLog.query.count()
+
+        assert log_count() == 0
+        db.session.execute(insert(AttendanceLog.__table__).values(
+            user_id=user.id, timestamp=datetime(2025, 1, 1, 8),
+            device_ip='1.1.1.1', scan_type='check-in'
+        ))
+        db.session.commit()
+        assert log_count() == 1
+
+def test_cached_instances_are_attached(app):
+    with app.app_context():
+        db.session.add(Department(department_name='HR'))
+        db.session.commit()
+        first_department()
+        db.session.remove()
+        calls.clear()
+        department = first_department()
+        assert calls == []
+        assert department in db.session, 'cached instance should be merged into the session'
+        assert department.department_name == 'HR'
+
+def test_user_identity_is_cached_until_the_user_changes(app):
+    from helpers import get_user_identity
+
+    with app.app_context():
+        user = User(first_name='A', last_name='B', email='a@b', password_hash='x', role='employee', status='active')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Department(department_name='HR', manager_id=user.id))
+        db.session.commit()
+        user.department_id = 1
+        db.session.commit()
+        get_user_identity(user.id)
+        db.session.remove()
+
+        queries = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+        identity = get_user_identity(user.id)
+        assert (identity.department.department_name, identity.managed_department[0].department_name) == ('HR', 'HR')
+        assert len(queries) == 1 and 'updated_at' in queries[0], \
+            f'only the version probe should reach the database: {queries}'
+        assert b'password_hash' not in cache.backend.get(f'user_identity:{user.id!r}'), 'the password hash must not be cached'
+        assert identity.password_hash == 'x', 'the password hash should load on demand'
+
+        identity.role = 'manager'
+        db.session.commit()
+        db.session.remove()
+        assert get_user_identity(user.id).role == 'manager', 'a role change should invalidate the identity'
+        db.session.remove()
+
+        # Another worker deactivates the user: nothing in this process's cache is told
+        with db.engine.begin() as connection:
+            connection.execute(update(User).where(User.id == user.id).values(status='inactive', updated_at=datetime(2100, 1, 1)))
+        assert get_user_identity(user.id).status == 'inactive', 'a change made elsewhere should be seen on the next request'
+
+def test_cached_lookups_leave_secrets_out(make_app, tmp_path):
+    from helpers import get_employees_for_manager, get_active_smtp_config
+    from models import SMTPConfiguration
+    from routes.members import get_sorted_active_members
+
+    app = make_app()
+    register_cache_listeners(db.session)
+    path = tmp_path / 'cache.sqlite3'
+    cache.configure(SQLiteBackend(str(path)))
+    try:
+        with app.app_context():
+            db.session.add(Department(department_name='HR'))
+            for number, role in enumerate(('manager', 'employee', 'employee')):
+                db.session.add(User(first_name=f'Name{number}', last_name='Doe', email=f'{number}@example.com',
+                                    password_hash=f'secret-hash-{number}', salary=12345.0, role=role,
+                                    status='active', department_id=1))
+            db.session.add(SMTPConfiguration(smtp_server='smtp.example.com', smtp_username='mailer',
+                                             smtp_password='secret-smtp-password', sender_email='hr@example.com'))
+            db.session.commit()
+            for _ in range(2):
+                assert [user.id for user in get_employees_for_manager(1)] == [2, 3]
+                assert [user.id for user in get_sorted_active_members()] == [1, 2, 3]
+                assert get_active_smtp_config().smtp_server == 'smtp.example.com'
+                db.session.remove()
+
+            stored = b''.join(value for (value,) in sqlite3.connect(str(path)).execute('SELECT value FROM cache_entries'))
+            assert stored, 'the lookups should have been cached'
+            for secret in (b'secret-hash', b'secret-smtp-password', b'password_hash', b'salary'):
+                assert secret not in stored, f'{secret!r} must not reach the cache'
+            assert get_active_smtp_config().smtp_password == 'secret-smtp-password', 'the password should load on demand'
+            assert get_sorted_active_members()[0].department.department_name == 'HR'
+    finally:
+        cache.configure(MemoryBackend())
@@ -0,0 +1,278 @@
+"""
+Tests for the dashboard statistics service (report_helpers/dashboard_stats.py).
+
+Seeds a company with every role, inactive and unenrolled users, a manager without a team, a
+week of punches (some exactly at 09:00 and around midnight), leaves and permissions in every
+status and leave balances of this year and last, and checks that get_dashboard_stats and
+/api/dashboard/charts give every user exactly what the per-counter queries they replaced gave
+(reproduced below from the previous helpers.py and routes/api.py). Uses an in-memory SQLite
+database.
+"""
+import random
+from datetime import datetime, date, time, timedelta
+
+import pytest
+from flask_login import LoginManager
+
+from extensions import db
+from models import User, Department, LeaveRequest, LeaveType, LeaveBalance, PermissionRequest, AttendanceLog
+from cache import cache, MemoryBackend
+from helpers import get_dashboard_stats, get_employees_for_manager
+from routes.api import api_bp
+
+STATUSES = ('pending', 'approved', 'rejected')
+
+# (first name, role, status, fingerprint number, department)
+USERS = [
+    ('Admin', 'admin', 'active', '1', None),
+    ('Owner', 'product_owner', 'active', '2', 1),
+    ('Director', 'director', 'active', '3', None),
+    ('Manager', 'manager', 'active', '4', 1),
+    ('Lonely', 'manager', 'active', '5', 3),
+    ('Alice', 'employee', 'active', '10', 1),
+    ('Bob', 'employee', 'active', '11', 1),
+    ('Carol', 'employee', 'inactive', '12', 1),
+    ('Dave', 'employee', 'active', None, 1),
+    ('Erin', 'employee', 'active', '', 2),
+    ('Frank', 'employee', 'active', '15', 2),
+    ('Grace', 'employee', 'active', '16', None),
+]
+
+def seed(today, seed_value=14):
+    rng = random.Random(seed_value)
+    db.session.add_all([Department(department_name=name) for name in ('Sales', 'Support', 'Empty')])
+    db.session.flush()
+    for number, (first_name, role, status, fingerprint_number, department_id) in enumerate(USERS, start=1):
+        db.session.add(User(first_name=first_name, last_name='Test', email=f'{first_name.lower()}@example.com',
+                            password_hash='x', role=role, status=status, fingerprint_number=fingerprint_number,
+                            department_id=department_id))
+    db.session.flush()
+    db.session.get(Department, 2).manager_id = 4
+    leave_types = [LeaveType(name='Annual Leave', color='#00ff00'), LeaveType(name='Sick Leave', color='#ff0000')]
+    db.session.add_all(leave_types)
+    db.session.flush()
+
+    user_ids = list(range(1, len(USERS) + 1))
+    for offset in range(8):
+        day = today - timedelta(days=offset)
+        for user_id in rng.sample(user_ids, rng.randint(3, len(user_ids))):
+            first = datetime.combine(day, rng.choice([time(0, 0), time(8, 30), time(9, 0), time(9, 0, 1), time(11, 45)]))
+            for scan in range(rng.randint(1, 3)):
+                db.session.add(AttendanceLog(user_id=user_id, timestamp=first + timedelta(hours=4 * scan),
+                                             device_ip='10.0.0.5', scan_type='check-in' if scan % 2 == 0 else 'check-out'))
+        db.session.add(AttendanceLog(user_id=rng.choice(user_ids), timestamp=datetime.combine(day, time(23, 59, 59)),
+                                     device_ip='10.0.0.5', scan_type='check-out'))
+    for _ in range(40):
+        start = today + timedelta(days=rng.randint(-10, 3))
+        db.session.add(LeaveRequest(user_id=rng.choice(user_ids), leave_type_id=rng.choice(leave_types).id,
+                                    start_date=start, end_date=start + timedelta(days=rng.randint(0, 4)),
+                                    status=rng.choice(STATUSES), manager_status=rng.choice(STATUSES), reason='r'))
+    for _ in range(30):
+        start = datetime.combine(today - timedelta(days=rng.randint(0, 10)), time(10))
+        db.session.add(PermissionRequest(user_id=rng.choice(user_ids), start_time=start, end_time=start + timedelta(hours=2),
+                                         status=rng.choice(STATUSES), admin_status=rng.choice(STATUSES), reason='r'))
+    for user_id in user_ids:
+        for year in (today.year - 1, today.year):
+            for leave_type in leave_types:
+                total = rng.randint(0, 21)
+                used = rng.randint(0, 25)
+                db.session.add(LeaveBalance(user_id=user_id, leave_type_id=leave_type.id, year=year,
+                                            total_days=total, used_days=used, remaining_days=total - used))
+    db.session.commit()
+
+def baseline_dashboard_stats(user):
+    """get_dashboard_stats as it was before scope_counters: one COUNT query per counter"""
+    stats = {
+        'pending_leave_requests': 0, 'pending_permission_requests': 0,
+        'approved_leave_requests': 0, 'approved_permission_requests': 0,
+        'rejected_leave_requests': 0, 'rejected_permission_requests': 0,
+        'total_employees': 0, 'total_departments': 0, 'leave_balances': []
+    }
+    start_datetime = datetime.combine(date.today(), datetime.min.time())
+    end_datetime = datetime.combine(date.today(), datetime.max.time())
+
+    if user.role == 'employee':
+        for status in STATUSES:
+            stats[f'{status}_leave_requests'] = LeaveRequest.query.filter_by(user_id=user.id, status=status).count()
+            stats[f'{status}_permission_requests'] = PermissionRequest.query.filter_by(user_id=user.id, status=status).count()
+        present = 1 if AttendanceLog.query.filter(
+            AttendanceLog.user_id == user.id,
+            AttendanceLog.timestamp.between(start_datetime, end_datetime)
+        ).first() is not None else 0
+        stats.update(present_today=present, absent_today=1 - present,
+                     team_present_today=present, team_absent_today=1 - present)
+        if user.department:
+            stats['department_name'] = user.department.department_name
+            stats['total_employees'] = User.query.filter_by(department_id=user.department_id, status='active').count()
+        else:
+            stats['department_name'] = None
+            stats['total_employees'] = 0
+
+    elif user.role == 'manager':
+        employees = get_employees_for_manager(user.id)
+        employee_ids = [emp.id for emp in employees]
+        if employee_ids:
+            stats['pending_leave_requests'] = LeaveRequest.query.filter(
+                LeaveRequest.user_id.in_(employee_ids), LeaveRequest.status == 'pending',
+                LeaveRequest.manager_status == 'pending'
+            ).count()
+            stats['pending_permission_requests'] = PermissionRequest.query.filter(
+                PermissionRequest.user_id.in_(employee_ids), PermissionRequest.status == 'pending',
+                PermissionRequest.admin_status == 'pending'
+            ).count()
+            stats['approved_leave_requests'] = LeaveRequest.query.filter(
+                LeaveRequest.user_id.in_(employee_ids), LeaveRequest.status == 'approved'
+            ).count()
+            stats['approved_permission_requests'] = PermissionRequest.query.filter(
+                PermissionRequest.user_id.in_(employee_ids), PermissionRequest.status == 'approved'
+            ).count()
+            active_employee_ids = [emp.id for emp in employees if emp.status == 'active']
+            stats['team_present_today'] = len(db.session.query(AttendanceLog.user_id).filter(
+                AttendanceLog.timestamp.between(start_datetime, end_datetime),
+                AttendanceLog.user_id.in_(active_employee_ids)
+            ).distinct().all())
+            stats['team_absent_today'] = len(active_employee_ids) - stats['team_present_today']
+            stats['total_employees'] = len(active_employee_ids)
+        else:
+            stats['team_present_today'] = 0
+            stats['team_absent_today'] = 0
+
+    elif user.role in ['admin', 'product_owner', 'director']:
+        excluded_roles = ['admin', 'director'] if user.role == 'director' else ['admin', 'product_owner']
+        for status in STATUSES:
+            stats[f'{status}_leave_requests'] = LeaveRequest.query.filter_by(status=status).count()
+            stats[f'{status}_permission_requests'] = PermissionRequest.query.filter_by(status=status).count()
+        enrolled = User.query.filter(User.status == 'active', User.fingerprint_number != None, User.fingerprint_number != '')
+        staff = enrolled.filter(User.role.notin_(excluded_roles)).count()
+        stats['total_employees'] = staff if user.role == 'director' else enrolled.count()
+        stats['total_departments'] = Department.query.count()
+        present_users = db.session.query(AttendanceLog.user_id).join(User).filter(
+            AttendanceLog.timestamp.between(start_datetime, end_datetime),
+            User.fingerprint_number != None,
+            User.fingerprint_number != '',
+            User.status == 'active',
+            User.role.notin_(excluded_roles)
+        ).distinct().count()
+        stats['total_attendance_today'] = present_users
+        stats['team_present_today'] = present_users
+        stats['team_absent_today'] = staff - present_users
+        stats['attendance_rate'] = round(present_users / staff * 100, 1) if staff > 0 else 0
+
+    balances = LeaveBalance.query.join(LeaveType).filter(LeaveBalance.year == datetime.now().year)
+    if user.role not in ['admin', 'director']:
+        balances = balances.filter(LeaveBalance.user_id == user.id)
+    stats['leave_balances'] = [{
+        'leave_type_name': balance.leave_type.name,
+        'total_days': balance.total_days,
+        'used_days': balance.used_days,
+        'remaining_days': balance.remaining_days,
+        'is_negative': balance.remaining_days < 0,
+        'color': balance.leave_type.color
+    } for balance in balances.all()]
+    return stats
+
+def baseline_chart_data(user):
+    """/api/dashboard/charts data as it was before weekly_chart_data: queries per day and per present user"""
+    today = date.today()
+    if user.role == 'employee':
+        employees = [user] if user.status == 'active' else []
+    elif user.role == 'manager':
+        employees = get_employees_for_manager(user.id)
+    else:
+        employees = User.query.filter(User.status == 'active', User.role.notin_(['admin', 'product_owner', 'director'])).all()
+    employee_ids = [emp.id for emp in employees if emp.status == 'active']
+    if not employee_ids:
+        return {'weekly_attendance': [0] * 7, 'weekly_leaves': [0] * 7, 'weekly_productivity': [0] * 7,
+                'team_status': {'present': 0, 'on_leave': 0, 'late': 0, 'absent': 0}}
+
+    def day_bounds(day):
+        return datetime.combine(day, datetime.min.time()), datetime.combine(day, datetime.max.time())
+
+    def approved_leaves(day):
+        return LeaveRequest.query.filter(
+            LeaveRequest.user_id.in_(employee_ids), LeaveRequest.start_date <= day,
+            LeaveRequest.end_date >= day, LeaveRequest.status == 'approved'
+        ).count()
+
+    attendance, leaves, day_labels = [], [], []
+    for i in range(6, -1, -1):
+        target_date = today - timedelta(days=i)
+        day_labels.append(target_date.strftime('%a'))
+        present_count = db.session.query(AttendanceLog.user_id).filter(
+            AttendanceLog.timestamp.between(*day_bounds(target_date)),
+            AttendanceLog.user_id.in_(employee_ids)
+        ).distinct().count()
+        attendance.append(round(present_count / len(employee_ids) * 100, 1))
+        leaves.append(approved_leaves(target_date))
+
+    present_ids = [user_id for (user_id,) in db.session.query(AttendanceLog.user_id).filter(
+        AttendanceLog.timestamp.between(*day_bounds(today)),
+        AttendanceLog.user_id.in_(employee_ids)
+    ).distinct()]
+    late_threshold = datetime.combine(today, time(9, 0))
+    late_count = 0
+    for user_id in present_ids:
+        first_log = AttendanceLog.query.filter(
+            AttendanceLog.user_id == user_id,
+            AttendanceLog.timestamp.between(*day_bounds(today))
+        ).order_by(AttendanceLog.timestamp.asc()).first()
+        if first_log and first_log.timestamp > late_threshold:
+            late_count += 1
+    on_leave_count = approved_leaves(today)
+    return {
+        'weekly_attendance': attendance,
+        'weekly_leaves': leaves,
+        'weekly_productivity': list(attendance),
+        'day_labels': day_labels,
+        'team_status': {
+            'present': max(0, len(present_ids) - late_count),
+            'on_leave': on_leave_count,
+            'late': late_count,
+            'absent': max(0, len(employee_ids) - len(present_ids) - on_leave_count)
+        },
+        'total_team': len(employee_ids)
+    }
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(SECRET_KEY='test')
+    app.register_blueprint(api_bp)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    cache.configure(MemoryBackend())
+    with app.app_context():
+        seed(date.today())
+    return app
+
+USER_IDS = list(range(1, len(USERS) + 1))
+
+@pytest.mark.parametrize('user_id', USER_IDS, ids=[f'{name}-{role}' for name, role, *_ in USERS])
+def test_dashboard_stats_match_baseline(app, user_id):
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        expected = baseline_dashboard_stats(user)
+        assert expected['leave_balances'], 'every user has balances this year'
+        assert get_dashboard_stats.uncached(user) == expected
+        assert get_dashboard_stats(user) == expected
+
+@pytest.mark.parametrize('user_id', USER_IDS, ids=[f'{name}-{role}' for name, role, *_ in USERS])
+def test_dashboard_charts_match_baseline(app, user_id):
+    with app.app_context():
+        expected = baseline_chart_data(db.session.get(User, user_id))
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    response = client.get('/api/dashboard/charts')
+    assert response.status_code == 200
+    assert response.json == {'status': 'success', 'data': expected}
+
+def test_seed_covers_the_interesting_cases(app):
+    """Guards the baselines above against comparing nothing but zeros"""
+    with app.app_context():
+        admin = baseline_dashboard_stats(db.session.get(User, 1))
+        assert all(admin[f'{status}_leave_requests'] for status in STATUSES)
+        assert 0 < admin['total_attendance_today'] < admin['total_employees']
+        charts = baseline_chart_data(db.session.get(User, 1))
+        assert charts['team_status']['late'] and charts['team_status']['present'] and any(charts['weekly_leaves'])
+        assert baseline_chart_data(db.session.get(User, 5))['weekly_attendance'] == [0] * 7, 'manager without a team'
@@ -0,0 +1,144 @@
+"""
+Tests for the fingerprint device session manager (device_sessions.py).
+
+Checks that a device connection is reused across operations and used by one caller at a
+time, that failed connects back off, and that stale and idle connections are replaced or
+closed. Uses a fake ZK connector; no device or network needed.
+"""
+import time
+import threading
+
+import device_sessions
+from device_sessions import DeviceSessionManager, DeviceUnavailable, DeviceBusy
+
+class FakeDevice:
+    """Stands in for zk.ZK: counts connects and fails them while `down` is set"""
+
+    def __init__(self):
+        self.connects = 0
+        self.disconnects = 0
+        self.active = 0
+        self.max_active = 0
+        self.down = False
+        self.stale = False
+
+    def __call__(self, ip, port=4370, timeout=60):
+        return FakeConnection(self)
+
+class FakeConnection:
+    def __init__(self, device):
+        self.device = device
+
+    def connect(self):
+        if self.device.down:
+            raise OSError('timed out')
+        self.device.connects += 1
+        self.device.stale = False
+        return self
+
+    def disconnect(self):
+        self.device.disconnects += 1
+
+    def get_time(self):
+        if self.device.stale:
+            raise OSError('broken pipe')
+
+    def get_attendance(self):
+        self.device.active += 1
+        self.device.max_active = max(self.device.max_active, self.device.active)
+        time.sleep(0.05)
+        self.device.active -= 1
+        return []
+
+def make_manager(**kwargs):
+    device = FakeDevice()
+    manager = DeviceSessionManager(connector=device, **kwargs)
+    return manager, device
+
+def test_connection_is_reused_and_serialized():
+    manager, device = make_manager()
+
+    def work():
+        with manager.borrow('10.0.0.5', 4370) as conn:
+            conn.get_attendance()
+
+    threads = [threading.Thread(target=work) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert device.connects == 1, device.connects
+    assert device.max_active == 1, 'operations on one device must not overlap'
+    assert manager.stats()['10.0.0.5:4370']['borrows'] == 5
+
+def test_busy_device():
+    manager, device = make_manager()
+    holding = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with manager.borrow('10.0.0.5', 4370):
+            holding.set()
+            release.wait(2)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    holding.wait(2)
+    try:
+        with manager.borrow('10.0.0.5', 4370, wait=0.1):
+            raise AssertionError('borrow should time out while the device is held')
+    except DeviceBusy:
+        pass
+    release.set()
+    thread.join()
+
+def test_reconnect_backoff():
+    manager, device = make_manager(backoff_base=60)
+    device.down = True
+    for _ in range(2):
+        try:
+            with manager.borrow('10.0.0.5', 4370):
+                pass
+            raise AssertionError('borrow should fail while the device is down')
+        except DeviceUnavailable:
+            pass
+    stats = manager.stats()['10.0.0.5:4370']
+    assert stats['failures'] == 1, 'second borrow should fail fast during backoff'
+    assert stats['retry_in'] > 0
+
+    device.down = False
+    with manager.borrow('10.0.0.5', 4370, retry_now=True):
+        pass
+    assert manager.stats()['10.0.0.5:4370']['failures'] == 0
+
+def test_stale_connection_is_replaced():
+    manager, device = make_manager()
+    with manager.borrow('10.0.0.5', 4370):
+        pass
+    device.stale = True
+    original = device_sessions.HEALTH_CHECK_AFTER
+    device_sessions.HEALTH_CHECK_AFTER = 0
+    try:
+        with manager.borrow('10.0.0.5', 4370):
+            pass
+    finally:
+        device_sessions.HEALTH_CHECK_AFTER = original
+    assert device.connects == 2, device.connects
+
+def test_failed_operation_drops_connection():
+    manager, device = make_manager()
+    try:
+        with manager.borrow('10.0.0.5', 4370):
+            raise OSError('device reset')
+    except OSError:
+        pass
+    assert not manager.is_connected('10.0.0.5', 4370)
+    assert device.disconnects == 1
+
+def test_idle_connections_close():
+    manager, device = make_manager(idle_timeout=0)
+    with manager.borrow('10.0.0.5', 4370):
+        pass
+    assert manager.close_idle() == 1
+    assert device.disconnects == 1
+    assert not manager.is_connected('10.0.0.5', 4370)
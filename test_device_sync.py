@@ -0,0 +1,85 @@
+"""
+Tests for the incremental device sync (fetch_device_attendance / ingest_device_attendance in
+routes/attendance.py) against the simulated device.
+
+Checks that punches in the cursor's own second and punches stamped earlier than the cursor
+(device clock set back) are still ingested, that a full device overwriting its oldest records
+at a constant count is not skipped by the size probe, and that a device whose log no longer
+holds the last ingested record is scanned in full. Uses a temporary SQLite database; no device
+or network needed.
+"""
+from datetime import datetime
+
+import pytest
+
+from extensions import db
+from models import User, DeviceSettings, AttendanceLog
+from cache import cache, MemoryBackend
+from device_sessions import device_sessions
+from device_simulator import SimulatedDevice
+from routes.attendance import device_fetch_info, fetch_device_attendance, ingest_device_attendance
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(User(first_name='Jane', last_name='Doe', email='jane@example.com', password_hash='x',
+                            role='employee', status='active', fingerprint_number='100'))
+        db.session.add(User(first_name='John', last_name='Roe', email='john@example.com', password_hash='x',
+                            role='employee', status='active', fingerprint_number='101'))
+        db.session.add(DeviceSettings(device_ip='10.0.0.5', device_port=4370, device_name='Entrance'))
+        db.session.commit()
+    cache.configure(MemoryBackend())
+    return app
+
+def use_device(device):
+    device_sessions.close_all()
+    device_sessions.configure(connector=device)
+    return device
+
+def sync(full_sync=False):
+    device = db.session.get(DeviceSettings, 1)
+    return ingest_device_attendance(device, fetch_device_attendance(device_fetch_info(device), full_sync), full_sync)
+
+def stored_punches():
+    return sorted((log.user_id, log.timestamp) for log in AttendanceLog.query.all())
+
+def test_same_second_and_backdated_punches_are_ingested(app):
+    device = use_device(SimulatedDevice(users=[('100', 'Jane Doe'), ('101', 'John Roe')]))
+    with app.app_context():
+        device.punch('100', datetime(2025, 3, 3, 9, 0, 0))
+        assert sync()['records_added'] == 1
+
+        device.punch('101', datetime(2025, 3, 3, 9, 0, 0))  # same second as the cursor
+        device.punch('100', datetime(2025, 3, 3, 8, 30, 0))  # device clock set back
+        result = sync()
+        assert (result['sync_mode'], result['records_added']) == ('incremental', 2), result
+        assert len(stored_punches()) == 3
+
+        assert sync()['total_fetched'] == 0, 'an unchanged device should be skipped by the size probe'
+
+def test_full_device_that_wraps_is_not_skipped(app):
+    device = use_device(SimulatedDevice(users=[('100', 'Jane Doe')], capacity=3))
+    with app.app_context():
+        for hour in (7, 8, 9):
+            device.punch('100', datetime(2025, 3, 3, hour))
+        assert sync()['records_added'] == 3
+
+        device.punch('100', datetime(2025, 3, 3, 10))  # overwrites the 7:00 record, count stays 3
+        result = sync()
+        assert (result['sync_mode'], result['records_added']) == ('incremental', 1), result
+        assert datetime(2025, 3, 3, 10) in [timestamp for _, timestamp in stored_punches()]
+
+def test_cleared_log_falls_back_to_a_full_scan(app):
+    device = use_device(SimulatedDevice(users=[('100', 'Jane Doe')]))
+    with app.app_context():
+        device.punch('100', datetime(2025, 3, 3, 9))
+        device.punch('100', datetime(2025, 3, 3, 17))
+        sync()
+
+        device.clear_attendance()
+        for day in (2, 4, 5):
+            device.punch('100', datetime(2025, 3, day, 9))
+        result = sync()
+        assert (result['sync_mode'], result['records_added']) == ('full', 3), result
+        assert len(stored_punches()) == 5
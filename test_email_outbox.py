@@ -0,0 +1,153 @@
+"""
+Tests for the email outbox (email_outbox.py) against a local SMTP server.
+
+Checks that queued messages are delivered over a single SMTP login, that a refused recipient
+is retried with backoff and dead-lettered after the last attempt without holding up the rest
+of the batch, that an unreachable relay leaves the queue for the next run, and that emails
+are queued in the caller's transaction rather than committed on their own. Uses a
+temporary SQLite database and an in-process SMTP server on localhost.
+"""
+import socket
+import threading
+import socketserver
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import SMTPConfiguration, EmailOutbox
+from cache import cache, MemoryBackend
+from email_outbox import enqueue_email, commit_queued_emails, deliver_outbox, requeue_dead_emails, outbox_stats
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of SMTP for smtplib: EHLO, AUTH, MAIL, RCPT, DATA, RSET, QUIT"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        server.sessions += 1
+        self.reply('220 localhost test SMTP')
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 AUTH PLAIN')
+            elif command == 'AUTH':
+                server.logins += 1
+                self.reply('235 Authentication successful')
+            elif command == 'RCPT':
+                address = line.split(':', 1)[1].strip().strip('<>')
+                self.reply('550 No such user' if address in server.refused else '250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline().rstrip(b'\r\n') != b'.':
+                    pass
+                server.messages += 1
+                self.reply('250 Queued')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, refused=()):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.refused = set(refused)
+        self.sessions = 0
+        self.logins = 0
+        self.messages = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPServer()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def make_outbox_app(make_app):
+    """Factory: an app whose active SMTP configuration points at the given port"""
+    def factory(smtp_port):
+        app = make_app('outbox.sqlite3')
+        cache.configure(MemoryBackend())  # the active SMTP configuration is cached
+        with app.app_context():
+            db.session.add(SMTPConfiguration(smtp_server='127.0.0.1', smtp_port=smtp_port, smtp_username='hr',
+                                             smtp_password='secret', use_tls=False, use_ssl=False,
+                                             sender_email='hr@example.com'))
+            db.session.commit()
+        return app
+    return factory
+
+def closed_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def test_batch_is_sent_over_one_session(smtp_server, make_outbox_app):
+    app = make_outbox_app(smtp_server.server_address[1])
+    with app.app_context():
+        for i in range(5):
+            assert enqueue_email(f'employee{i}@example.com', f'Leave request {i}', '<p>Approved</p>')
+        db.session.commit()
+        assert smtp_server.messages == 0, 'queueing must not talk to the relay'
+
+        assert deliver_outbox() == {'sent': 5, 'failed': 0, 'dead': 0}
+        assert (smtp_server.sessions, smtp_server.logins, smtp_server.messages) == (1, 1, 5)
+        assert outbox_stats() == {'sent': 5}
+        assert deliver_outbox() == {'sent': 0, 'failed': 0, 'dead': 0}, 'nothing left to send'
+
+def test_refused_recipient_backs_off_then_dead_letters(smtp_server, make_outbox_app):
+    smtp_server.refused.add('gone@example.com')
+    app = make_outbox_app(smtp_server.server_address[1])
+    with app.app_context():
+        bounced = enqueue_email('gone@example.com', 'Payslip', '<p>Hi</p>')
+        enqueue_email('jane@example.com', 'Payslip', '<p>Hi</p>')
+        db.session.commit()
+
+        assert deliver_outbox(max_attempts=2, retry_base=60) == {'sent': 1, 'failed': 1, 'dead': 0}
+        assert smtp_server.sessions == 1, 'a refused recipient must not cost the session'
+        assert bounced.status == 'pending' and bounced.attempts == 1
+        assert bounced.next_attempt_at > datetime.utcnow() + timedelta(seconds=50), 'should back off'
+        assert deliver_outbox(max_attempts=2) == {'sent': 0, 'failed': 0, 'dead': 0}, 'not due yet'
+
+        bounced.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        assert deliver_outbox(max_attempts=2) == {'sent': 0, 'failed': 0, 'dead': 1}
+        assert bounced.status == 'dead' and 'No such user' in bounced.last_error
+
+        assert requeue_dead_emails() == 1
+        assert db.session.get(EmailOutbox, bounced.id).status == 'pending'
+
+def test_unreachable_relay_keeps_the_queue(make_outbox_app):
+    app = make_outbox_app(closed_port())
+    with app.app_context():
+        for i in range(3):
+            enqueue_email(f'employee{i}@example.com', 'Reminder', '<p>Check in</p>')
+        db.session.commit()
+        assert deliver_outbox() == {'sent': 0, 'failed': 1, 'dead': 0}, 'the run should stop at the first failure'
+        attempts = sorted(message.attempts for message in EmailOutbox.query.all())
+        assert attempts == [0, 0, 1], attempts
+        assert outbox_stats() == {'pending': 3}
+
+def test_emails_are_queued_in_the_callers_transaction(make_outbox_app):
+    app = make_outbox_app(closed_port())
+    with app.app_context():
+        enqueue_email('jane@example.com', 'Leave approved', '<p>Approved</p>')
+        db.session.rollback()
+        assert EmailOutbox.query.count() == 0, 'a rolled back change must not send its email'
+
+        enqueue_email('jane@example.com', 'Leave approved', '<p>Approved</p>')
+        with db.engine.connect() as connection:
+            assert connection.execute(EmailOutbox.__table__.select()).first() is None, 'enqueue_email must not commit'
+        assert commit_queued_emails()
+        assert outbox_stats() == {'pending': 1}
@@ -0,0 +1,229 @@
+"""
+Parity test for the streaming (write-only) Excel exports.
+
+Builds the daily attendance and attendance report workbooks with both the streaming writer
+and the in-memory writer and checks that values, merged cells, column widths and styles match.
+Also builds the historical daily attendance export from a temporary SQLite database and checks
+it against the rows the export produced before it was streamed and prefetched. No server needed.
+"""
+import io
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from flask import Flask
+from openpyxl import load_workbook
+from sqlalchemy import event
+
+from extensions import db
+from models import User, AttendanceLog, DailyAttendance, LeaveRequest, LeaveType, PermissionRequest, PaidHoliday
+from routes.attendance import export_daily_attendance_to_excel, iter_historical_attendance
+from routes.calendar import export_to_excel
+
+def export_app(streaming):
+    app = Flask(__name__)
+    app.config['EXCEL_STREAMING_EXPORT'] = streaming
+    return app
+
+def make_user(user_id, first_name, last_name, fingerprint_number=None):
+    return SimpleNamespace(
+        id=user_id,
+        first_name=first_name,
+        last_name=last_name,
+        fingerprint_number=fingerprint_number,
+        get_full_name=lambda: f"{first_name} {last_name}"
+    )
+
+def make_log(hour, minute):
+    return SimpleNamespace(timestamp=datetime(2025, 3, 2, hour, minute))
+
+USERS = [make_user(i, f"First{i}", f"Last{i}", str(100 + i) if i % 3 else None) for i in range(1, 40)]
+
+def daily_attendance_data():
+    """Attendance dict in the shape built by export_daily_attendance"""
+    data = {}
+    for i, user in enumerate(USERS):
+        entry = {'user': user, 'check_in': None, 'check_out': None, 'duration': None, 'status': 'Absent'}
+        if i % 4 == 0:
+            entry.update(check_in=make_log(8, i % 60), check_out=make_log(17, 5), duration='9h 5m', status='present')
+        elif i % 4 == 1:
+            entry.update(status='leave', leave_type_name='Annual Leave')
+        elif i % 4 == 2:
+            entry.update(status='Paid Holiday', holiday_name='Founders Day', permission_request=object())
+        data[user.id] = entry
+    return data
+
+def historical_attendance_data(days=5):
+    historical = {}
+    for day in range(1, days + 1):
+        date_obj = date(2025, 3, day)
+        historical[date_obj.strftime('%Y-%m-%d')] = {
+            'attendance_data': daily_attendance_data(),
+            'date': date_obj,
+            'paid_holiday': None,
+            'is_paid_holiday': False
+        }
+    return historical
+
+def render(app, export, *args):
+    """Run an export inside a request and return the loaded worksheet"""
+    with app.test_request_context('/'):
+        response = app.make_response(export(*args))
+        response.direct_passthrough = False
+        body = response.get_data()
+        disposition = response.headers['Content-Disposition']
+        response.close()
+    return load_workbook(io.BytesIO(body)).active, disposition
+
+def color_signature(color):
+    if color is None:
+        return None
+    return color.rgb if color.type == 'rgb' else (color.type, color.theme)
+
+def cell_signature(cell):
+    font, fill, border, alignment = cell.font, cell.fill, cell.border, cell.alignment
+    return (
+        cell.value,
+        font.name, bool(font.b), font.sz, color_signature(font.color),
+        fill.fill_type, fill.fgColor.rgb if fill.fill_type else None,
+        *(getattr(side, 'style', None) for side in (border.left, border.right, border.top, border.bottom)),
+        alignment.horizontal
+    )
+
+def assert_same_sheet(streamed, in_memory):
+    assert streamed.title == in_memory.title
+    assert streamed.max_row == in_memory.max_row, (streamed.max_row, in_memory.max_row)
+    assert sorted(map(str, streamed.merged_cells.ranges)) == sorted(map(str, in_memory.merged_cells.ranges))
+    for letter, dimension in in_memory.column_dimensions.items():
+        assert streamed.column_dimensions[letter].width == dimension.width, letter
+    for streamed_row, memory_row in zip(streamed.iter_rows(max_col=8), in_memory.iter_rows(max_col=8)):
+        for streamed_cell, memory_cell in zip(streamed_row, memory_row):
+            assert cell_signature(streamed_cell) == cell_signature(memory_cell), memory_cell.coordinate
+
+def check_parity(export, *args):
+    streamed, streamed_disposition = render(export_app(True), export, *args)
+    in_memory, memory_disposition = render(export_app(False), export, *args)
+    assert streamed_disposition == memory_disposition
+    assert_same_sheet(streamed, in_memory)
+
+def test_daily_attendance_parity():
+    check_parity(export_daily_attendance_to_excel, daily_attendance_data(), date(2025, 3, 2), date(2025, 3, 2))
+
+def test_historical_attendance_parity():
+    check_parity(export_daily_attendance_to_excel, None, date(2025, 3, 1), date(2025, 3, 5), None, historical_attendance_data())
+
+def test_historical_attendance_stream():
+    """A (date_key, date_data) generator produces the same sheet as the dict"""
+    historical = historical_attendance_data()
+    from_dict, _ = render(export_app(True), export_daily_attendance_to_excel, None, date(2025, 3, 1), date(2025, 3, 5), None, historical)
+    from_stream, _ = render(export_app(True), export_daily_attendance_to_excel, None, date(2025, 3, 1), date(2025, 3, 5), None, iter(historical.items()))
+    assert_same_sheet(from_stream, from_dict)
+
+def test_attendance_report_parity():
+    reports = []
+    for i, user in enumerate(USERS):
+        metrics = SimpleNamespace(
+            present_days=20 - i % 5, absent_days=i % 3, annual_leave_days=i % 2, paid_leave_days=1,
+            day_off_days=8, extra_time_hours=i * 0.75, total_days=31, total_working_days=22
+        )
+        reports.append(SimpleNamespace(user=user, summary_metrics=metrics))
+    check_parity(export_to_excel, reports, date(2025, 3, 1), date(2025, 3, 31))
+
+# Rows of the historical export for seed_attendance(), as produced by the export before it
+# streamed logs and prefetched the per-day lookups
+BASELINE_HISTORICAL_ROWS = [
+    ('2025-03-01', [
+        ('101', 'Bob Ray', '-', '-', '-', 'Not Yet Joined', '-'),
+        ('102', 'Carol Lee', '-', '-', '-', 'DayOff', '-'),
+        ('100', 'Jane Doe', '-', '-', '-', 'DayOff', '-'),
+    ]),
+    ('2025-03-02', [
+        ('101', 'Bob Ray', '-', '-', '-', 'Not Yet Joined', '-'),
+        ('102', 'Carol Lee', '-', '-', '-', 'Absent', '-'),
+        ('100', 'Jane Doe', '08:00 AM', '05:00 PM', '9h 0m', 'Present', '-'),
+    ]),
+    ('2025-03-03', [
+        ('101', 'Bob Ray', '-', '-', '-', 'Not Yet Joined', '-'),
+        ('102', 'Carol Lee', '09:00 AM', '-', '-', 'Present', '-'),
+        ('100', 'Jane Doe', '-', '-', '-', 'Absent', '-'),
+    ]),
+    ('2025-03-04', [
+        ('101', 'Bob Ray', '-', '-', '-', 'Absent', '-'),
+        ('102', 'Carol Lee', '09:15 AM', '-', '-', 'Present', 'Leave: Annual Leave'),
+        ('100', 'Jane Doe', '08:00 AM', '06:00 PM', '10h 0m', 'Present', 'Permission'),
+    ]),
+    ('2025-03-05', [
+        ('101', 'Bob Ray', '-', '-', '-', 'Permission', 'Permission'),
+        ('102', 'Carol Lee', '-', '-', '-', 'Leave Request', '-'),
+        ('100', 'Jane Doe', '-', '-', '-', 'Absent', '-'),
+    ]),
+    ('2025-03-06', [
+        ('101', 'Bob Ray', '08:30 AM', '04:00 PM', '7h 30m', 'Present', '-'),
+        ('102', 'Carol Lee', '-', '-', '-', 'Paid Holiday', '-'),
+        ('100', 'Jane Doe', '-', '-', '-', 'Founders Day', 'Holiday: Founders Day'),
+    ]),
+    ('2025-03-07', [
+        ('101', 'Bob Ray', '-', '-', '-', 'DayOff', '-'),
+        ('102', 'Carol Lee', '-', '-', '-', 'DayOff', '-'),
+        ('100', 'Jane Doe', '10:00 AM', '02:00 PM', '4h 0m', 'Present', '-'),
+    ]),
+    ('2025-03-08', [
+        ('101', 'Bob Ray', '-', '-', '-', 'DayOff', '-'),
+        ('102', 'Carol Lee', '-', '-', '-', 'DayOff', '-'),
+        ('100', 'Jane Doe', '-', '-', '-', 'DayOff', '-'),
+    ]),
+    ('2025-03-09', [
+        ('101', 'Bob Ray', '-', '-', '-', 'Absent', '-'),
+        ('102', 'Carol Lee', '-', '-', '-', 'Absent', '-'),
+        ('100', 'Jane Doe', '-', '-', '-', 'Absent', '-'),
+    ]),
+]
+
+def seed_attendance():
+    """Three users over 2025-03-01..09 with logs, leaves, permissions and paid holidays"""
+    jane = User(first_name='Jane', last_name='Doe', email='jane@x', password_hash='x', role='admin', fingerprint_number='100')
+    bob = User(first_name='Bob', last_name='Ray', email='bob@x', password_hash='x', fingerprint_number='101', joining_date=date(2025, 3, 4))
+    carol = User(first_name='Carol', last_name='Lee', email='carol@x', password_hash='x', fingerprint_number='102')
+    db.session.add_all([jane, bob, carol])
+    db.session.flush()
+    annual = LeaveType(name='Annual')
+    founders_day = PaidHoliday(holiday_type='day', start_date=date(2025, 3, 6), description='Founders Day', created_by=jane.id)
+    db.session.add_all([annual, founders_day,
+                        PaidHoliday(holiday_type='range', start_date=date(2025, 3, 8), end_date=date(2025, 3, 9), description='Spring', created_by=jane.id)])
+    db.session.flush()
+    for user, day, hour, minute in [(jane, 2, 8, 0), (jane, 2, 17, 0), (carol, 3, 9, 0), (bob, 6, 8, 30), (bob, 6, 16, 0),
+                                    (jane, 4, 8, 0), (jane, 4, 18, 0), (carol, 4, 9, 15), (jane, 7, 10, 0), (jane, 7, 14, 0)]:
+        db.session.add(AttendanceLog(user_id=user.id, timestamp=datetime(2025, 3, day, hour, minute), device_ip='1', scan_type='check'))
+    db.session.add_all([
+        LeaveRequest(user_id=carol.id, leave_type_id=annual.id, start_date=date(2025, 3, 4), end_date=date(2025, 3, 5), status='approved', reason='r'),
+        LeaveRequest(user_id=jane.id, leave_type_id=annual.id, start_date=date(2025, 3, 5), end_date=date(2025, 3, 5), status='pending', reason='r'),
+        PermissionRequest(user_id=jane.id, start_time=datetime(2025, 3, 4, 10), end_time=datetime(2025, 3, 4, 12), status='approved', reason='r'),
+        PermissionRequest(user_id=bob.id, start_time=datetime(2025, 3, 5, 10), end_time=datetime(2025, 3, 5, 12), status='approved', reason='r'),
+        DailyAttendance(user_id=jane.id, date=date(2025, 3, 6), status='paid_holiday', paid_holiday_id=founders_day.id, holiday_name='Founders Day'),
+        DailyAttendance(user_id=carol.id, date=date(2025, 3, 6), status='paid_holiday', paid_holiday_id=founders_day.id),
+        # Points at a holiday that was deleted since
+        DailyAttendance(user_id=jane.id, date=date(2025, 3, 3), status='paid_holiday', paid_holiday_id=999, holiday_name='Gone'),
+        DailyAttendance(user_id=carol.id, date=date(2025, 3, 4), status='leave', leave_type_name='Annual Leave'),
+        DailyAttendance(user_id=carol.id, date=date(2025, 3, 5), status='leave')
+    ])
+    db.session.commit()
+
+def test_historical_export_matches_baseline(make_app):
+    app = make_app(EXCEL_STREAMING_EXPORT=True)
+    with app.app_context():
+        seed_attendance()
+        users = User.query.order_by(User.first_name.desc(), User.last_name.desc()).all()
+
+        queries = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+        historical = list(iter_historical_attendance(users, date(2025, 3, 1), date(2025, 3, 9)))
+        assert len(queries) <= 10, f'lookups should not run per user and day: {len(queries)} queries'
+
+        sheet, _ = render(app, export_daily_attendance_to_excel, None, date(2025, 3, 1), date(2025, 3, 9), None, iter(historical))
+    rows, day = [], None
+    for values in sheet.iter_rows(min_row=4, max_col=7, values_only=True):
+        if values[0] and str(values[0]).startswith('Date: '):
+            day = (values[0][len('Date: '):], [])
+            rows.append(day)
+        elif values[0] is not None:
+            day[1].append(tuple(values))
+    assert rows == BASELINE_HISTORICAL_ROWS, rows
@@ -0,0 +1,93 @@
+"""
+Tests for background report exports (export_jobs.py).
+
+Checks that a job calls its export builder directly with the requesting user and the saved query
+arguments and stores the file in the job row, that roles are checked again when the job runs,
+and that only queued jobs whose worker lease ran out are taken over. Uses a temporary SQLite
+database; no server needed.
+"""
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from flask import send_file
+
+import export_jobs
+from extensions import db
+from models import User, ExportJob
+from export_jobs import background_export, run_export_job, renew_export_job_leases, cleanup_export_jobs, worker_id
+
+calls = []
+
+def build_test_export(viewer, query_args):
+    calls.append((viewer.email, query_args.getlist('user_ids')))
+    return send_file(io.BytesIO(f'report for {viewer.email}'.encode()), as_attachment=True,
+                     download_name='report.xlsx', mimetype='application/vnd.ms-excel')
+
+background_export(build_test_export, roles=['admin'])
+BUILDER = f'{__name__}.build_test_export'
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(User(first_name='A', last_name='B', email='a@b', password_hash='x', role='admin', status='active'))
+        db.session.commit()
+    return app
+
+def add_job(job_id, status='queued', worker=None, lease_expires_at=None):
+    db.session.add(ExportJob(
+        id=job_id, user_id=1, endpoint=BUILDER, status=status,
+        params='{"args": [["user_ids", "2"], ["user_ids", "3"]]}',
+        worker=worker or worker_id(), lease_expires_at=lease_expires_at or datetime.utcnow() + timedelta(minutes=3),
+        started_at=datetime.utcnow() if status == 'running' else None
+    ))
+    db.session.commit()
+
+def test_job_calls_the_builder_and_stores_the_file(app):
+    calls.clear()
+    with app.app_context():
+        add_job('job-1')
+    run_export_job(app, 'job-1')
+    with app.app_context():
+        job = ExportJob.query.get('job-1')
+        assert job.status == 'done', job.error
+        assert calls == [('a@b', ['2', '3'])], calls
+        assert (job.filename, job.content, job.file_size) == ('report.xlsx', b'report for a@b', 14)
+        assert job.lease_expires_at is None and job.expires_at is not None
+
+def test_roles_are_checked_when_the_job_runs(app):
+    calls.clear()
+    with app.app_context():
+        add_job('job-2')
+        User.query.get(1).role = 'employee'
+        db.session.commit()
+    run_export_job(app, 'job-2')
+    with app.app_context():
+        job = ExportJob.query.get('job-2')
+        assert job.status == 'failed' and 'access' in job.error, (job.status, job.error)
+        assert calls == [], 'the builder should not run for a user who lost the role'
+
+def test_only_jobs_with_an_expired_lease_are_taken_over(app):
+    submitted = []
+    original = export_jobs.submit_export_job
+    export_jobs.submit_export_job = lambda app, job_id: submitted.append(job_id)
+    try:
+        with app.app_context():
+            past = datetime.utcnow() - timedelta(minutes=1)
+            add_job('mine')
+            add_job('busy-elsewhere', worker='other:1')
+            add_job('orphaned', worker='other:2', lease_expires_at=past)
+            add_job('died-running', status='running', worker='other:3', lease_expires_at=past)
+
+            assert renew_export_job_leases(app) == 1
+            assert submitted == ['orphaned'], submitted
+            assert ExportJob.query.get('orphaned').worker == worker_id()
+            assert renew_export_job_leases(app) == 0, 'a renewed lease should not be taken over again'
+
+            cleanup_export_jobs(app)
+            statuses = {job.id: job.status for job in ExportJob.query.all()}
+            assert statuses == {'mine': 'queued', 'busy-elsewhere': 'queued', 'orphaned': 'queued',
+                                'died-running': 'failed'}, statuses
+    finally:
+        export_jobs.submit_export_job = original
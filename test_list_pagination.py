@@ -0,0 +1,87 @@
+"""
+Tests for the keyset-paginated request lists (keyset_paginate / apply_list_filters in helpers.py).
+
+Walks the next cursors to the end and the previous cursors back to the start over rows that
+share created_at, with and without status and department filters, and checks every row comes
+once, in (created_at, id) newest-first order, with the pages the same both ways. Also checks
+that created_at can't be NULL, since such a row would have no cursor. Uses an in-memory SQLite
+database.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import User, Department, PermissionRequest
+from helpers import keyset_paginate, apply_list_filters
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add_all([Department(department_name='Sales'), Department(department_name='Support')])
+        db.session.flush()
+        for user_id, department_id in ((1, 1), (2, 2)):
+            db.session.add(User(first_name=f'User{user_id}', last_name='Doe', email=f'user{user_id}@example.com',
+                                password_hash='x', role='employee', status='active', department_id=department_id))
+        db.session.flush()
+        # Three rows per created_at, so page edges fall inside runs of equal timestamps
+        base = datetime(2025, 3, 1, 9)
+        for index in range(25):
+            db.session.add(PermissionRequest(
+                user_id=1 + index % 2, reason='r',
+                status=('pending', 'approved', 'rejected')[index % 3],
+                start_time=base, end_time=base + timedelta(hours=1),
+                created_at=base + timedelta(hours=index // 3)
+            ))
+        db.session.commit()
+    return app
+
+def expected_ids(query):
+    return [row.id for row in sorted(query.all(), key=lambda row: (row.created_at, row.id), reverse=True)]
+
+def walk(query, per_page):
+    """Pages following next cursors, then the pages following prev cursors back from the last one"""
+    forward = [keyset_paginate(query, PermissionRequest, per_page=per_page)]
+    while forward[-1].next_cursor:
+        forward.append(keyset_paginate(query, PermissionRequest, after=forward[-1].next_cursor, per_page=per_page))
+    backward = [forward[-1]]
+    while backward[-1].prev_cursor:
+        backward.append(keyset_paginate(query, PermissionRequest, before=backward[-1].prev_cursor, per_page=per_page))
+    return forward, list(reversed(backward))
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'status': 'approved'},
+    {'department_id': 2},
+    {'status': 'pending', 'department_id': 1},
+    {'date_range': 'custom', 'date_from': datetime(2025, 3, 1).date(), 'date_to': datetime(2025, 3, 1).date()}
+])
+@pytest.mark.parametrize('per_page', [1, 4, 5])
+def test_cursors_walk_every_row_once(app, filters, per_page):
+    with app.app_context():
+        query = apply_list_filters(PermissionRequest.query, PermissionRequest, **filters)
+        expected = expected_ids(query)
+        assert expected, 'filters should leave some rows'
+        forward, backward = walk(query, per_page)
+
+        assert [row.id for page in forward for row in page.items] == expected
+        assert all(len(page.items) == per_page for page in forward[:-1])
+        assert [[row.id for row in page.items] for page in backward] == [[row.id for row in page.items] for page in forward]
+        assert forward[0].total == len(expected) and forward[0].prev_cursor is None
+        assert all(page.total is None for page in forward[1:]), 'only the first page counts'
+
+def test_total_is_carried_along(app):
+    with app.app_context():
+        first = keyset_paginate(PermissionRequest.query, PermissionRequest, per_page=10)
+        second = keyset_paginate(PermissionRequest.query, PermissionRequest, after=first.next_cursor, total=first.total)
+        assert second.total == 25
+
+def test_created_at_is_required(app):
+    with app.app_context():
+        start = datetime(2025, 3, 1, 9)
+        with pytest.raises(IntegrityError):
+            db.session.execute(PermissionRequest.__table__.insert().values(
+                user_id=1, reason='r', start_time=start, end_time=start, created_at=None
+            ))
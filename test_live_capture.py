@@ -0,0 +1,146 @@
+"""
+Tests for real-time punch capture (live_capture.py) against the simulated device.
+
+Checks that a punch on the device lands in attendance_logs and daily_attendance (recomputing
+only its own day) and is published on the live stream within seconds, that other device
+operations still get the device while a listener runs - in this process or, through the lease
+row, in another one - that the periodic sync only reconciles captured devices once their
+reconciliation window has passed, and that a listener rides out failed lease renewals but stops
+once its lease is gone or about to expire. Uses a temporary SQLite database; no device, network or
+PostgreSQL needed.
+"""
+import time
+from datetime import datetime, date
+from types import SimpleNamespace
+
+import pytest
+
+from extensions import db
+from models import User, DeviceSettings, AttendanceLog, DailyAttendance, AttendanceDirtyDay
+from cache import cache, MemoryBackend
+from device_sessions import device_sessions, DeviceSessionManager
+from device_simulator import SimulatedDevice
+import live_capture
+import live_updates
+
+def wait_for(condition, seconds=5):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+@pytest.fixture
+def capture(make_app):
+    """A listener capturing the simulated device; yields (app, device)"""
+    app = make_app('capture.sqlite3', DEVICE_LIVE_CAPTURE_TIMEOUT=0.2)
+    with app.app_context():
+        db.session.add(User(first_name='Jane', last_name='Doe', email='jane@example.com', password_hash='x',
+                            role='employee', status='active', fingerprint_number='100'))
+        db.session.add(DeviceSettings(device_ip='10.0.0.5', device_port=4370, device_name='Entrance'))
+        db.session.commit()
+    cache.configure(MemoryBackend())
+    device = SimulatedDevice(users=[('100', 'Jane Doe')])
+    device_sessions.configure(connector=device)
+    assert live_capture.supervise_listeners(app) == 1
+    assert wait_for(lambda: live_capture.listener_stats()['1']['capturing']), live_capture.listener_stats()
+    yield app, device
+    live_capture.stop_listeners(timeout=5)
+
+def test_punch_is_stored_and_published(capture):
+    app, device = capture
+    with app.app_context():
+        # Backlog from elsewhere: left for the periodic drain, not recomputed per punch
+        db.session.add(AttendanceDirtyDay(user_id=1, date=date(2025, 2, 3)))
+        db.session.commit()
+    sequence = live_updates.current_sequence('attendance')
+    punched_at = datetime(2025, 3, 3, 8, 55)
+    device.punch('100', punched_at)
+
+    def stored():
+        with app.app_context():
+            db.session.remove()
+            return (AttendanceLog.query.filter_by(timestamp=punched_at).count() == 1
+                    and DailyAttendance.query.filter_by(date=punched_at.date()).count() == 1)
+
+    assert wait_for(stored), 'punch should be stored and its day recomputed'
+    assert live_updates.current_sequence('attendance') == sequence + 1, 'punch should be published'
+    with app.app_context():
+        device_row = db.session.get(DeviceSettings, 1)
+        assert device_row.last_sync_timestamp is None, 'live punches must not move the sync cursor'
+        assert [row.date for row in AttendanceDirtyDay.query.all()] == [date(2025, 2, 3)]
+
+def test_other_operations_get_the_device(capture):
+    app, device = capture
+    device.punch('100', datetime(2025, 3, 3, 9, 0))
+    started = time.monotonic()
+    with device_sessions.borrow('10.0.0.5', 4370, wait=5) as conn:
+        assert len(conn.get_attendance()) == 1
+    assert time.monotonic() - started < 2, 'listener should hand the device over promptly'
+    assert wait_for(lambda: live_capture.listener_stats()['1']['capturing']), 'listener should resume'
+
+def test_other_processes_get_the_device(capture):
+    app, device = capture
+    # Another worker: its own sessions, taking the device over through the lease row
+    other_process = DeviceSessionManager(connector=device)
+    other_process.handover = lambda ip, port, wait: live_capture.take_over_device(app, ip, port, wait)
+    device.punch('100', datetime(2025, 3, 3, 9, 5))
+    with other_process.borrow('10.0.0.5', 4370, wait=5) as conn:
+        assert not live_capture.listener_stats()['1']['capturing']
+        assert not device_sessions.is_connected('10.0.0.5', 4370), 'listener should close its connection'
+        assert len(conn.get_attendance()) == 1
+    other_process.close_all()
+    assert wait_for(lambda: live_capture.listener_stats()['1']['capturing']), 'listener should resume'
+
+def test_captured_devices_are_only_reconciled(capture):
+    app, device = capture
+    with app.app_context():
+        devices = DeviceSettings.query.all()
+        assert live_capture.devices_due_for_sync(devices, 60) == devices, 'never reconciled yet'
+        live_capture.mark_reconciled([device.id for device in devices])
+        assert live_capture.devices_due_for_sync(devices, 60) == []
+        assert live_capture.devices_due_for_sync(devices, 0) == devices, 'reconciliation window passed'
+    live_capture.stop_listeners(timeout=5)
+    with app.app_context():
+        devices = DeviceSettings.query.all()
+        assert live_capture.devices_due_for_sync(devices, 60) == devices, 'stopped listener releases its device'
+
+@pytest.fixture
+def fast_lease(monkeypatch):
+    """Renew on every check and retry every 50 ms against a 1 s lease"""
+    monkeypatch.setattr(live_capture, 'SYNC_LEASE_HEARTBEAT', 0)
+    monkeypatch.setattr(live_capture, 'SYNC_LEASE_RETRY', 0.05)
+    monkeypatch.setattr(live_capture, 'SYNC_LEASE_TTL', 1)
+
+def renewing_listener(monkeypatch, results):
+    """A listener (not started) whose renewals answer from results, then the last one for good"""
+    calls = []
+
+    def renew_lease(*args):
+        calls.append(args)
+        return results[min(len(calls), len(results)) - 1]
+
+    monkeypatch.setattr(live_capture, 'renew_lease', renew_lease)
+    device = SimpleNamespace(id=1, device_ip='10.0.0.5', device_port=4370)
+    return live_capture.DeviceListener(None, device), calls
+
+def test_listener_rides_out_failed_renewals(fast_lease, monkeypatch):
+    listener, calls = renewing_listener(monkeypatch, [None, None, True])
+    deadline = time.monotonic() + 1.5
+    while time.monotonic() < deadline:
+        assert listener._renew(), 'a failed query must not stop live capture'
+        time.sleep(0.01)
+    assert len(calls) > 3
+
+def test_listener_stops_before_its_lease_expires(fast_lease, monkeypatch):
+    listener, calls = renewing_listener(monkeypatch, [None])
+    started = time.monotonic()
+    assert listener._renew(), 'one failed renewal must not give the lease up'
+    assert wait_for(lambda: not listener._renew(), seconds=2)
+    assert time.monotonic() - started < 1 and len(calls) > 2
+
+def test_listener_stops_once_its_lease_is_gone(fast_lease, monkeypatch):
+    listener, calls = renewing_listener(monkeypatch, [False])
+    assert not listener._renew()
+    assert listener.stop_event.is_set()
@@ -0,0 +1,143 @@
+"""
+Tests for the live update channel behind /attendance/stream (live_updates.py).
+
+Checks that published attendance events reach open streams filtered to each stream's user
+scope, that a stream falling too far behind gets a single unscoped event, that streams are
+capped per process and only offered with a shared cache backend, and that polls answer 304
+without running the view until an event is published or a table it reads is written. Uses the
+in-process and SQLite cache backends; no database or server needed.
+"""
+import json
+import time
+import threading
+from datetime import date
+
+from flask import Flask, jsonify
+from flask_login import LoginManager, UserMixin, login_user
+
+import live_updates
+from cache import cache, MemoryBackend, SQLiteBackend
+from live_updates import LiveStream, publish, stream_stats, conditional_poll
+
+def read_events(stream):
+    """Drain a stream and return the decoded data of its events"""
+    events = []
+    for frame in stream:
+        for line in frame.splitlines():
+            if line.startswith('data: '):
+                events.append(json.loads(line[len('data: '):]))
+    stream.close()
+    return events
+
+def publish_later(*batches):
+    def run():
+        time.sleep(0.2)
+        for pairs in batches:
+            publish('attendance', pairs)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_events_are_scoped():
+    cache.configure(MemoryBackend())
+    everyone = LiveStream.open(4, user_ids=None, max_seconds=1, poll=0.1)
+    employee = LiveStream.open(4, user_ids={2}, max_seconds=1, poll=0.1)
+    publisher = publish_later(
+        [(2, date(2025, 1, 1)), (3, date(2025, 1, 2))],
+        [(3, date(2025, 1, 3))]
+    )
+    results = {}
+    readers = [threading.Thread(target=lambda name=name, stream=stream: results.update({name: read_events(stream)}))
+               for name, stream in (('everyone', everyone), ('employee', employee))]
+    for reader in readers:
+        reader.start()
+    for thread in [publisher] + readers:
+        thread.join()
+
+    assert [event['user_ids'] for event in results['everyone']] == [[2, 3], [3]], results['everyone']
+    assert results['employee'] == [{
+        'type': 'attendance', 'at': results['employee'][0]['at'], 'user_ids': [2], 'days': ['2025-01-01']
+    }], results['employee']
+
+def test_backlog_overflow_sends_unscoped_event():
+    cache.configure(MemoryBackend())
+    stream = LiveStream.open(4, user_ids={2}, max_seconds=1, poll=0.1)
+    frames = iter(stream)
+    assert next(frames).startswith('retry:')
+    for _ in range(live_updates.MAX_BACKLOG + 1):
+        publish('attendance', [(9, date(2025, 1, 1))])
+    events = [json.loads(frame.split('data: ', 1)[1]) for frame in frames if 'data: ' in frame]
+    stream.close()
+    assert events == [{'type': 'attendance', 'at': None}], events
+
+def test_stream_cap():
+    first = LiveStream.open(1, user_ids=None)
+    assert first is not None
+    assert LiveStream.open(1, user_ids=None) is None, 'second stream should be refused'
+    first.close()
+    first.close()
+    assert stream_stats()['open_streams'] == 0
+    second = LiveStream.open(1, user_ids=None)
+    assert second is not None
+    second.close()
+
+def test_streams_need_a_shared_backend(tmp_path):
+    cache.configure(MemoryBackend())
+    assert LiveStream.open(4, shared_only=True, user_ids=None) is None, 'memory backend should not get streams'
+    assert stream_stats()['open_streams'] == 0
+    cache.configure(SQLiteBackend(str(tmp_path / 'cache.sqlite3')))
+    stream = LiveStream.open(4, shared_only=True, user_ids=None)
+    assert stream is not None, 'shared backend should get a stream'
+    stream.close()
+    cache.configure(MemoryBackend())
+
+def polling_app():
+    """An app with one polled view counting its runs, logged in as user 7 on every request"""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: None)
+    app.runs = 0
+
+    class PollingUser(UserMixin):
+        id = 7
+
+    @app.before_request
+    def log_in():
+        login_user(PollingUser())
+
+    @app.route('/poll')
+    @conditional_poll('attendance_logs')
+    def poll():
+        app.runs += 1
+        return jsonify({'runs': app.runs})
+    return app
+
+def test_unchanged_polls_are_not_modified(tmp_path):
+    cache.configure(SQLiteBackend(str(tmp_path / 'cache.sqlite3')))
+    client = polling_app().test_client()
+    first = client.get('/poll')
+    etag = first.headers['ETag']
+    assert first.json == {'runs': 1} and 'no-cache' in first.headers['Cache-Control']
+
+    unchanged = client.get('/poll', headers={'If-None-Match': etag})
+    assert (unchanged.status_code, unchanged.data, unchanged.headers['ETag']) == (304, b'', etag)
+    assert client.get('/poll?user_id=3', headers={'If-None-Match': etag}).status_code == 200, 'scoped by URL'
+
+    publish('attendance', [(7, date(2025, 1, 1))])
+    published = client.get('/poll', headers={'If-None-Match': etag})
+    assert published.status_code == 200 and published.headers['ETag'] != etag
+    etag = published.headers['ETag']
+
+    cache.invalidate_tags(['leave_requests'])
+    assert client.get('/poll', headers={'If-None-Match': etag}).status_code == 304, 'unrelated table'
+    cache.invalidate_tags(['attendance_logs'])
+    assert client.get('/poll', headers={'If-None-Match': etag}).json == {'runs': 4}
+    cache.configure(MemoryBackend())
+
+def test_polls_without_a_shared_backend_always_run():
+    cache.configure(MemoryBackend())
+    client = polling_app().test_client()
+    response = client.get('/poll')
+    assert 'ETag' not in response.headers
+    assert client.get('/poll', headers={'If-None-Match': '*'}).json == {'runs': 2}
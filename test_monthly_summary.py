@@ -0,0 +1,103 @@
+"""
+Tests for the materialized monthly attendance summary (report_helpers/monthly_summary.py).
+
+Checks that reading a month without a stored summary computes it without writing anything, that
+`flask prepare-database` builds the table from daily attendance while it is empty and leaves it
+alone afterwards, with the stored rows matching the computed ones, and that approving or moving a
+permission refreshes the stored months it touches. Uses an in-memory SQLite database.
+"""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import User, DailyAttendance, PermissionRequest, MonthlyAttendanceSummary
+from report_helpers import monthly_summary
+from report_helpers.monthly_summary import get_monthly_summary, register_monthly_summary_listeners, SUMMARY_FIELDS
+from schema_setup import prepare_database
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(User(first_name='Jane', last_name='Doe', email='jane@example.com', password_hash='x',
+                            role='employee', status='active'))
+        db.session.flush()
+        db.session.add_all([
+            DailyAttendance(user_id=1, date=date(2025, 3, 3), status='present', total_working_hours=10.5),
+            DailyAttendance(user_id=1, date=date(2025, 3, 4), status='present', total_working_hours=8.0),
+            DailyAttendance(user_id=1, date=date(2025, 3, 5), status='absent'),
+            DailyAttendance(user_id=1, date=date(2025, 4, 1), status='half-day', total_working_hours=4.0)
+        ])
+        db.session.add(PermissionRequest(user_id=1, start_time=datetime(2025, 3, 4, 9), end_time=datetime(2025, 3, 4, 10, 20),
+                                         reason='r', status='approved'))
+        db.session.commit()
+    return app
+
+@pytest.fixture
+def listeners(app):
+    """The commit listeners the app registers at startup, removed again afterwards"""
+    register_monthly_summary_listeners()
+    yield
+    event.remove(db.session, 'before_flush', monthly_summary._capture_summary_changes)
+    event.remove(db.session, 'before_commit', monthly_summary._refresh_before_commit)
+    event.remove(db.session, 'after_rollback', monthly_summary._clear_after_rollback)
+
+def summary_values(summary):
+    return {field: getattr(summary, field) for field in SUMMARY_FIELDS}
+
+def test_missing_month_is_computed_without_writing(app):
+    with app.app_context():
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        summary = get_monthly_summary(1, 2025, 3)
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert (summary.present_days, summary.absent_days, summary.total_working_hours) == (2, 1, 18.5)
+        assert (summary.permission_hours, summary.extra_time_hours) == (1.33, 1.5)
+        assert all(statement.lstrip().upper().startswith('SELECT') for statement in statements), statements
+        assert summary not in db.session
+        db.session.commit()
+        assert MonthlyAttendanceSummary.query.count() == 0
+
+def test_prepare_database_builds_an_empty_summary_table(app):
+    with app.app_context():
+        computed = {month: summary_values(get_monthly_summary(1, 2025, month)) for month in (3, 4)}
+        assert MonthlyAttendanceSummary.query.count() == 0
+        prepare_database(upgrade=False)
+        stored = {row.month: summary_values(row) for row in MonthlyAttendanceSummary.query.filter_by(user_id=1)}
+        assert stored == computed
+
+        MonthlyAttendanceSummary.query.filter_by(month=4).delete()
+        db.session.commit()
+        prepare_database(upgrade=False)
+        assert [row.month for row in MonthlyAttendanceSummary.query.all()] == [3], 'a populated table is not rebuilt'
+
+def stored_permission_hours(month):
+    db.session.expire_all()
+    return MonthlyAttendanceSummary.query.filter_by(user_id=1, year=2025, month=month).one().permission_hours
+
+def test_permission_changes_refresh_stored_months(app, listeners):
+    with app.app_context():
+        prepare_database(upgrade=False)
+        assert stored_permission_hours(4) == 0.0
+
+        permission = PermissionRequest(user_id=1, start_time=datetime(2025, 4, 1, 14), end_time=datetime(2025, 4, 1, 16),
+                                       reason='r', status='pending')
+        db.session.add(permission)
+        db.session.commit()
+        assert stored_permission_hours(4) == 0.0, 'pending permissions are not counted'
+
+        permission.status = 'approved'
+        db.session.commit()
+        assert stored_permission_hours(4) == 2.0
+
+        permission.start_time, permission.end_time = datetime(2025, 3, 5, 14), datetime(2025, 3, 5, 16)
+        db.session.commit()
+        assert (stored_permission_hours(3), stored_permission_hours(4)) == (3.33, 0.0)
+
+        db.session.delete(permission)
+        db.session.commit()
+        assert stored_permission_hours(3) == 1.33
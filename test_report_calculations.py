@@ -0,0 +1,159 @@
+"""
+Tests for the unified report calculation (report_helpers/report_calculations.py).
+
+Seeds two weeks of daily attendance rows, punches (single and multiple per day), approved,
+pending and rejected leaves of each category, permissions, single-day and range paid holidays,
+notes and a mid-range joiner, and checks that the summary metrics and the per-day fields the
+reports render match what the calculation produced before its rows were prefetched, both for
+one user and for several users at once, and that the query count does not grow with the number
+of users. Uses an in-memory SQLite database.
+"""
+import random
+from datetime import datetime, date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import User, AttendanceLog, DailyAttendance, LeaveRequest, LeaveType, PermissionRequest, PaidHoliday, Note
+from report_helpers.report_calculations import calculate_unified_report_data, calculate_multiple_users_report_data
+
+START, END = date(2025, 3, 1), date(2025, 3, 14)
+
+# Summary metrics (total_days ... extra_time_hours) and per-day fields the calculation produced
+# for seed() before ReportPrefetch
+EXPECTED = [
+    (1, (14, 18, 11, 1, 3, 1, 3, 5.0, 1, 5, 61.1, -24.2),
+     [('2025-03-14', 'present', '2025-03-14 19:04:00', 'None', 9.0, 0.0, '9h 0m', 1, 0),
+      ('2025-03-13', 'present', '2025-03-13 13:56:00', '2025-03-13 16:24:00', 2.4667, -6.5333, '2h 28m', 2, 0),
+      ('2025-03-12', 'present', '2025-03-12 07:04:00', '2025-03-12 18:18:00', 11.2333, 2.2333, '11h 13m', 3, 1),
+      ('2025-03-11', 'present', '2025-03-11 10:59:00', '2025-03-11 15:51:00', 4.8667, -4.1333, '4h 51m', 2, 1),
+      ('2025-03-10', 'present', '2025-03-10 14:55:00', 'None', 9.0, 0.0, '9h 0m', 1, 1),
+      ('2025-03-07', 'present', '2025-03-07 16:01:00', 'None', 9.0, 0.0, '9h 0m', 1, 0),
+      ('2025-03-06', 'present', '2025-03-06 17:30:00', '2025-03-06 19:36:00', 2.1, -6.9, '2h 6m', 3, 0),
+      ('2025-03-05', 'present', '2025-03-05 17:09:00', 'None', 9.0, 0.0, '9h 0m', 1, 0),
+      ('2025-03-04', 'present', '2025-03-04 16:11:00', 'None', 9.0, 0.0, '9h 0m', 1, 0),
+      ('2025-03-03', 'Annual Leave', '2025-03-03 08:36:00', '2025-03-03 14:37:00', 6.0167, -2.9833, '6h 0m', 2, 0),
+      ('2025-03-02', 'Annual Leave', 'None', 'None', 0.0, 0.0, '-', 0, 0),
+      ('2025-03-01', 'Annual Leave', '2025-03-01 14:42:00', '2025-03-01 17:01:00', 2.3167, -6.6833, '2h 19m', 3, 0)],
+     [1, 2], [3, 2, 1]),
+    (2, (14, 19, 9, 0, 6, 0, 3, 3.0, 1, 3, 47.4, -20.8),
+     [('2025-03-14', 'present', '2025-03-14 11:24:00', '2025-03-14 14:32:00', 3.1333, -5.8667, '3h 7m', 2, 0),
+      ('2025-03-13', 'present', '2025-03-13 07:43:00', 'None', 9.0, 0.0, '9h 0m', 1, 0),
+      ('2025-03-12', 'leave', 'None', 'None', 0.0, 0.0, '-', 0, 0),
+      ('2025-03-11', 'present', '2025-03-11 07:20:00', '2025-03-11 10:35:00', 3.25, -5.75, '3h 15m', 2, 0),
+      ('2025-03-10', 'present', '2025-03-10 07:00:00', '2025-03-10 11:36:00', 4.6, -4.4, '4h 35m', 2, 0),
+      ('2025-03-09', 'present', '2025-03-09 08:59:00', '2025-03-09 17:59:00', 9.0, 0.0, '9h 0m', 3, 0),
+      ('2025-03-08', 'leave', 'None', 'None', 0.0, 0.0, '-', 0, 0),
+      ('2025-03-07', 'Annual Leave', 'None', 'None', 0.0, 0.0, '-', 0, 0),
+      ('2025-03-06', 'Other', '2025-03-06 10:01:00', '2025-03-06 18:38:00', 8.6167, -0.3833, '8h 37m', 3, 0),
+      ('2025-03-04', 'Other', 'None', 'None', 0.0, 0.0, '-', 0, 1),
+      ('2025-03-03', 'present', '2025-03-03 09:17:00', 'None', 9.0, 0.0, '9h 0m', 1, 1),
+      ('2025-03-02', 'present', '2025-03-02 13:59:00', 'None', 9.0, 0.0, '9h 0m', 1, 0),
+      ('2025-03-01', 'present', '2025-03-01 08:29:00', '2025-03-01 12:44:00', 4.25, -4.75, '4h 15m', 2, 0)],
+     [5, 6, 4], [6, 4]),
+    (3, (14, 15, 8, 1, 3, 0, 4, 4.0, 0, 3, 53.3, 1.7),
+     [('2025-03-14', 'present', '2025-03-14 11:35:00', 'None', 9.0, 0.0, '9h 0m', 1, 0),
+      ('2025-03-13', 'absent', 'None', 'None', 0.0, 0.0, '-', 0, 0),
+      ('2025-03-12', 'present', '2025-03-12 11:46:00', 'None', 9.0, 0.0, '9h 0m', 1, 0),
+      ('2025-03-10', 'present', '2025-03-10 08:10:00', '2025-03-10 19:17:00', 11.1167, 2.1167, '11h 7m', 2, 0),
+      ('2025-03-09', 'Other', '2025-03-09 14:10:00', '2025-03-09 17:10:00', 3.0, -6.0, '3h 0m', 2, 0),
+      ('2025-03-08', 'present', '2025-03-08 11:04:00', '2025-03-08 19:37:00', 8.55, -0.45, '8h 33m', 2, 0),
+      ('2025-03-05', 'present', '2025-03-05 14:11:00', 'None', 9.0, 0.0, '9h 0m', 1, 1),
+      ('2025-03-04', 'present', '2025-03-04 13:37:00', '2025-03-04 18:43:00', 5.1, -3.9, '5h 5m', 2, 0),
+      ('2025-03-03', 'leave', 'None', 'None', 0.0, 0.0, '-', 0, 0),
+      ('2025-03-02', 'absent', 'None', 'None', 0.0, 0.0, '-', 0, 0),
+      ('2025-03-01', 'present', '2025-03-01 10:53:00', '2025-03-01 17:25:00', 6.5333, -2.4667, '6h 31m', 2, 0)],
+     [9, 7, 8], [7, 9])
+]
+
+def seed(users=3, seed_value=11):
+    """Deterministic fortnight of report data"""
+    rng = random.Random(seed_value)
+    for number in range(users):
+        db.session.add(User(first_name=f'User{number}', last_name='Test', email=f'user{number}@example.com',
+                            password_hash='x', role='employee', status='active',
+                            fingerprint_number=str(100 + number),
+                            joining_date=date(2025, 3, 5) if number == 2 else None))
+    leave_types = [LeaveType(name=name) for name in ('Annual Leave', 'Sick Leave', 'Unpaid Leave', 'Paid Leave', 'Other')]
+    db.session.add_all(leave_types)
+    db.session.add_all([
+        PaidHoliday(holiday_type='day', start_date=date(2025, 3, 6), description='Founders Day'),
+        PaidHoliday(holiday_type='range', start_date=date(2025, 3, 12), end_date=date(2025, 3, 13), description='Spring Break')
+    ])
+    db.session.flush()
+
+    for user_id in range(1, users + 1):
+        for offset in range((END - START).days + 1):
+            day = START + timedelta(days=offset)
+            roll = rng.random()
+            if roll < 0.15:
+                continue
+            if roll < 0.25:
+                # A day row without punches
+                db.session.add(DailyAttendance(user_id=user_id, date=day, status=rng.choice(['absent', 'present', 'leave'])))
+                continue
+            punches = sorted({datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randint(7 * 60, 20 * 60))
+                              for _ in range(rng.choice([1, 2, 2, 3]))})
+            for timestamp in punches:
+                db.session.add(AttendanceLog(user_id=user_id, timestamp=timestamp, device_ip='10.0.0.5', scan_type='check-in'))
+            db.session.add(DailyAttendance(
+                user_id=user_id, date=day, status='present', first_check_in=punches[0],
+                last_check_out=punches[-1] if len(punches) > 1 else None, is_incomplete_day=len(punches) == 1
+            ))
+        for _ in range(3):
+            start = START + timedelta(days=rng.randint(0, 12))
+            db.session.add(LeaveRequest(user_id=user_id, leave_type_id=rng.choice(leave_types).id,
+                                        start_date=start, end_date=start + timedelta(days=rng.randint(0, 2)),
+                                        reason='r', status=rng.choice(['approved', 'approved', 'pending', 'rejected'])))
+        for _ in range(3):
+            start = datetime.combine(START + timedelta(days=rng.randint(0, 13)), datetime.min.time()) + timedelta(hours=rng.randint(9, 15))
+            db.session.add(PermissionRequest(user_id=user_id, start_time=start, end_time=start + timedelta(hours=rng.choice([1, 2])),
+                                             reason='r', status=rng.choice(['approved', 'pending', 'rejected'])))
+        start = START + timedelta(days=rng.randint(0, 10))
+        db.session.add(Note(user_id=user_id, created_by_id=1, start_date=start, end_date=start + timedelta(days=2), comment='n'))
+    db.session.commit()
+
+def snapshot(report):
+    """The summary and the per-day fields the reports and exports render"""
+    return (
+        report.user.id,
+        tuple(report.summary_metrics),
+        [(record.date.isoformat(), record.status, str(record.check_in), str(record.check_out), round(record.hours_worked, 4),
+          round(record.extra_time, 4), record.formatted_hours_worked, len(record.all_logs), len(record.notes))
+         for record in report.attendance_records],
+        [leave_request.id for leave_request in report.leave_requests],
+        [permission_request.id for permission_request in report.permission_requests]
+    )
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        seed()
+    return app
+
+def test_multiple_users_match_the_baseline(app):
+    with app.app_context():
+        reports = calculate_multiple_users_report_data(User.query.order_by(User.id).all(), START, END)
+        assert [snapshot(report) for report in reports] == EXPECTED
+
+def test_single_user_matches_the_baseline(app):
+    with app.app_context():
+        for user, expected in zip(User.query.order_by(User.id).all(), EXPECTED):
+            assert snapshot(calculate_unified_report_data(user, START, END)) == expected
+
+def test_query_count_does_not_grow_with_the_users(app):
+    with app.app_context():
+        counts = []
+        for user_count in (1, 3):
+            # The calculation relabels leave days on the loaded rows; do not count their autoflush
+            db.session.rollback()
+            selected = User.query.order_by(User.id).limit(user_count).all()
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, 'before_cursor_execute', listener)
+            calculate_multiple_users_report_data(selected, START, END)
+            event.remove(db.engine, 'before_cursor_execute', listener)
+            counts.append(len(statements))
+        assert counts[0] == counts[1], f'report queries should not depend on the number of users: {counts}'
@@ -0,0 +1,72 @@
+"""
+Tests for database-backed sessions (server_sessions.py).
+
+Checks that a session survives across requests and is served from the cache, that requests
+which only read the session don't write it, and that expired sessions are not loaded and are
+removed by the sweep. Uses a temporary SQLite database.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from flask import session
+from sqlalchemy import event
+
+from extensions import db
+from models import ServerSession
+from cache import cache, MemoryBackend
+from server_sessions import init_sessions, sweep_expired_sessions
+
+@pytest.fixture
+def app(make_app):
+    app = make_app('sessions.sqlite3', SECRET_KEY='test', SESSION_TYPE='database', PERMANENT_SESSION_LIFETIME=1800)
+    cache.configure(MemoryBackend())
+    init_sessions(app)
+
+    @app.route('/login')
+    def login():
+        session['user'] = 'jane'
+        return 'ok'
+
+    @app.route('/whoami')
+    def whoami():
+        return session.get('user', 'anonymous')
+
+    return app
+
+def count_statements(app):
+    """Record the SQL sent for server_sessions"""
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement.split()[0])
+                     if 'server_sessions' in statement else None)
+    return statements
+
+def test_reads_are_cached_and_not_written_back(app):
+    statements = count_statements(app)
+    client = app.test_client()
+
+    assert client.get('/login').status_code == 200
+    assert statements.count('INSERT') == 1, statements
+    del statements[:]
+
+    for _ in range(3):
+        assert client.get('/whoami').get_data(as_text=True) == 'jane'
+    assert statements == [], f'unchanged sessions should come from the cache, got {statements}'
+
+    cache.configure(MemoryBackend())
+    assert client.get('/whoami').get_data(as_text=True) == 'jane', 'should fall back to the table'
+    assert statements == ['SELECT'], statements
+
+def test_expired_sessions_are_ignored_and_swept(app):
+    client = app.test_client()
+    client.get('/login')
+    with app.app_context():
+        db.session.query(ServerSession).update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+    cache.configure(MemoryBackend())
+
+    assert client.get('/whoami').get_data(as_text=True) == 'anonymous'
+    assert sweep_expired_sessions(app) == 1
+    with app.app_context():
+        assert ServerSession.query.count() == 0
@@ -0,0 +1,195 @@
+"""
+Tests for the sync agent's local spool (LogSpool, queue_device_logs and drain_spool in
+sync_agent/attendance_sync_agent.py).
+
+Checks that records read again inside the overlap window are neither queued nor uploaded a
+second time, that the device cursor and the queued rows are committed together (a failed
+enqueue leaves neither behind, a reopened spool sees both), that a batch the server refuses is
+moved to rejected_logs while the batches after it still drain, and that a server outage leaves
+the queue in place with a backoff. Uses a temporary SQLite spool, a fake device connection and
+a fake server session; no device or network needed.
+"""
+import gzip
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('zk')
+pytest.importorskip('schedule')
+
+DEVICE = 'device_entrance'
+START = datetime(2025, 3, 3, 9)
+
+class FakeDevice:
+    """Stands in for a ZK connection: get_attendance() returns the punches added so far, in punch order"""
+
+    def __init__(self):
+        self.records = []
+
+    def punch(self, user_id, timestamp, punch=0):
+        self.records.append(SimpleNamespace(user_id=user_id, timestamp=timestamp, punch=punch))
+
+    def get_attendance(self):
+        return list(self.records)
+
+    def disconnect(self):
+        pass
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self.body
+
+class FakeServer:
+    """Stands in for the agent's requests session: decodes each batch and answers with the next status"""
+
+    def __init__(self):
+        self.batches = []
+        self.status = 200
+        self.reject_user = None
+
+    def post(self, url, data, headers, timeout):
+        logs = [json.loads(line) for line in gzip.decompress(data).decode('utf-8').splitlines()]
+        if self.status != 200:
+            return FakeResponse(self.status, {'error': 'unavailable'})
+        if any(log['user_id'] == self.reject_user for log in logs):
+            return FakeResponse(400, {'error': 'invalid batch'})
+        self.batches.append(logs)
+        return FakeResponse(200, {'summary': {'received': len(logs), 'inserted': len(logs)}})
+
+    def received(self):
+        return [(log['user_id'], log['timestamp']) for batch in self.batches for log in batch]
+
+@pytest.fixture
+def agent_module(tmp_path, monkeypatch):
+    # The module logs to sync_agent.log in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sync_agent'))
+    import attendance_sync_agent
+    return attendance_sync_agent
+
+@pytest.fixture
+def make_agent(agent_module, tmp_path):
+    def factory(batch_size=5000):
+        config = tmp_path / 'config.ini'
+        config.write_text(
+            '[server]\nurl = http://server.test\nsync_secret = secret\n'
+            f'[sync]\nbatch_size = {batch_size}\nmax_retries = 1\noverlap_minutes = 10\n'
+            f'spool_path = {tmp_path / "spool.db"}\nretry_base_seconds = 30\n'
+            f'[{DEVICE}]\nname = Entrance\nip = 10.0.0.5\n'
+        )
+        agent = agent_module.AttendanceSyncAgent(str(config))
+        agent.http = FakeServer()
+        return agent
+    return factory
+
+@pytest.fixture
+def device():
+    return FakeDevice()
+
+def fetch(agent, device):
+    """One fetch cycle for the device without uploading"""
+    agent.connect_to_device = lambda config: device
+    assert agent.sync_device(agent.devices[0])
+
+def test_overlap_window_records_are_not_queued_twice(make_agent, device):
+    agent = make_agent()
+    for minute in (0, 5, 20):
+        device.punch('1', START + timedelta(minutes=minute))
+    fetch(agent, device)
+    assert agent.spool.pending_count() == 3
+
+    # Same records again before the upload: already queued
+    fetch(agent, device)
+    assert agent.spool.pending_count() == 3
+    assert agent.drain_spool()
+    assert agent.spool.pending_count() == 0
+
+    # A new punch plus one that arrived late, stamped inside the overlap window
+    device.punch('2', START + timedelta(minutes=30))
+    device.punch('3', START + timedelta(minutes=15))
+    fetch(agent, device)
+    assert agent.spool.pending_count() == 2, 'records sent before are not queued again'
+    assert agent.drain_spool()
+
+    received = agent.http.received()
+    assert len(received) == len(set(received)) == 5
+    cursor = agent.spool.cursor(DEVICE)
+    assert cursor['record_count'] == 5
+    assert cursor['last_timestamp'] == cursor['acked_timestamp'] == (START + timedelta(minutes=30)).isoformat()
+
+def test_cleared_device_log_is_queued_again(make_agent, device):
+    agent = make_agent()
+    for minute in (0, 5):
+        device.punch('1', START + timedelta(minutes=minute))
+    fetch(agent, device)
+    assert agent.drain_spool()
+
+    device.records = []
+    device.punch('1', START + timedelta(hours=1))
+    fetch(agent, device)
+    assert agent.spool.pending_count() == 1
+    assert agent.spool.cursor(DEVICE)['record_count'] == 1
+
+def test_cursor_and_pending_rows_commit_together(agent_module, make_agent, tmp_path):
+    agent = make_agent()
+    good = {'user_id': '1', 'timestamp': START.isoformat(), 'punch': 0}
+    # The cursor write fails after the rows went in: the rows go too
+    with pytest.raises(sqlite3.Error):
+        agent.spool.enqueue(DEVICE, [good], object(), 1)
+    assert agent.spool.pending_count() == 0
+    assert agent.spool.cursor(DEVICE) == {'last_timestamp': None, 'record_count': None, 'acked_timestamp': None}
+
+    assert agent.spool.enqueue(DEVICE, [good], START.isoformat(), 1) == 1
+    # A fresh spool on the same file, as after a restart, sees both
+    reopened = agent_module.LogSpool(str(tmp_path / 'spool.db'))
+    assert reopened.pending_count() == 1
+    assert reopened.cursor(DEVICE)['last_timestamp'] == START.isoformat()
+    assert reopened.cursor(DEVICE)['record_count'] == 1
+
+def test_rejected_batch_is_set_aside_and_later_batches_drain(make_agent, device):
+    agent = make_agent(batch_size=2)
+    for minute, user_id in enumerate(['1', '2', 'bad', '3', '4', '5']):
+        device.punch(user_id, START + timedelta(minutes=minute))
+    fetch(agent, device)
+    agent.http.reject_user = 'bad'
+
+    assert agent.drain_spool()
+    assert agent.spool.pending_count() == 0
+    assert agent.spool.rejected_count() == 2
+    assert [user_id for user_id, _ in agent.http.received()] == ['1', '2', '4', '5']
+    rejected = agent.spool.conn.execute('SELECT user_id, status_code FROM rejected_logs ORDER BY id').fetchall()
+    assert rejected == [('bad', 400), ('3', 400)]
+    assert agent.drain_failures == 0
+
+    agent.http.reject_user = None
+    assert agent.spool.requeue_rejected() == 2
+    assert agent.drain_spool()
+    assert agent.spool.rejected_count() == 0
+    assert len(agent.http.received()) == 6
+
+def test_outage_keeps_the_queue_and_backs_off(make_agent, device):
+    agent = make_agent(batch_size=2)
+    for minute in range(3):
+        device.punch('1', START + timedelta(minutes=minute))
+    fetch(agent, device)
+    agent.http.status = 503
+
+    assert not agent.drain_spool()
+    assert agent.spool.pending_count() == 3
+    assert agent.drain_failures == 1
+    assert not agent.drain_spool(), 'no new attempt before the backoff delay'
+    assert agent.drain_failures == 1
+
+    agent.http.status = 200
+    assert agent.drain_spool(force=True)
+    assert agent.spool.pending_count() == 0
+    assert agent.drain_failures == 0 and agent.next_drain_at == 0.0
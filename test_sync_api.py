@@ -0,0 +1,133 @@
+"""
+Tests for the v2 batch sync endpoint (POST /api/v2/sync/logs in routes/api.py).
+
+Checks the per-line results and summary of a gzip NDJSON batch, that a retried batch gets the
+stored response back without writing again, also when it was compressed again, while a
+different batch under the same Idempotency-Key is refused with 422, that oversized, over-long
+and truncated bodies (including a small gzip body that inflates past the limit) are rejected
+before anything is written, that unsigned or unkeyed batches are refused, and that an upload
+recomputes only the days it touched. Uses an in-memory SQLite database.
+"""
+import gzip
+import hashlib
+import hmac
+import json
+from datetime import date
+
+import pytest
+
+from extensions import db
+from models import User, AttendanceLog, SyncBatch, DailyAttendance, AttendanceDirtyDay
+from routes.attendance import mark_attendance_dirty
+from cache import cache, MemoryBackend
+from routes.api import api_bp
+
+SECRET = 'test-sync-secret'
+
+@pytest.fixture
+def app(make_app, monkeypatch):
+    monkeypatch.setenv('SYNC_SECRET', SECRET)
+    app = make_app(SYNC_BATCH_MAX_BYTES=4096, SYNC_BATCH_MAX_LOGS=50)
+    app.register_blueprint(api_bp)
+    cache.configure(MemoryBackend())
+    with app.app_context():
+        for fingerprint_number in ('100', '101'):
+            db.session.add(User(first_name='Jane', last_name=fingerprint_number, email=f'{fingerprint_number}@example.com',
+                                password_hash='x', role='employee', status='active',
+                                fingerprint_number=fingerprint_number))
+        db.session.commit()
+    return app
+
+def ndjson(*logs):
+    return ''.join((log if isinstance(log, str) else json.dumps(log)) + '\n' for log in logs).encode()
+
+def post(client, body, key, encoding='gzip', signature=None):
+    """Send body as is (compress it first for the default Content-Encoding: gzip)"""
+    headers = {
+        'X-Sync-Signature': signature or hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest(),
+        'Idempotency-Key': key,
+        'X-Device-IP': '10.0.0.5'
+    }
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return client.post('/api/v2/sync/logs', data=body, headers=headers, content_type='application/x-ndjson')
+
+BATCH = gzip.compress(ndjson(
+    {'user_id': '100', 'timestamp': '2025-03-03T08:55:00'},
+    {'user_id': 100, 'timestamp': '2025-03-03T08:55:00'},       # same punch again in the batch
+    {'user_id': '999', 'timestamp': '2025-03-03T09:00:00'},     # no such user
+    {'user_id': '101', 'timestamp': 'yesterday'},
+    'not json',
+    {'user_id': '101', 'timestamp': '2025-03-03T17:05:00Z'}
+))
+
+def test_each_line_gets_a_result(app):
+    client = app.test_client()
+    response = post(client, BATCH, 'batch-1')
+    assert response.status_code == 200, response.get_json()
+    result = response.get_json()
+    assert result['results'] == ['inserted', 'duplicate', 'unmatched', 'invalid', 'invalid', 'inserted']
+    assert result['summary'] == {'inserted': 2, 'updated': 0, 'unchanged': 0, 'duplicate': 1, 'unmatched': 1,
+                                 'invalid': 2, 'received': 6}
+    assert [error['index'] for error in result['errors']] == [2, 3, 4]
+
+    response = post(client, gzip.compress(ndjson({'user_id': '100', 'timestamp': '2025-03-03T08:55:00'},
+                                                 {'user_id': '100', 'timestamp': '2025-03-04T09:00:00'})), 'batch-2')
+    assert response.get_json()['results'] == ['unchanged', 'inserted']
+    with app.app_context():
+        assert AttendanceLog.query.count() == 3
+
+def test_retried_batch_is_replayed_and_reused_key_is_refused(app):
+    client = app.test_client()
+    first = post(client, BATCH, 'batch-1').get_json()
+    with app.app_context():
+        AttendanceLog.query.delete()
+        db.session.commit()
+
+    retry = post(client, BATCH, 'batch-1')
+    assert retry.status_code == 200
+    assert retry.get_json() == dict(first, replayed=True)
+    with app.app_context():
+        assert AttendanceLog.query.count() == 0, 'a replayed batch should not be ingested again'
+
+    # The agent compresses the spooled batch again when it retries after a restart
+    recompressed = post(client, gzip.compress(gzip.decompress(BATCH), compresslevel=1, mtime=1), 'batch-1')
+    assert recompressed.status_code == 200, recompressed.get_json()
+    assert recompressed.get_json() == dict(first, replayed=True)
+
+    other = post(client, gzip.compress(ndjson({'user_id': '100', 'timestamp': '2025-03-05T09:00:00'})), 'batch-1')
+    assert other.status_code == 422, other.get_json()
+    with app.app_context():
+        assert AttendanceLog.query.count() == 0
+        assert SyncBatch.query.count() == 1
+
+def test_oversized_batches_are_rejected(app):
+    client = app.test_client()
+    # 64 KB of blank lines compresses to well under the 4 KB limit
+    bomb = post(client, gzip.compress(b'\n' * 65536), 'bomb')
+    assert bomb.status_code == 413, bomb.get_json()
+    assert post(client, b' ' * 5000, 'plain', encoding=None).status_code == 413
+    too_many = ndjson(*({'user_id': '100', 'timestamp': f'2025-03-03T09:{minute:02d}:00'} for minute in range(51)))
+    assert post(client, too_many, 'too-many', encoding=None).status_code == 413
+    assert post(client, BATCH[:-8], 'truncated').status_code == 400
+    with app.app_context():
+        assert AttendanceLog.query.count() == 0
+        assert SyncBatch.query.count() == 0, 'rejected batches should not store their key'
+
+def test_unsigned_or_unkeyed_batches_are_refused(app):
+    client = app.test_client()
+    assert post(client, BATCH, 'batch-1', signature='0' * 64).status_code == 401
+    assert post(client, BATCH, '').status_code == 400
+    assert post(client, BATCH, 'k' * 129).status_code == 400
+    with app.app_context():
+        assert AttendanceLog.query.count() == 0
+
+def test_only_the_uploaded_days_are_recomputed(app):
+    with app.app_context():
+        # Queued earlier, e.g. by a leave approval; left for the periodic drain
+        mark_attendance_dirty([(2, date(2025, 3, 10))])
+        db.session.commit()
+    assert post(app.test_client(), BATCH, 'batch-1').status_code == 200
+    with app.app_context():
+        assert [(row.user_id, row.date) for row in AttendanceDirtyDay.query.all()] == [(2, date(2025, 3, 10))]
+        assert {(row.user_id, row.date) for row in DailyAttendance.query.all()} == {(1, date(2025, 3, 3)), (2, date(2025, 3, 3))}
@@ -0,0 +1,144 @@
+"""
+Tests for the cluster-wide sync lease (connection_manager.py).
+
+Checks that only one holder gets the lease until it expires, that renewals tell a lease that is
+gone apart from a query that failed, that the heartbeat rides out transient database errors but
+marks the operation lost once the lease is gone or about to expire, and that a device ingest
+which lost the lease neither commits its batch nor moves the sync cursor. Uses a temporary
+SQLite database; no device, network or PostgreSQL needed.
+"""
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import connection_manager
+from connection_manager import (acquire_lease, renew_lease, release_lease, register_sync_operation,
+                                unregister_sync_operation, sync_lease_lost, check_sync_lease,
+                                SyncLeaseLost, SYNC_LEASE_NAME)
+from extensions import db
+from models import User, DeviceSettings, AttendanceLog, SyncLease
+from cache import cache, MemoryBackend
+from device_sessions import device_sessions
+from device_simulator import SimulatedDevice
+from routes.attendance import device_fetch_info, fetch_device_attendance, ingest_device_attendance
+
+def wait_for(condition, seconds=5):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+@pytest.fixture
+def app(make_app):
+    return make_app('leases.sqlite3')
+
+@pytest.fixture
+def fast_heartbeat(monkeypatch):
+    """Heartbeat every 50 ms against a 1 s lease"""
+    monkeypatch.setattr(connection_manager, 'SYNC_LEASE_HEARTBEAT', 0.05)
+    monkeypatch.setattr(connection_manager, 'SYNC_LEASE_RETRY', 0.05)
+    monkeypatch.setattr(connection_manager, 'SYNC_LEASE_TTL', 1)
+
+def test_lease_is_exclusive_until_released(app):
+    with app.app_context():
+        assert acquire_lease('job', 'first')
+        assert not acquire_lease('job', 'second')
+        assert acquire_lease('other-job', 'second'), 'leases are per name'
+        release_lease('job', 'second')  # not the holder: no effect
+        assert not acquire_lease('job', 'second')
+        release_lease('job', 'first')
+        assert acquire_lease('job', 'second')
+
+def test_expired_lease_is_taken_over(app):
+    with app.app_context():
+        assert acquire_lease('job', 'first', ttl=0)
+        time.sleep(0.01)
+        assert acquire_lease('job', 'second')
+        assert db.session.get(SyncLease, 'job').holder == 'second'
+        assert renew_lease('job', 'first') is False, 'the old holder must see the lease is gone'
+
+def test_renew_tells_a_lost_lease_from_a_failed_query(app, tmp_path):
+    with app.app_context():
+        assert acquire_lease('job', 'first', ttl=5)
+        before = db.session.get(SyncLease, 'job').expires_at
+        assert renew_lease('job', 'first', ttl=60) is True
+        db.session.expire_all()
+        assert db.session.get(SyncLease, 'job').expires_at > before
+
+        unreachable = create_engine(f"sqlite:///{tmp_path / 'missing' / 'db.sqlite3'}")
+        assert renew_lease('job', 'first', engine=unreachable) is None
+
+        release_lease('job', 'first')
+        assert renew_lease('job', 'first') is False
+
+def test_heartbeat_survives_transient_errors(app, fast_heartbeat, monkeypatch):
+    real_renew = connection_manager.renew_lease
+    calls = []
+
+    def flaky_renew(*args, **kwargs):
+        calls.append(args)
+        return None if len(calls) <= 2 else real_renew(*args, **kwargs)
+
+    monkeypatch.setattr(connection_manager, 'renew_lease', flaky_renew)
+    with app.app_context():
+        assert register_sync_operation('op-1')
+        try:
+            assert wait_for(lambda: len(calls) > 5)
+            assert not sync_lease_lost('op-1')
+            check_sync_lease('op-1')
+        finally:
+            unregister_sync_operation('op-1')
+
+def test_heartbeat_gives_up_before_the_lease_expires(app, fast_heartbeat, monkeypatch):
+    monkeypatch.setattr(connection_manager, 'renew_lease', lambda *args, **kwargs: None)
+    with app.app_context():
+        started = time.monotonic()
+        assert register_sync_operation('op-1')
+        try:
+            assert not sync_lease_lost('op-1'), 'one failed renewal must not give the lease up'
+            assert wait_for(lambda: sync_lease_lost('op-1'))
+            assert time.monotonic() - started < connection_manager.SYNC_LEASE_TTL
+            with pytest.raises(SyncLeaseLost):
+                check_sync_lease('op-1')
+        finally:
+            unregister_sync_operation('op-1')
+        assert not sync_lease_lost('op-1')
+
+def test_heartbeat_notices_a_cleared_lease(app, fast_heartbeat):
+    with app.app_context():
+        assert register_sync_operation('op-1')
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text('DELETE FROM sync_leases WHERE name = :name'), {'name': SYNC_LEASE_NAME})
+            assert wait_for(lambda: sync_lease_lost('op-1'))
+            assert acquire_lease(SYNC_LEASE_NAME, 'op-2'), 'another worker can take over'
+        finally:
+            unregister_sync_operation('op-1')
+
+def test_ingest_stops_when_the_lease_is_lost(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(User(first_name='Jane', last_name='Doe', email='jane@example.com', password_hash='x',
+                            role='employee', status='active', fingerprint_number='100'))
+        db.session.add(DeviceSettings(device_ip='10.0.0.5', device_port=4370, device_name='Entrance'))
+        db.session.commit()
+    cache.configure(MemoryBackend())
+    simulated = SimulatedDevice(users=[('100', 'Jane Doe')])
+    device_sessions.close_all()
+    device_sessions.configure(connector=simulated)
+    simulated.punch('100', datetime(2025, 3, 3, 9))
+
+    def lost():
+        raise SyncLeaseLost('lease lost')
+
+    with app.app_context():
+        device = db.session.get(DeviceSettings, 1)
+        with pytest.raises(SyncLeaseLost):
+            ingest_device_attendance(device, fetch_device_attendance(device_fetch_info(device)), check_lease=lost)
+        db.session.expire_all()
+        assert AttendanceLog.query.count() == 0
+        assert db.session.get(DeviceSettings, 1).last_sync_timestamp is None